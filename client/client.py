@@ -1,34 +1,215 @@
 # client/client.py
 
+import asyncio
 import grpc
+import queue
+import threading
 import uuid
 from mcp2pc import two_phase_pb2, two_phase_pb2_grpc
+from common import tracing
+from common.channels import get_aio_channel, get_channel
+from common.ops import InvalidOperation, Operation, parse_op
 
-def run_transaction(state_ops, recipient, amount_wei, timeout_blocks=500):
-    tx_id = uuid.uuid4().hex
-    stub = two_phase_pb2_grpc.CoordinatorStub(
-        grpc.insecure_channel("localhost:50051")
-    )
+def _op_fields(state_ops):
+    # state_ops may mix Operation messages (common/ops.py set_op /
+    # delete_op) and legacy "SET k v" strings; strings go out typed, except
+    # ones that don't parse, which are sent as-is in `operations` so the
+    # shards reject them with an ABORT vote
+    ops, legacy = [], []
+    for op in state_ops:
+        if isinstance(op, Operation):
+            ops.append(op)
+            continue
+        try:
+            ops.append(parse_op(op))
+        except InvalidOperation:
+            legacy.append(op)
+    return {"ops": ops, "operations": legacy}
+
+DEFAULT_TARGET = "localhost:50051"
+
+class Client:
+    # reusable coordinator client over the process-wide channel pool
+    # (common/channels.py): each call picks a long-lived, keepalive-tuned
+    # channel instead of dialing the coordinator again
+    def __init__(self, target=DEFAULT_TARGET):
+        self.target = target
+
+    def run(self, state_ops, recipient, amount_wei, timeout_blocks=500):
+        # one transaction end to end; True if it committed
+        stub = two_phase_pb2_grpc.CoordinatorStub(get_channel(self.target))
+        tx_id, prep_req = _prepare_request(state_ops, recipient, amount_wei, timeout_blocks)
+
+        # the root span of the tx's trace; every coordinator and shard span
+        # for it hangs below this one
+        with tracing.span("transaction", tx=tx_id) as span:
+            # Phase 1: off-chain vote
+            votes = [resp for resp in stub.Prepare(prep_req)]
+            if any(v.status == two_phase_pb2.PrepareResponse.ABORT for v in votes):
+                print("Abort triggered")
+                stub.Abort(two_phase_pb2.AbortRequest(transaction_id=tx_id))
+                _outcome(span, "aborted")
+                return False
+            if all(v.committed for v in votes):
+                # single-shard tx: the coordinator already committed it in one phase
+                print(f"Committed on shard {votes[0].shard_id} (one phase)")
+                _outcome(span, "committed")
+                return True
+
+            # Phase 2: commit (Coordinator does off-chain Commit + on-chain finalize)
+            stub.Commit(two_phase_pb2.CommitRequest(transaction_id=tx_id))
+            print(f"Committed on shards {[v.shard_id for v in votes]}")
+            _outcome(span, "committed")
+            return True
+
+    def run_many(self, transactions, max_inflight=32):
+        # many transactions at once over one Transact stream (run_pipelined)
+        return run_pipelined(transactions, max_inflight, self.target)
+
+
+class AioClient:
+    # asyncio counterpart of Client, over grpc.aio channels pooled per
+    # event loop; run_many keeps up to max_inflight transactions in flight
+    # as concurrent unary/streaming calls spread over the pool
+    def __init__(self, target=DEFAULT_TARGET):
+        self.target = target
+
+    async def run(self, state_ops, recipient, amount_wei, timeout_blocks=500):
+        _, committed = await self._run(state_ops, recipient, amount_wei, timeout_blocks)
+        return committed
+
+    async def run_many(self, transactions, max_inflight=32):
+        # transactions: iterable of (state_ops, recipient, amount_wei,
+        # timeout_blocks); returns { tx_id: True if committed }
+        slots = asyncio.Semaphore(max_inflight)
+
+        async def one(tx):
+            async with slots:
+                return await self._run(*tx)
+
+        return dict(await asyncio.gather(*(one(tx) for tx in transactions)))
 
-    prep_req = two_phase_pb2.PrepareRequest(
+    async def _run(self, state_ops, recipient, amount_wei, timeout_blocks):
+        stub = two_phase_pb2_grpc.CoordinatorStub(get_aio_channel(self.target))
+        tx_id, prep_req = _prepare_request(state_ops, recipient, amount_wei, timeout_blocks)
+        with tracing.span("transaction", tx=tx_id) as span:
+            try:
+                votes = [resp async for resp in stub.Prepare(prep_req)]
+                if any(v.status == two_phase_pb2.PrepareResponse.ABORT for v in votes):
+                    await stub.Abort(two_phase_pb2.AbortRequest(transaction_id=tx_id))
+                    _outcome(span, "aborted")
+                    return tx_id, False
+                if not all(v.committed for v in votes):
+                    await stub.Commit(two_phase_pb2.CommitRequest(transaction_id=tx_id))
+            except grpc.aio.AioRpcError as e:
+                print(f"Transaction {tx_id} failed: {e.details()}")
+                _outcome(span, "failed", f"ERROR {e.code().name}")
+                return tx_id, False
+            _outcome(span, "committed")
+            return tx_id, True
+
+
+def _prepare_request(state_ops, recipient, amount_wei, timeout_blocks):
+    tx_id = uuid.uuid4().hex
+    return tx_id, two_phase_pb2.PrepareRequest(
         transaction_id     = tx_id,
-        operations         = state_ops,
+        **_op_fields(state_ops),
         timeout_blocks     = timeout_blocks,
         onchain_recipient  = recipient,
-        onchain_amount     = amount_wei
+        onchain_amount     = amount_wei,
+        commit_on_ready    = True
     )
 
-    # Phase 1: off-chain vote
-    votes = [resp for resp in stub.Prepare(prep_req)]
-    if any(v.status != two_phase_pb2.PrepareResponse.READY for v in votes):
-        print("Abort triggered")
-        stub.Abort(two_phase_pb2.AbortRequest(transaction_id=tx_id))
-        return False
-
-    # Phase 2: commit (Coordinator does off-chain Commit + on-chain finalize)
-    stub.Commit(two_phase_pb2.CommitRequest(transaction_id=tx_id))
-    print(f"Committed on shards {[v.shard_id for v in votes]}")
-    return True
+def _outcome(span, outcome, status=None):
+    # records how a tx ended on its span (None while tracing is off)
+    if span is not None:
+        span.set(outcome=outcome)
+        if status is not None:
+            span.status = status
+
+def run_transaction(state_ops, recipient, amount_wei, timeout_blocks=500, target=DEFAULT_TARGET):
+    return Client(target).run(state_ops, recipient, amount_wei, timeout_blocks)
+
+def run_pipelined(transactions, max_inflight=32, target=DEFAULT_TARGET):
+    """
+    Drives many transactions over one Transact stream, keeping up to
+    `max_inflight` of them between prepare and final outcome at once.
+
+    transactions: iterable of (state_ops, recipient, amount_wei, timeout_blocks)
+    Returns { tx_id: True if committed, False if aborted or failed }.
+    """
+    stub = two_phase_pb2_grpc.CoordinatorStub(get_channel(target))
+
+    outgoing = queue.Queue()
+    slots    = threading.Semaphore(max_inflight)
+    outcomes = {}
+    lock     = threading.Lock()
+    state    = {"sent": 0, "fed": False, "closed": False}
+    done     = object()
+
+    def close_if_finished():
+        with lock:
+            if state["fed"] and len(outcomes) == state["sent"] and not state["closed"]:
+                state["closed"] = True
+                outgoing.put(done)
+
+    def feed():
+        try:
+            _feed()
+        finally:
+            # even if `transactions` raised, let the stream drain and close
+            with lock:
+                state["fed"] = True
+            close_if_finished()
+
+    def _feed():
+        for state_ops, recipient, amount_wei, timeout_blocks in transactions:
+            _, prep_req = _prepare_request(state_ops, recipient, amount_wei, timeout_blocks)
+            slots.acquire()   # released when the tx's outcome arrives
+            with lock:
+                state["sent"] += 1
+            outgoing.put(two_phase_pb2.TransactRequest(prepare=prep_req))
+
+    def requests():
+        while True:
+            req = outgoing.get()
+            if req is done:
+                return
+            yield req
+
+    threading.Thread(target=feed, daemon=True).start()
+    # one span for the whole stream; the coordinator adds a Transact/<kind>
+    # span per tx step under it
+    with tracing.span("pipeline"):
+        for resp in stub.Transact(requests()):
+            tx_id = resp.transaction_id
+            if resp.HasField("votes"):
+                votes = resp.votes.votes
+                if votes and all(v.committed for v in votes):
+                    # committed in one phase; there is no decision to send
+                    with lock:
+                        outcomes[tx_id] = True
+                    slots.release()
+                    close_if_finished()
+                    continue
+                # Phase 1 done: send the decision on the same stream
+                if all(v.status != two_phase_pb2.PrepareResponse.ABORT for v in votes):
+                    outgoing.put(two_phase_pb2.TransactRequest(
+                        commit=two_phase_pb2.CommitRequest(transaction_id=tx_id)))
+                else:
+                    outgoing.put(two_phase_pb2.TransactRequest(
+                        abort=two_phase_pb2.AbortRequest(transaction_id=tx_id)))
+                continue
+
+            outcome = resp.outcome
+            if outcome.error:
+                print(f"Transaction {tx_id} failed: {outcome.error}")
+            with lock:
+                outcomes[tx_id] = (outcome.decision == two_phase_pb2.Outcome.COMMITTED
+                                   and not outcome.error)
+            slots.release()
+            close_if_finished()
+    return outcomes
 
 if __name__ == "__main__":
     # parameters
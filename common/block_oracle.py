@@ -0,0 +1,180 @@
+import threading, time, logging
+from typing import Callable, Dict, List, Optional
+
+from . import lightclient
+
+logger = logging.getLogger(__name__)
+
+class BlockHeightOracle:
+    # shared view of one chain's head: caches the latest block height for up
+    # to `max_staleness` seconds, follows new heads in the background and
+    # pushes them to subscribers. Drop-in for LightClient.get_block_height.
+    def __init__(self, client, max_staleness: float = 1.0, poll_interval: float = 2.0):
+        self.client = client
+        self.max_staleness = max_staleness
+        self.poll_interval = poll_interval
+
+        self._height: Optional[int] = None
+        self._fetched_at = 0.0
+        self._cond = threading.Condition()
+        self._fetch_lock = threading.Lock()   # single-flight refreshes
+        self._subscribers: List[Callable[[int], None]] = []
+        self._dispatched: Optional[int] = None   # last head pushed to subscribers
+        self._poller: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()           # a caller saw a new head
+
+    def get_block_height(self) -> int:
+        # cached head if fresh enough, otherwise one RPC shared by all callers
+        height = self._fresh_height()
+        if height is not None:
+            return height
+        with self._fetch_lock:
+            height = self._fresh_height()
+            if height is not None:
+                return height
+            is_new = self._fetch()
+            height = self._height
+        if is_new:
+            # subscribers run on the poller, not on this caller's thread
+            self._wake.set()
+        return height
+
+    def refresh(self) -> int:
+        # unconditionally reads eth_blockNumber, publishes the result and
+        # runs the subscribers for a new head on the calling thread
+        self._fetch()
+        self._dispatch()
+        return self._height
+
+    def subscribe(self, callback: Callable[[int], None]) -> Callable[[], None]:
+        # callback(height) runs on the poller thread (or a refresh() caller)
+        # for every new head, never while the oracle holds a lock; returns a
+        # function that removes the subscription
+        with self._cond:
+            self._subscribers.append(callback)
+        self._ensure_poller()
+
+        def unsubscribe():
+            with self._cond:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+        return unsubscribe
+
+    def wait_for_height(self, target: int, timeout: Optional[float] = None) -> int:
+        # blocks until the chain reaches `target`; returns the observed height
+        height = self.get_block_height()
+        if height >= target:
+            return height
+        self._ensure_poller()
+        end = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._height is None or self._height < target:
+                remaining = None if end is None else end - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(f"block {target} not reached within {timeout}s "
+                                       f"(head={self._height})")
+                self._cond.wait(remaining)
+            return self._height
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+
+    # --- internals ---
+
+    def _fresh_height(self) -> Optional[int]:
+        with self._cond:
+            if (self._height is not None
+                    and time.monotonic() - self._fetched_at <= self.max_staleness):
+                return self._height
+        return None
+
+    def _fetch(self) -> bool:
+        # one eth_blockNumber into the cache; True if it is a new head
+        return self._observe(self.client.get_block_height())
+
+    def _observe(self, height: int) -> bool:
+        with self._cond:
+            self._fetched_at = time.monotonic()
+            if self._height is not None and height <= self._height:
+                return False
+            self._height = height
+            self._cond.notify_all()
+            return True
+
+    def _dispatch(self):
+        # pushes the cached head to subscribers unless it already was
+        with self._cond:
+            height = self._height
+            if height is None or (self._dispatched is not None and height <= self._dispatched):
+                return
+            self._dispatched = height
+            subscribers = list(self._subscribers)
+        for cb in subscribers:
+            try:
+                cb(height)
+            except Exception:
+                logger.exception(f"[BlockHeightOracle] subscriber failed at block {height}")
+
+    def _ensure_poller(self):
+        with self._cond:
+            if self._poller is not None:
+                return
+            self._poller = threading.Thread(
+                target=self._poll_loop, name="block-oracle", daemon=True
+            )
+        self._poller.start()
+
+    def _new_head_filter(self):
+        # eth_newBlockFilter lets us poll cheaply for "anything new?"; not
+        # every endpoint supports it, in which case we poll eth_blockNumber
+        try:
+            return self.client.w3.eth.filter("latest")
+        except Exception:
+            return None
+
+    def _poll_loop(self):
+        head_filter = self._new_head_filter()
+        while True:
+            woken = self._wake.wait(self.poll_interval)
+            if self._stop.is_set():
+                return
+            if woken:
+                # a get_block_height caller already fetched the new head
+                self._wake.clear()
+            else:
+                try:
+                    if head_filter is not None and not head_filter.get_new_entries():
+                        # no new head since last poll: cached height is current
+                        with self._cond:
+                            self._fetched_at = time.monotonic()
+                        continue
+                    self._fetch()
+                except Exception as e:
+                    logger.warning(f"[BlockHeightOracle] head poll failed: {e}")
+                    head_filter = None
+                    continue
+            self._dispatch()
+
+
+# process-wide registry, one oracle per RPC URL
+_oracles: Dict[str, BlockHeightOracle] = {}
+_registry_lock = threading.Lock()
+
+def get_oracle(rpc_url: str, **kwargs) -> BlockHeightOracle:
+    # returns the shared oracle for rpc_url, creating it (and its LightClient)
+    # on first use; kwargs only apply to that first call
+    with _registry_lock:
+        oracle = _oracles.get(rpc_url)
+        if oracle is None:
+            oracle = BlockHeightOracle(lightclient.LightClient(rpc_url), **kwargs)
+            _oracles[rpc_url] = oracle
+        return oracle
+
+def clear_oracles():
+    # stops and forgets every shared oracle (tests, clean shutdown)
+    with _registry_lock:
+        for oracle in _oracles.values():
+            oracle.close()
+        _oracles.clear()
@@ -0,0 +1,177 @@
+from functools import cached_property
+from typing import List, Optional, Tuple
+
+from web3 import AsyncWeb3, Web3
+from web3._utils.method_formatters import log_entry_formatter, receipt_formatter
+from web3.datastructures import AttributeDict
+from web3.exceptions import TransactionNotFound
+
+from . import simchain
+
+class ChainBackend:
+    # what the shards read from and send to a chain: head height, nonces,
+    # raw sends, receipts, view calls, fee history and logs. This base class answers through
+    # any Web3 instance; w3 stays exposed for what needs web3 itself
+    # (contract ABI encoding, build_transaction, account helpers).
+    def __init__(self, w3):
+        self.w3 = w3
+
+    def block_height(self) -> int:
+        return self.w3.eth.block_number
+
+    def nonce(self, address: str) -> int:
+        # the account's pending transaction count
+        return self.w3.eth.get_transaction_count(address, "pending")
+
+    def send(self, raw_tx: bytes):
+        # broadcasts a signed tx; returns its hash
+        return self.w3.eth.send_raw_transaction(raw_tx)
+
+    def receipts(self, hashes: List[bytes]) -> List[Optional[AttributeDict]]:
+        # receipt per hash, None for txs not mined yet; one JSON-RPC batch
+        # where the provider supports it
+        provider = self._batch_provider
+        if hasattr(provider, "make_batch_request"):
+            responses = provider.make_batch_request([
+                ("eth_getTransactionReceipt", ["0x" + bytes(h).hex()]) for h in hashes
+            ])
+            if not isinstance(responses, list):
+                # a batch-level error comes back as a single response
+                raise RuntimeError(responses.get("error", responses))
+            return [_receipt(r["result"]) if r.get("result") else None for r in responses]
+
+        receipts = []
+        for h in hashes:
+            try:
+                receipts.append(self.w3.eth.get_transaction_receipt(h))
+            except TransactionNotFound:
+                receipts.append(None)
+        return receipts
+
+    def call(self, to: str, data: bytes) -> bytes:
+        # eth_call at the latest block
+        return bytes(self.w3.eth.call({"to": to, "data": data}))
+
+    def fee_history(self, block_count: int, percentiles: List[float]) -> dict:
+        # eth_feeHistory up to the latest block: baseFeePerGas (block_count
+        # blocks, then the next block's) and per block the tip paid at each
+        # percentile, as ints
+        history = self.w3.eth.fee_history(block_count, "latest", percentiles)
+        return {"baseFeePerGas": list(history["baseFeePerGas"]),
+                "reward": [list(r) for r in history.get("reward") or ()]}
+
+    def logs(self, addresses: List[str], topics: list,
+             ranges: List[Tuple[int, int]]) -> List[List[AttributeDict]]:
+        # eth_getLogs per inclusive (from, to) block range, for logs of any
+        # of `addresses` matching `topics`; one JSON-RPC batch where the
+        # provider supports it
+        filters = [{"address": addresses, "topics": topics,
+                    "fromBlock": hex(first), "toBlock": hex(last)} for first, last in ranges]
+        provider = self._batch_provider
+        if hasattr(provider, "make_batch_request"):
+            responses = provider.make_batch_request([("eth_getLogs", [f]) for f in filters])
+            if not isinstance(responses, list):
+                raise RuntimeError(responses.get("error", responses))
+            for r in responses:
+                if "error" in r:
+                    raise RuntimeError(r["error"])
+            return [[_log(raw) for raw in r["result"]] for r in responses]
+        return [list(self.w3.eth.get_logs(f)) for f in filters]
+
+    @cached_property
+    def chain_id(self) -> int:
+        return self.w3.eth.chain_id
+
+    def is_connected(self) -> bool:
+        return self.w3.is_connected()
+
+    def async_w3(self) -> AsyncWeb3:
+        # an AsyncWeb3 on the same chain, for the grpc.aio servicers
+        raise NotImplementedError(f"{type(self).__name__} has no asyncio client")
+
+    @property
+    def _batch_provider(self):
+        return getattr(self.w3, "provider", None)
+
+
+class HTTPBackend(ChainBackend):
+    # a JSON-RPC node over HTTP. Nothing is sent until the first call, so
+    # services can start before their node is reachable.
+    def __init__(self, rpc_url: str):
+        super().__init__(Web3(Web3.HTTPProvider(rpc_url)))
+        self.rpc_url = rpc_url
+        # HTTPProvider.make_batch_request marks the whole provider as batching
+        # while it runs, so calls other threads make on w3 meanwhile come back
+        # as unsent batch entries; receipt batches go through a provider of
+        # their own
+        self._receipt_provider = Web3.HTTPProvider(rpc_url)
+
+    def async_w3(self) -> AsyncWeb3:
+        return AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(self.rpc_url))
+
+    @property
+    def _batch_provider(self):
+        return self._receipt_provider
+
+
+class SimBackend(ChainBackend):
+    # an in-process SimChain (common/simchain.py). Heads, sends and receipts
+    # go straight to the chain; w3 (over SimProvider) is there for contract
+    # encoding and anything else web3 builds.
+    def __init__(self, chain: simchain.SimChain):
+        super().__init__(Web3(simchain.SimProvider(chain)))
+        self.chain = chain
+
+    def block_height(self) -> int:
+        return self.chain.height
+
+    def nonce(self, address: str) -> int:
+        return int(self.chain.rpc("eth_getTransactionCount", [address, "pending"]), 16)
+
+    def send(self, raw_tx: bytes):
+        return bytes.fromhex(self.chain.rpc("eth_sendRawTransaction", ["0x" + bytes(raw_tx).hex()])[2:])
+
+    def receipts(self, hashes: List[bytes]) -> List[Optional[AttributeDict]]:
+        raw = [self.chain.rpc("eth_getTransactionReceipt", ["0x" + bytes(h).hex()]) for h in hashes]
+        return [_receipt(r) if r else None for r in raw]
+
+    def fee_history(self, block_count: int, percentiles: List[float]) -> dict:
+        raw = self.chain.rpc("eth_feeHistory", [block_count, "latest", percentiles])
+        return {"baseFeePerGas": [int(b, 16) for b in raw["baseFeePerGas"]],
+                "reward": [[int(t, 16) for t in r] for r in raw.get("reward", ())]}
+
+    def logs(self, addresses: List[str], topics: list,
+             ranges: List[Tuple[int, int]]) -> List[List[AttributeDict]]:
+        return [[_log(raw) for raw in self.chain.rpc("eth_getLogs", [{
+                    "address": addresses, "topics": topics,
+                    "fromBlock": hex(first), "toBlock": hex(last)}])]
+                for first, last in ranges]
+
+    @cached_property
+    def chain_id(self) -> int:
+        return self.chain.CHAIN_ID
+
+    def is_connected(self) -> bool:
+        return True
+
+    def async_w3(self) -> AsyncWeb3:
+        return AsyncWeb3(simchain.AsyncSimProvider(self.chain))
+
+
+def _receipt(raw: dict) -> AttributeDict:
+    # a raw eth_getTransactionReceipt result as web3 returns it: attribute
+    # access all the way down, which event decoding relies on for the logs
+    return AttributeDict.recursive(receipt_formatter(raw))
+
+
+def _log(raw: dict) -> AttributeDict:
+    # a raw eth_getLogs entry as web3 returns it
+    return AttributeDict.recursive(log_entry_formatter(raw))
+
+
+def connect(rpc_url: str) -> ChainBackend:
+    # "sim://<name>" is a SimChain registered in this process (see
+    # simchain.register); anything else is an HTTP JSON-RPC endpoint
+    if rpc_url.startswith("sim://"):
+        return SimBackend(simchain.get_chain(rpc_url))
+    return HTTPBackend(rpc_url)
@@ -0,0 +1,128 @@
+import asyncio, itertools, json, threading, weakref
+from typing import Dict, List, Tuple
+
+import grpc
+
+from .interceptors import ClientMetricsInterceptor, ClientTracingInterceptor, aio_client_interceptors
+
+# keepalive pings find a dead peer (a crashed shard, a dropped NAT entry)
+# within ~40s instead of at the next call's deadline
+KEEPALIVE_MS         = 30_000
+KEEPALIVE_TIMEOUT_MS = 10_000
+MAX_MESSAGE_BYTES    = 64 << 20   # PrepareBatch/LockOnChainBatch can be big
+MAX_STREAMS          = 1000       # concurrent calls per server connection
+
+# transparent retries, only for the shard's off-chain calls: all are
+# idempotent (Prepare re-takes locks it holds and re-stages the same writes).
+# On-chain calls send transactions and are never retried here.
+_RETRIED = ["Prepare", "Commit", "Abort", "Rollback", "PrepareBatch", "CommitBatch", "AbortBatch"]
+SERVICE_CONFIG = {
+    "methodConfig": [{
+        "name": [{"service": "mcp2pc.Shard", "method": m} for m in _RETRIED],
+        "retryPolicy": {
+            "maxAttempts": 3,
+            "initialBackoff": "0.05s",
+            "maxBackoff": "0.5s",
+            "backoffMultiplier": 2,
+            "retryableStatusCodes": ["UNAVAILABLE"],
+        },
+    }],
+}
+
+CHANNEL_OPTIONS: List[Tuple[str, object]] = [
+    ("grpc.keepalive_time_ms", KEEPALIVE_MS),
+    ("grpc.keepalive_timeout_ms", KEEPALIVE_TIMEOUT_MS),
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.max_pings_without_data", 0),
+    ("grpc.max_send_message_length", MAX_MESSAGE_BYTES),
+    ("grpc.max_receive_message_length", MAX_MESSAGE_BYTES),
+    ("grpc.enable_retries", 1),
+    ("grpc.service_config", json.dumps(SERVICE_CONFIG)),
+    # a connection of its own per pooled channel, rather than one shared
+    # subchannel per target, so a pool spreads calls over several sockets
+    ("grpc.use_local_subchannel_pool", 1),
+]
+
+# servers must accept the clients' keepalive pings, or they answer them
+# with GOAWAY ("too_many_pings")
+SERVER_OPTIONS: List[Tuple[str, object]] = [
+    ("grpc.keepalive_time_ms", KEEPALIVE_MS),
+    ("grpc.keepalive_timeout_ms", KEEPALIVE_TIMEOUT_MS),
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.min_ping_interval_without_data_ms", KEEPALIVE_MS // 2),
+    ("grpc.http2.max_ping_strikes", 0),
+    ("grpc.max_concurrent_streams", MAX_STREAMS),
+    ("grpc.max_send_message_length", MAX_MESSAGE_BYTES),
+    ("grpc.max_receive_message_length", MAX_MESSAGE_BYTES),
+]
+
+class ChannelPool:
+    # long-lived channels, `size` per target, handed out round-robin. One
+    # HTTP/2 connection carries at most MAX_STREAMS calls at once; several
+    # let a busy client go past that. aio=True makes grpc.aio channels,
+    # which belong to the event loop they were made on. Every call is
+    # recorded in the grpc_client_* metrics and, while tracing is on, as a
+    # client span whose context travels to the server.
+    def __init__(self, size: int = 4, options=None, aio: bool = False):
+        if size < 1:
+            raise ValueError("a channel pool needs at least one channel per target")
+        self.size = size
+        self.options = list(CHANNEL_OPTIONS if options is None else options)
+        self.aio = aio
+        self._channels: Dict[str, list] = {}
+        self._turns: Dict[str, itertools.count] = {}
+        self._lock = threading.Lock()
+
+    def get(self, target: str):
+        with self._lock:
+            channels = self._channels.get(target)
+            if channels is None:
+                channels = [self._open(target) for _ in range(self.size)]
+                self._channels[target] = channels
+                self._turns[target] = itertools.count()
+            return channels[next(self._turns[target]) % self.size]
+
+    def _open(self, target):
+        if self.aio:
+            return grpc.aio.insecure_channel(target, options=self.options,
+                                             interceptors=aio_client_interceptors())
+        return grpc.intercept_channel(grpc.insecure_channel(target, options=self.options),
+                                      ClientMetricsInterceptor(), ClientTracingInterceptor())
+
+    def close(self):
+        for channel in self._drain():
+            channel.close()
+
+    async def aclose(self):
+        # close() for an aio pool
+        await asyncio.gather(*(channel.close() for channel in self._drain()))
+
+    def _drain(self):
+        with self._lock:
+            channels = [ch for chs in self._channels.values() for ch in chs]
+            self._channels.clear()
+            self._turns.clear()
+        return channels
+
+
+# process-wide pools: one for sync channels, one per running event loop
+_pool = ChannelPool()
+_aio_pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, ChannelPool]" = weakref.WeakKeyDictionary()
+_registry_lock = threading.Lock()
+
+def get_channel(target: str) -> grpc.Channel:
+    # a pooled, keepalive-tuned channel to target
+    return _pool.get(target)
+
+def get_aio_channel(target: str) -> grpc.aio.Channel:
+    # the grpc.aio counterpart of get_channel, for the running event loop
+    loop = asyncio.get_running_loop()
+    with _registry_lock:
+        pool = _aio_pools.get(loop)
+        if pool is None:
+            pool = _aio_pools[loop] = ChannelPool(aio=True)
+    return pool.get(target)
+
+def close_channels():
+    # closes every pooled sync channel (tests, clean shutdown)
+    _pool.close()
@@ -0,0 +1,101 @@
+import statistics, threading, logging
+from typing import NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+GWEI = 10**9
+
+class Fees(NamedTuple):
+    max_fee: int   # maxFeePerGas
+    tip: int       # maxPriorityFeePerGas
+
+    def as_tx(self) -> dict:
+        # the EIP-1559 fields of a transaction dict
+        return {"maxFeePerGas": self.max_fee, "maxPriorityFeePerGas": self.tip}
+
+    @classmethod
+    def of(cls, tx: dict) -> "Fees":
+        return cls(tx["maxFeePerGas"], tx["maxPriorityFeePerGas"])
+
+
+class FeeEngine:
+    # EIP-1559 fees for a shard's adapter transactions, priced by how many
+    # blocks are left before the tx's deadline. The tip is a percentile of
+    # the tips paid in the last HISTORY_BLOCKS blocks (eth_feeHistory, read
+    # at most once per block and shared by every caller): the 10th with
+    # plenty of time, the 90th within URGENT_BLOCKS of the deadline. The fee
+    # cap leaves room for the base fee to rise 12.5% in every block until
+    # the tx would be replaced (after `replace_after` blocks unmined).
+    HISTORY_BLOCKS = 20
+    PERCENTILES    = (10, 50, 90)
+    URGENT_BLOCKS  = 5      # this close to the deadline: 90th percentile tip
+    RELAXED_BLOCKS = 50     # at least this far from it: 10th percentile tip
+    DEFAULT_TIP    = GWEI   # when recent blocks paid no tips at all
+    # a replacement raises both caps by this much; nodes require at least
+    # 10% to accept one under the same nonce
+    BUMP = 0.125
+
+    def __init__(self, chain, oracle, replace_after: int = 3, max_fee_cap: int = 500 * GWEI):
+        self.chain = chain
+        self.oracle = oracle
+        self.replace_after = replace_after
+        self.max_fee_cap = max_fee_cap
+        self._history = None
+        self._history_height: Optional[int] = None
+        self._lock = threading.Lock()   # single-flight history reads
+
+    def quote(self, deadline: Optional[int] = None) -> Fees:
+        # fees for a tx that must be mined by block `deadline` (None: no
+        # deadline, priced at the median tip)
+        height, history = self._recent()
+        base = history["baseFeePerGas"][-1]   # the next block's base fee
+        tip = self._tip(history, self._percentile_index(deadline, height))
+        growth = 9**self.replace_after
+        max_fee = -(-base * growth // 8**self.replace_after) + tip
+        return self._capped(Fees(max_fee, tip))
+
+    def bump(self, fees: Fees, deadline: Optional[int] = None) -> Optional[Fees]:
+        # fees to replace a tx sent with `fees`: at least BUMP above both of
+        # its caps, and no less than a fresh quote. None if max_fee_cap
+        # leaves no room for a replacement the node would accept.
+        fresh = self.quote(deadline)
+        bumped = Fees(max(_raise(fees.max_fee, self.BUMP), fresh.max_fee),
+                      max(_raise(fees.tip, self.BUMP), fresh.tip))
+        capped = self._capped(bumped)
+        if capped.max_fee < _raise(fees.max_fee, 0.1) or capped.tip < _raise(fees.tip, 0.1):
+            return None
+        return capped
+
+    # --- internals ---
+
+    def _recent(self):
+        # (head height, fee history up to it), re-read once per new head
+        height = self.oracle.get_block_height()
+        with self._lock:
+            if self._history_height != height:
+                self._history = self.chain.fee_history(self.HISTORY_BLOCKS, list(self.PERCENTILES))
+                self._history_height = height
+            return height, self._history
+
+    def _percentile_index(self, deadline, height) -> int:
+        if deadline is None:
+            return 1
+        left = deadline - height
+        if left <= self.URGENT_BLOCKS:
+            return 2
+        return 0 if left >= self.RELAXED_BLOCKS else 1
+
+    def _tip(self, history, index) -> int:
+        # median over recent blocks of their tip at PERCENTILES[index];
+        # empty blocks report 0 and are skipped
+        paid = [r[index] for r in history.get("reward") or () if r and r[index]]
+        return int(statistics.median(paid)) if paid else self.DEFAULT_TIP
+
+    def _capped(self, fees: Fees) -> Fees:
+        max_fee = min(fees.max_fee, self.max_fee_cap)
+        return Fees(max_fee, min(fees.tip, max_fee))
+
+
+def _raise(value: int, fraction: float) -> int:
+    # value increased by `fraction`, rounded up
+    return value + -(-value * int(fraction * 1000) // 1000)
@@ -0,0 +1,74 @@
+import threading, logging
+from concurrent import futures
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Tuple
+
+from . import tracing
+
+logger = logging.getLogger(__name__)
+
+class GroupWindow:
+    # collects items submitted by concurrent callers and hands them to
+    # flush(items) as one group, once `max_size` items are waiting or
+    # `window` seconds after the first one arrived, whichever comes first.
+    # flush returns one result per item, in order; each caller's Future
+    # resolves to its own result. Extra latency is bounded by `window`.
+    # While tracing, a flush is one span in the first caller's trace, linked
+    # to the spans of the others.
+    def __init__(self, flush: Callable[[List[Any]], List[Any]],
+                 window: float, max_size: int, name: str = "group",
+                 flush_workers: int = 4):
+        self.window = window
+        self.max_size = max_size
+        self.name = name
+        self._flush = flush
+        self._group: List[Tuple[Any, Future, Optional[tracing.SpanContext]]] = []
+        self._generation = 0   # bumped on every flush, so stale timers no-op
+        self._lock = threading.Lock()
+        self._executor = futures.ThreadPoolExecutor(
+            max_workers=flush_workers, thread_name_prefix=f"{name}-flush"
+        )
+
+    def submit(self, item) -> Future:
+        fut = Future()
+        with self._lock:
+            self._group.append((item, fut, tracing.current_context()))
+            if len(self._group) >= self.max_size:
+                self._dispatch_locked()
+            elif len(self._group) == 1:
+                timer = threading.Timer(self.window, self._on_timer, args=(self._generation,))
+                timer.daemon = True
+                timer.start()
+        return fut
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    # --- internals ---
+
+    def _on_timer(self, generation: int):
+        with self._lock:
+            if generation == self._generation and self._group:
+                self._dispatch_locked()
+
+    def _dispatch_locked(self):
+        group, self._group = self._group, []
+        self._generation += 1
+        self._executor.submit(self._run, group)
+
+    def _run(self, group: List[Tuple[Any, Future, Optional[tracing.SpanContext]]]):
+        logger.debug(f"[GroupWindow:{self.name}] flushing {len(group)} item(s)")
+        callers = [ctx for _, _, ctx in group]
+        try:
+            with tracing.span(f"{self.name} group", parent=callers[0], links=callers[1:],
+                              size=len(group)):
+                results = self._flush([item for item, _, _ in group])
+            if len(results) != len(group):
+                raise RuntimeError(f"expected {len(group)} results, got {len(results)}")
+        except Exception as e:
+            logger.exception(f"[GroupWindow:{self.name}] flush of {len(group)} item(s) failed")
+            for _, fut, _ in group:
+                fut.set_exception(e)
+            return
+        for (_, fut, _), result in zip(group, results):
+            fut.set_result(result)
@@ -0,0 +1,367 @@
+import asyncio, inspect, time
+
+import grpc
+
+from . import metrics, tracing
+
+# per-RPC metrics, server and client side, labelled like the go-grpc-prometheus
+# families so existing dashboards apply
+_HANDLED_SECONDS = {
+    side: metrics.histogram(f"grpc_{side}_handling_seconds",
+                            f"Seconds from start to end of an RPC, {side} side",
+                            ("grpc_service", "grpc_method"))
+    for side in ("server", "client")
+}
+_HANDLED = {
+    side: metrics.counter(f"grpc_{side}_handled_total",
+                          f"RPCs completed, by status code, {side} side",
+                          ("grpc_service", "grpc_method", "grpc_code"))
+    for side in ("server", "client")
+}
+_IN_FLIGHT = {
+    side: metrics.gauge(f"grpc_{side}_in_flight",
+                        f"RPCs started and not yet completed, {side} side",
+                        ("grpc_service", "grpc_method"))
+    for side in ("server", "client")
+}
+
+class _Call:
+    # one RPC being measured: in flight from construction until done()
+    def __init__(self, side: str, full_method: str):
+        service, _, method = full_method.lstrip("/").rpartition("/")
+        self.side = side
+        self.labels = {"grpc_service": service, "grpc_method": method}
+        self.started = time.perf_counter()
+        self.finished = False
+        _IN_FLIGHT[side].inc(**self.labels)
+
+    def done(self, code):
+        if self.finished:
+            return
+        self.finished = True
+        _IN_FLIGHT[self.side].dec(**self.labels)
+        _HANDLED_SECONDS[self.side].observe(time.perf_counter() - self.started, **self.labels)
+        code = code or grpc.StatusCode.OK
+        _HANDLED[self.side].inc(grpc_code=getattr(code, "name", code), **self.labels)
+
+
+def _code(context, default):
+    # the status a handler set (abort, set_code), else `default`
+    code = context.code() if hasattr(context, "code") else None
+    return code if isinstance(code, grpc.StatusCode) else default
+
+def _status(code) -> str:
+    # a span status from a gRPC status code
+    if code is None or code == grpc.StatusCode.OK:
+        return "OK"
+    return f"ERROR {getattr(code, 'name', code)}"
+
+def _span_name(full_method) -> str:
+    # "/mcp2pc.Shard/Prepare" -> "Shard/Prepare"
+    if isinstance(full_method, bytes):
+        full_method = full_method.decode()
+    service, _, method = full_method.lstrip("/").rpartition("/")
+    return f"{service.rpartition('.')[2]}/{method}"
+
+def _tx_attrs(request) -> dict:
+    # the transaction(s) a request is about, as span attributes; streamed
+    # requests (an iterator) carry none
+    tx = getattr(request, "transaction_id", None)
+    if tx:
+        return {"tx": tx}
+    items = getattr(request, "requests", None) or getattr(request, "items", None)
+    txs = ([it.transaction_id for it in items] if items
+           else list(getattr(request, "transaction_ids", None) or ()))
+    return {"txs": txs} if txs else {}
+
+# --- server side ---
+
+_HANDLER_FACTORIES = {
+    "unary_unary":   grpc.unary_unary_rpc_method_handler,
+    "unary_stream":  grpc.unary_stream_rpc_method_handler,
+    "stream_unary":  grpc.stream_unary_rpc_method_handler,
+    "stream_stream": grpc.stream_stream_rpc_method_handler,
+}
+
+def _rewrap(handler, wrap):
+    # the same handler with its behavior passed through wrap(behavior, streams_out)
+    for kind, factory in _HANDLER_FACTORIES.items():
+        behavior = getattr(handler, kind)
+        if behavior is not None:
+            return factory(wrap(behavior, kind.endswith("stream")),
+                           request_deserializer=handler.request_deserializer,
+                           response_serializer=handler.response_serializer)
+    return handler
+
+
+class ServerMetricsInterceptor(grpc.ServerInterceptor):
+    # latency, in-flight count and status code of every RPC a grpc.server
+    # handles
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None:
+            return None
+        method = handler_call_details.method
+
+        def wrap(behavior, streams_out):
+            if streams_out:
+                def measured_stream(request, context):
+                    call, code = _Call("server", method), None
+                    try:
+                        yield from behavior(request, context)
+                    except GeneratorExit:
+                        code = grpc.StatusCode.CANCELLED
+                        raise
+                    except Exception:
+                        code = _code(context, grpc.StatusCode.UNKNOWN)
+                        raise
+                    finally:
+                        call.done(code or _code(context, grpc.StatusCode.OK))
+                return measured_stream
+
+            def measured(request, context):
+                call = _Call("server", method)
+                try:
+                    response = behavior(request, context)
+                except Exception:
+                    call.done(_code(context, grpc.StatusCode.UNKNOWN))
+                    raise
+                call.done(_code(context, grpc.StatusCode.OK))
+                return response
+            return measured
+
+        return _rewrap(handler, wrap)
+
+
+class AioServerMetricsInterceptor(grpc.aio.ServerInterceptor):
+    # ServerMetricsInterceptor for grpc.aio servers
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None:
+            return None
+        method = handler_call_details.method
+
+        def wrap(behavior, streams_out):
+            # streaming handlers that write through context.write instead of
+            # yielding are coroutines, measured like unary ones
+            if streams_out and inspect.isasyncgenfunction(behavior):
+                async def measured_stream(request, context):
+                    call, code = _Call("server", method), None
+                    try:
+                        async for response in behavior(request, context):
+                            yield response
+                    except asyncio.CancelledError:
+                        code = grpc.StatusCode.CANCELLED
+                        raise
+                    except Exception:
+                        code = _code(context, grpc.StatusCode.UNKNOWN)
+                        raise
+                    finally:
+                        call.done(code or _code(context, grpc.StatusCode.OK))
+                return measured_stream
+
+            async def measured(request, context):
+                call = _Call("server", method)
+                try:
+                    response = behavior(request, context)
+                    if inspect.isawaitable(response):
+                        response = await response
+                except asyncio.CancelledError:
+                    call.done(grpc.StatusCode.CANCELLED)
+                    raise
+                except Exception:
+                    call.done(_code(context, grpc.StatusCode.UNKNOWN))
+                    raise
+                call.done(_code(context, grpc.StatusCode.OK))
+                return response
+            return measured
+
+        return _rewrap(handler, wrap)
+
+
+class ServerTracingInterceptor(grpc.ServerInterceptor):
+    # a span per handled RPC, continuing the caller's trace from the
+    # traceparent in its metadata; `service` names this server in the spans
+    def __init__(self, service: str = ""):
+        self.attrs = {"kind": "server", "service": service} if service else {"kind": "server"}
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None or not tracing.enabled():
+            return handler
+        name = _span_name(handler_call_details.method)
+        parent = tracing.extract(handler_call_details.invocation_metadata)
+
+        def wrap(behavior, streams_out):
+            if streams_out:
+                def traced_stream(request, context):
+                    with tracing.span(name, parent, **self.attrs, **_tx_attrs(request)):
+                        yield from behavior(request, context)
+                return traced_stream
+
+            def traced(request, context):
+                with tracing.span(name, parent, **self.attrs, **_tx_attrs(request)):
+                    return behavior(request, context)
+            return traced
+
+        return _rewrap(handler, wrap)
+
+
+class AioServerTracingInterceptor(grpc.aio.ServerInterceptor):
+    # ServerTracingInterceptor for grpc.aio servers
+    def __init__(self, service: str = ""):
+        self.attrs = {"kind": "server", "service": service} if service else {"kind": "server"}
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None or not tracing.enabled():
+            return handler
+        name = _span_name(handler_call_details.method)
+        parent = tracing.extract(handler_call_details.invocation_metadata)
+
+        def wrap(behavior, streams_out):
+            if streams_out and inspect.isasyncgenfunction(behavior):
+                async def traced_stream(request, context):
+                    with tracing.span(name, parent, **self.attrs, **_tx_attrs(request)):
+                        async for response in behavior(request, context):
+                            yield response
+                return traced_stream
+
+            async def traced(request, context):
+                with tracing.span(name, parent, **self.attrs, **_tx_attrs(request)):
+                    response = behavior(request, context)
+                    if inspect.isawaitable(response):
+                        response = await response
+                    return response
+            return traced
+
+        return _rewrap(handler, wrap)
+
+# --- client side ---
+
+class ClientMetricsInterceptor(grpc.UnaryUnaryClientInterceptor,
+                               grpc.UnaryStreamClientInterceptor,
+                               grpc.StreamUnaryClientInterceptor,
+                               grpc.StreamStreamClientInterceptor):
+    # per-RPC metrics for calls made on a channel wrapped with
+    # grpc.intercept_channel; every call object is also a grpc.Future, and
+    # the metrics are recorded when it completes
+    def _measure(self, continuation, details, request):
+        call = _Call("client", details.method)
+        try:
+            outcome = continuation(details, request)
+        except Exception:
+            call.done(grpc.StatusCode.UNKNOWN)
+            raise
+        outcome.add_done_callback(lambda f: call.done(f.code()))
+        return outcome
+
+    intercept_unary_unary   = _measure
+    intercept_unary_stream  = _measure
+    intercept_stream_unary  = _measure
+    intercept_stream_stream = _measure
+
+
+class _AioClientMetrics:
+    # ClientMetricsInterceptor for grpc.aio channels, which take one
+    # interceptor object per call type (see aio_client_interceptors)
+    async def _measure(self, continuation, details, request):
+        method = details.method
+        call = _Call("client", method.decode() if isinstance(method, bytes) else method)
+        try:
+            outcome = await continuation(details, request)
+        except Exception:
+            call.done(grpc.StatusCode.UNKNOWN)
+            raise
+        # the status is only readable by awaiting it, which is instant once
+        # the call is done
+        outcome.add_done_callback(lambda c: asyncio.ensure_future(_finish(call.done, c)))
+        return outcome
+
+class _AioUnaryUnary(_AioClientMetrics, grpc.aio.UnaryUnaryClientInterceptor):
+    intercept_unary_unary = _AioClientMetrics._measure
+
+class _AioUnaryStream(_AioClientMetrics, grpc.aio.UnaryStreamClientInterceptor):
+    intercept_unary_stream = _AioClientMetrics._measure
+
+class _AioStreamUnary(_AioClientMetrics, grpc.aio.StreamUnaryClientInterceptor):
+    intercept_stream_unary = _AioClientMetrics._measure
+
+class _AioStreamStream(_AioClientMetrics, grpc.aio.StreamStreamClientInterceptor):
+    intercept_stream_stream = _AioClientMetrics._measure
+
+
+
+class ClientTracingInterceptor(grpc.UnaryUnaryClientInterceptor,
+                               grpc.UnaryStreamClientInterceptor,
+                               grpc.StreamUnaryClientInterceptor,
+                               grpc.StreamStreamClientInterceptor):
+    # a client span per call, child of the caller's current span, whose
+    # context goes out in the traceparent metadata so the server's span
+    # continues the same trace
+    def _trace(self, continuation, details, request):
+        if not tracing.enabled():
+            return continuation(details, request)
+        span = tracing.Span(_span_name(details.method), tracing.current_context(),
+                            kind="client", **_tx_attrs(request))
+        metadata = list(details.metadata or ()) + [(tracing.TRACEPARENT, span.context.traceparent)]
+        try:
+            outcome = continuation(details._replace(metadata=metadata), request)
+        except Exception as e:
+            span.finish(f"ERROR {type(e).__name__}")
+            raise
+        outcome.add_done_callback(lambda f: span.finish(_status(f.code())))
+        return outcome
+
+    intercept_unary_unary   = _trace
+    intercept_unary_stream  = _trace
+    intercept_stream_unary  = _trace
+    intercept_stream_stream = _trace
+
+
+class _AioClientTracing:
+    # ClientTracingInterceptor for grpc.aio channels
+    async def _trace(self, continuation, details, request):
+        if not tracing.enabled():
+            return await continuation(details, request)
+        span = tracing.Span(_span_name(details.method), tracing.current_context(),
+                            kind="client", **_tx_attrs(request))
+        metadata = grpc.aio.Metadata(*(details.metadata or ()))
+        metadata.add(tracing.TRACEPARENT, span.context.traceparent)
+        try:
+            outcome = await continuation(details._replace(metadata=metadata), request)
+        except Exception as e:
+            span.finish(f"ERROR {type(e).__name__}")
+            raise
+        outcome.add_done_callback(lambda c: asyncio.ensure_future(
+            _finish(lambda code: span.finish(_status(code)), c)))
+        return outcome
+
+class _AioTracedUnaryUnary(_AioClientTracing, grpc.aio.UnaryUnaryClientInterceptor):
+    intercept_unary_unary = _AioClientTracing._trace
+
+class _AioTracedUnaryStream(_AioClientTracing, grpc.aio.UnaryStreamClientInterceptor):
+    intercept_unary_stream = _AioClientTracing._trace
+
+class _AioTracedStreamUnary(_AioClientTracing, grpc.aio.StreamUnaryClientInterceptor):
+    intercept_stream_unary = _AioClientTracing._trace
+
+class _AioTracedStreamStream(_AioClientTracing, grpc.aio.StreamStreamClientInterceptor):
+    intercept_stream_stream = _AioClientTracing._trace
+
+
+def aio_client_interceptors() -> list:
+    # grpc.aio.insecure_channel(..., interceptors=aio_client_interceptors()):
+    # metrics, then tracing, for each call type
+    return [_AioUnaryUnary(), _AioUnaryStream(), _AioStreamUnary(), _AioStreamStream(),
+            _AioTracedUnaryUnary(), _AioTracedUnaryStream(),
+            _AioTracedStreamUnary(), _AioTracedStreamStream()]
+
+
+async def _finish(done, outcome):
+    # done(status code) once the aio call `outcome` has finished
+    try:
+        code = await outcome.code()
+    except asyncio.CancelledError:
+        code = grpc.StatusCode.CANCELLED
+    done(code)
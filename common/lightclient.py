@@ -1,12 +1,17 @@
-from web3 import Web3
+from .chain_backend import ChainBackend, connect
 
 class LightClient:
-    # minimal Ethereum light client wrapper to fetch block heights
+    # minimal Ethereum light client wrapper to fetch block heights. The
+    # chain behind it is a ChainBackend (common/chain_backend.py): an HTTP
+    # node, or an in-process SimChain for a "sim://<name>" URL. Nothing is
+    # sent at construction; is_connected() checks the endpoint.
     def __init__(self, rpc_url: str):
-        self.w3 = Web3(Web3.HTTPProvider(rpc_url))
-        if not self.w3.is_connected():
-            raise ConnectionError(f"Unable to connect to RPC at {rpc_url}")
+        self.backend: ChainBackend = connect(rpc_url)
+        self.w3 = self.backend.w3
 
     def get_block_height(self) -> int:
         # returns the latest block number on the chain
-        return self.w3.eth.block_number
\ No newline at end of file
+        return self.backend.block_height()
+
+    def is_connected(self) -> bool:
+        return self.backend.is_connected()
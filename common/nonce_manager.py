@@ -0,0 +1,80 @@
+import heapq, threading, logging
+from typing import List, Optional, Set
+
+from . import tracing
+
+logger = logging.getLogger(__name__)
+
+def is_nonce_too_low(err: Exception) -> bool:
+    # node-side rejections meaning the nonce was already used or mined
+    msg = str(err).lower()
+    return "nonce too low" in msg or "nonce has already been used" in msg
+
+class NonceManager:
+    # hands out nonces for one account locally, so many transactions from the
+    # same key can be signed and sent concurrently without racing on
+    # get_transaction_count. Starts from (and resyncs to) the pending count
+    # the ChainBackend reports. A sent tx the node later drops leaves that
+    # count below the nonces handed out; the next resync finds the gap and
+    # hands the lost nonce out again.
+    def __init__(self, chain, address: str):
+        self.chain = chain
+        self.address = address
+        self._lock = threading.Lock()
+        self._next: Optional[int] = None
+        self._inflight: Set[int] = set()   # allocated, not yet broadcast
+        self._free: List[int] = []         # min-heap of gaps to reuse first
+
+    def allocate(self) -> int:
+        with self._lock:
+            if self._next is None:
+                self._sync_locked()
+            if self._free:
+                nonce = heapq.heappop(self._free)
+            else:
+                nonce = self._next
+                self._next += 1
+            self._inflight.add(nonce)
+            return nonce
+
+    def confirm(self, nonce: int):
+        # the tx using `nonce` was accepted by the node
+        with self._lock:
+            self._inflight.discard(nonce)
+
+    def release(self, nonce: int):
+        # the tx using `nonce` never reached the mempool; give it back so the
+        # next allocation fills the gap instead of stalling later nonces
+        with self._lock:
+            self._inflight.discard(nonce)
+            if self._next is None or nonce >= self._next:
+                return
+            if nonce == self._next - 1:
+                self._next = nonce
+            elif nonce not in self._free:
+                heapq.heappush(self._free, nonce)
+
+    def resync(self):
+        # re-reads the pending count, e.g. after a "nonce too low" rejection
+        # or when a sent tx gets no receipt in time
+        with self._lock:
+            self._sync_locked()
+
+    def _sync_locked(self):
+        with tracing.span("chain/nonce", address=self.address):
+            pending = self.chain.nonce(self.address)
+        if self._next is not None and pending != self._next:
+            logger.info(f"[NonceManager] {self.address} resync: local={self._next} pending={pending}")
+
+        if self._next is None or pending >= self._next:
+            # the node has seen everything we handed out (or more)
+            self._next = pending
+            self._free = []
+            return
+
+        # nonces in [pending, _next) are in flight locally or were lost; the
+        # lowest lost one is a gap that blocks every later nonce
+        self._free = [n for n in self._free if n >= pending]
+        if pending not in self._inflight and pending not in self._free:
+            self._free.append(pending)
+        heapq.heapify(self._free)
@@ -0,0 +1,72 @@
+import threading, logging
+from collections import defaultdict
+from concurrent import futures
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from . import tracing
+
+logger = logging.getLogger(__name__)
+
+class OnChainBatcher:
+    # queues on-chain adapter actions ("lock", "commit", "reclaim") and
+    # flushes each kind once per new block, so everything that piled up in
+    # between goes out as one *Batch adapter call instead of one Ethereum tx
+    # per item. `flush(kind, items)` sends one batch and returns a
+    # (tx_hash, error) pair per item, error "" meaning success. While
+    # tracing, each batch is a span in its first item's trace, linked to
+    # the spans of the others (as in GroupWindow).
+    def __init__(self, oracle, flush: Callable[[str, List[Any]], List[Tuple[str, str]]],
+                 max_batch: int = 100, flush_workers: int = 4):
+        self.max_batch = max_batch
+        self._flush = flush
+        self._queues: Dict[str, List[Tuple[Any, Future, Optional[tracing.SpanContext]]]] = defaultdict(list)
+        self._lock = threading.Lock()
+        # flushes wait for receipts, which arrive on the oracle thread, so
+        # they must not run on it
+        self._executor = futures.ThreadPoolExecutor(
+            max_workers=flush_workers, thread_name_prefix="onchain-flush"
+        )
+        self._unsubscribe = oracle.subscribe(self._on_block)
+
+    def submit(self, kind: str, item) -> Future:
+        # Future resolving to (tx_hash, error) once the item's batch is mined
+        fut = Future()
+        with self._lock:
+            self._queues[kind].append((item, fut, tracing.current_context()))
+        return fut
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return sum(len(q) for q in self._queues.values())
+
+    def close(self):
+        self._unsubscribe()
+        self._executor.shutdown(wait=False)
+
+    # --- internals ---
+
+    def _on_block(self, height: int):
+        with self._lock:
+            queues, self._queues = self._queues, defaultdict(list)
+        for kind, queued in queues.items():
+            for i in range(0, len(queued), self.max_batch):
+                chunk = queued[i:i + self.max_batch]
+                logger.debug(f"[OnChainBatcher] block {height}: flushing {len(chunk)} {kind}(s)")
+                self._executor.submit(self._run, kind, chunk)
+
+    def _run(self, kind: str, chunk: List[Tuple[Any, Future, Optional[tracing.SpanContext]]]):
+        callers = [ctx for _, _, ctx in chunk]
+        try:
+            with tracing.span(f"{kind} batch", parent=callers[0], links=callers[1:],
+                              size=len(chunk)):
+                results = self._flush(kind, [item for item, _, _ in chunk])
+            if len(results) != len(chunk):
+                raise RuntimeError(f"expected {len(chunk)} results, got {len(results)}")
+        except Exception as e:
+            logger.warning(f"[OnChainBatcher] {kind} batch of {len(chunk)} failed: {e}")
+            for _, fut, _ in chunk:
+                fut.set_exception(e)
+            return
+        for (_, fut, _), result in zip(chunk, results):
+            fut.set_result(result)
@@ -0,0 +1,70 @@
+from typing import Dict, Optional, Tuple
+
+from mcp2pc import two_phase_pb2
+
+Operation = two_phase_pb2.Operation
+
+class InvalidOperation(ValueError):
+    # a state change a shard refuses to stage; it votes ABORT instead
+    pass
+
+# --- building ops (clients) ---
+
+def set_op(key, value) -> Operation:
+    return Operation(opcode=Operation.SET, key=_bytes(key), value=_bytes(value))
+
+def delete_op(key) -> Operation:
+    return Operation(opcode=Operation.DELETE, key=_bytes(key))
+
+def read_op(key) -> Operation:
+    return Operation(opcode=Operation.READ, key=_bytes(key))
+
+def parse_op(text: str) -> Operation:
+    # legacy string form -> typed op: "SET k v" or "DEL k"
+    key, value = _parse_legacy(text)
+    return delete_op(key) if value is None else set_op(key, value)
+
+# --- compiling ops (shards) ---
+
+def compile_write_set(request) -> Dict[str, Optional[str]]:
+    # validates a PrepareRequest's typed `ops`, then its legacy string
+    # `operations`, into the write set applied at Commit: key -> new value,
+    # None for a delete; the last change to a key wins. READ ops write
+    # nothing. Raises InvalidOperation on the first malformed op.
+    writes = {}
+    for op in getattr(request, "ops", ()):
+        if not op.key:
+            raise InvalidOperation("operation without a key")
+        key = _text(op.key)
+        if op.opcode == Operation.SET:
+            writes[key] = _text(op.value)
+        elif op.opcode == Operation.DELETE:
+            writes[key] = None
+        elif op.opcode == Operation.READ:
+            continue
+        else:
+            raise InvalidOperation(f"unknown opcode {op.opcode} for key {key!r}")
+    for text in request.operations:
+        key, value = _parse_legacy(text)
+        writes[key] = value
+    return writes
+
+def _parse_legacy(text: str) -> Tuple[str, Optional[str]]:
+    parts = text.split(maxsplit=2)
+    verb = parts[0].upper() if parts else ""
+    if verb == "SET" and len(parts) == 3:
+        return parts[1], parts[2]
+    if verb in ("DEL", "DELETE") and len(parts) == 2:
+        return parts[1], None
+    raise InvalidOperation(f"malformed operation {text!r}")
+
+# shard state is str -> str; arbitrary key/value bytes round-trip through
+# surrogateescape, so non-UTF-8 bytes survive the log and snapshots
+
+def _text(raw: bytes) -> str:
+    return raw.decode("utf-8", "surrogateescape")
+
+def _bytes(value) -> bytes:
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode("utf-8", "surrogateescape")
@@ -0,0 +1,100 @@
+import bisect, hashlib, json
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+from mcp2pc import two_phase_pb2
+from common.ops import InvalidOperation, Operation, parse_op
+
+class HashRing:
+    # consistent-hash ring: each shard owns `vnodes` points, a key belongs
+    # to the first point at or after its hash. Adding a shard moves only
+    # ~1/N of the keys.
+    def __init__(self, shard_ids: Iterable[str], vnodes: int = 128):
+        points = sorted(
+            (_hash(f"{sid}#{i}".encode()), sid)
+            for sid in shard_ids for i in range(vnodes)
+        )
+        if not points:
+            raise ValueError("hash ring needs at least one shard")
+        self._hashes = [h for h, _ in points]
+        self._owners = [sid for _, sid in points]
+
+    def owner(self, key: bytes) -> str:
+        i = bisect.bisect_left(self._hashes, _hash(key))
+        return self._owners[i % len(self._owners)]
+
+
+class RangeMap:
+    # key-range partitioning: ranges = [[lower bound, shard], ...]; a key
+    # belongs to the range with the greatest lower bound <= key. The first
+    # bound must be "" so every key has an owner.
+    def __init__(self, ranges: List[Tuple[str, str]]):
+        ranges = sorted((lo.encode(), sid) for lo, sid in ranges)
+        if not ranges or ranges[0][0] != b"":
+            raise ValueError('key ranges must start at ""')
+        self._bounds = [lo for lo, _ in ranges]
+        self._owners = [sid for _, sid in ranges]
+
+    def owner(self, key: bytes) -> str:
+        return self._owners[bisect.bisect_right(self._bounds, key) - 1]
+
+
+def load_partitioner(path, shard_ids):
+    # {"scheme": "hash", "vnodes": 128} or
+    # {"scheme": "range", "ranges": [["", "shard1"], ["m", "shard2"]]}
+    with open(path) as f:
+        cfg = json.load(f)
+    scheme = cfg.get("scheme", "hash")
+    if scheme == "hash":
+        return HashRing(shard_ids, cfg.get("vnodes", 128))
+    if scheme == "range":
+        ranges = cfg["ranges"]
+        unknown = {sid for _, sid in ranges} - set(shard_ids)
+        if unknown:
+            raise ValueError(f"key ranges name unknown shard(s) {sorted(unknown)}")
+        return RangeMap(ranges)
+    raise ValueError(f"unknown partitioning scheme {scheme!r}")
+
+
+def split_request(request, partitioner) -> Dict[str, two_phase_pb2.PrepareRequest]:
+    # splits a PrepareRequest into one sub-request per shard owning any of
+    # its keys, each op kept in its original relative order. Ops whose key
+    # can't be read go to the shard owning the tx id, which rejects them.
+    # The on-chain transfer goes to one shard only, so it happens once: the
+    # shard owning the tx id if it writes, else the first writer by id; a
+    # tx that writes nothing is paid by the shard owning its id. Shards
+    # left with only READ ops and no transfer vote READ_ONLY.
+    home = partitioner.owner(request.transaction_id.encode())
+    parts = defaultdict(lambda: {"ops": [], "operations": []})
+    writers = set()
+    for op in request.ops:
+        sid = partitioner.owner(op.key)
+        parts[sid]["ops"].append(op)
+        if op.opcode != Operation.READ:
+            writers.add(sid)
+    for text in request.operations:
+        try:
+            sid = partitioner.owner(parse_op(text).key)
+        except InvalidOperation:
+            sid = home
+        parts[sid]["operations"].append(text)
+        writers.add(sid)
+    payer = home if home in writers or not writers else min(writers)
+    onchain = {
+        "onchain_recipient": request.onchain_recipient,
+        "onchain_amount":    request.onchain_amount,
+    }
+    return {
+        sid: two_phase_pb2.PrepareRequest(
+            transaction_id = request.transaction_id,
+            timeout_blocks = request.timeout_blocks,
+            start_ts       = request.start_ts,
+            **(onchain if sid == payer else {}),
+            **parts[sid]
+        )
+        for sid in sorted(set(parts) | {payer})
+    }
+
+
+def _hash(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "big")
@@ -0,0 +1,97 @@
+import heapq, itertools, threading, logging
+from concurrent import futures
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class ReceiptTracker:
+    # resolves one Future per pending tx hash. Instead of every handler
+    # polling wait_for_transaction_receipt on its own, all outstanding
+    # receipts are fetched together once per new block, through
+    # ChainBackend.receipts (one JSON-RPC batch where the provider supports it).
+    def __init__(self, chain, oracle):
+        self.chain = chain
+        self.oracle = oracle
+        self._pending: Dict[bytes, Future] = {}
+        # min-heap of (height, seq, Future) for after_blocks
+        self._heights: List[Tuple[int, int, Future]] = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._unsubscribe = oracle.subscribe(self._on_block)
+
+    def track(self, tx_hash) -> Future:
+        # Future resolving to the tx receipt; safe to call more than once
+        key = bytes(tx_hash)
+        with self._lock:
+            fut = self._pending.get(key)
+            if fut is None:
+                fut = self._pending[key] = Future()
+            return fut
+
+    def wait(self, tx_hash, timeout: Optional[float] = 120):
+        # drop-in for w3.eth.wait_for_transaction_receipt (same 120s default)
+        fut = self.track(tx_hash)
+        try:
+            return fut.result(timeout)
+        except futures.TimeoutError:
+            self.forget(tx_hash)
+            raise
+
+    def after_blocks(self, n: int) -> Future:
+        # Future resolving to the head height once n blocks past the current
+        # head have been seen, right after that block's receipt poll; lets a
+        # caller wait for a receipt "or n blocks", whichever comes first
+        target = self.oracle.get_block_height() + n
+        fut = Future()
+        with self._lock:
+            heapq.heappush(self._heights, (target, next(self._seq), fut))
+        return fut
+
+    def forget(self, tx_hash):
+        with self._lock:
+            self._pending.pop(bytes(tx_hash), None)
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def close(self):
+        self._unsubscribe()
+
+    # --- internals ---
+
+    def _on_block(self, height: int):
+        try:
+            self._poll(height)
+        finally:
+            with self._lock:
+                reached = []
+                while self._heights and self._heights[0][0] <= height:
+                    reached.append(heapq.heappop(self._heights)[2])
+            for fut in reached:
+                if not fut.done():
+                    fut.set_result(height)
+
+    def _poll(self, height: int):
+        with self._lock:
+            hashes = list(self._pending)
+        if not hashes:
+            return
+        try:
+            receipts = self.chain.receipts(hashes)
+        except Exception as e:
+            logger.warning(f"[ReceiptTracker] receipt poll at block {height} failed: {e}")
+            return
+
+        found = 0
+        for key, receipt in zip(hashes, receipts):
+            if receipt is None:
+                continue
+            with self._lock:
+                fut = self._pending.pop(key, None)
+            if fut is not None and not fut.done():
+                fut.set_result(receipt)
+                found += 1
+        logger.debug(f"[ReceiptTracker] block {height}: {found}/{len(hashes)} receipts")
+
@@ -0,0 +1,684 @@
+# common/simchain.py
+import argparse, itertools, json, logging, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import rlp
+from eth_abi import decode as abi_decode, encode as abi_encode
+from eth_account import Account
+from eth_account.typed_transactions import TypedTransaction
+from eth_utils import keccak, to_checksum_address
+from hexbytes import HexBytes
+from web3.providers.async_base import AsyncBaseProvider
+from web3.providers.base import BaseProvider
+
+logger = logging.getLogger(__name__)
+
+ABI_PATH = Path(__file__).parent.parent / "abi" / "TwoPhaseAdapter.json"
+
+# TwoPhaseAdapter.Status
+NONE, PENDING, COMMITTED, ABORTED = range(4)
+
+# gas charged per adapter call (batch calls: base + per item); a tx whose
+# gas limit is below this runs out of gas and reverts
+GAS_COST = {
+    "lockFunds": 70_000, "lockAndCommit": 80_000, "commit": 45_000, "reclaim": 45_000,
+}
+BATCH_GAS_BASE = 30_000
+BATCH_GAS_PER_ITEM = {"lockFundsBatch": 65_000, "commitBatch": 40_000, "reclaimBatch": 40_000}
+TRANSFER_GAS = 21_000
+
+class Revert(Exception):
+    pass
+
+class SimChain:
+    # in-memory Ethereum-like chain for benchmarks and local runs: funded
+    # accounts with nonces, a fee-ordered mempool, one block every
+    # `block_time` seconds, and TwoPhaseAdapter instances whose methods
+    # (checks, events, transfers) are implemented in Python instead of EVM
+    # bytecode. Web3 reaches it through SimProvider ("sim://<name>" RPC URLs,
+    # see register()) or, from other processes, through serve_http().
+    CHAIN_ID  = 1337
+    GAS_LIMIT = 30_000_000
+    FUNDING   = 10**24     # every account starts with 1M ether
+
+    def __init__(self, block_time: float = 0.1, base_fee: int = 10**9, adapters=()):
+        self.block_time = block_time
+        self.base_fee = base_fee
+        self._lock = threading.RLock()
+        self._balances: Dict[str, int] = {}
+        self._nonces: Dict[str, int] = {}
+        # address -> {txId: [sender, recipient, amount, deadline, status]}
+        self._adapters: Dict[str, Dict[bytes, list]] = {}
+        self._mempool: Dict[Tuple[str, int], dict] = {}   # (sender, nonce) -> tx
+        self._txs: Dict[bytes, dict] = {}
+        self._receipts: Dict[bytes, dict] = {}
+        self._blocks: List[dict] = []
+        self._block_tips: List[List[Tuple[int, int]]] = []   # (tip, gas used) per tx
+        self._stop = threading.Event()
+        self._miner: Optional[threading.Thread] = None
+        self._abi = _AdapterAbi(json.loads(ABI_PATH.read_text()))
+        for address in adapters:
+            self.deploy_adapter(address)
+        self._seal([], 0)      # genesis
+
+    # --- control ---
+
+    def deploy_adapter(self, address: Optional[str] = None) -> str:
+        with self._lock:
+            if address is None:
+                address = "0x" + keccak(f"adapter-{len(self._adapters)}".encode())[-20:].hex()
+            address = to_checksum_address(address)
+            self._adapters.setdefault(address, {})
+            return address
+
+    def start(self):
+        # mines a block every block_time seconds on a background thread;
+        # with block_time=0 each accepted tx is mined as it arrives instead
+        if self._miner is None and self.block_time:
+            self._miner = threading.Thread(target=self._mine_loop, name="simchain-miner", daemon=True)
+            self._miner.start()
+        return self
+
+    def close(self):
+        self._stop.set()
+        if self._miner is not None:
+            self._miner.join()
+
+    def mine(self) -> int:
+        # seals one block from the mempool; returns its number
+        with self._lock:
+            included, gas = [], 0
+            nonces = dict(self._nonces)
+            while True:
+                ready = [tx for (sender, nonce), tx in self._mempool.items()
+                         if nonce == nonces.get(sender, 0) and tx["max_fee"] >= self.base_fee
+                         and gas + tx["gas"] <= self.GAS_LIMIT]
+                if not ready:
+                    break
+                # highest tip first, like a fee-maximizing block builder
+                tx = max(ready, key=lambda t: (self._tip(t), -t["seq"]))
+                del self._mempool[(tx["from"], tx["nonce"])]
+                nonces[tx["from"]] = tx["nonce"] + 1
+                included.append(tx)
+                gas += tx["gas"]
+            return self._seal(included, gas)
+
+    @property
+    def height(self) -> int:
+        with self._lock:
+            return self._blocks[-1]["number"]
+
+    def adapter_tx(self, address: str, tx_id32: bytes) -> Optional[list]:
+        # [sender, recipient, amount, deadline, status] of an adapter entry
+        with self._lock:
+            entry = self._adapters[to_checksum_address(address)].get(tx_id32)
+            return list(entry) if entry else None
+
+    def balance(self, address: str) -> int:
+        with self._lock:
+            return self._balance(to_checksum_address(address))
+
+    def stats(self) -> dict:
+        # counters for benchmark reports
+        with self._lock:
+            return {
+                "height":   self._blocks[-1]["number"],
+                "mined":    len(self._receipts),
+                "reverted": sum(1 for r in self._receipts.values() if r["status"] == "0x0"),
+                "pending":  len(self._mempool),
+                "gas_used": sum(int(b["gasUsed"], 16) for b in self._blocks),
+            }
+
+    # --- JSON-RPC ---
+
+    def rpc(self, method: str, params: list):
+        # result of one JSON-RPC call; raises ValueError for a node-side error
+        handler = getattr(self, "_rpc_" + method, None)
+        if handler is None:
+            raise ValueError(f"the method {method} does not exist/is not available")
+        with self._lock:
+            return handler(*params)
+
+    def _rpc_web3_clientVersion(self):
+        return "SimChain/v1"
+
+    def _rpc_net_version(self):
+        return str(self.CHAIN_ID)
+
+    def _rpc_eth_chainId(self):
+        return hex(self.CHAIN_ID)
+
+    def _rpc_eth_blockNumber(self):
+        return hex(self._blocks[-1]["number"])
+
+    def _rpc_eth_gasPrice(self):
+        return hex(self.base_fee + 10**9)
+
+    def _rpc_eth_maxPriorityFeePerGas(self):
+        return hex(10**9)
+
+    def _rpc_eth_feeHistory(self, block_count, newest_block="latest", reward_percentiles=None):
+        # base fees of the blocks asked for plus the next one's, and per
+        # block the tip paid at each percentile of its gas, as geth reports them
+        count = block_count if isinstance(block_count, int) else int(block_count, 16)
+        newest = (self._blocks[-1]["number"] if newest_block in ("latest", "pending")
+                  else int(newest_block, 16))
+        oldest = max(0, newest - count + 1)
+        blocks = self._blocks[oldest:newest + 1]
+        next_base = self.base_fee if newest == self._blocks[-1]["number"] else \
+            int(self._blocks[newest + 1]["baseFeePerGas"], 16)
+        out = {
+            "oldestBlock":   hex(oldest),
+            "baseFeePerGas": [b["baseFeePerGas"] for b in blocks] + [hex(next_base)],
+            "gasUsedRatio":  [int(b["gasUsed"], 16) / self.GAS_LIMIT for b in blocks],
+        }
+        if reward_percentiles:
+            out["reward"] = [[hex(t) for t in _tips_at(self._block_tips[b["number"]], reward_percentiles)]
+                             for b in blocks]
+        return out
+
+    def _rpc_eth_getLogs(self, flt):
+        # logs of the mined blocks in [fromBlock, toBlock], filtered by
+        # address (one or a list) and topics (per position: None, a topic or
+        # a list of alternatives)
+        last = self._blocks[-1]["number"]
+        def block_number(tag, default):
+            if tag in (None, "latest", "pending", "safe", "finalized"):
+                return default if tag is None else last
+            return 0 if tag == "earliest" else int(tag, 16)
+        first, end = block_number(flt.get("fromBlock"), last), block_number(flt.get("toBlock"), last)
+        addresses = flt.get("address")
+        if isinstance(addresses, str):
+            addresses = [addresses]
+        addresses = {a.lower() for a in addresses} if addresses else None
+        topics = [None if t is None else {x.lower() for x in ([t] if isinstance(t, str) else t)}
+                  for t in flt.get("topics") or ()]
+
+        out = []
+        for block in self._blocks[first:min(end, last) + 1]:
+            for h in block["transactions"]:
+                for log in self._receipts[bytes.fromhex(h[2:])]["logs"]:
+                    if addresses is not None and log["address"].lower() not in addresses:
+                        continue
+                    if all(want is None or (i < len(log["topics"]) and log["topics"][i] in want)
+                           for i, want in enumerate(topics)):
+                        out.append(log)
+        return out
+
+    def _rpc_eth_estimateGas(self, tx, block="latest"):
+        data = bytes.fromhex(tx.get("data", tx.get("input", "0x"))[2:])
+        return hex(self._gas_cost(data))
+
+    def _rpc_eth_getBalance(self, address, block="latest"):
+        return hex(self._balance(to_checksum_address(address)))
+
+    def _rpc_eth_getTransactionCount(self, address, block="latest"):
+        address = to_checksum_address(address)
+        nonce = self._nonces.get(address, 0)
+        if block == "pending":
+            while (address, nonce) in self._mempool:
+                nonce += 1
+        return hex(nonce)
+
+    def _rpc_eth_getBlockByNumber(self, number, full=False):
+        if number in ("latest", "pending", "safe", "finalized"):
+            block = self._blocks[-1]
+        elif number == "earliest":
+            block = self._blocks[0]
+        else:
+            n = int(number, 16)
+            if n >= len(self._blocks):
+                return None
+            block = self._blocks[n]
+        out = {**block, "number": hex(block["number"])}
+        if full:
+            out["transactions"] = [self._tx_json(self._txs[bytes.fromhex(h[2:])])
+                                   for h in block["transactions"]]
+        return out
+
+    def _rpc_eth_sendRawTransaction(self, raw_hex):
+        tx = self._decode(bytes.fromhex(raw_hex[2:]))
+        sender, nonce = tx["from"], tx["nonce"]
+        if tx["chain_id"] not in (None, self.CHAIN_ID):
+            raise ValueError(f"invalid chain id {tx['chain_id']}")
+        if nonce < self._nonces.get(sender, 0):
+            raise ValueError(f"nonce too low: next nonce {self._nonces.get(sender, 0)}, tx nonce {nonce}")
+        if tx["value"] + tx["gas"] * tx["max_fee"] > self._balance(sender):
+            raise ValueError("insufficient funds for gas * price + value")
+        old = self._mempool.get((sender, nonce))
+        if old is not None:
+            # a replacement must raise both fee caps by at least 10%
+            if tx["max_fee"] < old["max_fee"] * 11 // 10 or tx["tip_cap"] < old["tip_cap"] * 11 // 10:
+                raise ValueError("replacement transaction underpriced")
+        self._mempool[(sender, nonce)] = tx
+        self._txs[tx["hash"]] = tx
+        if not self.block_time:
+            self.mine()      # instant blocks: every accepted tx is mined at once
+        return "0x" + tx["hash"].hex()
+
+    def _rpc_eth_getTransactionByHash(self, tx_hash):
+        tx = self._txs.get(bytes.fromhex(tx_hash[2:]))
+        return self._tx_json(tx) if tx else None
+
+    def _rpc_eth_getTransactionReceipt(self, tx_hash):
+        return self._receipts.get(bytes.fromhex(tx_hash[2:]))
+
+    def _rpc_eth_call(self, call, block="latest"):
+        to = to_checksum_address(call["to"])
+        data = bytes.fromhex(call.get("data", call.get("input", "0x"))[2:])
+        if to not in self._adapters:
+            return "0x"
+        fn, args = self._abi.decode_call(data)
+        if fn["name"] != "transactions":
+            raise ValueError("execution reverted: only view calls are simulated")
+        entry = self._adapters[to].get(args[0]) or [_ZERO, _ZERO, 0, 0, NONE]
+        return "0x" + abi_encode([o["type"] for o in fn["outputs"]], entry).hex()
+
+    # --- block building ---
+
+    def _mine_loop(self):
+        while not self._stop.wait(self.block_time):
+            try:
+                self.mine()
+            except Exception:
+                logger.exception("[SimChain] mining failed")
+
+    def _seal(self, txs: List[dict], gas: int) -> int:
+        number = len(self._blocks)
+        parent = self._blocks[-1]["hash"] if self._blocks else "0x" + "00" * 32
+        block_hash = "0x" + keccak(f"block-{number}-{parent}".encode()).hex()
+        receipts, log_index = [], 0
+        for i, tx in enumerate(txs):
+            receipt = self._execute(tx, number, block_hash, i, log_index)
+            log_index += len(receipt["logs"])
+            receipts.append(receipt)
+            self._receipts[tx["hash"]] = receipt
+            tx["block"] = (number, block_hash, i)
+        self._block_tips.append([
+            (int(r["effectiveGasPrice"], 16) - self.base_fee, int(r["gasUsed"], 16)) for r in receipts
+        ])
+        self._blocks.append({
+            "number":        number,
+            "hash":          block_hash,
+            "parentHash":    parent,
+            "timestamp":     hex(int(time.time())),
+            "baseFeePerGas": hex(self.base_fee),
+            "gasLimit":      hex(self.GAS_LIMIT),
+            "gasUsed":       hex(sum(int(r["gasUsed"], 16) for r in receipts)),
+            "miner":         _ZERO,
+            "transactions":  ["0x" + tx["hash"].hex() for tx in txs],
+        })
+        if txs:
+            logger.debug(f"[SimChain] block {number}: {len(txs)} tx(s)")
+        return number
+
+    def _execute(self, tx, number, block_hash, index, log_index) -> dict:
+        sender, to = tx["from"], tx["to"]
+        self._nonces[sender] = tx["nonce"] + 1
+        price = min(tx["max_fee"], self.base_fee + tx["tip_cap"])
+        cost = self._gas_cost(tx["data"]) if to in self._adapters else TRANSFER_GAS
+        gas_used, logs, status = min(cost, tx["gas"]), [], 1
+        balances = self._balances
+        try:
+            if cost > tx["gas"]:
+                raise Revert("out of gas")
+            if to is None:
+                raise Revert("contract creation is not simulated")
+            # state changes are staged on copies and kept only on success
+            balances = dict(self._balances)
+            self._debit(balances, sender, tx["value"])
+            if to in self._adapters:
+                entries = dict(self._adapters[to])
+                logs = self._call_adapter(to, entries, balances, tx, number)
+                self._adapters[to] = entries
+            else:
+                balances[to] = self._balance(to, balances) + tx["value"]
+        except Revert as e:
+            status, logs, balances = 0, [], self._balances
+            logger.debug(f"[SimChain] tx {tx['hash'].hex()} reverted: {e}")
+        self._balances = balances
+        self._debit(self._balances, sender, gas_used * price, allow_debt=True)
+
+        def log_json(i, log):
+            return {"address": to, "topics": log[0], "data": log[1],
+                    "blockNumber": hex(number), "blockHash": block_hash,
+                    "transactionHash": "0x" + tx["hash"].hex(),
+                    "transactionIndex": hex(index), "logIndex": hex(log_index + i),
+                    "removed": False}
+
+        return {
+            "transactionHash":   "0x" + tx["hash"].hex(),
+            "transactionIndex":  hex(index),
+            "blockHash":         block_hash,
+            "blockNumber":       hex(number),
+            "from":              sender,
+            "to":                to,
+            "cumulativeGasUsed": hex(gas_used),
+            "gasUsed":           hex(gas_used),
+            "effectiveGasPrice": hex(price),
+            "contractAddress":   None,
+            "logs":              [log_json(i, log) for i, log in enumerate(logs)],
+            "logsBloom":         "0x" + "00" * 256,
+            "status":            hex(status),
+            "type":              hex(tx["type"]),
+        }
+
+    # --- TwoPhaseAdapter ---
+
+    def _call_adapter(self, adapter, entries, balances, tx, number) -> list:
+        # runs one adapter method against staged copies; raises Revert
+        try:
+            fn, args = self._abi.decode_call(tx["data"])
+        except ValueError as e:
+            raise Revert(str(e))
+        sender, value, logs = tx["from"], tx["value"], []
+        event = self._abi.event_log
+
+        def lock_error(tx_id, amount, deadline):
+            if tx_id in entries:              return "TX exists"
+            if amount == 0:                   return "Must lock >0"
+            if deadline <= number:            return "Deadline in past"
+            return ""
+
+        def settle_error(tx_id, commit):
+            entry = entries.get(tx_id)
+            if entry is None or entry[4] != PENDING: return "Not pending"
+            if commit and number > entry[3]:         return "Past deadline"
+            if not commit and number <= entry[3]:    return "Too early"
+            return ""
+
+        def pay(to, amount):
+            self._debit(balances, adapter, amount)
+            balances[to] = self._balance(to, balances) + amount
+
+        def lock(tx_id, recipient, amount, deadline):
+            entries[tx_id] = [sender, to_checksum_address(recipient), amount, deadline, PENDING]
+            logs.append(event("Locked", tx_id, sender, recipient, amount, deadline))
+
+        def settle(tx_id, commit):
+            entry = entries[tx_id] = list(entries[tx_id])
+            entry[4] = COMMITTED if commit else ABORTED
+            pay(entry[1] if commit else entry[0], entry[2])
+            logs.append(event("Committed" if commit else "Reclaimed", tx_id))
+
+        balances[adapter] = self._balance(adapter, balances) + value
+        name = fn["name"]
+        if name in ("lockFunds", "lockAndCommit"):
+            tx_id, recipient, deadline = args
+            err = lock_error(tx_id, value, deadline)
+            if err:
+                raise Revert(err)
+            lock(tx_id, recipient, value, deadline)
+            if name == "lockAndCommit":
+                settle(tx_id, commit=True)
+        elif name in ("commit", "reclaim"):
+            (tx_id,) = args
+            err = settle_error(tx_id, name == "commit")
+            if err:
+                raise Revert(err)
+            settle(tx_id, name == "commit")
+        elif name == "lockFundsBatch":
+            (items,) = args
+            if sum(it[2] for it in items) != value:
+                raise Revert("Value mismatch")
+            refund = 0
+            for tx_id, recipient, amount, deadline in items:
+                err = lock_error(tx_id, amount, deadline)
+                if err:
+                    refund += amount
+                    logs.append(event("BatchItemFailed", tx_id, err))
+                else:
+                    lock(tx_id, recipient, amount, deadline)
+            if refund:
+                pay(sender, refund)
+        elif name in ("commitBatch", "reclaimBatch"):
+            (tx_ids,) = args
+            commit = name == "commitBatch"
+            for tx_id in tx_ids:
+                err = settle_error(tx_id, commit)
+                if err:
+                    logs.append(event("BatchItemFailed", tx_id, err))
+                else:
+                    settle(tx_id, commit)
+        else:
+            raise Revert(f"{name} is not a transaction")
+        return logs
+
+    # --- helpers ---
+
+    def _gas_cost(self, data: bytes) -> int:
+        try:
+            fn, args = self._abi.decode_call(data)
+        except ValueError:
+            return TRANSFER_GAS
+        name = fn["name"]
+        if name in BATCH_GAS_PER_ITEM:
+            return BATCH_GAS_BASE + BATCH_GAS_PER_ITEM[name] * len(args[0])
+        return GAS_COST.get(name, TRANSFER_GAS)
+
+    def _tip(self, tx) -> int:
+        return min(tx["tip_cap"], tx["max_fee"] - self.base_fee)
+
+    def _balance(self, address, balances=None) -> int:
+        balances = self._balances if balances is None else balances
+        if address in self._adapters:
+            return balances.get(address, 0)
+        return balances.get(address, self.FUNDING)
+
+    def _debit(self, balances, address, amount, allow_debt=False):
+        have = self._balance(address, balances)
+        if amount > have and not allow_debt:
+            raise Revert("insufficient balance")
+        balances[address] = have - amount
+
+    def _decode(self, raw: bytes) -> dict:
+        # a signed legacy or typed (EIP-2930/1559) transaction
+        sender = to_checksum_address(Account.recover_transaction(raw))
+        if raw[0] < 0x80:
+            fields = TypedTransaction.from_bytes(HexBytes(raw)).as_dict()
+            tx_type = fields["type"]
+            max_fee = fields.get("maxFeePerGas", fields.get("gasPrice"))
+            tip_cap = fields.get("maxPriorityFeePerGas", max_fee)
+            chain_id = fields["chainId"]
+            to, value, data = fields["to"], fields["value"], bytes(fields["data"])
+            nonce, gas = fields["nonce"], fields["gas"]
+        else:
+            nonce, gas_price, gas, to, value, data, v, _, _ = rlp.decode(raw)
+            tx_type, max_fee = 0, int.from_bytes(gas_price, "big")
+            tip_cap = max_fee
+            v = int.from_bytes(v, "big")
+            chain_id = (v - 35) // 2 if v >= 35 else None
+            nonce, gas = int.from_bytes(nonce, "big"), int.from_bytes(gas, "big")
+            value = int.from_bytes(value, "big")
+        return {
+            "hash": keccak(raw), "from": sender, "to": to_checksum_address(to) if to else None,
+            "nonce": nonce, "gas": gas, "value": value, "data": bytes(data),
+            "max_fee": max_fee, "tip_cap": tip_cap, "type": tx_type, "chain_id": chain_id,
+            "seq": next(_seq), "block": None,
+        }
+
+    def _tx_json(self, tx) -> dict:
+        number, block_hash, index = tx["block"] or (None, None, None)
+        return {
+            "hash": "0x" + tx["hash"].hex(), "from": tx["from"], "to": tx["to"],
+            "nonce": hex(tx["nonce"]), "gas": hex(tx["gas"]), "value": hex(tx["value"]),
+            "input": "0x" + tx["data"].hex(), "type": hex(tx["type"]),
+            "maxFeePerGas": hex(tx["max_fee"]), "maxPriorityFeePerGas": hex(tx["tip_cap"]),
+            "chainId": hex(self.CHAIN_ID),
+            "blockNumber": None if number is None else hex(number),
+            "blockHash": block_hash,
+            "transactionIndex": None if index is None else hex(index),
+        }
+
+
+class _AdapterAbi:
+    # selectors, argument decoding and event encoding for TwoPhaseAdapter
+    def __init__(self, abi):
+        self.functions, self.events = {}, {}
+        for entry in abi:
+            if entry.get("type") == "function":
+                types = [_canonical(i) for i in entry["inputs"]]
+                selector = keccak(text=f"{entry['name']}({','.join(types)})")[:4]
+                self.functions[selector] = (entry, types)
+            elif entry.get("type") == "event":
+                types = [_canonical(i) for i in entry["inputs"]]
+                topic = keccak(text=f"{entry['name']}({','.join(types)})")
+                self.events[entry["name"]] = (entry, types, topic)
+
+    def decode_call(self, data: bytes):
+        fn = self.functions.get(data[:4])
+        if fn is None:
+            raise ValueError("unknown function selector")
+        entry, types = fn
+        return entry, list(abi_decode(types, data[4:]))
+
+    def event_log(self, name, *args):
+        # (topics, data) of one log, as hex strings
+        entry, types, topic = self.events[name]
+        topics, data_types, data_args = ["0x" + topic.hex()], [], []
+        for spec, typ, arg in zip(entry["inputs"], types, args):
+            if spec.get("indexed"):
+                topics.append("0x" + abi_encode([typ], [arg]).hex())
+            else:
+                data_types.append(typ)
+                data_args.append(arg)
+        return topics, "0x" + abi_encode(data_types, data_args).hex()
+
+
+def _canonical(spec) -> str:
+    typ = spec["type"]
+    if typ.startswith("tuple"):
+        return "(" + ",".join(_canonical(c) for c in spec["components"]) + ")" + typ[len("tuple"):]
+    return typ
+
+def _tips_at(tips: List[Tuple[int, int]], percentiles) -> List[int]:
+    # for each percentile, the tip of the tx in which that share of the
+    # block's gas (sorted by tip) was used; 0 for an empty block
+    if not tips:
+        return [0] * len(percentiles)
+    tips = sorted(tips)
+    total = sum(gas for _, gas in tips)
+    out = []
+    for p in percentiles:
+        threshold, used = total * p / 100, 0
+        for tip, gas in tips:
+            used += gas
+            if used >= threshold:
+                break
+        out.append(tip)
+    return out
+
+_ZERO = "0x" + "00" * 20
+_seq = itertools.count()
+
+
+class SimProvider(BaseProvider):
+    # web3 provider answering from a SimChain in this process; supports
+    # JSON-RPC batches, so ReceiptTracker fetches receipts in one call
+    def __init__(self, chain: SimChain):
+        super().__init__()
+        self.chain = chain
+        self._ids = itertools.count()
+
+    def make_request(self, method, params):
+        return self._call(method, params)
+
+    def make_batch_request(self, requests):
+        return [self._call(method, params) for method, params in requests]
+
+    def is_connected(self, show_traceback: bool = False) -> bool:
+        return True
+
+    def _call(self, method, params):
+        return _response(self.chain, method, params, next(self._ids))
+
+
+class AsyncSimProvider(AsyncBaseProvider):
+    # SimProvider for AsyncWeb3; calls are answered inline, since the chain
+    # never blocks on I/O
+    def __init__(self, chain: SimChain):
+        super().__init__()
+        self.chain = chain
+        self._ids = itertools.count()
+
+    async def make_request(self, method, params):
+        return _response(self.chain, method, params, next(self._ids))
+
+    async def make_batch_request(self, requests):
+        return [_response(self.chain, method, params, next(self._ids)) for method, params in requests]
+
+    async def is_connected(self, show_traceback: bool = False) -> bool:
+        return True
+
+
+def _response(chain, method, params, request_id) -> dict:
+    response = {"jsonrpc": "2.0", "id": request_id}
+    try:
+        response["result"] = chain.rpc(method, list(params or []))
+    except ValueError as e:
+        response["error"] = {"code": -32000, "message": str(e)}
+    return response
+
+
+# process-wide registry, so "sim://<name>" RPC URLs resolve to a chain
+_chains: Dict[str, SimChain] = {}
+_registry_lock = threading.Lock()
+
+def register(name: str, chain: SimChain) -> str:
+    # makes chain reachable as "sim://<name>"; returns that URL
+    with _registry_lock:
+        _chains[name] = chain
+    return f"sim://{name}"
+
+def get_chain(url: str) -> SimChain:
+    name = url[len("sim://"):] if url.startswith("sim://") else url
+    with _registry_lock:
+        chain = _chains.get(name)
+    if chain is None:
+        raise ConnectionError(f"no simulated chain registered as {url!r}")
+    return chain
+
+
+def serve_http(chain: SimChain, host: str = "127.0.0.1", port: int = 8545) -> ThreadingHTTPServer:
+    # JSON-RPC over HTTP (single calls and batches) for shards in other
+    # processes; serves on a daemon thread until server.shutdown()
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"    # keep-alive for web3's pooled session
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            reply = ([self._one(r) for r in body] if isinstance(body, list) else self._one(body))
+            data = json.dumps(reply).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _one(self, req):
+            return _response(chain, req["method"], req.get("params"), req.get("id"))
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="simchain-http", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="local simulated chain with TwoPhaseAdapter semantics")
+    p.add_argument("--port", type=int, default=8545)
+    p.add_argument("--block-time", type=float, default=1.0)
+    p.add_argument("--adapters", default=str(Path(__file__).parent.parent / "config" / "adapters.json"),
+                   help="JSON {shard: adapter address}; each address gets an adapter")
+    args = p.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    with open(args.adapters) as f:
+        chain = SimChain(args.block_time, adapters=json.load(f).values()).start()
+    serve_http(chain, "0.0.0.0", args.port)
+    logger.info(f"[SimChain] serving on :{args.port}, one block every {args.block_time}s")
+    threading.Event().wait()
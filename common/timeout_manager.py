@@ -1,20 +1,112 @@
-from typing import Dict
+import heapq, logging, threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
 from .lightclient import LightClient
 
+logger = logging.getLogger(__name__)
+
 class TimeoutManager:
     # manages per-transaction deadlines based on on-chain block heights
-    def __init__(self, client: LightClient):
+    # swept tx ids remembered so a late Prepare still sees them as expired
+    EXPIRED_MEMORY = 100_000
+
+    def __init__(self, client: LightClient,
+                 on_expired: Optional[Callable[[List[str]], None]] = None):
         self.client = client
         self.deadlines: Dict[str, int] = {}
+        # min-heap of (deadline, tx_id) over self.deadlines; entries for
+        # finished or restarted txs are skipped lazily and compacted away
+        self._heap: List[Tuple[int, str]] = []
+        self._expired: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._on_expired = None
+        self._unsubscribe = None
+        if on_expired is not None:
+            self.start_sweeper(on_expired)
 
     def start(self, tx_id: str, timeout_blocks: int):
         # starts a timeout for a transaction: deadline = current_height + timeout_blocks
         current_height = self.client.get_block_height()
-        self.deadlines[tx_id] = current_height + timeout_blocks
-        print(f"[TimeoutManager] TX {tx_id} deadline set at block {self.deadlines[tx_id]}")
+        deadline = current_height + timeout_blocks
+        with self._lock:
+            self.deadlines[tx_id] = deadline
+            heapq.heappush(self._heap, (deadline, tx_id))
+            self._maybe_compact()
+        logger.debug(f"[TimeoutManager] TX {tx_id} deadline set at block {deadline}")
+
+    def restore(self, tx_id: str, deadline: int):
+        # re-arms a known deadline, e.g. one replayed from a write-ahead log;
+        # if it already passed, the next sweep expires it
+        with self._lock:
+            self.deadlines[tx_id] = deadline
+            heapq.heappush(self._heap, (deadline, tx_id))
+            self._maybe_compact()
 
     def is_expired(self, tx_id: str) -> bool:
         # checks if the current block height has passed the deadline
+        if self.was_swept(tx_id):
+            return True
         if tx_id not in self.deadlines:
             raise KeyError(f"No deadline found for TX {tx_id}")
-        return self.client.get_block_height() > self.deadlines[tx_id]
\ No newline at end of file
+        return self.client.get_block_height() > self.deadlines[tx_id]
+
+    def was_swept(self, tx_id: str) -> bool:
+        # true if pop_expired already handed out this tx (bounded memory)
+        with self._lock:
+            return tx_id in self._expired
+
+    def complete(self, tx_id: str):
+        # forgets a finished (committed or aborted) transaction
+        with self._lock:
+            if self.deadlines.pop(tx_id, None) is not None:
+                self._maybe_compact()
+
+    def cancel(self, tx_id: str):
+        # forgets an aborted transaction, but remembers it like a swept one,
+        # so a Prepare that arrives after its Abort still votes ABORT
+        with self._lock:
+            if self.deadlines.pop(tx_id, None) is not None:
+                self._maybe_compact()
+            self._expired[tx_id] = None
+            while len(self._expired) > self.EXPIRED_MEMORY:
+                self._expired.popitem(last=False)
+
+    def pop_expired(self, height: int) -> List[str]:
+        # removes and returns every tx whose deadline is below `height`,
+        # earliest deadline first
+        expired = []
+        with self._lock:
+            while self._heap and self._heap[0][0] < height:
+                deadline, tx_id = heapq.heappop(self._heap)
+                if self.deadlines.get(tx_id) == deadline:
+                    del self.deadlines[tx_id]
+                    expired.append(tx_id)
+                    self._expired[tx_id] = None
+            while len(self._expired) > self.EXPIRED_MEMORY:
+                self._expired.popitem(last=False)
+        return expired
+
+    # --- background sweeper ---
+
+    def start_sweeper(self, on_expired: Callable[[List[str]], None]):
+        # on every new head pushed by the client (a BlockHeightOracle), hands
+        # the batch of newly expired tx ids to on_expired(tx_ids)
+        self.stop_sweeper()
+        self._on_expired = on_expired
+        self._unsubscribe = self.client.subscribe(self._sweep)
+
+    def stop_sweeper(self):
+        if self._unsubscribe is not None:
+            self._unsubscribe()
+            self._unsubscribe = None
+
+    def _sweep(self, height: int):
+        expired = self.pop_expired(height)
+        if expired and self._on_expired is not None:
+            self._on_expired(expired)
+
+    def _maybe_compact(self):
+        # keep the heap proportional to live deadlines under sustained load
+        if len(self._heap) > 2 * len(self.deadlines) + 64:
+            self._heap = [(d, tx) for tx, d in self.deadlines.items()]
+            heapq.heapify(self._heap)
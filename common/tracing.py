@@ -0,0 +1,177 @@
+import contextvars, json, os, secrets, threading, time
+from contextlib import contextmanager
+from typing import Iterable, List, NamedTuple, Optional
+
+# the W3C trace-context header, carried in gRPC metadata
+TRACEPARENT = "traceparent"
+# a path here makes every process that imports this module append its spans
+# to that file (see configure)
+TRACE_FILE_ENV = "TWOPC_TRACE_FILE"
+
+class SpanContext(NamedTuple):
+    trace_id: str   # 32 hex digits
+    span_id: str    # 16 hex digits
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+
+class Span:
+    # one timed operation in a trace. Wall-clock start, so spans recorded by
+    # different processes line up; the duration itself is monotonic.
+    def __init__(self, name: str, parent: Optional[SpanContext] = None,
+                 links: Iterable[SpanContext] = (), **attrs):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        # spans this one also works for, e.g. every tx in a batched call
+        self.links = list(dict.fromkeys(l for l in links if l is not None and l != parent))
+        self.attrs = attrs
+        self.status = "OK"
+        self.start = time.time()
+        self.end: Optional[float] = None
+        self._started = time.perf_counter()
+
+    @property
+    def context(self) -> SpanContext:
+        return SpanContext(self.trace_id, self.span_id)
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def finish(self, status: Optional[str] = None):
+        # ends the span and hands it to the exporter; later calls are no-ops
+        if self.end is not None:
+            return
+        self.end = self.start + (time.perf_counter() - self._started)
+        if status is not None:
+            self.status = status
+        exporter = _exporter
+        if exporter is not None:
+            exporter.export(self)
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name, "trace_id": self.trace_id, "span_id": self.span_id,
+            "parent_id": self.parent_id, "start": self.start, "end": self.end,
+            "status": self.status, "attrs": self.attrs,
+            "links": [list(l) for l in self.links],
+        }
+
+
+# --- exporters ---
+
+class FileExporter:
+    # one JSON object per line, appended with a single write so processes
+    # sharing the file don't interleave spans
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        line = (json.dumps(span.to_dict(), default=str) + "\n").encode()
+        with self._lock:
+            os.write(self._fd, line)
+
+    def close(self):
+        os.close(self._fd)
+
+
+class MemoryExporter:
+    # keeps finished spans in a list: tests, or an in-process collector
+    def __init__(self):
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def close(self):
+        pass
+
+
+_exporter = None
+
+def configure(exporter=None):
+    # starts tracing into `exporter` (an object with export(span), or a file
+    # path for a FileExporter); None stops it. Returns the exporter.
+    global _exporter
+    if isinstance(exporter, str):
+        exporter = FileExporter(exporter)
+    previous, _exporter = _exporter, exporter
+    if previous is not None and previous is not exporter:
+        previous.close()
+    return exporter
+
+def enabled() -> bool:
+    return _exporter is not None
+
+if os.environ.get(TRACE_FILE_ENV):
+    configure(os.environ[TRACE_FILE_ENV])
+
+# --- context ---
+
+_current: contextvars.ContextVar = contextvars.ContextVar("twopc_span", default=None)
+_INHERIT = object()
+
+def current() -> Optional[Span]:
+    return _current.get()
+
+def current_context() -> Optional[SpanContext]:
+    span = _current.get()
+    return span.context if span is not None else None
+
+@contextmanager
+def span(name: str, parent=_INHERIT, links: Iterable[SpanContext] = (), **attrs):
+    # times the with-block as a child of `parent` (default: the current span)
+    # and makes it current meanwhile; yields None while tracing is off
+    if _exporter is None:
+        yield None
+        return
+    if parent is _INHERIT:
+        parent = current_context()
+    s = Span(name, parent, links, **attrs)
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.status = f"ERROR {type(e).__name__}"
+        raise
+    finally:
+        try:
+            _current.reset(token)
+        except ValueError:
+            # a generator closed from another context; nothing to restore
+            pass
+        s.finish()
+
+def carry(fn):
+    # fn bound to a copy of the current context, for running it on another
+    # thread (executor pools don't carry contextvars over)
+    ctx = contextvars.copy_context()
+    return lambda *args, **kwargs: ctx.run(fn, *args, **kwargs)
+
+# --- propagation ---
+
+def parse_traceparent(value: str) -> Optional[SpanContext]:
+    parts = value.strip().split("-") if value else []
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None
+    if set(parts[1]) == {"0"} or set(parts[2]) == {"0"}:
+        return None
+    return SpanContext(parts[1], parts[2])
+
+def extract(metadata) -> Optional[SpanContext]:
+    # the span context a caller sent in its gRPC metadata, if any
+    for key, value in metadata or ():
+        if key == TRACEPARENT:
+            return parse_traceparent(value if isinstance(value, str) else value.decode())
+    return None
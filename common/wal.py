@@ -0,0 +1,190 @@
+import os, json, struct, threading, logging, zlib
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# record framing: payload length, crc32 of payload, then the JSON payload
+_HEADER = struct.Struct(">II")
+
+class WriteAheadLog:
+    # append-only, checksummed log of per-key field updates: a durable dict
+    # where put(key, fields) merges fields into state[key] and delete(key)
+    # drops it. One flusher thread writes everything queued since its last
+    # flush and fsyncs once, so concurrent writers share a disk flush (group
+    # commit). Segments rotate at `segment_bytes`; every segment starts with
+    # a snapshot of the live state, after which older segments are deleted,
+    # so recovery only reads the newest segment.
+    def __init__(self, directory, segment_bytes: int = 16 << 20):
+        self.dir = Path(directory)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = segment_bytes
+
+        self._state: Dict[str, dict] = {}
+        self._state_lock = threading.Lock()
+        self._queue: List[Tuple[dict, Optional[Future]]] = []
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self._recover()
+        self._flusher = threading.Thread(target=self._flush_loop, name="wal-flusher", daemon=True)
+        self._flusher.start()
+
+    def put(self, key: str, fields: dict, durable: bool = True) -> Future:
+        # Future resolves once the record is on disk (at once if not durable)
+        return self._append({"op": "put", "key": key, "fields": fields}, durable)
+
+    def delete(self, key: str, durable: bool = False) -> Future:
+        return self._append({"op": "del", "key": key}, durable)
+
+    def state(self) -> Dict[str, dict]:
+        # live keys as of the last flush
+        with self._state_lock:
+            return {k: dict(v) for k, v in self._state.items()}
+
+    def segments(self) -> List[Path]:
+        return sorted(self.dir.glob("wal-*.log"))
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._flusher.join()
+        self._file.close()
+
+    # --- write path ---
+
+    def _append(self, record: dict, durable: bool) -> Future:
+        fut = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("write-ahead log is closed")
+            self._queue.append((record, fut if durable else None))
+            self._cond.notify()
+        if not durable:
+            fut.set_result(None)
+        return fut
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                batch, self._queue = self._queue, []
+            try:
+                self._write([record for record, _ in batch])
+                if self._file.tell() >= self.segment_bytes:
+                    self._rotate()
+            except Exception as e:
+                logger.exception(f"[WAL] flush of {len(batch)} record(s) failed")
+                for _, fut in batch:
+                    if fut is not None:
+                        fut.set_exception(e)
+                continue
+            for _, fut in batch:
+                if fut is not None:
+                    fut.set_result(None)
+
+    def _write(self, records: List[dict]):
+        self._file.write(b"".join(encode_record(r) for r in records))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        with self._state_lock:
+            for r in records:
+                _apply(self._state, r)
+
+    def _rotate(self):
+        # compaction: start a segment with a snapshot of the live state, then
+        # drop every older segment, which the snapshot supersedes
+        old = self.segments()
+        self._seq += 1
+        self._open_segment()
+        for path in old:
+            path.unlink()
+        logger.info(f"[WAL] rotated to segment {self._seq}; {len(self._state)} live key(s)")
+
+    def _open_segment(self):
+        path = self.dir / f"wal-{self._seq:08d}.log"
+        self._file = open(path, "ab")
+        with self._state_lock:
+            snapshot = {"op": "snapshot", "state": self._state}
+            self._file.write(encode_record(snapshot))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        fsync_dir(self.dir)
+
+    # --- recovery ---
+
+    def _recover(self):
+        segments = self.segments()
+        self._seq = 0
+        if segments:
+            # replay from the newest segment that starts with a snapshot;
+            # anything older is superseded by it
+            start = 0
+            for i in range(len(segments) - 1, -1, -1):
+                first = next(read_records(segments[i]), None)
+                if first is not None and first[1]["op"] == "snapshot":
+                    start = i
+                    break
+            for path in segments[start:]:
+                good_end = 0
+                for good_end, record in read_records(path):
+                    _apply(self._state, record)
+                if good_end < path.stat().st_size:
+                    logger.warning(f"[WAL] {path.name}: dropping torn tail after byte {good_end}")
+                    break
+            self._seq = int(segments[-1].stem.split("-")[1]) + 1
+            logger.info(f"[WAL] replayed {len(segments) - start} segment(s); "
+                        f"{len(self._state)} live key(s)")
+
+        # always continue in a fresh, compacted segment
+        self._open_segment()
+        for path in segments:
+            path.unlink()
+
+
+def encode_record(record: dict) -> bytes:
+    payload = json.dumps(record, separators=(",", ":")).encode()
+    return _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+def read_records(path: Path) -> Iterator[Tuple[int, dict]]:
+    # yields (end offset, record) up to EOF or the first torn/corrupt record
+    with open(path, "rb") as f:
+        offset = 0
+        while True:
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                return
+            length, crc = _HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                return
+            offset += _HEADER.size + length
+            yield offset, json.loads(payload)
+
+def _apply(state: Dict[str, dict], record: dict):
+    op = record["op"]
+    if op == "put":
+        state.setdefault(record["key"], {}).update(record["fields"])
+    elif op == "del":
+        state.pop(record["key"], None)
+    elif op == "snapshot":
+        state.clear()
+        state.update({k: dict(v) for k, v in record["state"].items()})
+
+def fsync_dir(path: Path):
+    # makes segment creation/deletion durable (no-op where unsupported)
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
@@ -15,33 +15,151 @@ contract TwoPhaseAdapter {
 
     mapping(bytes32 => TxData) public transactions;
 
+    // one lockFunds() call inside lockFundsBatch
+    struct LockItem {
+        bytes32 txId;
+        address recipient;
+        uint256 amount;
+        uint256 deadline;
+    }
+
     event Locked   (bytes32 indexed txId, address indexed sender, address indexed recipient, uint256 amount, uint256 deadline);
     event Committed(bytes32 indexed txId);
     event Reclaimed(bytes32 indexed txId);
+    // emitted by the *Batch entry points for every item they skip
+    event BatchItemFailed(bytes32 indexed txId, string reason);
 
     function lockFunds(bytes32 txId, address recipient, uint256 deadline) external payable {
-        require(transactions[txId].status == Status.None, "TX exists");
-        require(msg.value > 0, "Must lock >0");
-        require(deadline > block.number, "Deadline in past");
-        transactions[txId] = TxData(msg.sender, recipient, msg.value, deadline, Status.Pending);
+        string memory err = _lockError(txId, msg.value, deadline);
+        require(bytes(err).length == 0, err);
+        _lock(txId, recipient, msg.value, deadline);
+    }
+
+    /// @notice one-phase commit of a single-participant tx: records txId as
+    /// Committed and pays the recipient in the same call. Same checks as
+    /// lockFunds, so it reverts once the deadline has passed.
+    function lockAndCommit(bytes32 txId, address recipient, uint256 deadline) external payable {
+        string memory err = _lockError(txId, msg.value, deadline);
+        require(bytes(err).length == 0, err);
+        transactions[txId] = TxData(msg.sender, recipient, msg.value, deadline, Status.Committed);
         emit Locked(txId, msg.sender, recipient, msg.value, deadline);
+        payable(recipient).transfer(msg.value);
+        emit Committed(txId);
     }
 
     function commit(bytes32 txId) external {
+        string memory err = _commitError(txId);
+        require(bytes(err).length == 0, err);
         TxData storage t = transactions[txId];
-        require(t.status == Status.Pending, "Not pending");
-        require(block.number <= t.deadline, "Past deadline");
         t.status = Status.Committed;
         payable(t.recipient).transfer(t.amount);
         emit Committed(txId);
     }
 
     function reclaim(bytes32 txId) external {
+        string memory err = _reclaimError(txId);
+        require(bytes(err).length == 0, err);
         TxData storage t = transactions[txId];
-        require(t.status == Status.Pending, "Not pending");
-        require(block.number > t.deadline, "Too early");
         t.status = Status.Aborted;
         payable(t.sender).transfer(t.amount);
         emit Reclaimed(txId);
     }
+
+    // --- batch entry points: one Ethereum tx for many txIds ---
+    // Items that would revert on their own are skipped with BatchItemFailed
+    // instead of reverting the whole batch; ok[i] reports each outcome.
+
+    /// @notice msg.value must equal the sum of item amounts; skipped amounts are refunded.
+    function lockFundsBatch(LockItem[] calldata items) external payable returns (bool[] memory ok) {
+        ok = new bool[](items.length);
+        uint256 total;
+        uint256 refund;
+        for (uint256 i = 0; i < items.length; i++) {
+            LockItem calldata it = items[i];
+            total += it.amount;
+            string memory err = _lockError(it.txId, it.amount, it.deadline);
+            if (bytes(err).length != 0) {
+                refund += it.amount;
+                emit BatchItemFailed(it.txId, err);
+                continue;
+            }
+            _lock(it.txId, it.recipient, it.amount, it.deadline);
+            ok[i] = true;
+        }
+        require(total == msg.value, "Value mismatch");
+        if (refund > 0) {
+            payable(msg.sender).transfer(refund);
+        }
+    }
+
+    function commitBatch(bytes32[] calldata txIds) external returns (bool[] memory ok) {
+        ok = new bool[](txIds.length);
+        for (uint256 i = 0; i < txIds.length; i++) {
+            string memory err = _commitError(txIds[i]);
+            if (bytes(err).length == 0) {
+                TxData storage t = transactions[txIds[i]];
+                t.status = Status.Committed;
+                if (_pay(t.recipient, t.amount)) {
+                    emit Committed(txIds[i]);
+                    ok[i] = true;
+                    continue;
+                }
+                t.status = Status.Pending;
+                err = "Transfer failed";
+            }
+            emit BatchItemFailed(txIds[i], err);
+        }
+    }
+
+    function reclaimBatch(bytes32[] calldata txIds) external returns (bool[] memory ok) {
+        ok = new bool[](txIds.length);
+        for (uint256 i = 0; i < txIds.length; i++) {
+            string memory err = _reclaimError(txIds[i]);
+            if (bytes(err).length == 0) {
+                TxData storage t = transactions[txIds[i]];
+                t.status = Status.Aborted;
+                if (_pay(t.sender, t.amount)) {
+                    emit Reclaimed(txIds[i]);
+                    ok[i] = true;
+                    continue;
+                }
+                t.status = Status.Pending;
+                err = "Transfer failed";
+            }
+            emit BatchItemFailed(txIds[i], err);
+        }
+    }
+
+    // --- shared checks: empty string means the call may proceed ---
+
+    function _lockError(bytes32 txId, uint256 amount, uint256 deadline) internal view returns (string memory) {
+        if (transactions[txId].status != Status.None) return "TX exists";
+        if (amount == 0) return "Must lock >0";
+        if (deadline <= block.number) return "Deadline in past";
+        return "";
+    }
+
+    function _commitError(bytes32 txId) internal view returns (string memory) {
+        TxData storage t = transactions[txId];
+        if (t.status != Status.Pending) return "Not pending";
+        if (block.number > t.deadline) return "Past deadline";
+        return "";
+    }
+
+    function _reclaimError(bytes32 txId) internal view returns (string memory) {
+        TxData storage t = transactions[txId];
+        if (t.status != Status.Pending) return "Not pending";
+        if (block.number <= t.deadline) return "Too early";
+        return "";
+    }
+
+    function _lock(bytes32 txId, address recipient, uint256 amount, uint256 deadline) internal {
+        transactions[txId] = TxData(msg.sender, recipient, amount, deadline, Status.Pending);
+        emit Locked(txId, msg.sender, recipient, amount, deadline);
+    }
+
+    // same 2300-gas stipend as transfer(), but reports failure instead of reverting
+    function _pay(address to, uint256 amount) internal returns (bool sent) {
+        (sent, ) = payable(to).call{value: amount, gas: 2300}("");
+    }
 }
@@ -0,0 +1,284 @@
+# coordinator/aio_coordinator.py
+import asyncio, grpc, logging, time
+
+from mcp2pc import two_phase_pb2, two_phase_pb2_grpc
+from common.channels     import SERVER_OPTIONS, get_aio_channel
+from common.interceptors import AioServerMetricsInterceptor, AioServerTracingInterceptor
+from common.metrics      import serve_metrics
+from common.partition    import load_partitioner
+from common              import tracing
+from coordinator.coordinator import PHASE_SECONDS, Coordinator, load_config
+
+logger = logging.getLogger(__name__)
+
+class AioCoordinator(two_phase_pb2_grpc.CoordinatorServicer):
+    # grpc.aio servicer over a regular Coordinator: same tx state, deadlines,
+    # expiry sweeper and group windows, but every per-shard call is awaited
+    # on grpc.aio stubs, so a request in flight costs a coroutine instead of
+    # a worker thread (plus one per shard while it fans out)
+    def __init__(self, core: Coordinator, shard_cfg):
+        """
+        core:      the Coordinator holding transaction state; its sync stubs
+                   stay in use for the sweeper and group-commit flushes
+        shard_cfg: { shard_id: "host:port", ... } for the async stubs
+        """
+        self.core = core
+        self.shard_stubs = {
+            sid: two_phase_pb2_grpc.ShardStub(get_aio_channel(addr))
+            for sid, addr in shard_cfg.items()
+        }
+        self.chain_stubs_onchain = self.shard_stubs
+
+    async def Prepare(self, request, context):
+        core = self.core
+        routes = core._route(request)
+        if core._one_phase(request, routes):
+            (sid, part), = routes.items()
+            try:
+                one_phase = await asyncio.to_thread(core._one_phase_request, sid, part)
+                vote = await self.shard_stubs[sid].PrepareAndCommit(
+                    one_phase, timeout=core.ONCHAIN_TIMEOUT)
+            except Exception as e:
+                vote = core._votes({sid: (None, e)})[0]
+            yield vote
+            return
+
+        # _begin reads the chain head, a blocking RPC when the oracle's cache
+        # is stale, so keep it off the event loop
+        logged = await asyncio.to_thread(core._begin, request, routes)
+        await asyncio.wrap_future(logged)
+
+        if core.prepare_window is not None:
+            with PHASE_SECONDS.time(phase="vote"):
+                votes = await asyncio.wrap_future(core.prepare_window.submit(routes))
+            for vote in votes:
+                yield vote
+            return
+
+        # votes stream back as they arrive; the first ABORT ends the stream
+        async def prepare(sid, stub):
+            return await stub.Prepare(routes[sid], timeout=core.PREPARE_TIMEOUT)
+
+        read_only, started = [], time.perf_counter()
+        answers = self._stream_fan_out(core._only(self.shard_stubs, routes), prepare,
+                                       core.PREPARE_TIMEOUT)
+        try:
+            async for sid, resp, err in answers:
+                vote = core._votes({sid: (resp, err)})[0]
+                status = getattr(vote, "status", None)
+                if status == two_phase_pb2.PrepareResponse.ABORT:
+                    await answers.aclose()
+                    PHASE_SECONDS.observe(time.perf_counter() - started, phase="vote")
+                    core._early_abort(request.transaction_id, routes, [sid] + read_only)
+                    yield vote
+                    return
+                if status == two_phase_pb2.PrepareResponse.READ_ONLY:
+                    read_only.append(sid)
+                yield vote
+        finally:
+            await answers.aclose()
+        PHASE_SECONDS.observe(time.perf_counter() - started, phase="vote")
+        core._drop_read_only(request.transaction_id, read_only)
+
+    async def Commit(self, request, context):
+        core  = self.core
+        tx_id = request.transaction_id
+        logger.info(f"[AioCoordinator] Commit full flow for tx={tx_id}")
+        meta, logged = core._claim(tx_id)
+        await asyncio.wrap_future(logged)
+        if core.commit_window is not None:
+            await asyncio.wrap_future(core.commit_window.submit((tx_id, meta)))
+            return two_phase_pb2.Empty()
+        chain_stubs = core._only(self.chain_stubs_onchain, core._onchain(meta))
+        shard_stubs = core._only(self.shard_stubs, core._participants(meta))
+
+        # --- On-chain locking step (all payers at once) ---
+        async def lock(sid, stub):
+            return await stub.LockOnChain(core._lock_request(sid, tx_id, meta),
+                                          timeout=core.ONCHAIN_TIMEOUT)
+
+        with PHASE_SECONDS.time(phase="lock_onchain"):
+            results = await self._fan_out(chain_stubs, lock, core.ONCHAIN_TIMEOUT)
+        locked = core._succeeded("LockOnChain", results)
+
+        # --- Off-chain commit step ---
+        async def commit(sid, stub):
+            return await stub.Commit(request, timeout=core.OFFCHAIN_TIMEOUT)
+
+        with PHASE_SECONDS.time(phase="commit_offchain"):
+            results = await self._fan_out(shard_stubs, commit, core.OFFCHAIN_TIMEOUT)
+        core._warn_failed("off-chain Commit", results)
+
+        # --- On-chain finalize step ---
+        async def commit_onchain(sid, stub):
+            return await stub.CommitOnChain(
+                two_phase_pb2.OnChainRequest(transaction_id=tx_id),
+                timeout=core.ONCHAIN_TIMEOUT
+            )
+
+        with PHASE_SECONDS.time(phase="commit_onchain"):
+            results = await self._fan_out(chain_stubs, commit_onchain, core.ONCHAIN_TIMEOUT)
+        committed = core._succeeded("CommitOnChain", results)
+
+        core._settle(tx_id, meta, locked, committed)
+        return two_phase_pb2.Empty()
+
+    async def Abort(self, request, context):
+        core  = self.core
+        tx_id = request.transaction_id
+        logger.info(f"[AioCoordinator] Abort full flow for tx={tx_id}")
+        participants = core._abandon(tx_id)
+        if not participants:
+            return two_phase_pb2.Empty()
+
+        if core.presumed_abort:
+            core._abort_unacked(tx_id, participants)
+            return two_phase_pb2.Empty()
+
+        if core.abort_window is not None:
+            await asyncio.wrap_future(core.abort_window.submit((tx_id, participants)))
+            return two_phase_pb2.Empty()
+
+        # --- Off-chain abort step ---
+        async def abort(sid, stub):
+            return await stub.Abort(request, timeout=core.OFFCHAIN_TIMEOUT)
+
+        with PHASE_SECONDS.time(phase="abort_offchain"):
+            results = await self._fan_out(core._only(self.shard_stubs, participants), abort,
+                                          core.OFFCHAIN_TIMEOUT)
+        core._warn_failed("off-chain Abort", results)
+
+        # --- On-chain reclaim step ---
+        async def reclaim(sid, stub):
+            return await stub.ReclaimOnChain(
+                two_phase_pb2.OnChainRequest(transaction_id=tx_id),
+                timeout=core.ONCHAIN_TIMEOUT
+            )
+
+        with PHASE_SECONDS.time(phase="reclaim_onchain"):
+            results = await self._fan_out(core._only(self.chain_stubs_onchain, participants), reclaim,
+                                          core.ONCHAIN_TIMEOUT)
+        core._succeeded("ReclaimOnChain", results)
+        return two_phase_pb2.Empty()
+
+    async def Transact(self, request_iterator, context):
+        # same contract as Coordinator.Transact: steps run as they arrive,
+        # replies are tagged by tx id, at most STREAM_INFLIGHT per stream
+        replies = asyncio.Queue()
+        slots = asyncio.Semaphore(self.core.STREAM_INFLIGHT)
+        finished = object()
+
+        async def handle(req):
+            try:
+                await replies.put(await self._transact_step(req))
+            finally:
+                slots.release()
+
+        async def read():
+            steps = set()
+            try:
+                async for req in request_iterator:
+                    await slots.acquire()
+                    task = asyncio.create_task(handle(req))
+                    steps.add(task)
+                    task.add_done_callback(steps.discard)
+            except Exception as e:
+                logger.warning(f"[AioCoordinator] Transact stream closed: {e}")
+            finally:
+                await asyncio.gather(*steps, return_exceptions=True)
+                await replies.put(finished)
+
+        reader = asyncio.create_task(read())
+        try:
+            while True:
+                reply = await replies.get()
+                if reply is finished:
+                    return
+                yield reply
+        finally:
+            reader.cancel()
+
+    async def _transact_step(self, req):
+        core = self.core
+        kind = req.WhichOneof("kind")
+        if kind == "prepare":
+            try:
+                votes = [vote async for vote in self.Prepare(req.prepare, None)]
+            except Exception as e:
+                logger.exception("[AioCoordinator] Transact prepare failed")
+                votes = core._abort_votes(str(e) or type(e).__name__)
+            return core._votes_reply(req, votes)
+        step = {"commit": self.Commit, "abort": self.Abort}.get(kind)
+        if step is None:
+            return core._outcome_reply(req, "empty TransactRequest")
+        try:
+            await step(getattr(req, kind), None)
+        except Exception as e:
+            logger.exception(f"[AioCoordinator] Transact {kind} failed")
+            return core._outcome_reply(req, str(e) or type(e).__name__)
+        return core._outcome_reply(req)
+
+    async def _fan_out(self, stubs, call, timeout):
+        """
+        Awaits call(sid, stub) for every shard concurrently; the asyncio
+        counterpart of Coordinator._fan_out, with the same { sid: (result,
+        error) } return value and the same `timeout` budget for the phase.
+        """
+        sids = list(stubs)
+        outs = await asyncio.gather(
+            *(asyncio.wait_for(call(sid, stubs[sid]), timeout) for sid in sids),
+            return_exceptions=True
+        )
+        results = {}
+        for sid, out in zip(sids, outs):
+            if isinstance(out, asyncio.TimeoutError):
+                results[sid] = (None, TimeoutError(f"no reply within {timeout}s"))
+            elif isinstance(out, Exception):
+                results[sid] = (None, out)
+            else:
+                results[sid] = (out, None)
+        return results
+
+    async def _stream_fan_out(self, stubs, call, timeout):
+        """
+        Runs call(sid, stub) for every shard concurrently and yields (sid,
+        result, error) as each one finishes; the asyncio counterpart of
+        Coordinator._stream_fan_out. Closing the generator early cancels the
+        calls still in flight.
+        """
+        tasks = {
+            asyncio.ensure_future(asyncio.wait_for(call(sid, stub), timeout)): sid
+            for sid, stub in stubs.items()
+        }
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    err = task.exception()
+                    if isinstance(err, asyncio.TimeoutError):
+                        err = TimeoutError(f"no reply within {timeout}s")
+                    yield tasks[task], (None if err else task.result()), err
+        finally:
+            for task in pending:
+                task.cancel()
+
+async def serve_aio(group_window=None, group_max=100, wal_dir=None, partitions=None,
+                    presumed_abort=False, metrics_port=None, trace_file=None):
+    shard_cfg, rpc_cfg, adapter_cfg = load_config()
+    partitioner = load_partitioner(partitions, shard_cfg) if partitions else None
+    core = Coordinator(shard_cfg, rpc_cfg, adapter_cfg, default_timeout_blocks=500,
+                       group_window=group_window, group_max=group_max, wal_dir=wal_dir,
+                       partitioner=partitioner, presumed_abort=presumed_abort)
+
+    if metrics_port is not None:
+        serve_metrics(metrics_port)
+    if trace_file is not None:
+        tracing.configure(trace_file)
+    server = grpc.aio.server(options=SERVER_OPTIONS,
+                             interceptors=[AioServerMetricsInterceptor(),
+                                           AioServerTracingInterceptor("coordinator")])
+    two_phase_pb2_grpc.add_CoordinatorServicer_to_server(AioCoordinator(core, shard_cfg), server)
+    server.add_insecure_port('[::]:50051')
+    await server.start()
+    await server.wait_for_termination()
@@ -1,160 +1,944 @@
 # coordinator/coordinator.py
-import grpc, json, threading, os, logging
+import grpc, json, os, logging, queue, threading, time
+from collections import OrderedDict, defaultdict
 from concurrent import futures
 
 from mcp2pc import two_phase_pb2, two_phase_pb2_grpc
 from common.timeout_manager import TimeoutManager
-from common.lightclient     import LightClient
+from common.block_oracle   import get_oracle
+from common.group_window   import GroupWindow
+from common.wal            import WriteAheadLog
+from common.partition      import load_partitioner, split_request
+from common.channels       import SERVER_OPTIONS, get_channel
+from common.interceptors   import ServerMetricsInterceptor, ServerTracingInterceptor
+from common.metrics        import histogram, serve_metrics
+from common                import tracing
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# wall time of each coordinator phase: one sample per tx, or per group when
+# a group window batches them
+PHASE_SECONDS = histogram("twopc_phase_seconds", "Seconds spent in each coordinator phase",
+                          ("phase",))
+
 class Coordinator(two_phase_pb2_grpc.CoordinatorServicer):
-    def __init__(self, shard_cfg, rpc_cfg, adapter_cfg, default_timeout_blocks):
+    # per-shard gRPC deadlines (seconds) for each fan-out phase
+    PREPARE_TIMEOUT  = 10
+    OFFCHAIN_TIMEOUT = 1
+    ONCHAIN_TIMEOUT  = 180   # covers send + wait_for_transaction_receipt
+    # per Transact stream: requests in flight before we stop reading more
+    STREAM_INFLIGHT  = 64
+
+    def __init__(self, shard_cfg, rpc_cfg, adapter_cfg, default_timeout_blocks,
+                 fanout_workers=None, group_window=None, group_max=100,
+                 wal_dir=None, partitioner=None, presumed_abort=False):
         """
         shard_cfg:   { shard_id: "host:port", ... }
         rpc_cfg:     { shard_id: "https://...rpc", ... }
         adapter_cfg: { shard_id: "0xContractAddress...", ... }
         default_timeout_blocks: number of blocks before timeout
+        fanout_workers: size of the shared per-shard fan-out pool
+                        (default: 10 concurrent requests x number of shards)
+        group_window: seconds to collect concurrent Prepares/Commits/Aborts
+                      into one batched RPC per shard (None: no group commit)
+        group_max:    flush a group early once it holds this many txs
+        wal_dir:      directory for the write-ahead log of Prepare metadata
+                      and decisions, replayed on startup (None: memory only)
+        partitioner:  maps a key to its owner shard (common/partition.py);
+                      each shard then prepares, commits and locks on-chain
+                      only for txs touching its keys (None: every shard
+                      takes part in every tx)
+        presumed_abort: log nothing until a commit decision and send aborts
+                      without waiting for acks; a tx unknown after a restart
+                      is presumed aborted, and shards abort undecided txs at
+                      their own deadlines
         """
         self.default_tb = default_timeout_blocks
 
+        # one reusable pool for every per-shard call, shared by all requests
+        self.executor = futures.ThreadPoolExecutor(
+            max_workers=fanout_workers or 10 * max(1, len(shard_cfg)),
+            thread_name_prefix="coord-fanout",
+        )
+        # Transact steps block on the fan-out pool, so they get their own
+        self.stream_executor = futures.ThreadPoolExecutor(
+            max_workers=self.STREAM_INFLIGHT, thread_name_prefix="coord-stream"
+        )
+        # expiry handling runs off the block oracle's thread, one batch at a
+        # time, and fans out on the pool above
+        self.sweep_executor = futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="coord-sweeper"
+        )
+
         # off-chain 2PC stubs
         self.shard_stubs = {
-            sid: two_phase_pb2_grpc.ShardStub(grpc.insecure_channel(addr))
+            sid: two_phase_pb2_grpc.ShardStub(get_channel(addr))
             for sid, addr in shard_cfg.items()
         }
 
         # reuse same stubs for on-chain adapter calls
         self.chain_stubs_onchain = self.shard_stubs
 
-        # per-shard timeout managers
+        # in-memory store for on-chain params and the commit/abort decision
+        self.tx_meta = {}
+        self._meta_lock = threading.Lock()
+        # start timestamps of recent txs, so a retried tx keeps its wait-die
+        # age at the shards (see _stamp)
+        self._starts = OrderedDict()
+
+        # per-shard timeout managers; shards on the same RPC URL share one
+        # block-height oracle, so a Prepare costs at most one eth_blockNumber.
+        # Their sweepers abort undecided txs once a shard's deadline passes.
         self.timeout_mgrs = {
-            sid: TimeoutManager(LightClient(rpc_cfg[sid]))
+            sid: TimeoutManager(
+                get_oracle(rpc_cfg[sid]),
+                on_expired=lambda tx_ids, sid=sid: self._on_expired(sid, tx_ids)
+            )
             for sid in shard_cfg
         }
 
         # on-chain adapter addresses
         self.adapters = adapter_cfg
 
-        # in-memory store for on-chain params
-        self.tx_meta = {}
+        # key -> owner shard; None sends every tx to every shard
+        self.partitioner = partitioner
+
+        # presumed abort: only commit decisions are logged and acknowledged
+        self.presumed_abort = presumed_abort
+
+        # optional group commit: each phase collects the txs arriving within
+        # group_window seconds (or group_max of them) and sends them to every
+        # shard as one PrepareBatch/CommitBatch/*OnChainBatch call
+        self.prepare_window = self.commit_window = self.abort_window = None
+        if group_window is not None:
+            self.prepare_window = GroupWindow(self._prepare_group, group_window, group_max, "prepare")
+            self.commit_window  = GroupWindow(self._commit_group,  group_window, group_max, "commit")
+            self.abort_window   = GroupWindow(self._abort_group,   group_window, group_max, "abort")
+
+        # durable tx_meta: Prepare metadata and commit decisions are forced to
+        # disk (concurrent ones share an fsync) before shards act on them
+        self.wal = None
+        if wal_dir is not None:
+            self.wal = WriteAheadLog(wal_dir)
+            self._recover()
 
         logger.info(f"Coordinator listening on 50051; shards={list(shard_cfg)}; default_tb={self.default_tb}")
 
     def Prepare(self, request, context):
+        routes = self._route(request)
+        if self._one_phase(request, routes):
+            (sid, part), = routes.items()
+            try:
+                vote = self.shard_stubs[sid].PrepareAndCommit(
+                    self._one_phase_request(sid, part), timeout=self.ONCHAIN_TIMEOUT)
+            except Exception as e:
+                vote = self._votes({sid: (None, e)})[0]
+            yield vote
+            return
+
+        self._begin(request, routes).result()
+
+        if self.prepare_window is not None:
+            with PHASE_SECONDS.time(phase="vote"):
+                votes = self.prepare_window.submit(routes).result()
+            yield from votes
+            return
+
+        # fan-out off-chain Prepare() of each shard's part and stream each
+        # vote back as it arrives; a shard that errors or misses its
+        # deadline votes ABORT, and the first ABORT ends the stream
+        read_only, started = [], time.perf_counter()
+        answers = self._stream_fan_out(self._only(self.shard_stubs, routes), "Prepare",
+                                       routes, self.PREPARE_TIMEOUT)
+        try:
+            for sid, resp, err in answers:
+                vote = self._votes({sid: (resp, err)})[0]
+                status = getattr(vote, "status", None)
+                if status == two_phase_pb2.PrepareResponse.ABORT:
+                    answers.close()
+                    PHASE_SECONDS.observe(time.perf_counter() - started, phase="vote")
+                    self._early_abort(request.transaction_id, routes, [sid] + read_only)
+                    yield vote
+                    return
+                if status == two_phase_pb2.PrepareResponse.READ_ONLY:
+                    read_only.append(sid)
+                yield vote
+        finally:
+            answers.close()
+        PHASE_SECONDS.observe(time.perf_counter() - started, phase="vote")
+        self._drop_read_only(request.transaction_id, read_only)
+
+    def Commit(self, request, context):
+        tx_id = request.transaction_id
+        logger.info(f"[Coordinator] Commit full flow for tx={tx_id}")
+        meta, logged = self._claim(tx_id)
+        logged.result()
+        if self.commit_window is not None:
+            self.commit_window.submit((tx_id, meta)).result()
+        else:
+            self._commit_phases(tx_id, meta)
+        return two_phase_pb2.Empty()
+
+    def _commit_phases(self, tx_id, meta):
+        participants = self._participants(meta)
+        if not participants:
+            # every shard voted READ_ONLY: nothing to commit anywhere
+            self._settle(tx_id, meta, set(), set())
+            return
+
+        onchain = self._onchain(meta)
+
+        # --- On-chain locking step (all payers at once) ---
+        def lock(sid, stub):
+            return stub.LockOnChain(self._lock_request(sid, tx_id, meta),
+                                    timeout=self.ONCHAIN_TIMEOUT)
+
+        with PHASE_SECONDS.time(phase="lock_onchain"):
+            results = self._fan_out(self._only(self.chain_stubs_onchain, onchain), lock,
+                                    self.ONCHAIN_TIMEOUT)
+        locked = self._succeeded("LockOnChain", results)
+
+        # quick debug: compare current block vs deadline
+        any_mgr  = self.timeout_mgrs[participants[0]]
+        current  = any_mgr.client.get_block_height()
+        deadline = any_mgr.deadlines.get(tx_id)
+        logger.info(f"[Coordinator] current block height = {current}, deadline = {deadline}")
+
+        # --- Off-chain commit step ---
+        def commit(sid, stub):
+            return stub.Commit(two_phase_pb2.CommitRequest(transaction_id=tx_id),
+                               timeout=self.OFFCHAIN_TIMEOUT)
+
+        with PHASE_SECONDS.time(phase="commit_offchain"):
+            results = self._fan_out(self._only(self.shard_stubs, participants), commit,
+                                    self.OFFCHAIN_TIMEOUT)
+        self._warn_failed("off-chain Commit", results)
+
+        # --- On-chain finalize step ---
+        def commit_onchain(sid, stub):
+            return stub.CommitOnChain(
+                two_phase_pb2.OnChainRequest(transaction_id=tx_id),
+                timeout=self.ONCHAIN_TIMEOUT
+            )
+
+        with PHASE_SECONDS.time(phase="commit_onchain"):
+            results = self._fan_out(self._only(self.chain_stubs_onchain, onchain),
+                                    commit_onchain, self.ONCHAIN_TIMEOUT)
+        committed = self._succeeded("CommitOnChain", results)
+
+        self._settle(tx_id, meta, locked, committed)
+
+    # --- per-tx steps shared with the asyncio servicer ---
+
+    def _route(self, request):
+        # { sid: the part of `request` that shard prepares }
+        self._stamp(request)
+        if self.partitioner is None:
+            return {sid: request for sid in self.shard_stubs}
+        return split_request(request, self.partitioner)
+
+    # start timestamps remembered for retries
+    STARTS_KEPT = 100_000
+
+    def _stamp(self, request):
+        # sets the tx's start timestamp, its age under the shards' wait-die
+        # locking, unless the request already carries one. A tx gets it on
+        # its first Prepare here, and a retry of the same tx id reuses it, so
+        # the retry is no younger than the first attempt
+        if not hasattr(request, "start_ts") or request.start_ts:
+            return
+        with self._meta_lock:
+            start = self._starts.get(request.transaction_id)
+            if start is None:
+                start = self._starts[request.transaction_id] = time.time_ns()
+                if len(self._starts) > self.STARTS_KEPT:
+                    self._starts.popitem(last=False)
+        request.start_ts = start
+
+    def _begin(self, request, routes):
+        # Prepare bookkeeping: block-height deadlines + on-chain args, for
+        # the shards in `routes`. Returns a Future that resolves once they
+        # are durable.
         tx_id = request.transaction_id
         tb    = request.timeout_blocks or self.default_tb
-        logger.info(f"[Coordinator] Prepare(tx={tx_id}, timeout_blocks={tb})")
+        logger.info(f"[Coordinator] Prepare(tx={tx_id}, timeout_blocks={tb}, shards={sorted(routes)})")
 
         # record block-height deadlines
-        for sid, tm in self.timeout_mgrs.items():
-            tm.start(tx_id, tb)
+        for sid in routes:
+            self.timeout_mgrs[sid].start(tx_id, tb)
 
         # stash on-chain args for later
-        self.tx_meta[tx_id] = {
+        meta = {
             "recipient": request.onchain_recipient,
             "amount":    request.onchain_amount,
         }
+        if self.partitioner is not None:
+            meta["participants"] = sorted(routes)
+            payer = next((sid for sid, part in routes.items() if part.onchain_amount), None)
+            if payer is not None:
+                meta["payer"] = payer
+        with self._meta_lock:
+            self.tx_meta[tx_id] = meta
+        if self.presumed_abort:
+            # logged along with a commit decision, if one is ever made
+            return self._log_nothing()
+        return self._log(tx_id, **meta, deadlines=self._deadlines(tx_id, meta))
 
-        # fan-out off-chain Prepare()
-        votes, threads = [], []
-        def vote_thread(sid, stub):
-            try:
-                resp = stub.Prepare(request)
-                votes.append(resp)
-            except grpc.RpcError:
-                votes.append(
-                    two_phase_pb2.PrepareResponse(
-                        status=two_phase_pb2.PrepareResponse.ABORT,
-                        shard_id=sid
-                    )
-                )
+    def _deadlines(self, tx_id, meta):
+        return {sid: self.timeout_mgrs[sid].deadlines.get(tx_id)
+                for sid in self._participants(meta)}
 
-        for sid, stub in self.shard_stubs.items():
-            t = threading.Thread(target=vote_thread, args=(sid, stub))
-            t.start(); threads.append(t)
-        for t in threads:
-            t.join()
+    def _one_phase(self, request, routes):
+        # the client commits on all-READY votes and only one shard takes
+        # part: that shard's vote is the decision, so it can commit at once
+        return len(routes) == 1 and getattr(request, "commit_on_ready", False)
 
-        # stream back all votes to client
-        for vote in votes:
-            yield vote
+    def _one_phase_request(self, sid, part):
+        # the shard owns the whole tx, including its deadline; the
+        # coordinator keeps no state for it
+        tx_id = part.transaction_id
+        tb    = part.timeout_blocks or self.default_tb
+        logger.info(f"[Coordinator] one-phase commit of tx={tx_id} on {sid}")
+        deadline = self.timeout_mgrs[sid].client.get_block_height() + tb
+        return two_phase_pb2.OnePhaseRequest(
+            prepare=part,
+            lock=two_phase_pb2.LockRequest(
+                transaction_id=tx_id,
+                recipient=part.onchain_recipient,
+                amount=part.onchain_amount,
+                deadline=deadline,
+            )
+        )
 
-    def Commit(self, request, context):
-        tx_id = request.transaction_id
-        logger.info(f"[Coordinator] Commit full flow for tx={tx_id}")
+    @staticmethod
+    def _read_only(results):
+        # shards whose Prepare fan-out result is a READ_ONLY vote
+        return [sid for sid, (resp, err) in results.items()
+                if err is None and getattr(resp, "status", None) == two_phase_pb2.PrepareResponse.READ_ONLY]
 
-        # --- On-chain locking step (pull from stash) ---
-        meta = self.tx_meta.get(tx_id)
-        if not meta:
-            raise RuntimeError(f"No metadata for tx {tx_id}")
-        recipient = meta["recipient"]
-        amount    = meta["amount"]
+    def _drop_read_only(self, tx_id, sids):
+        # shards that voted READ_ONLY already released the tx; leave them
+        # out of its second phase and on-chain steps
+        if not sids:
+            return
+        for sid in sids:
+            self.timeout_mgrs[sid].complete(tx_id)
+        with self._meta_lock:
+            meta = self.tx_meta.get(tx_id)
+            if meta is None:
+                return
+            meta["participants"] = [sid for sid in self._participants(meta) if sid not in sids]
+            # a lost update only makes recovery send no-op calls to them
+            self._log(tx_id, durable=False, participants=meta["participants"])
 
-        for sid, stub in self.chain_stubs_onchain.items():
-            deadline = self.timeout_mgrs[sid].deadlines.get(tx_id)
-            lock_req = two_phase_pb2.LockRequest(
-                transaction_id=tx_id,
-                recipient     = recipient,
-                amount        = amount,
-                deadline      = deadline
-            )
-            try:
-                txh = stub.LockOnChain(lock_req)
-                logger.info(f"[Coordinator] LockOnChain on {sid}: {txh.hash}")
-            except grpc.RpcError as e:
-                logger.error(f"[Coordinator] LockOnChain failed on {sid}: {e}")
+    def _participants(self, meta):
+        # shards a tx was prepared on; all of them when not partitioning or
+        # when the tx is unknown here
+        if meta is not None and "participants" in meta:
+            return meta["participants"]
+        return list(self.shard_stubs)
 
-        # quick debug: compare current block vs deadline
-        any_mgr = next(iter(self.timeout_mgrs.values()))
-        current = any_mgr.client.get_block_height()
-        logger.info(f"[Coordinator] current block height = {current}, deadline = {deadline}")
+    def _onchain(self, meta):
+        # participants that lock and pay out the tx's on-chain transfer: its
+        # payer alone when split_request picked one, else all of them
+        participants = self._participants(meta)
+        if meta is not None and "payer" in meta:
+            return [sid for sid in participants if sid == meta["payer"]]
+        return participants
 
-        # --- Off-chain commit step ---
-        for sid, stub in self.shard_stubs.items():
-            try:
-                stub.Commit(request, timeout=1)
-            except grpc.RpcError:
-                logger.warning(f"[Coordinator] off-chain Commit failed on {sid}")
+    @staticmethod
+    def _only(stubs, sids):
+        return {sid: stubs[sid] for sid in sids}
 
-        # --- On-chain finalize step ---
-        for sid, stub in self.chain_stubs_onchain.items():
-            try:
-                txh = stub.CommitOnChain(
-                    two_phase_pb2.OnChainRequest(transaction_id=tx_id)
+    def _claim(self, tx_id):
+        # pull on-chain args from the Prepare stash and claim the decision,
+        # so the expiry sweeper leaves this tx alone. Returns (meta, Future
+        # resolving once the decision is durable); nothing may be locked
+        # on-chain before that.
+        with self._meta_lock:
+            meta = self.tx_meta.get(tx_id)
+            if not meta:
+                raise RuntimeError(f"No metadata for tx {tx_id}")
+            if meta.get("decision") == "abort":
+                raise RuntimeError(f"tx {tx_id} was already aborted")
+            meta["decision"] = "commit"
+            if self.presumed_abort:
+                # first WAL write for this tx: it must stand on its own
+                fields = {k: v for k, v in meta.items() if k != "decision"}
+                fields["deadlines"] = self._deadlines(tx_id, meta)
+            else:
+                fields = {}
+        return meta, self._log(tx_id, decision="commit", **fields)
+
+    def _lock_request(self, sid, tx_id, meta):
+        return two_phase_pb2.LockRequest(
+            transaction_id=tx_id,
+            recipient     = meta["recipient"],
+            amount        = meta["amount"],
+            deadline      = self.timeout_mgrs[sid].deadlines.get(tx_id)
+        )
+
+    def _votes(self, results):
+        # Prepare fan-out results -> one vote per shard, ABORT on error
+        votes = []
+        for sid, (resp, err) in results.items():
+            if err is not None:
+                logger.warning(f"[Coordinator] Prepare failed on {sid}: {err}")
+                resp = two_phase_pb2.PrepareResponse(
+                    status=two_phase_pb2.PrepareResponse.ABORT,
+                    shard_id=sid,
+                    error=str(err)
                 )
-                logger.info(f"[Coordinator] CommitOnChain on {sid}: {txh.hash}")
-            except grpc.RpcError as e:
-                logger.error(f"[Coordinator] CommitOnChain failed on {sid}: {e}")
+            votes.append(resp)
+        return votes
 
-        self.tx_meta.pop(tx_id, None)
-        return two_phase_pb2.Empty()
+    def _succeeded(self, phase, results):
+        # shards whose on-chain call went through, logging each outcome
+        ok = set()
+        for sid, (txh, err) in results.items():
+            if err is None:
+                ok.add(sid)
+                logger.info(f"[Coordinator] {phase} on {sid}: {txh.hash}")
+            else:
+                logger.error(f"[Coordinator] {phase} failed on {sid}: {err}")
+        return ok
+
+    def _warn_failed(self, phase, results):
+        for sid, (_, err) in results.items():
+            if err is not None:
+                logger.warning(f"[Coordinator] {phase} failed on {sid}: {err}")
+
+    def _settle(self, tx_id, meta, locked, committed):
+        # funds locked on a shard that failed to commit can only be reclaimed
+        # after its deadline; keep those deadlines for the expiry sweeper
+        stranded = locked - committed
+        if stranded:
+            with self._meta_lock:
+                meta["stranded"] = stranded
+                # under the lock, so a record the sweeper already deleted
+                # is not recreated without its Prepare fields
+                if self.tx_meta.get(tx_id) is meta:
+                    self._log(tx_id, durable=False, stranded=sorted(stranded))
+            for sid, tm in self.timeout_mgrs.items():
+                if sid not in stranded:
+                    tm.complete(tx_id)
+                elif tx_id not in tm.deadlines:
+                    # already swept past its deadline; reclaim right away
+                    self._on_expired(sid, [tx_id])
+        else:
+            self._forget(tx_id)
 
     def Abort(self, request, context):
         tx_id = request.transaction_id
         logger.info(f"[Coordinator] Abort full flow for tx={tx_id}")
+        participants = self._abandon(tx_id)
+        if not participants:
+            return two_phase_pb2.Empty()
+
+        if self.presumed_abort:
+            self._abort_unacked(tx_id, participants)
+            return two_phase_pb2.Empty()
+
+        if self.abort_window is not None:
+            self.abort_window.submit((tx_id, participants)).result()
+            return two_phase_pb2.Empty()
 
         # --- Off-chain abort step ---
-        for sid, stub in self.shard_stubs.items():
-            try:
-                stub.Abort(request, timeout=1)
-            except grpc.RpcError:
-                logger.warning(f"[Coordinator] off-chain Abort failed on {sid}")
+        def abort(sid, stub):
+            return stub.Abort(request, timeout=self.OFFCHAIN_TIMEOUT)
+
+        with PHASE_SECONDS.time(phase="abort_offchain"):
+            results = self._fan_out(self._only(self.shard_stubs, participants), abort,
+                                    self.OFFCHAIN_TIMEOUT)
+        self._warn_failed("off-chain Abort", results)
 
         # --- On-chain reclaim step ---
-        for sid, stub in self.chain_stubs_onchain.items():
+        def reclaim(sid, stub):
+            return stub.ReclaimOnChain(
+                two_phase_pb2.OnChainRequest(transaction_id=tx_id),
+                timeout=self.ONCHAIN_TIMEOUT
+            )
+
+        with PHASE_SECONDS.time(phase="reclaim_onchain"):
+            results = self._fan_out(self._only(self.chain_stubs_onchain, participants), reclaim,
+                                    self.ONCHAIN_TIMEOUT)
+        self._succeeded("ReclaimOnChain", results)
+        return two_phase_pb2.Empty()
+
+    def _abandon(self, tx_id):
+        # Abort bookkeeping: forgets the tx and returns the shards it still
+        # has to be aborted on, none if an early abort already did that
+        with self._meta_lock:
+            meta = self.tx_meta.get(tx_id)
+            participants = self._participants(meta)
+            if meta is not None and meta.get("decision") == "abort":
+                participants = []
+        self._forget(tx_id, logged=not self.presumed_abort)
+        return participants
+
+    def _early_abort(self, tx_id, routes, settled):
+        # a shard voted ABORT while others were still preparing: the tx is
+        # decided, so abort every other shard at once, including those whose
+        # (now cancelled) Prepare may still land. `settled` voted ABORT or
+        # READ_ONLY and kept nothing. The tx stays known, as aborted, until
+        # the client's Abort or its deadline.
+        with self._meta_lock:
+            meta = self.tx_meta.get(tx_id)
+            if meta is None or meta.get("decision") is not None:
+                return
+            meta["decision"] = "abort"
+        logger.info(f"[Coordinator] early abort of tx={tx_id}: {settled[0]} voted ABORT")
+        self._abort_unacked(tx_id, [sid for sid in routes if sid not in settled])
+
+    def _abort_unacked(self, tx_id, participants):
+        # an abort decided before any commit decision: nothing was locked
+        # on-chain, so there is nothing to reclaim, and no one waits for the
+        # shards' acks; one that misses this aborts at its own deadline
+        if not participants:
+            return
+        if self.abort_window is not None:
+            self.abort_window.submit((tx_id, participants))
+            return
+        request = two_phase_pb2.AbortRequest(transaction_id=tx_id)
+
+        def send(sid, stub):
+            try:
+                stub.Abort(request, timeout=self.OFFCHAIN_TIMEOUT)
+            except Exception as e:
+                logger.warning(f"[Coordinator] off-chain Abort failed on {sid}: {e}")
+
+        for sid in participants:
+            self.executor.submit(tracing.carry(send), sid, self.shard_stubs[sid])
+
+    # --- group commit: one batched call per shard for a whole window ---
+
+    def _prepare_group(self, routes):
+        # routes: { sid: sub-request } per tx; returns each tx's votes, one
+        # per shard it was routed to
+        per_shard = defaultdict(list)   # sid -> [(tx index, sub-request)]
+        for i, parts in enumerate(routes):
+            for sid, req in parts.items():
+                per_shard[sid].append((i, req))
+
+        def prepare(sid, stub):
+            batch = two_phase_pb2.PrepareBatchRequest(requests=[req for _, req in per_shard[sid]])
+            return stub.PrepareBatch(batch, timeout=self.PREPARE_TIMEOUT)
+
+        results = self._fan_out(self._only(self.shard_stubs, per_shard), prepare,
+                                self.PREPARE_TIMEOUT)
+        votes = [[] for _ in routes]
+        read_only = defaultdict(list)   # tx index -> [sid]
+        for sid, (resp, err) in results.items():
+            entries = per_shard[sid]
+            if err is None and len(resp.responses) != len(entries):
+                err = RuntimeError(f"{len(resp.responses)} votes for {len(entries)} requests")
+            if err is not None:
+                logger.warning(f"[Coordinator] PrepareBatch failed on {sid}: {err}")
+                abort = two_phase_pb2.PrepareResponse(
+                    status=two_phase_pb2.PrepareResponse.ABORT,
+                    shard_id=sid,
+                    error=str(err)
+                )
+                responses = [abort] * len(entries)
+            else:
+                responses = resp.responses
+            for (i, _), vote in zip(entries, responses):
+                votes[i].append(vote)
+                if vote.status == two_phase_pb2.PrepareResponse.READ_ONLY:
+                    read_only[i].append(sid)
+        for i, sids in read_only.items():
+            self._drop_read_only(routes[i][sids[0]].transaction_id, sids)
+        return votes
+
+    def _commit_group(self, items):
+        # items: [(tx_id, meta)]; the same three phases as Commit, each one
+        # batched call per participating shard, then every tx is settled on
+        # its own
+        logger.info(f"[Coordinator] group Commit of {len(items)} tx(s)")
+        per_shard = defaultdict(list)   # sid -> [tx_id]
+        per_chain = defaultdict(list)   # sid -> [(tx_id, meta)], for the payers
+        for tx_id, meta in items:
+            for sid in self._participants(meta):
+                per_shard[sid].append(tx_id)
+            for sid in self._onchain(meta):
+                per_chain[sid].append((tx_id, meta))
+
+        def lock(sid, stub):
+            batch = two_phase_pb2.LockBatchRequest(items=[
+                self._lock_request(sid, tx_id, meta) for tx_id, meta in per_chain[sid]
+            ])
+            return stub.LockOnChainBatch(batch, timeout=self.ONCHAIN_TIMEOUT)
+
+        with PHASE_SECONDS.time(phase="lock_onchain"):
+            results = self._fan_out(self._only(self.chain_stubs_onchain, per_chain), lock,
+                                    self.ONCHAIN_TIMEOUT)
+        locked = self._batch_outcomes("LockOnChainBatch", results)
+
+        def commit(sid, stub):
+            return stub.CommitBatch(two_phase_pb2.CommitBatchRequest(transaction_ids=per_shard[sid]),
+                                    timeout=self.OFFCHAIN_TIMEOUT)
+
+        with PHASE_SECONDS.time(phase="commit_offchain"):
+            results = self._fan_out(self._only(self.shard_stubs, per_shard), commit,
+                                    self.OFFCHAIN_TIMEOUT)
+        self._warn_failed("off-chain CommitBatch", results)
+
+        def commit_onchain(sid, stub):
+            return stub.CommitOnChainBatch(
+                two_phase_pb2.OnChainBatchRequest(transaction_ids=[tx_id for tx_id, _ in per_chain[sid]]),
+                timeout=self.ONCHAIN_TIMEOUT
+            )
+
+        with PHASE_SECONDS.time(phase="commit_onchain"):
+            results = self._fan_out(self._only(self.chain_stubs_onchain, per_chain), commit_onchain,
+                                    self.ONCHAIN_TIMEOUT)
+        committed = self._batch_outcomes("CommitOnChainBatch", results)
+
+        for tx_id, meta in items:
+            self._settle(tx_id, meta, locked[tx_id], committed[tx_id])
+        return [None] * len(items)
+
+    def _abort_group(self, items):
+        # items: [(tx_id, participants)]
+        logger.info(f"[Coordinator] group Abort of {len(items)} tx(s)")
+        per_shard = defaultdict(list)   # sid -> [tx_id]
+        for tx_id, participants in items:
+            for sid in participants:
+                per_shard[sid].append(tx_id)
+
+        def abort(sid, stub):
+            return stub.AbortBatch(two_phase_pb2.AbortBatchRequest(transaction_ids=per_shard[sid]),
+                                   timeout=self.OFFCHAIN_TIMEOUT)
+
+        with PHASE_SECONDS.time(phase="abort_offchain"):
+            results = self._fan_out(self._only(self.shard_stubs, per_shard), abort,
+                                    self.OFFCHAIN_TIMEOUT)
+        self._warn_failed("off-chain AbortBatch", results)
+        if self.presumed_abort:
+            return [None] * len(items)
+
+        def reclaim(sid, stub):
+            return stub.ReclaimOnChainBatch(
+                two_phase_pb2.OnChainBatchRequest(transaction_ids=per_shard[sid]),
+                timeout=self.ONCHAIN_TIMEOUT
+            )
+
+        with PHASE_SECONDS.time(phase="reclaim_onchain"):
+            results = self._fan_out(self._only(self.chain_stubs_onchain, per_shard), reclaim,
+                                    self.ONCHAIN_TIMEOUT)
+        self._batch_outcomes("ReclaimOnChainBatch", results)
+        return [None] * len(items)
+
+    def _batch_outcomes(self, phase, results):
+        # { tx_id: shards where the item succeeded } from a *OnChainBatch fan-out
+        ok = defaultdict(set)
+        for sid, (resp, err) in results.items():
+            if err is not None:
+                logger.error(f"[Coordinator] {phase} failed on {sid}: {err}")
+                continue
+            for r in resp.results:
+                if r.ok:
+                    ok[r.transaction_id].add(sid)
+                else:
+                    logger.error(f"[Coordinator] {phase} on {sid} failed for tx={r.transaction_id}: {r.error}")
+        return ok
+
+    def Transact(self, request_iterator, context):
+        # pipelined client stream: each prepare/commit/abort runs as soon as
+        # it arrives and its reply is sent when ready, tagged by tx id. At most
+        # STREAM_INFLIGHT requests run at once; beyond that we stop reading,
+        # and HTTP/2 flow control pushes back on the client.
+        replies = queue.Queue()
+        slots = threading.BoundedSemaphore(self.STREAM_INFLIGHT)
+        finished = object()
+
+        def handle(req):
+            # a span per step, inside the stream's, names the tx it is for
+            kind = req.WhichOneof("kind")
+            tx_id = getattr(req, kind).transaction_id if kind else ""
+            try:
+                with tracing.span(f"Transact/{kind}", tx=tx_id):
+                    replies.put(self._transact_step(req))
+            finally:
+                slots.release()
+
+        def read():
+            try:
+                for req in request_iterator:
+                    slots.acquire()
+                    self.stream_executor.submit(tracing.carry(handle), req)
+            except Exception as e:
+                logger.warning(f"[Coordinator] Transact stream closed: {e}")
+            finally:
+                # drain: every in-flight step has replied once all slots are back
+                for _ in range(self.STREAM_INFLIGHT):
+                    slots.acquire()
+                replies.put(finished)
+
+        threading.Thread(target=tracing.carry(read), name="coord-stream-reader", daemon=True).start()
+        while True:
+            reply = replies.get()
+            if reply is finished:
+                return
+            yield reply
+
+    def _transact_step(self, req):
+        kind = req.WhichOneof("kind")
+        if kind == "prepare":
+            try:
+                votes = list(self.Prepare(req.prepare, None))
+            except Exception as e:
+                # e.g. the oracle or the WAL failed; the client still needs
+                # votes to decide on, and it will abort on these
+                logger.exception("[Coordinator] Transact prepare failed")
+                votes = self._abort_votes(str(e) or type(e).__name__)
+            return self._votes_reply(req, votes)
+        step = {"commit": self.Commit, "abort": self.Abort}.get(kind)
+        if step is None:
+            return self._outcome_reply(req, "empty TransactRequest")
+        try:
+            step(getattr(req, kind), None)
+        except Exception as e:
+            logger.exception(f"[Coordinator] Transact {kind} failed")
+            return self._outcome_reply(req, str(e) or type(e).__name__)
+        return self._outcome_reply(req)
+
+    def _abort_votes(self, error):
+        return [
+            two_phase_pb2.PrepareResponse(status=two_phase_pb2.PrepareResponse.ABORT,
+                                          shard_id=sid, error=error)
+            for sid in self.shard_stubs
+        ]
+
+    def _votes_reply(self, req, votes):
+        return two_phase_pb2.TransactResponse(
+            transaction_id=req.prepare.transaction_id,
+            votes=two_phase_pb2.Votes(votes=votes)
+        )
+
+    def _outcome_reply(self, req, error=""):
+        kind = req.WhichOneof("kind")
+        decision = (two_phase_pb2.Outcome.COMMITTED if kind == "commit"
+                    else two_phase_pb2.Outcome.ABORTED)
+        return two_phase_pb2.TransactResponse(
+            transaction_id=getattr(req, kind).transaction_id if kind else "",
+            outcome=two_phase_pb2.Outcome(decision=decision, error=error)
+        )
+
+    def _forget(self, tx_id, logged=True):
+        # drops all coordinator-side state for a decided transaction;
+        # logged=False when the WAL holds no record of it
+        with self._meta_lock:
+            self.tx_meta.pop(tx_id, None)
+        for tm in self.timeout_mgrs.values():
+            tm.complete(tx_id)
+        if self.wal is not None and logged:
+            # a lost delete only makes recovery redo an idempotent step
+            self.wal.delete(tx_id)
+
+    # --- write-ahead log ---
+
+    def _log(self, tx_id, durable=True, **fields):
+        # merges fields into the tx's WAL record; Future resolves when durable
+        if self.wal is None:
+            return self._log_nothing()
+        return self.wal.put(tx_id, fields, durable=durable)
+
+    @staticmethod
+    def _log_nothing():
+        done = futures.Future()
+        done.set_result(None)
+        return done
+
+    def _recover(self):
+        # rebuilds tx_meta and deadlines from the WAL. Undecided txs are left
+        # to the client or the expiry sweeper, as before the restart; commits
+        # that never reached _settle are driven to completion again.
+        redo = []
+        for tx_id, rec in self.wal.state().items():
+            if "recipient" not in rec or "amount" not in rec:
+                # a late update for a tx deleted meanwhile: nothing to resume
+                logger.warning(f"[Coordinator] discarding partial WAL record for tx={tx_id}: {rec}")
+                self.wal.delete(tx_id)
+                continue
+            meta = {"recipient": rec["recipient"], "amount": rec["amount"]}
+            for key in ("participants", "payer"):
+                if key in rec:
+                    meta[key] = rec[key]
+            deadlines = rec.get("deadlines", {})
+            if "decision" in rec:
+                meta["decision"] = rec["decision"]
+            if "stranded" in rec:
+                meta["stranded"] = set(rec["stranded"])
+                deadlines = {sid: d for sid, d in deadlines.items() if sid in meta["stranded"]}
+            elif meta.get("decision") == "commit":
+                redo.append(tx_id)
+            for sid, deadline in deadlines.items():
+                if sid in self.timeout_mgrs and deadline is not None:
+                    self.timeout_mgrs[sid].restore(tx_id, deadline)
+            self.tx_meta[tx_id] = meta
+
+        logger.info(f"[Coordinator] recovered {len(self.tx_meta)} in-flight tx(s) from WAL; "
+                    f"re-driving {len(redo)} commit(s)")
+        for tx_id in redo:
+            self.sweep_executor.submit(self._commit_phases, tx_id, self.tx_meta[tx_id])
+
+    def _on_expired(self, sid, tx_ids):
+        # sweeper callback: tx_ids just passed their deadline on shard `sid`.
+        # Undecided txs can no longer commit there, so abort them everywhere;
+        # committed txs whose lock on `sid` was stranded can now be reclaimed.
+        undecided, reclaim, early = [], [], []
+        with self._meta_lock:
+            for tx_id in tx_ids:
+                meta = self.tx_meta.get(tx_id)
+                if meta is None:
+                    continue
+                if meta.get("decision") is None:
+                    meta["decision"] = "abort"
+                    undecided.append((tx_id, self._participants(meta)))
+                elif meta["decision"] == "abort":
+                    # aborted early; the client never sent its Abort
+                    early.append(tx_id)
+                elif sid in meta.get("stranded", ()):
+                    meta["stranded"].discard(sid)
+                    reclaim.append(tx_id)
+                    if not meta["stranded"]:
+                        self.tx_meta.pop(tx_id)
+                        if self.wal is not None:
+                            self.wal.delete(tx_id)
+                    else:
+                        self._log(tx_id, durable=False, stranded=sorted(meta["stranded"]))
+        for tx_id in [tx_id for tx_id, _ in undecided] + early:
+            self._forget(tx_id, logged=not self.presumed_abort)
+        if self.presumed_abort:
+            # each shard's own sweeper aborts these at the same deadline
+            undecided = []
+
+        if undecided or reclaim:
+            logger.info(f"[Coordinator] deadline passed on {sid}: aborting {len(undecided)}, "
+                        f"reclaiming {len(reclaim)}")
+            self.sweep_executor.submit(self._bulk_expire, sid, undecided, reclaim)
+
+    def _bulk_expire(self, sid, undecided, reclaim):
+        # undecided: [(tx_id, participants)]. They never reached LockOnChain,
+        # so an off-chain Abort on each participant is enough
+        per_shard = defaultdict(list)
+        for tx_id, participants in undecided:
+            for _sid in participants:
+                per_shard[_sid].append(tx_id)
+
+        def abort_all(_sid, stub):
+            for tx_id in per_shard[_sid]:
+                stub.Abort(two_phase_pb2.AbortRequest(transaction_id=tx_id),
+                           timeout=self.OFFCHAIN_TIMEOUT)
+
+        if undecided:
+            results = self._fan_out(self._only(self.shard_stubs, per_shard), abort_all,
+                                    self.OFFCHAIN_TIMEOUT * len(undecided))
+            for _sid, (_, err) in results.items():
+                if err is not None:
+                    logger.warning(f"[Coordinator] bulk Abort failed on {_sid}: {err}")
+
+        stub = self.chain_stubs_onchain[sid]
+        for tx_id in reclaim:
             try:
                 txh = stub.ReclaimOnChain(
-                    two_phase_pb2.OnChainRequest(transaction_id=tx_id)
+                    two_phase_pb2.OnChainRequest(transaction_id=tx_id),
+                    timeout=self.ONCHAIN_TIMEOUT
                 )
                 logger.info(f"[Coordinator] ReclaimOnChain on {sid}: {txh.hash}")
             except grpc.RpcError as e:
                 logger.error(f"[Coordinator] ReclaimOnChain failed on {sid}: {e}")
 
-        return two_phase_pb2.Empty()
+    def _fan_out(self, stubs, call, timeout):
+        """
+        Runs call(sid, stub) for every shard on the shared executor and waits
+        for all of them before returning (the barrier between phases).
+
+        Each call is expected to pass `timeout` as its gRPC deadline; the
+        barrier waits up to the same budget per call, counted from when the
+        call starts running, so time spent queued behind other requests on
+        the shared pool does not eat into it. Queued calls are never
+        cancelled: a Commit or Abort fanned out here has been decided and
+        must reach every shard, so the barrier waits for it to start.
+
+        Returns { sid: (result, error) } in shard order; exactly one of result
+        and error is set.
+        """
+        started = {sid: threading.Event() for sid in stubs}
+        began = {}
 
-def serve():
+        def run(sid, stub):
+            began[sid] = time.monotonic()
+            started[sid].set()
+            return call(sid, stub)
+
+        # each call runs in the caller's trace context, so its RPC is a
+        # child of the phase that fanned it out
+        pending = {
+            sid: self.executor.submit(tracing.carry(run), sid, stub)
+            for sid, stub in stubs.items()
+        }
+
+        results = {}
+        for sid, fut in pending.items():
+            started[sid].wait()
+            try:
+                left = began[sid] + timeout - time.monotonic()
+                results[sid] = (fut.result(timeout=max(0.0, left)), None)
+            except futures.TimeoutError:
+                results[sid] = (None, TimeoutError(f"no reply within {timeout}s"))
+            except Exception as e:
+                results[sid] = (None, e)
+        return results
+
+    def _stream_fan_out(self, stubs, method, requests, timeout):
+        """
+        Starts stub.<method>(requests[sid]) on every shard at once and
+        yields (sid, result, error) as each call finishes, in completion
+        order; exactly one of result and error is set.
+
+        Each call carries `timeout` as its gRPC deadline, and the stream
+        gives up on calls still running once that much time has passed.
+        Closing the generator early cancels the calls still in flight.
+        """
+        finished = queue.Queue()
+        calls = {}
+        for sid, stub in stubs.items():
+            call = self._start_call(getattr(stub, method), requests[sid], timeout)
+            call.add_done_callback(lambda _, sid=sid: finished.put(sid))
+            calls[sid] = call
+
+        end = time.monotonic() + timeout
+        try:
+            while calls:
+                try:
+                    sid = finished.get(timeout=max(0.0, end - time.monotonic()))
+                except queue.Empty:
+                    break
+                call = calls.pop(sid)
+                try:
+                    result, err = call.result(), None
+                except Exception as e:
+                    result, err = None, e
+                yield sid, result, err
+            for sid in list(calls):
+                calls.pop(sid).cancel()
+                yield sid, None, TimeoutError(f"no reply within {timeout}s")
+        finally:
+            for call in calls.values():
+                call.cancel()
+
+    def _start_call(self, method, request, timeout):
+        # a gRPC stub method's non-blocking form; an in-process stub method
+        # runs on the shared executor instead
+        start = getattr(method, "future", None)
+        if start is not None:
+            return start(request, timeout=timeout)
+        return self.executor.submit(tracing.carry(method), request, timeout=timeout)
+
+def load_config():
     base = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
     with open(os.path.join(base, 'config', 'shards.json'))      as f:
@@ -163,10 +947,24 @@ def serve():
         rpc_cfg     = json.load(f)
     with open(os.path.join(base, 'config', 'adapters.json'))   as f:
         adapter_cfg = json.load(f)
+    return shard_cfg, rpc_cfg, adapter_cfg
+
+def serve(group_window=None, group_max=100, wal_dir=None, partitions=None,
+          presumed_abort=False, metrics_port=None, trace_file=None):
+    shard_cfg, rpc_cfg, adapter_cfg = load_config()
+    partitioner = load_partitioner(partitions, shard_cfg) if partitions else None
 
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+    if metrics_port is not None:
+        serve_metrics(metrics_port)
+    if trace_file is not None:
+        tracing.configure(trace_file)
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10), options=SERVER_OPTIONS,
+                         interceptors=[ServerMetricsInterceptor(),
+                                       ServerTracingInterceptor("coordinator")])
     two_phase_pb2_grpc.add_CoordinatorServicer_to_server(
-        Coordinator(shard_cfg, rpc_cfg, adapter_cfg, default_timeout_blocks=500),
+        Coordinator(shard_cfg, rpc_cfg, adapter_cfg, default_timeout_blocks=500,
+                    group_window=group_window, group_max=group_max, wal_dir=wal_dir,
+                    partitioner=partitioner, presumed_abort=presumed_abort),
         server
     )
     server.add_insecure_port('[::]:50051')
@@ -174,4 +972,31 @@ def serve():
     server.wait_for_termination()
 
 if __name__ == '__main__':
-    serve()
+    import argparse
+    p = argparse.ArgumentParser()
+    p.add_argument('--group-window', type=float, default=None,
+                   help='seconds to coalesce concurrent txs per shard (default: off)')
+    p.add_argument('--group-max', type=int, default=100,
+                   help='max txs per group before it is flushed early')
+    p.add_argument('--aio', action='store_true',
+                   help='serve with the asyncio (grpc.aio) coordinator')
+    p.add_argument('--wal-dir', default=None,
+                   help='directory for the decision write-ahead log (default: memory only)')
+    p.add_argument('--partitions', default=None,
+                   help='key partitioning config, e.g. config/partitions.json '
+                        '(default: every shard takes part in every tx)')
+    p.add_argument('--presumed-abort', action='store_true',
+                   help='log and acknowledge only commit decisions')
+    p.add_argument('--metrics-port', type=int, default=None,
+                   help='serve Prometheus metrics on http://0.0.0.0:<port>/metrics')
+    p.add_argument('--trace-file', default=None,
+                   help='append trace spans to this file as JSON lines (scripts/critical_path.py)')
+    args = p.parse_args()
+    if args.aio:
+        import asyncio
+        from coordinator.aio_coordinator import serve_aio
+        asyncio.run(serve_aio(args.group_window, args.group_max, args.wal_dir, args.partitions,
+                              args.presumed_abort, args.metrics_port, args.trace_file))
+    else:
+        serve(args.group_window, args.group_max, args.wal_dir, args.partitions,
+              args.presumed_abort, args.metrics_port, args.trace_file)
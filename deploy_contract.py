@@ -6,6 +6,9 @@ load_dotenv()  # loads ALCHEMY_RPC_URL and PRIVATE_KEY from .env
 from web3 import Web3
 import solcx
 import os
+from pathlib import Path
+
+SRC_PATH = Path(__file__).parent / "contracts" / "evm_adapter" / "TwoPhaseAdapter.sol"
 
 # 0. Ensure solc 0.8.0 is available
 try:
@@ -20,51 +23,7 @@ compiled = solcx.compile_standard({
     "language": "Solidity",
     "sources": {
         "TwoPhaseAdapter.sol": {
-            "content": '''
-// SPDX-License-Identifier: MIT
-pragma solidity ^0.8.0;
-
-contract TwoPhaseAdapter {
-    enum Status { None, Pending, Committed, Aborted }
-    struct TxData {
-        address sender;
-        address recipient;
-        uint256 amount;
-        uint256 deadline;
-        Status  status;
-    }
-    mapping(bytes32 => TxData) public transactions;
-    event Locked(bytes32 indexed txId, address indexed sender, address indexed recipient, uint256 amount, uint256 deadline);
-    event Committed(bytes32 indexed txId);
-    event Reclaimed(bytes32 indexed txId);
-
-    function lockFunds(bytes32 txId, address recipient, uint256 deadline) external payable {
-        require(transactions[txId].status == Status.None, "TX exists");
-        require(msg.value > 0, "Must lock >0");
-        require(deadline > block.number, "Deadline in past");
-        transactions[txId] = TxData(msg.sender, recipient, msg.value, deadline, Status.Pending);
-        emit Locked(txId, msg.sender, recipient, msg.value, deadline);
-    }
-
-    function commit(bytes32 txId) external {
-        TxData storage t = transactions[txId];
-        require(t.status == Status.Pending, "Not pending");
-        require(block.number <= t.deadline, "Past deadline");
-        t.status = Status.Committed;
-        payable(t.recipient).transfer(t.amount);
-        emit Committed(txId);
-    }
-
-    function reclaim(bytes32 txId) external {
-        TxData storage t = transactions[txId];
-        require(t.status == Status.Pending, "Not pending");
-        require(block.number > t.deadline, "Too early");
-        t.status = Status.Aborted;
-        payable(t.sender).transfer(t.amount);
-        emit Reclaimed(txId);
-    }
-}
-'''
+            "content": SRC_PATH.read_text(encoding="utf-8")
         }
     },
     "settings": {
@@ -105,7 +64,7 @@ txn = Contract.constructor().build_transaction({
     "from": account.address,
     "nonce": nonce,
     "chainId": w3.eth.chain_id,
-    "gas": 1_000_000,
+    "gas": 3_000_000,   # batch entry points make the contract larger
     "maxFeePerGas": w3.to_wei("100", "gwei"),
     "maxPriorityFeePerGas": w3.to_wei("2", "gwei"),
 })
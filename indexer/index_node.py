@@ -0,0 +1,254 @@
+# indexer/index_node.py
+import grpc, threading
+from concurrent import futures
+from pathlib import Path
+from typing import Dict
+import json, logging
+
+from web3 import Web3
+
+from mcp2pc import two_phase_pb2, two_phase_pb2_grpc
+
+from common.block_oracle import get_oracle
+from common.channels import SERVER_OPTIONS
+from common import tracing
+from common.interceptors import ServerMetricsInterceptor, ServerTracingInterceptor
+from common.metrics import gauge, serve_metrics
+from indexer.store import AdapterEvent, TxStatusStore
+from shard.shard_node import _tx_id32
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ABI_PATH = Path(__file__).parent.parent / "abi" / "TwoPhaseAdapter.json"
+# the adapter events that move an entry's status
+EVENTS = ("Locked", "Committed", "Reclaimed")
+
+# block each shard's adapter logs are indexed up to
+INDEXED_HEIGHT = gauge("indexer_indexed_height", "Block the adapter logs are indexed up to",
+                       ("shard",))
+
+class EventIndexer:
+    # follows the Locked/Committed/Reclaimed logs of the adapters on one
+    # chain into a TxStatusStore. On every new head it reads the logs from
+    # its cursor up to head - confirmations: one eth_getLogs covers every
+    # adapter and event over up to MAX_RANGE blocks, and a catch-up sends
+    # RANGES_PER_CALL of those in one JSON-RPC batch. Each step's events and
+    # cursors are stored in one SQLite transaction, so a restart resumes
+    # where the last step ended. A reorg deeper than `confirmations` blocks
+    # is not undone in the store.
+    MAX_RANGE = 2000          # blocks per eth_getLogs; providers cap the span
+    RANGES_PER_CALL = 10
+
+    def __init__(self, store: TxStatusStore, chain, oracle, adapters: Dict[str, str],
+                 from_block: int = 0, confirmations: int = 0):
+        self.store = store
+        self.chain = chain
+        self.oracle = oracle
+        # checksum address -> shard id
+        self.shards = {Web3.to_checksum_address(a): sid for sid, a in adapters.items()}
+        self.from_block = from_block
+        self.confirmations = confirmations
+        contract = chain.w3.eth.contract(abi=json.loads(ABI_PATH.read_text()))
+        # topic0 -> event, for decoding
+        self._events = {}
+        for name in EVENTS:
+            event = contract.events[name]()
+            self._events[bytes.fromhex(event.topic.removeprefix("0x"))] = event
+        self._topics = [["0x" + t.hex() for t in self._events]]
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._unsubscribe = None
+
+    def start(self):
+        # catches up now, then after every new head, on a thread of its own
+        # so a long catch-up never holds up the oracle's other subscribers
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="EventIndexer", daemon=True)
+            self._thread.start()
+            self._unsubscribe = self.oracle.subscribe(lambda height: self._wake.set())
+            self._wake.set()
+        return self
+
+    def close(self):
+        if self._unsubscribe is not None:
+            self._unsubscribe()
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def catch_up(self) -> int:
+        # indexes every block up to head - confirmations; returns that height
+        target = self.oracle.get_block_height() - self.confirmations
+        cursors = {}
+        for sid in self.shards.values():
+            height = self.store.cursor(sid)
+            cursors[sid] = self.from_block - 1 if height is None else height
+        start = min(cursors.values()) + 1
+
+        while start <= target:
+            ranges = []
+            while start <= target and len(ranges) < self.RANGES_PER_CALL:
+                end = min(start + self.MAX_RANGE - 1, target)
+                ranges.append((start, end))
+                start = end + 1
+            with tracing.span("indexer/get_logs", first=ranges[0][0], last=end):
+                batches = self.chain.logs(list(self.shards), self._topics, ranges)
+            events = []
+            for log in (log for batch in batches for log in batch):
+                shard = self.shards.get(Web3.to_checksum_address(log.address))
+                # a shard whose cursor is past this block already has it
+                if shard is not None and not log.get("removed") and log.blockNumber > cursors[shard]:
+                    events.append(self._decode(shard, log))
+            cursors = {sid: max(height, end) for sid, height in cursors.items()}
+            self.store.apply(events, cursors)
+            for sid, height in cursors.items():
+                INDEXED_HEIGHT.set(height, shard=sid)
+            if events:
+                logger.info(f"[Indexer] blocks {ranges[0][0]}-{end}: {len(events)} adapter event(s)")
+        return target
+
+    # --- internals ---
+
+    def _decode(self, shard, log) -> AdapterEvent:
+        event = self._events[bytes(log.topics[0])].process_log(log)
+        args = dict(event.args)
+        return AdapterEvent(shard, event.event, bytes(args.pop("txId")), log.blockNumber,
+                            "0x" + bytes(log.transactionHash).hex(), args)
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            try:
+                self.catch_up()
+            except Exception as e:
+                # retried on the next head
+                logger.warning(f"[Indexer] catch-up failed: {e}")
+
+
+class TxIndex(two_phase_pb2_grpc.TxIndexServicer):
+    # GetStatus / ListPending, answered from the store alone
+    DEFAULT_PAGE = 1000
+    MAX_PAGE = 10_000
+
+    def __init__(self, store: TxStatusStore, shard_ids):
+        self.store = store
+        self.shard_ids = list(shard_ids)
+
+    def GetStatus(self, request, context):
+        try:
+            tx_ids = [_tx_id32(tx) for tx in request.transaction_ids]
+        except ValueError as e:
+            return self._invalid(context, e, two_phase_pb2.StatusResponse())
+        return two_phase_pb2.StatusResponse(
+            records=[_record(r) for r in self.store.get(tx_ids)],
+            indexed_height=self.store.indexed_height(self.shard_ids),
+        )
+
+    def ListPending(self, request, context):
+        try:
+            sender = Web3.to_checksum_address(request.sender) if request.sender else None
+            recipient = Web3.to_checksum_address(request.recipient) if request.recipient else None
+            after = _parse_page_token(request.page_token) if request.page_token else None
+        except ValueError as e:
+            return self._invalid(context, e, two_phase_pb2.ListPendingResponse())
+        limit = min(request.limit or self.DEFAULT_PAGE, self.MAX_PAGE)
+
+        # one row past the page tells whether another page follows
+        rows = self.store.pending(
+            sender=sender, recipient=recipient,
+            deadline_from=request.deadline_from or None, deadline_to=request.deadline_to or None,
+            shard=request.shard_id or None, after=after, limit=limit + 1,
+        )
+        page, more = rows[:limit], len(rows) > limit
+        last = page[-1] if page else None
+        return two_phase_pb2.ListPendingResponse(
+            records=[_record(r) for r in page],
+            indexed_height=self.store.indexed_height(self.shard_ids),
+            next_page_token=f"{last.deadline}:{last.tx_id.hex()}:{last.shard}" if more else "",
+        )
+
+    def _invalid(self, context, error, empty):
+        context.set_details(str(error))
+        context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+        return empty
+
+
+def _record(r) -> two_phase_pb2.TxRecord:
+    return two_phase_pb2.TxRecord(
+        transaction_id=r.tx_id.hex(), shard_id=r.shard,
+        sender=r.sender or "", recipient=r.recipient or "",
+        amount=r.amount or 0, deadline=r.deadline or 0, status=r.status,
+        locked_block=r.locked_block or 0, settled_block=r.settled_block or 0,
+        lock_hash=r.lock_hash or "", settle_hash=r.settle_hash or "",
+    )
+
+def _parse_page_token(token):
+    # "<deadline>:<tx id hex>:<shard>", the key of a page's last record
+    deadline, tx_id, shard = token.split(":", 2)
+    return int(deadline), bytes.fromhex(tx_id), shard
+
+
+def load_config():
+    base = Path(__file__).parent.parent
+    with open(base / 'config' / 'shard_rpcs.json') as f:
+        rpc_cfg = json.load(f)
+    with open(base / 'config' / 'adapters.json') as f:
+        adapter_cfg = json.load(f)
+    return rpc_cfg, adapter_cfg
+
+
+def start_indexers(store, rpc_cfg, adapter_cfg, from_block=0, confirmations=0):
+    # one EventIndexer per chain, covering every adapter on it
+    by_chain = {}
+    for sid, address in adapter_cfg.items():
+        by_chain.setdefault(rpc_cfg[sid], {})[sid] = address
+    indexers = []
+    for rpc_url, adapters in by_chain.items():
+        oracle = get_oracle(rpc_url)
+        indexers.append(EventIndexer(store, oracle.client.backend, oracle, adapters,
+                                     from_block, confirmations).start())
+    return indexers
+
+
+def serve(port, db_path=None, from_block=0, confirmations=2, metrics_port=None, trace_file=None):
+    rpc_cfg, adapter_cfg = load_config()
+    if metrics_port is not None:
+        serve_metrics(metrics_port)
+    if trace_file is not None:
+        tracing.configure(trace_file)
+
+    store = TxStatusStore(db_path or ":memory:")
+    start_indexers(store, rpc_cfg, adapter_cfg, from_block, confirmations)
+
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10), options=SERVER_OPTIONS,
+                         interceptors=[ServerMetricsInterceptor(),
+                                       ServerTracingInterceptor("indexer")])
+    two_phase_pb2_grpc.add_TxIndexServicer_to_server(TxIndex(store, adapter_cfg), server)
+    server.add_insecure_port(f'[::]:{port}')
+    server.start()
+    server.wait_for_termination()
+
+
+if __name__ == '__main__':
+    import argparse
+    p = argparse.ArgumentParser()
+    p.add_argument('--port', type=int, default=50070)
+    p.add_argument('--db', default=None,
+                   help='SQLite file for the index (default: memory only, rebuilt on start)')
+    p.add_argument('--from-block', type=int, default=0,
+                   help='first block to index, e.g. the adapters\' deployment block')
+    p.add_argument('--confirmations', type=int, default=2,
+                   help='index only blocks at least this far below the head')
+    p.add_argument('--metrics-port', type=int, default=None,
+                   help='serve Prometheus metrics on http://0.0.0.0:<port>/metrics')
+    p.add_argument('--trace-file', default=None,
+                   help='append trace spans to this file as JSON lines (scripts/critical_path.py)')
+    args = p.parse_args()
+    serve(args.port, args.db, args.from_block, args.confirmations, args.metrics_port,
+          args.trace_file)
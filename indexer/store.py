@@ -0,0 +1,169 @@
+# indexer/store.py
+import sqlite3, threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+# TwoPhaseAdapter.Status
+NONE, PENDING, COMMITTED, ABORTED = range(4)
+
+# one row per adapter entry. Partial indexes cover the pending rows only,
+# which is what ListPending scans; status lookups go through the primary key
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS txs (
+    tx_id         BLOB NOT NULL,      -- the adapter's bytes32 id
+    shard         TEXT NOT NULL,
+    sender        TEXT,               -- NULL: locked before the indexed range
+    recipient     TEXT,
+    amount        TEXT,               -- uint256, in decimal
+    deadline      INTEGER,
+    status        INTEGER NOT NULL,
+    locked_block  INTEGER,
+    settled_block INTEGER,
+    lock_hash     TEXT,
+    settle_hash   TEXT,
+    PRIMARY KEY (tx_id, shard)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS pending_by_deadline  ON txs (deadline, tx_id, shard) WHERE status = 1;
+CREATE INDEX IF NOT EXISTS pending_by_sender    ON txs (sender, deadline, tx_id, shard) WHERE status = 1;
+CREATE INDEX IF NOT EXISTS pending_by_recipient ON txs (recipient, deadline, tx_id, shard) WHERE status = 1;
+CREATE TABLE IF NOT EXISTS cursors (
+    shard  TEXT PRIMARY KEY,
+    height INTEGER NOT NULL           -- logs indexed up to this block
+);
+"""
+
+_COLUMNS = ("tx_id, shard, sender, recipient, amount, deadline, status, "
+            "locked_block, settled_block, lock_hash, settle_hash")
+
+class TxRecord(NamedTuple):
+    tx_id: bytes
+    shard: str
+    sender: Optional[str]
+    recipient: Optional[str]
+    amount: Optional[int]
+    deadline: Optional[int]
+    status: int
+    locked_block: Optional[int]
+    settled_block: Optional[int]
+    lock_hash: Optional[str]
+    settle_hash: Optional[str]
+
+    @classmethod
+    def _from_row(cls, row) -> "TxRecord":
+        row = list(row)
+        row[4] = int(row[4]) if row[4] is not None else None
+        return cls(*row)
+
+
+class AdapterEvent(NamedTuple):
+    # one decoded adapter log, in chain order
+    shard: str
+    name: str           # Locked, Committed or Reclaimed
+    tx_id: bytes
+    block: int
+    tx_hash: str
+    args: dict          # Locked: sender, recipient, amount, deadline
+
+
+class TxStatusStore:
+    # the indexer's view of every adapter entry, in SQLite: ":memory:" (the
+    # default) or a database file that survives restarts, along with the
+    # block each shard's logs are indexed up to. One connection shared under
+    # a lock: queries are point or short range lookups on an index.
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        if path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    # --- indexing ---
+
+    def apply(self, events: Iterable[AdapterEvent], cursors: Dict[str, int]):
+        # applies events in order and moves the shards' cursors, atomically
+        with self._lock:
+            db = self._db
+            db.execute("BEGIN")
+            try:
+                for ev in events:
+                    if ev.name == "Locked":
+                        a = ev.args
+                        db.execute(
+                            "INSERT INTO txs VALUES (?, ?, ?, ?, ?, ?, ?, ?, NULL, ?, NULL) "
+                            "ON CONFLICT (tx_id, shard) DO UPDATE SET sender = excluded.sender, "
+                            "recipient = excluded.recipient, amount = excluded.amount, "
+                            "deadline = excluded.deadline, locked_block = excluded.locked_block, "
+                            "lock_hash = excluded.lock_hash",
+                            (ev.tx_id, ev.shard, a["sender"], a["recipient"], str(a["amount"]),
+                             a["deadline"], PENDING, ev.block, ev.tx_hash))
+                    else:
+                        status = COMMITTED if ev.name == "Committed" else ABORTED
+                        db.execute(
+                            "INSERT INTO txs (tx_id, shard, status, settled_block, settle_hash) "
+                            "VALUES (?, ?, ?, ?, ?) ON CONFLICT (tx_id, shard) DO UPDATE SET "
+                            "status = excluded.status, settled_block = excluded.settled_block, "
+                            "settle_hash = excluded.settle_hash",
+                            (ev.tx_id, ev.shard, status, ev.block, ev.tx_hash))
+                db.executemany("INSERT OR REPLACE INTO cursors VALUES (?, ?)", cursors.items())
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    def cursor(self, shard: str) -> Optional[int]:
+        with self._lock:
+            row = self._db.execute("SELECT height FROM cursors WHERE shard = ?", (shard,)).fetchone()
+        return row[0] if row else None
+
+    def indexed_height(self, shards: Iterable[str]) -> int:
+        # the block every one of `shards` is indexed up to (0 if one isn't yet)
+        heights = [self.cursor(s) for s in shards]
+        return min((h or 0 for h in heights), default=0)
+
+    # --- queries ---
+
+    def get(self, tx_ids: List[bytes]) -> List[TxRecord]:
+        # every shard's entry for each id, in request order
+        if not tx_ids:
+            return []
+        marks = ", ".join("?" * len(tx_ids))
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {_COLUMNS} FROM txs WHERE tx_id IN ({marks}) ORDER BY tx_id, shard",
+                list(tx_ids)).fetchall()
+        order = {tx: i for i, tx in reversed(list(enumerate(tx_ids)))}
+        return sorted((TxRecord._from_row(r) for r in rows), key=lambda r: order[r.tx_id])
+
+    def pending(self, sender: Optional[str] = None, recipient: Optional[str] = None,
+                deadline_from: Optional[int] = None, deadline_to: Optional[int] = None,
+                shard: Optional[str] = None, after: Optional[Tuple[int, bytes, str]] = None,
+                limit: int = 1000) -> List[TxRecord]:
+        # pending entries matching every given filter (deadlines inclusive),
+        # by (deadline, tx_id, shard); `after` is the last key of a previous
+        # page. Addresses compare in checksum form, as the logs carry them.
+        # The status is inlined: SQLite only picks a partial index whose
+        # WHERE the query's terms match literally
+        where, params = [f"status = {PENDING}"], []
+        for column, value in (("sender", sender), ("recipient", recipient), ("shard", shard)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if deadline_from is not None:
+            where.append("deadline >= ?")
+            params.append(deadline_from)
+        if deadline_to is not None:
+            where.append("deadline <= ?")
+            params.append(deadline_to)
+        if after is not None:
+            where.append("(deadline, tx_id, shard) > (?, ?, ?)")
+            params.extend(after)
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {_COLUMNS} FROM txs WHERE {' AND '.join(where)} "
+                f"ORDER BY deadline, tx_id, shard LIMIT ?", params + [limit]).fetchall()
+        return [TxRecord._from_row(r) for r in rows]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
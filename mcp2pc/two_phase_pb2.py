@@ -24,7 +24,7 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0ftwo_phase.proto\x12\x06mcp2pc\"\x07\n\x05\x45mpty\"\x87\x01\n\x0ePrepareRequest\x12\x16\n\x0etransaction_id\x18\x01 \x01(\t\x12\x12\n\noperations\x18\x02 \x03(\t\x12\x16\n\x0etimeout_blocks\x18\x03 \x01(\x05\x12\x19\n\x11onchain_recipient\x18\x04 \x01(\t\x12\x16\n\x0eonchain_amount\x18\x05 \x01(\x04\"s\n\x0fPrepareResponse\x12.\n\x06status\x18\x01 \x01(\x0e\x32\x1e.mcp2pc.PrepareResponse.Status\x12\x10\n\x08shard_id\x18\x02 \x01(\t\"\x1e\n\x06Status\x12\t\n\x05READY\x10\x00\x12\t\n\x05\x41\x42ORT\x10\x01\"\'\n\rCommitRequest\x12\x16\n\x0etransaction_id\x18\x01 \x01(\t\"&\n\x0c\x41\x62ortRequest\x12\x16\n\x0etransaction_id\x18\x01 \x01(\t\")\n\x0fRollbackRequest\x12\x16\n\x0etransaction_id\x18\x01 \x01(\t\"Z\n\x0bLockRequest\x12\x16\n\x0etransaction_id\x18\x01 \x01(\t\x12\x11\n\trecipient\x18\x02 \x01(\t\x12\x0e\n\x06\x61mount\x18\x03 \x01(\x04\x12\x10\n\x08\x64\x65\x61\x64line\x18\x04 \x01(\x04\"\x16\n\x06TxHash\x12\x0c\n\x04hash\x18\x01 \x01(\t\"(\n\x0eOnChainRequest\x12\x16\n\x0etransaction_id\x18\x01 \x01(\t2\xa9\x01\n\x0b\x43oordinator\x12<\n\x07Prepare\x12\x16.mcp2pc.PrepareRequest\x1a\x17.mcp2pc.PrepareResponse0\x01\x12.\n\x06\x43ommit\x12\x15.mcp2pc.CommitRequest\x1a\r.mcp2pc.Empty\x12,\n\x05\x41\x62ort\x12\x14.mcp2pc.AbortRequest\x1a\r.mcp2pc.Empty2\xfc\x02\n\x05Shard\x12:\n\x07Prepare\x12\x16.mcp2pc.PrepareRequest\x1a\x17.mcp2pc.PrepareResponse\x12.\n\x06\x43ommit\x12\x15.mcp2pc.CommitRequest\x1a\r.mcp2pc.Empty\x12,\n\x05\x41\x62ort\x12\x14.mcp2pc.AbortRequest\x1a\r.mcp2pc.Empty\x12\x32\n\x08Rollback\x12\x17.mcp2pc.RollbackRequest\x1a\r.mcp2pc.Empty\x12\x32\n\x0bLockOnChain\x12\x13.mcp2pc.LockRequest\x1a\x0e.mcp2pc.TxHash\x12\x37\n\rCommitOnChain\x12\x16.mcp2pc.OnChainRequest\x1a\x0e.mcp2pc.TxHash\x12\x38\n\x0eReclaimOnChain\x12\x16.mcp2pc.OnChainRequest\x1a\x0e.mcp2pc.TxHashb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0ftwo_phase.proto\x12\x06mcp2pc\"\x07\n\x05\x45mpty\"\x87\x01\n\tOperation\x12(\n\x06opcode\x18\x01 \x01(\x0e\x32\x18.mcp2pc.Operation.Opcode\x12\x0b\n\x03key\x18\x02 \x01(\x0c\x12\r\n\x05value\x18\x03 \x01(\x0c\"4\n\x06Opcode\x12\x0b\n\x07INVALID\x10\x00\x12\x07\n\x03SET\x10\x01\x12\n\n\x06\x44\x45LETE\x10\x02\x12\x08\n\x04READ\x10\x03\"\xd2\x01\n\x0ePrepareRequest\x12\x16\n\x0etransaction_id\x18\x01 \x01(\t\x12\x12\n\noperations\x18\x02 \x03(\t\x12\x16\n\x0etimeout_blocks\x18\x03 \x01(\x05\x12\x19\n\x11onchain_recipient\x18\x04 \x01(\t\x12\x16\n\x0eonchain_amount\x18\x05 \x01(\x04\x12\x1e\n\x03ops\x18\x06 \x03(\x0b\x32\x11.mcp2pc.Operation\x12\x17\n\x0f\x63ommit_on_ready\x18\x07 \x01(\x08\x12\x10\n\x08start_ts\x18\x08 \x01(\x04\"\xa4\x01\n\x0fPrepareResponse\x12.\n\x06status\x18\x01 \x01(\x0e\x32\x1e.mcp2pc.PrepareResponse.Status\x12\x10\n\x08shard_id\x18\x02 \x01(\t\x12\r\n\x05\x65rror\x18\x03 \x01(\t\x12\x11\n\tcommitted\x18\x04 \x01(\x08\"-\n\x06Status\x12\t\n\x05READY\x10\x00\x12\t\n\x05\x41\x42ORT\x10\x01\x12\r\n\tREAD_ONLY\x10\x02\"\'\n\rCommitRequest\x12\x16\n\x0etransaction_id\x18\x01 \x01(\t\"&\n\x0c\x41\x62ortRequest\x12\x16\n\x0etransaction_id\x18\x01 \x01(\t\")\n\x0fRollbackRequest\x12\x16\n\x0etransaction_id\x18\x01 \x01(\t\"\x94\x01\n\x0fTransactRequest\x12)\n\x07prepare\x18\x01 \x01(\x0b\x32\x16.mcp2pc.PrepareRequestH\x00\x12\'\n\x06\x63ommit\x18\x02 \x01(\x0b\x32\x15.mcp2pc.CommitRequestH\x00\x12%\n\x05\x61\x62ort\x18\x03 \x01(\x0b\x32\x14.mcp2pc.AbortRequestH\x00\x42\x06\n\x04kind\"/\n\x05Votes\x12&\n\x05votes\x18\x01 \x03(\x0b\x32\x17.mcp2pc.PrepareResponse\"l\n\x07Outcome\x12*\n\x08\x64\x65\x63ision\x18\x01 \x01(\x0e\x32\x18.mcp2pc.Outcome.Decision\x12\r\n\x05\x65rror\x18\x02 \x01(\t\"&\n\x08\x44\x65\x63ision\x12\r\n\tCOMMITTED\x10\x00\x12\x0b\n\x07\x41\x42ORTED\x10\x01\"x\n\x10TransactResponse\x12\x16\n\x0etransaction_id\x18\x01 \x01(\t\x12\x1e\n\x05votes\x18\x02 \x01(\x0b\x32\r.mcp2pc.VotesH\x00\x12\"\n\x07outcome\x18\x03 \x01(\x0b\x32\x0f.mcp2pc.OutcomeH\x00\x42\x08\n\x06result\"?\n\x13PrepareBatchRequest\x12(\n\x08requests\x18\x01 \x03(\x0b\x32\x16.mcp2pc.PrepareRequest\"B\n\x14PrepareBatchResponse\x12*\n\tresponses\x18\x01 \x03(\x0b\x32\x17.mcp2pc.PrepareResponse\"-\n\x12\x43ommitBatchRequest\x12\x17\n\x0ftransaction_ids\x18\x01 \x03(\t\",\n\x11\x41\x62ortBatchRequest\x12\x17\n\x0ftransaction_ids\x18\x01 \x03(\t\"]\n\x0fOnePhaseRequest\x12\'\n\x07prepare\x18\x01 \x01(\x0b\x32\x16.mcp2pc.PrepareRequest\x12!\n\x04lock\x18\x02 \x01(\x0b\x32\x13.mcp2pc.LockRequest\"Z\n\x0bLockRequest\x12\x16\n\x0etransaction_id\x18\x01 \x01(\t\x12\x11\n\trecipient\x18\x02 \x01(\t\x12\x0e\n\x06\x61mount\x18\x03 \x01(\x04\x12\x10\n\x08\x64\x65\x61\x64line\x18\x04 \x01(\x04\"\x16\n\x06TxHash\x12\x0c\n\x04hash\x18\x01 \x01(\t\"(\n\x0eOnChainRequest\x12\x16\n\x0etransaction_id\x18\x01 \x01(\t\"6\n\x10LockBatchRequest\x12\"\n\x05items\x18\x01 \x03(\x0b\x32\x13.mcp2pc.LockRequest\".\n\x13OnChainBatchRequest\x12\x17\n\x0ftransaction_ids\x18\x01 \x03(\t\"R\n\x0f\x42\x61tchItemResult\x12\x16\n\x0etransaction_id\x18\x01 \x01(\t\x12\x0c\n\x04hash\x18\x02 \x01(\t\x12\n\n\x02ok\x18\x03 \x01(\x08\x12\r\n\x05\x65rror\x18\x04 \x01(\t\"7\n\x0b\x42\x61tchResult\x12(\n\x07results\x18\x01 \x03(\x0b\x32\x17.mcp2pc.BatchItemResult\"\xb4\x02\n\x08TxRecord\x12\x16\n\x0etransaction_id\x18\x01 \x01(\t\x12\x10\n\x08shard_id\x18\x02 \x01(\t\x12\x0e\n\x06sender\x18\x03 \x01(\t\x12\x11\n\trecipient\x18\x04 \x01(\t\x12\x0e\n\x06\x61mount\x18\x05 \x01(\x04\x12\x10\n\x08\x64\x65\x61\x64line\x18\x06 \x01(\x04\x12\'\n\x06status\x18\x07 \x01(\x0e\x32\x17.mcp2pc.TxRecord.Status\x12\x14\n\x0clocked_block\x18\x08 \x01(\x04\x12\x15\n\rsettled_block\x18\t \x01(\x04\x12\x11\n\tlock_hash\x18\n \x01(\t\x12\x13\n\x0bsettle_hash\x18\x0b \x01(\t\";\n\x06Status\x12\x08\n\x04NONE\x10\x00\x12\x0b\n\x07PENDING\x10\x01\x12\r\n\tCOMMITTED\x10\x02\x12\x0b\n\x07\x41\x42ORTED\x10\x03\"(\n\rStatusRequest\x12\x17\n\x0ftransaction_ids\x18\x01 \x03(\t\"K\n\x0eStatusResponse\x12!\n\x07records\x18\x01 \x03(\x0b\x32\x10.mcp2pc.TxRecord\x12\x16\n\x0eindexed_height\x18\x02 \x01(\x04\"\x98\x01\n\x12ListPendingRequest\x12\x0e\n\x06sender\x18\x01 \x01(\t\x12\x11\n\trecipient\x18\x02 \x01(\t\x12\x15\n\rdeadline_from\x18\x03 \x01(\x04\x12\x13\n\x0b\x64\x65\x61\x64line_to\x18\x04 \x01(\x04\x12\x10\n\x08shard_id\x18\x05 \x01(\t\x12\r\n\x05limit\x18\x06 \x01(\r\x12\x12\n\npage_token\x18\x07 \x01(\t\"i\n\x13ListPendingResponse\x12!\n\x07records\x18\x01 \x03(\x0b\x32\x10.mcp2pc.TxRecord\x12\x16\n\x0eindexed_height\x18\x02 \x01(\x04\x12\x17\n\x0fnext_page_token\x18\x03 \x01(\t2\xec\x01\n\x0b\x43oordinator\x12<\n\x07Prepare\x12\x16.mcp2pc.PrepareRequest\x1a\x17.mcp2pc.PrepareResponse0\x01\x12.\n\x06\x43ommit\x12\x15.mcp2pc.CommitRequest\x1a\r.mcp2pc.Empty\x12,\n\x05\x41\x62ort\x12\x14.mcp2pc.AbortRequest\x1a\r.mcp2pc.Empty\x12\x41\n\x08Transact\x12\x17.mcp2pc.TransactRequest\x1a\x18.mcp2pc.TransactResponse(\x01\x30\x01\x32\xd3\x06\n\x05Shard\x12:\n\x07Prepare\x12\x16.mcp2pc.PrepareRequest\x1a\x17.mcp2pc.PrepareResponse\x12.\n\x06\x43ommit\x12\x15.mcp2pc.CommitRequest\x1a\r.mcp2pc.Empty\x12,\n\x05\x41\x62ort\x12\x14.mcp2pc.AbortRequest\x1a\r.mcp2pc.Empty\x12\x32\n\x08Rollback\x12\x17.mcp2pc.RollbackRequest\x1a\r.mcp2pc.Empty\x12\x44\n\x10PrepareAndCommit\x12\x17.mcp2pc.OnePhaseRequest\x1a\x17.mcp2pc.PrepareResponse\x12I\n\x0cPrepareBatch\x12\x1b.mcp2pc.PrepareBatchRequest\x1a\x1c.mcp2pc.PrepareBatchResponse\x12\x38\n\x0b\x43ommitBatch\x12\x1a.mcp2pc.CommitBatchRequest\x1a\r.mcp2pc.Empty\x12\x36\n\nAbortBatch\x12\x19.mcp2pc.AbortBatchRequest\x1a\r.mcp2pc.Empty\x12\x32\n\x0bLockOnChain\x12\x13.mcp2pc.LockRequest\x1a\x0e.mcp2pc.TxHash\x12\x37\n\rCommitOnChain\x12\x16.mcp2pc.OnChainRequest\x1a\x0e.mcp2pc.TxHash\x12\x38\n\x0eReclaimOnChain\x12\x16.mcp2pc.OnChainRequest\x1a\x0e.mcp2pc.TxHash\x12\x41\n\x10LockOnChainBatch\x12\x18.mcp2pc.LockBatchRequest\x1a\x13.mcp2pc.BatchResult\x12\x46\n\x12\x43ommitOnChainBatch\x12\x1b.mcp2pc.OnChainBatchRequest\x1a\x13.mcp2pc.BatchResult\x12G\n\x13ReclaimOnChainBatch\x12\x1b.mcp2pc.OnChainBatchRequest\x1a\x13.mcp2pc.BatchResult2\x8d\x01\n\x07TxIndex\x12:\n\tGetStatus\x12\x15.mcp2pc.StatusRequest\x1a\x16.mcp2pc.StatusResponse\x12\x46\n\x0bListPending\x12\x1a.mcp2pc.ListPendingRequest\x1a\x1b.mcp2pc.ListPendingResponseb\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
@@ -33,26 +33,72 @@ if not _descriptor._USE_C_DESCRIPTORS:
   DESCRIPTOR._loaded_options = None
   _globals['_EMPTY']._serialized_start=27
   _globals['_EMPTY']._serialized_end=34
-  _globals['_PREPAREREQUEST']._serialized_start=37
-  _globals['_PREPAREREQUEST']._serialized_end=172
-  _globals['_PREPARERESPONSE']._serialized_start=174
-  _globals['_PREPARERESPONSE']._serialized_end=289
-  _globals['_PREPARERESPONSE_STATUS']._serialized_start=259
-  _globals['_PREPARERESPONSE_STATUS']._serialized_end=289
-  _globals['_COMMITREQUEST']._serialized_start=291
-  _globals['_COMMITREQUEST']._serialized_end=330
-  _globals['_ABORTREQUEST']._serialized_start=332
-  _globals['_ABORTREQUEST']._serialized_end=370
-  _globals['_ROLLBACKREQUEST']._serialized_start=372
-  _globals['_ROLLBACKREQUEST']._serialized_end=413
-  _globals['_LOCKREQUEST']._serialized_start=415
-  _globals['_LOCKREQUEST']._serialized_end=505
-  _globals['_TXHASH']._serialized_start=507
-  _globals['_TXHASH']._serialized_end=529
-  _globals['_ONCHAINREQUEST']._serialized_start=531
-  _globals['_ONCHAINREQUEST']._serialized_end=571
-  _globals['_COORDINATOR']._serialized_start=574
-  _globals['_COORDINATOR']._serialized_end=743
-  _globals['_SHARD']._serialized_start=746
-  _globals['_SHARD']._serialized_end=1126
+  _globals['_OPERATION']._serialized_start=37
+  _globals['_OPERATION']._serialized_end=172
+  _globals['_OPERATION_OPCODE']._serialized_start=120
+  _globals['_OPERATION_OPCODE']._serialized_end=172
+  _globals['_PREPAREREQUEST']._serialized_start=175
+  _globals['_PREPAREREQUEST']._serialized_end=385
+  _globals['_PREPARERESPONSE']._serialized_start=388
+  _globals['_PREPARERESPONSE']._serialized_end=552
+  _globals['_PREPARERESPONSE_STATUS']._serialized_start=507
+  _globals['_PREPARERESPONSE_STATUS']._serialized_end=552
+  _globals['_COMMITREQUEST']._serialized_start=554
+  _globals['_COMMITREQUEST']._serialized_end=593
+  _globals['_ABORTREQUEST']._serialized_start=595
+  _globals['_ABORTREQUEST']._serialized_end=633
+  _globals['_ROLLBACKREQUEST']._serialized_start=635
+  _globals['_ROLLBACKREQUEST']._serialized_end=676
+  _globals['_TRANSACTREQUEST']._serialized_start=679
+  _globals['_TRANSACTREQUEST']._serialized_end=827
+  _globals['_VOTES']._serialized_start=829
+  _globals['_VOTES']._serialized_end=876
+  _globals['_OUTCOME']._serialized_start=878
+  _globals['_OUTCOME']._serialized_end=986
+  _globals['_OUTCOME_DECISION']._serialized_start=948
+  _globals['_OUTCOME_DECISION']._serialized_end=986
+  _globals['_TRANSACTRESPONSE']._serialized_start=988
+  _globals['_TRANSACTRESPONSE']._serialized_end=1108
+  _globals['_PREPAREBATCHREQUEST']._serialized_start=1110
+  _globals['_PREPAREBATCHREQUEST']._serialized_end=1173
+  _globals['_PREPAREBATCHRESPONSE']._serialized_start=1175
+  _globals['_PREPAREBATCHRESPONSE']._serialized_end=1241
+  _globals['_COMMITBATCHREQUEST']._serialized_start=1243
+  _globals['_COMMITBATCHREQUEST']._serialized_end=1288
+  _globals['_ABORTBATCHREQUEST']._serialized_start=1290
+  _globals['_ABORTBATCHREQUEST']._serialized_end=1334
+  _globals['_ONEPHASEREQUEST']._serialized_start=1336
+  _globals['_ONEPHASEREQUEST']._serialized_end=1429
+  _globals['_LOCKREQUEST']._serialized_start=1431
+  _globals['_LOCKREQUEST']._serialized_end=1521
+  _globals['_TXHASH']._serialized_start=1523
+  _globals['_TXHASH']._serialized_end=1545
+  _globals['_ONCHAINREQUEST']._serialized_start=1547
+  _globals['_ONCHAINREQUEST']._serialized_end=1587
+  _globals['_LOCKBATCHREQUEST']._serialized_start=1589
+  _globals['_LOCKBATCHREQUEST']._serialized_end=1643
+  _globals['_ONCHAINBATCHREQUEST']._serialized_start=1645
+  _globals['_ONCHAINBATCHREQUEST']._serialized_end=1691
+  _globals['_BATCHITEMRESULT']._serialized_start=1693
+  _globals['_BATCHITEMRESULT']._serialized_end=1775
+  _globals['_BATCHRESULT']._serialized_start=1777
+  _globals['_BATCHRESULT']._serialized_end=1832
+  _globals['_TXRECORD']._serialized_start=1835
+  _globals['_TXRECORD']._serialized_end=2143
+  _globals['_TXRECORD_STATUS']._serialized_start=2084
+  _globals['_TXRECORD_STATUS']._serialized_end=2143
+  _globals['_STATUSREQUEST']._serialized_start=2145
+  _globals['_STATUSREQUEST']._serialized_end=2185
+  _globals['_STATUSRESPONSE']._serialized_start=2187
+  _globals['_STATUSRESPONSE']._serialized_end=2262
+  _globals['_LISTPENDINGREQUEST']._serialized_start=2265
+  _globals['_LISTPENDINGREQUEST']._serialized_end=2417
+  _globals['_LISTPENDINGRESPONSE']._serialized_start=2419
+  _globals['_LISTPENDINGRESPONSE']._serialized_end=2524
+  _globals['_COORDINATOR']._serialized_start=2527
+  _globals['_COORDINATOR']._serialized_end=2763
+  _globals['_SHARD']._serialized_start=2766
+  _globals['_SHARD']._serialized_end=3617
+  _globals['_TXINDEX']._serialized_start=3620
+  _globals['_TXINDEX']._serialized_end=3761
 # @@protoc_insertion_point(module_scope)
@@ -49,6 +49,11 @@ class CoordinatorStub(object):
                 request_serializer=two__phase__pb2.AbortRequest.SerializeToString,
                 response_deserializer=two__phase__pb2.Empty.FromString,
                 _registered_method=True)
+        self.Transact = channel.stream_stream(
+                '/mcp2pc.Coordinator/Transact',
+                request_serializer=two__phase__pb2.TransactRequest.SerializeToString,
+                response_deserializer=two__phase__pb2.TransactResponse.FromString,
+                _registered_method=True)
 
 
 class CoordinatorServicer(object):
@@ -72,6 +77,13 @@ class CoordinatorServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def Transact(self, request_iterator, context):
+        """many txs pipelined on one stream, replies tagged by transaction_id
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_CoordinatorServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -90,6 +102,11 @@ def add_CoordinatorServicer_to_server(servicer, server):
                     request_deserializer=two__phase__pb2.AbortRequest.FromString,
                     response_serializer=two__phase__pb2.Empty.SerializeToString,
             ),
+            'Transact': grpc.stream_stream_rpc_method_handler(
+                    servicer.Transact,
+                    request_deserializer=two__phase__pb2.TransactRequest.FromString,
+                    response_serializer=two__phase__pb2.TransactResponse.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'mcp2pc.Coordinator', rpc_method_handlers)
@@ -182,6 +199,33 @@ class Coordinator(object):
             metadata,
             _registered_method=True)
 
+    @staticmethod
+    def Transact(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_stream(
+            request_iterator,
+            target,
+            '/mcp2pc.Coordinator/Transact',
+            two__phase__pb2.TransactRequest.SerializeToString,
+            two__phase__pb2.TransactResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
 
 class ShardStub(object):
     """Missing associated documentation comment in .proto file."""
@@ -212,6 +256,26 @@ class ShardStub(object):
                 request_serializer=two__phase__pb2.RollbackRequest.SerializeToString,
                 response_deserializer=two__phase__pb2.Empty.FromString,
                 _registered_method=True)
+        self.PrepareAndCommit = channel.unary_unary(
+                '/mcp2pc.Shard/PrepareAndCommit',
+                request_serializer=two__phase__pb2.OnePhaseRequest.SerializeToString,
+                response_deserializer=two__phase__pb2.PrepareResponse.FromString,
+                _registered_method=True)
+        self.PrepareBatch = channel.unary_unary(
+                '/mcp2pc.Shard/PrepareBatch',
+                request_serializer=two__phase__pb2.PrepareBatchRequest.SerializeToString,
+                response_deserializer=two__phase__pb2.PrepareBatchResponse.FromString,
+                _registered_method=True)
+        self.CommitBatch = channel.unary_unary(
+                '/mcp2pc.Shard/CommitBatch',
+                request_serializer=two__phase__pb2.CommitBatchRequest.SerializeToString,
+                response_deserializer=two__phase__pb2.Empty.FromString,
+                _registered_method=True)
+        self.AbortBatch = channel.unary_unary(
+                '/mcp2pc.Shard/AbortBatch',
+                request_serializer=two__phase__pb2.AbortBatchRequest.SerializeToString,
+                response_deserializer=two__phase__pb2.Empty.FromString,
+                _registered_method=True)
         self.LockOnChain = channel.unary_unary(
                 '/mcp2pc.Shard/LockOnChain',
                 request_serializer=two__phase__pb2.LockRequest.SerializeToString,
@@ -227,6 +291,21 @@ class ShardStub(object):
                 request_serializer=two__phase__pb2.OnChainRequest.SerializeToString,
                 response_deserializer=two__phase__pb2.TxHash.FromString,
                 _registered_method=True)
+        self.LockOnChainBatch = channel.unary_unary(
+                '/mcp2pc.Shard/LockOnChainBatch',
+                request_serializer=two__phase__pb2.LockBatchRequest.SerializeToString,
+                response_deserializer=two__phase__pb2.BatchResult.FromString,
+                _registered_method=True)
+        self.CommitOnChainBatch = channel.unary_unary(
+                '/mcp2pc.Shard/CommitOnChainBatch',
+                request_serializer=two__phase__pb2.OnChainBatchRequest.SerializeToString,
+                response_deserializer=two__phase__pb2.BatchResult.FromString,
+                _registered_method=True)
+        self.ReclaimOnChainBatch = channel.unary_unary(
+                '/mcp2pc.Shard/ReclaimOnChainBatch',
+                request_serializer=two__phase__pb2.OnChainBatchRequest.SerializeToString,
+                response_deserializer=two__phase__pb2.BatchResult.FromString,
+                _registered_method=True)
 
 
 class ShardServicer(object):
@@ -257,6 +336,32 @@ class ShardServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def PrepareAndCommit(self, request, context):
+        """one-phase commit of a tx touching only this shard; votes like Prepare
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def PrepareBatch(self, request, context):
+        """group-commit variants of the above, one call per coordinator window
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def CommitBatch(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def AbortBatch(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def LockOnChain(self, request, context):
         """on‐chain adapter RPCs
         """
@@ -276,6 +381,25 @@ class ShardServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def LockOnChainBatch(self, request, context):
+        """batched on‐chain adapter RPCs, flushed once per block
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def CommitOnChainBatch(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ReclaimOnChainBatch(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_ShardServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -299,6 +423,26 @@ def add_ShardServicer_to_server(servicer, server):
                     request_deserializer=two__phase__pb2.RollbackRequest.FromString,
                     response_serializer=two__phase__pb2.Empty.SerializeToString,
             ),
+            'PrepareAndCommit': grpc.unary_unary_rpc_method_handler(
+                    servicer.PrepareAndCommit,
+                    request_deserializer=two__phase__pb2.OnePhaseRequest.FromString,
+                    response_serializer=two__phase__pb2.PrepareResponse.SerializeToString,
+            ),
+            'PrepareBatch': grpc.unary_unary_rpc_method_handler(
+                    servicer.PrepareBatch,
+                    request_deserializer=two__phase__pb2.PrepareBatchRequest.FromString,
+                    response_serializer=two__phase__pb2.PrepareBatchResponse.SerializeToString,
+            ),
+            'CommitBatch': grpc.unary_unary_rpc_method_handler(
+                    servicer.CommitBatch,
+                    request_deserializer=two__phase__pb2.CommitBatchRequest.FromString,
+                    response_serializer=two__phase__pb2.Empty.SerializeToString,
+            ),
+            'AbortBatch': grpc.unary_unary_rpc_method_handler(
+                    servicer.AbortBatch,
+                    request_deserializer=two__phase__pb2.AbortBatchRequest.FromString,
+                    response_serializer=two__phase__pb2.Empty.SerializeToString,
+            ),
             'LockOnChain': grpc.unary_unary_rpc_method_handler(
                     servicer.LockOnChain,
                     request_deserializer=two__phase__pb2.LockRequest.FromString,
@@ -314,6 +458,21 @@ def add_ShardServicer_to_server(servicer, server):
                     request_deserializer=two__phase__pb2.OnChainRequest.FromString,
                     response_serializer=two__phase__pb2.TxHash.SerializeToString,
             ),
+            'LockOnChainBatch': grpc.unary_unary_rpc_method_handler(
+                    servicer.LockOnChainBatch,
+                    request_deserializer=two__phase__pb2.LockBatchRequest.FromString,
+                    response_serializer=two__phase__pb2.BatchResult.SerializeToString,
+            ),
+            'CommitOnChainBatch': grpc.unary_unary_rpc_method_handler(
+                    servicer.CommitOnChainBatch,
+                    request_deserializer=two__phase__pb2.OnChainBatchRequest.FromString,
+                    response_serializer=two__phase__pb2.BatchResult.SerializeToString,
+            ),
+            'ReclaimOnChainBatch': grpc.unary_unary_rpc_method_handler(
+                    servicer.ReclaimOnChainBatch,
+                    request_deserializer=two__phase__pb2.OnChainBatchRequest.FromString,
+                    response_serializer=two__phase__pb2.BatchResult.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'mcp2pc.Shard', rpc_method_handlers)
@@ -433,6 +592,114 @@ class Shard(object):
             metadata,
             _registered_method=True)
 
+    @staticmethod
+    def PrepareAndCommit(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/mcp2pc.Shard/PrepareAndCommit',
+            two__phase__pb2.OnePhaseRequest.SerializeToString,
+            two__phase__pb2.PrepareResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def PrepareBatch(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/mcp2pc.Shard/PrepareBatch',
+            two__phase__pb2.PrepareBatchRequest.SerializeToString,
+            two__phase__pb2.PrepareBatchResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def CommitBatch(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/mcp2pc.Shard/CommitBatch',
+            two__phase__pb2.CommitBatchRequest.SerializeToString,
+            two__phase__pb2.Empty.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def AbortBatch(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/mcp2pc.Shard/AbortBatch',
+            two__phase__pb2.AbortBatchRequest.SerializeToString,
+            two__phase__pb2.Empty.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
     @staticmethod
     def LockOnChain(request,
             target,
@@ -513,3 +780,202 @@ class Shard(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def LockOnChainBatch(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/mcp2pc.Shard/LockOnChainBatch',
+            two__phase__pb2.LockBatchRequest.SerializeToString,
+            two__phase__pb2.BatchResult.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def CommitOnChainBatch(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/mcp2pc.Shard/CommitOnChainBatch',
+            two__phase__pb2.OnChainBatchRequest.SerializeToString,
+            two__phase__pb2.BatchResult.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def ReclaimOnChainBatch(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/mcp2pc.Shard/ReclaimOnChainBatch',
+            two__phase__pb2.OnChainBatchRequest.SerializeToString,
+            two__phase__pb2.BatchResult.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+
+class TxIndexStub(object):
+    """answered from the indexer's local store, never from the chain
+    """
+
+    def __init__(self, channel):
+        """Constructor.
+
+        Args:
+            channel: A grpc.Channel.
+        """
+        self.GetStatus = channel.unary_unary(
+                '/mcp2pc.TxIndex/GetStatus',
+                request_serializer=two__phase__pb2.StatusRequest.SerializeToString,
+                response_deserializer=two__phase__pb2.StatusResponse.FromString,
+                _registered_method=True)
+        self.ListPending = channel.unary_unary(
+                '/mcp2pc.TxIndex/ListPending',
+                request_serializer=two__phase__pb2.ListPendingRequest.SerializeToString,
+                response_deserializer=two__phase__pb2.ListPendingResponse.FromString,
+                _registered_method=True)
+
+
+class TxIndexServicer(object):
+    """answered from the indexer's local store, never from the chain
+    """
+
+    def GetStatus(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ListPending(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+
+def add_TxIndexServicer_to_server(servicer, server):
+    rpc_method_handlers = {
+            'GetStatus': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetStatus,
+                    request_deserializer=two__phase__pb2.StatusRequest.FromString,
+                    response_serializer=two__phase__pb2.StatusResponse.SerializeToString,
+            ),
+            'ListPending': grpc.unary_unary_rpc_method_handler(
+                    servicer.ListPending,
+                    request_deserializer=two__phase__pb2.ListPendingRequest.FromString,
+                    response_serializer=two__phase__pb2.ListPendingResponse.SerializeToString,
+            ),
+    }
+    generic_handler = grpc.method_handlers_generic_handler(
+            'mcp2pc.TxIndex', rpc_method_handlers)
+    server.add_generic_rpc_handlers((generic_handler,))
+    server.add_registered_method_handlers('mcp2pc.TxIndex', rpc_method_handlers)
+
+
+ # This class is part of an EXPERIMENTAL API.
+class TxIndex(object):
+    """answered from the indexer's local store, never from the chain
+    """
+
+    @staticmethod
+    def GetStatus(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/mcp2pc.TxIndex/GetStatus',
+            two__phase__pb2.StatusRequest.SerializeToString,
+            two__phase__pb2.StatusResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def ListPending(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/mcp2pc.TxIndex/ListPending',
+            two__phase__pb2.ListPendingRequest.SerializeToString,
+            two__phase__pb2.ListPendingResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
@@ -1,9 +1,10 @@
 #!/usr/bin/env python3
-import os, time, uuid, grpc
+import os, uuid
 from dotenv import load_dotenv
 from mcp2pc import two_phase_pb2, two_phase_pb2_grpc
 from common.timeout_manager import TimeoutManager
-from common.lightclient     import LightClient
+from common.block_oracle    import get_oracle
+from common.channels        import get_channel
 
 load_dotenv()
 
@@ -14,10 +15,9 @@ RECIP    = "0x24c881bF947a922cfb46794DEC370036d413b4B2"  # set in .env
 ENDPOINT = "localhost:50051"
 
 # set up
-stub = two_phase_pb2_grpc.CoordinatorStub(
-    grpc.insecure_channel(ENDPOINT)
-)
-tm = TimeoutManager(LightClient(RPC_URL))
+stub = two_phase_pb2_grpc.CoordinatorStub(get_channel(ENDPOINT))
+oracle = get_oracle(RPC_URL)
+tm = TimeoutManager(oracle)
 
 # off‐chain Prepare + on‐chain lock
 tx_id = uuid.uuid4().hex
@@ -43,10 +43,10 @@ tm.start(tx_id, TIMEOUT)
 dl = tm.deadlines[tx_id]
 print(f"  deadline at block {dl}")
 
-# wait til after deadline
-while tm.client.get_block_height() <= dl:
-    print(f"block={tm.client.get_block_height()} ≤ {dl}")
-    time.sleep(5)
+# wait til after deadline (new heads are pushed by the shared oracle)
+unsubscribe = oracle.subscribe(lambda h: print(f"block={h} ≤ {dl}"))
+oracle.wait_for_height(dl + 1)
+unsubscribe()
 
 # Abort to on-chain reclaim
 print("deadline passed; reclaiming on-chain")
@@ -0,0 +1,371 @@
+# scripts/bench_2pc.py
+#
+# End-to-end throughput and latency of the 2PC stack on a simulated chain:
+#   python scripts/bench_2pc.py --shards 3 --workload closed --clients 32 --duration 10
+#   python scripts/bench_2pc.py --workload open --rate 200 --skew 1.1 --fanout 2 --out open.json
+#
+# Starts a SimChain (common/simchain.py) with one TwoPhaseAdapter per shard,
+# N shards and a coordinator, either in this process (--mode inproc) or as
+# subprocesses that reach the chain over HTTP JSON-RPC (--mode subprocess),
+# then drives transactions through the coordinator's gRPC API:
+#   closed: --clients loops, each starting its next tx when the last ends
+#   open:   txs start at --rate per second (Poisson arrivals) however long
+#           earlier ones take, so queueing shows up in the latencies
+# Each tx writes --ops keys spread over --fanout shards, drawn with Zipf
+# exponent --skew (0: uniform); --abort-ratio of them carry an op the shards
+# reject, so they abort. Tx/s and p50/p99/p999 per phase (prepare, commit,
+# abort, total) go to --out as JSON; --compare prints the change against an
+# earlier result file. --trace-file records every tx's spans for
+# scripts/critical_path.py.
+
+import argparse, asyncio, bisect, json, logging, os, random, socket, subprocess, sys, time, uuid
+from collections import Counter
+from concurrent import futures
+from pathlib import Path
+
+import grpc
+from eth_account import Account
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from mcp2pc import two_phase_pb2, two_phase_pb2_grpc
+from common import simchain, tracing
+from common.block_oracle import get_oracle
+from common.channels import SERVER_OPTIONS, get_aio_channel
+from common.interceptors import ServerMetricsInterceptor, ServerTracingInterceptor
+from common.ops import set_op
+from common.partition import HashRing
+from coordinator.coordinator import Coordinator
+from shard.locks import KeyLocks, NO_WAIT, POLICIES
+from shard.shard_node import Shard
+
+PHASES    = ("prepare", "commit", "abort", "total")
+RECIPIENT = "0x24c881bF947a922cfb46794DEC370036d413b4B2"
+ABORT     = two_phase_pb2.PrepareResponse.ABORT
+
+# --- cluster ---
+
+def shard_server(args, sid, chain_url, adapter, address="127.0.0.1:0"):
+    # heads are polled at twice the block rate (every 5ms with instant
+    # blocks); the first get_oracle call for a URL fixes its settings
+    # for the whole process
+    _warm_oracle(args, chain_url)
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=64), options=SERVER_OPTIONS,
+                         interceptors=[ServerMetricsInterceptor(),
+                                       ServerTracingInterceptor(f"shard {sid}")])
+    two_phase_pb2_grpc.add_ShardServicer_to_server(
+        Shard(sid, chain_url, adapter, locks=KeyLocks(policy=args.lock_policy)), server)
+    port = server.add_insecure_port(address)
+    server.start()
+    return server, f"127.0.0.1:{port}"
+
+def coordinator_server(args, shard_cfg, chain_url, adapters, address="127.0.0.1:0"):
+    _warm_oracle(args, chain_url)
+    coord = Coordinator(shard_cfg, {sid: chain_url for sid in shard_cfg}, adapters,
+                        default_timeout_blocks=args.timeout_blocks,
+                        group_window=args.group_window, partitioner=HashRing(sorted(shard_cfg)),
+                        presumed_abort=args.presumed_abort)
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=args.server_workers),
+                         options=SERVER_OPTIONS,
+                         interceptors=[ServerMetricsInterceptor(),
+                                       ServerTracingInterceptor("coordinator")])
+    two_phase_pb2_grpc.add_CoordinatorServicer_to_server(coord, server)
+    port = server.add_insecure_port(address)
+    server.start()
+    return server, f"127.0.0.1:{port}"
+
+def start_inproc(args, chain, adapters):
+    chain_url = simchain.register(f"bench-{uuid.uuid4().hex[:8]}", chain)
+    servers, shard_cfg = [], {}
+    for sid, adapter in adapters.items():
+        server, shard_cfg[sid] = shard_server(args, sid, chain_url, adapter)
+        servers.append(server)
+    server, target = coordinator_server(args, shard_cfg, chain_url, adapters)
+    servers.append(server)
+
+    def stop():
+        for server in servers:
+            server.stop(None)
+    return target, stop
+
+def start_subprocesses(args, chain, adapters):
+    # the chain stays in this process and is served over HTTP; every shard
+    # and the coordinator is a child running this script in a --role
+    http = simchain.serve_http(chain, port=0)
+    chain_url = f"http://127.0.0.1:{http.server_address[1]}"
+    common = [sys.executable, __file__, "--block-time", str(args.block_time),
+              *(["--verbose"] if args.verbose else []),
+              "--lock-policy", args.lock_policy, "--chain-url", chain_url]
+    children, shard_cfg = [], {}
+    for sid, adapter in adapters.items():
+        shard_cfg[sid] = f"127.0.0.1:{_free_port()}"
+        children.append(subprocess.Popen(common + [
+            "--role", "shard", "--sid", sid, "--adapter", adapter, "--listen", shard_cfg[sid]]))
+    target = f"127.0.0.1:{_free_port()}"
+    children.append(subprocess.Popen(common + [
+        "--role", "coordinator", "--listen", target,
+        "--timeout-blocks", str(args.timeout_blocks), "--server-workers", str(args.server_workers),
+        "--cluster", json.dumps({"shards": shard_cfg, "adapters": adapters}),
+        *(["--group-window", str(args.group_window)] if args.group_window else []),
+        *(["--presumed-abort"] if args.presumed_abort else [])]))
+
+    def stop():
+        for child in children:
+            child.terminate()
+        for child in children:
+            child.wait()
+        http.shutdown()
+
+    try:
+        for addr in list(shard_cfg.values()) + [target]:
+            grpc.channel_ready_future(grpc.insecure_channel(addr)).result(timeout=30)
+    except Exception:
+        stop()
+        raise
+    return target, stop
+
+def serve_role(args):
+    # child process of --mode subprocess
+    if args.role == "shard":
+        server, _ = shard_server(args, args.sid, args.chain_url, args.adapter, args.listen)
+    else:
+        cluster = json.loads(args.cluster)
+        server, _ = coordinator_server(args, cluster["shards"], args.chain_url,
+                                       cluster["adapters"], args.listen)
+    server.wait_for_termination()
+
+def _warm_oracle(args, chain_url):
+    poll = max(args.block_time / 2, 0.005)
+    get_oracle(chain_url, max_staleness=poll, poll_interval=poll)
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+# --- workload ---
+
+class Workload:
+    # draws transactions: which keys (and so which shards) each one writes,
+    # and whether it carries an op the shards reject
+    def __init__(self, args, sids):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        ring = HashRing(sids)
+        # the key space by owner shard, hottest (lowest Zipf rank) first
+        self.keys = {sid: [] for sid in sids}
+        for i in range(args.keys):
+            self.keys[ring.owner(f"key{i}".encode())].append(f"key{i}")
+        self.sids = [sid for sid in sids if self.keys[sid]]
+        self.cdf = {sid: _zipf_cdf(len(keys), args.skew) for sid, keys in self.keys.items()}
+
+    def next(self) -> two_phase_pb2.PrepareRequest:
+        args, rng = self.args, self.rng
+        shards = rng.sample(self.sids, min(args.fanout, len(self.sids)))
+        ops = [set_op(self._pick(shards[i % len(shards)]), "v")
+               for i in range(max(args.ops, len(shards)))]
+        # an op that doesn't parse: the shard owning the tx id votes ABORT
+        bad = ["BAD"] if rng.random() < args.abort_ratio else []
+        return two_phase_pb2.PrepareRequest(
+            transaction_id    = uuid.UUID(int=rng.getrandbits(128)).hex,
+            ops               = ops,
+            operations        = bad,
+            timeout_blocks    = args.timeout_blocks,
+            onchain_recipient = RECIPIENT,
+            onchain_amount    = args.amount,
+            commit_on_ready   = True,
+        )
+
+    def _pick(self, sid):
+        cdf = self.cdf[sid]
+        return self.keys[sid][bisect.bisect_left(cdf, self.rng.random() * cdf[-1])]
+
+def _zipf_cdf(n, s):
+    total, cdf = 0.0, []
+    for rank in range(1, n + 1):
+        total += rank ** -s
+        cdf.append(total)
+    return cdf
+
+# --- load driver ---
+
+class Recorder:
+    def __init__(self):
+        self.samples = {phase: [] for phase in PHASES}
+        self.outcomes = Counter()
+
+    def report(self) -> dict:
+        return {phase: _summary(xs) for phase, xs in self.samples.items() if xs}
+
+def _summary(xs):
+    xs = sorted(xs)
+
+    def pct(q):
+        return round(xs[min(len(xs) - 1, int(q * len(xs)))] * 1e3, 3)
+
+    return {"count": len(xs), "mean_ms": round(sum(xs) / len(xs) * 1e3, 3),
+            "p50_ms": pct(0.50), "p99_ms": pct(0.99), "p999_ms": pct(0.999),
+            "max_ms": round(xs[-1] * 1e3, 3)}
+
+async def run_tx(target, req, rec):
+    stub = two_phase_pb2_grpc.CoordinatorStub(get_aio_channel(target))
+    tx_id = req.transaction_id
+    started = time.perf_counter()
+    with tracing.span("transaction", tx=tx_id) as span:
+        try:
+            votes = [v async for v in stub.Prepare(req)]
+            voted = time.perf_counter()
+            rec.samples["prepare"].append(voted - started)
+            if any(v.status == ABORT for v in votes):
+                await stub.Abort(two_phase_pb2.AbortRequest(transaction_id=tx_id))
+                rec.samples["abort"].append(time.perf_counter() - voted)
+                outcome = "aborted"
+            else:
+                if not all(v.committed for v in votes):
+                    await stub.Commit(two_phase_pb2.CommitRequest(transaction_id=tx_id))
+                    rec.samples["commit"].append(time.perf_counter() - voted)
+                outcome = "committed"
+        except grpc.aio.AioRpcError as e:
+            print(f"tx {tx_id} failed: {e.code().name} {e.details()}", file=sys.stderr)
+            outcome = "failed"
+        if span is not None:
+            span.set(outcome=outcome)
+    rec.samples["total"].append(time.perf_counter() - started)
+    rec.outcomes[outcome] += 1
+
+async def drive(args, target, workload):
+    rec, started = Recorder(), time.perf_counter()
+    end = started + args.duration
+    budget = iter(range(args.txs)) if args.txs else None
+
+    def more():
+        if budget is not None:
+            return next(budget, None) is not None
+        return time.perf_counter() < end
+
+    if args.workload == "closed":
+        async def client():
+            while more():
+                await run_tx(target, workload.next(), rec)
+        await asyncio.gather(*(client() for _ in range(args.clients)))
+    else:
+        rng, tasks = random.Random(args.seed + 1), []
+        while more():
+            tasks.append(asyncio.ensure_future(run_tx(target, workload.next(), rec)))
+            await asyncio.sleep(rng.expovariate(args.rate))
+        await asyncio.gather(*tasks)
+    return rec, time.perf_counter() - started
+
+# --- entry points ---
+
+def run(args) -> dict:
+    # one benchmark run; returns the JSON report
+    sids = [f"bench{i + 1}" for i in range(args.shards)]
+    if args.trace_file:
+        # the --role children pick the file up from the environment
+        os.environ[tracing.TRACE_FILE_ENV] = args.trace_file
+        tracing.configure(args.trace_file)
+    chain = simchain.SimChain(args.block_time)
+    adapters = {sid: chain.deploy_adapter() for sid in sids}
+    for sid in sids:
+        os.environ.setdefault(f"{sid.upper()}_KEY", "0x" + bytes(Account.create().key).hex())
+    chain.start()
+    start = start_inproc if args.mode == "inproc" else start_subprocesses
+    try:
+        target, stop = start(args, chain, adapters)
+        try:
+            rec, elapsed = asyncio.run(drive(args, target, Workload(args, sids)))
+        finally:
+            stop()
+    finally:
+        chain.close()
+
+    config = {k: v for k, v in vars(args).items()
+              if k not in ("role", "sid", "adapter", "listen", "chain_url", "cluster", "out", "compare",
+                           "verbose", "trace_file")}
+    return {
+        "config":          config,
+        "started":         time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "duration_s":      round(elapsed, 3),
+        "txs":             dict(rec.outcomes),
+        "throughput_tx_s": round(rec.outcomes["committed"] / elapsed, 2),
+        "phases":          rec.report(),
+        "chain":           chain.stats(),
+    }
+
+def print_report(report, baseline=None):
+    print(f"{sum(report['txs'].values())} txs in {report['duration_s']}s: {report['txs']}; "
+          f"{report['throughput_tx_s']} committed tx/s")
+    print(f"{'phase':<8} {'count':>7} {'p50 ms':>9} {'p99 ms':>9} {'p999 ms':>9}")
+    for phase, s in report["phases"].items():
+        print(f"{phase:<8} {s['count']:>7} {s['p50_ms']:>9} {s['p99_ms']:>9} {s['p999_ms']:>9}")
+    if baseline is None:
+        return
+    print(f"vs baseline ({baseline['started']}):")
+    print(f"  tx/s {_ratio(report['throughput_tx_s'], baseline['throughput_tx_s'])}")
+    for phase, s in report["phases"].items():
+        old = baseline["phases"].get(phase)
+        if old:
+            print(f"  {phase:<8} p50 {_ratio(s['p50_ms'], old['p50_ms'])}  "
+                  f"p99 {_ratio(s['p99_ms'], old['p99_ms'])}")
+
+def _ratio(new, old):
+    return f"{new} vs {old} ({(new / old - 1) * 100:+.1f}%)" if old else f"{new} vs {old}"
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="2PC load generator on a simulated chain")
+    p.add_argument('--shards', type=int, default=3)
+    p.add_argument('--mode', choices=['inproc', 'subprocess'], default='inproc')
+    p.add_argument('--block-time', type=float, default=0.1, help='seconds per simulated block (0: one block per tx)')
+    p.add_argument('--workload', choices=['closed', 'open'], default='closed')
+    p.add_argument('--clients', type=int, default=16, help='closed loop: concurrent clients')
+    p.add_argument('--rate', type=float, default=100.0, help='open loop: txs started per second')
+    p.add_argument('--duration', type=float, default=10.0, help='seconds to keep starting txs')
+    p.add_argument('--txs', type=int, default=0, help='stop after this many txs instead')
+    p.add_argument('--abort-ratio', type=float, default=0.0)
+    p.add_argument('--keys', type=int, default=10_000)
+    p.add_argument('--skew', type=float, default=0.0, help='Zipf exponent of key popularity')
+    p.add_argument('--fanout', type=int, default=2, help='shards written by each tx')
+    p.add_argument('--ops', type=int, default=2, help='keys written by each tx')
+    p.add_argument('--amount', type=int, default=1, help='wei locked per tx (0: off-chain only)')
+    p.add_argument('--timeout-blocks', type=int, default=100)
+    p.add_argument('--lock-policy', choices=POLICIES, default=NO_WAIT)
+    p.add_argument('--group-window', type=float, default=None)
+    p.add_argument('--presumed-abort', action='store_true')
+    p.add_argument('--server-workers', type=int, default=256,
+                   help='coordinator gRPC threads (one per in-flight request)')
+    p.add_argument('--seed', type=int, default=1)
+    p.add_argument('--verbose', action='store_true', help='keep the per-tx INFO logs')
+    p.add_argument('--out', default=None, help='write the JSON report here')
+    p.add_argument('--compare', default=None, help='earlier JSON report to compare against')
+    p.add_argument('--trace-file', default=None,
+                   help='append every process\'s trace spans here (see scripts/critical_path.py)')
+    # internal: children of --mode subprocess
+    p.add_argument('--role', choices=['shard', 'coordinator'], help=argparse.SUPPRESS)
+    p.add_argument('--sid', help=argparse.SUPPRESS)
+    p.add_argument('--adapter', help=argparse.SUPPRESS)
+    p.add_argument('--listen', help=argparse.SUPPRESS)
+    p.add_argument('--chain-url', help=argparse.SUPPRESS)
+    p.add_argument('--cluster', help=argparse.SUPPRESS)
+    return p.parse_args(argv)
+
+def main():
+    args = parse_args()
+    if not args.verbose:
+        # per-tx INFO lines from every component would dominate the run
+        logging.getLogger().setLevel(logging.WARNING)
+    if args.role:
+        serve_role(args)
+        return
+    report = run(args)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"report written to {args.out}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+# scripts/bench_storage.py
+#
+# Write throughput and restart time of the shard's LogStore:
+#   python scripts/bench_storage.py --keys 1000000 --writers 16
+#
+# Phase 1 commits --keys keys through prepare+commit pairs from --writers
+# threads (each tx writes --batch keys). Phase 2 reopens the store, which
+# replays the whole log and, since that tail is long, compacts it into a
+# snapshot. Phase 3 reopens again, now from the memory-mapped snapshot.
+
+import argparse, sys, tempfile, threading, time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from shard.storage import LogStore
+
+def write_phase(directory, keys, batch, writers, value):
+    # one huge segment, so the restart below has the whole log to replay
+    store = LogStore(directory, segment_bytes=1 << 40)
+    txs_per_writer = keys // (batch * writers)
+
+    def writer(w):
+        for t in range(txs_per_writer):
+            tx = f"w{w}-{t}"
+            writes = {f"key-{w}-{t}-{i}": value for i in range(batch)}
+            store.prepare(tx, writes, 1_000_000)
+            store.commit(tx)
+
+    threads = [threading.Thread(target=writer, args=(w,)) for w in range(writers)]
+    started = time.monotonic()
+    for t in threads: t.start()
+    for t in threads: t.join()
+    elapsed = time.monotonic() - started
+    store.close()
+
+    written = txs_per_writer * batch * writers
+    log_mb = sum(p.stat().st_size for p in store.segments()) / 1e6
+    print(f"write:   {written} keys, {written // batch} txs in {elapsed:.2f}s -> "
+          f"{written / elapsed:,.0f} keys/s, {written / batch / elapsed:,.0f} txs/s; "
+          f"log {log_mb:.1f} MB")
+    return written
+
+def restart_phase(directory, label, expected, segment_bytes=64 << 20):
+    started = time.monotonic()
+    store = LogStore(directory, segment_bytes=segment_bytes)
+    elapsed = time.monotonic() - started
+    assert len(store.state) == expected, (len(store.state), expected)
+    print(f"restart: {label}: {len(store.state)} keys in {elapsed:.2f}s")
+    store.close()   # waits for any snapshot the restart scheduled
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--keys', type=int, default=1_000_000)
+    p.add_argument('--batch', type=int, default=10, help='keys written per tx')
+    p.add_argument('--writers', type=int, default=16)
+    p.add_argument('--value-size', type=int, default=32)
+    p.add_argument('--dir', default=None, help='data directory (default: a temp dir)')
+    args = p.parse_args()
+
+    directory = args.dir or tempfile.mkdtemp(prefix="bench-storage-")
+    print(f"data dir {directory}")
+    written = write_phase(directory, args.keys, args.batch, args.writers, "v" * args.value_size)
+    # a small segment size makes this restart compact the replayed log
+    restart_phase(directory, "log replay", written, segment_bytes=1 << 20)
+    snaps = sorted(Path(directory).glob("snap-*.snap"))
+    if snaps:
+        print(f"         snapshot {snaps[-1].name}: {snaps[-1].stat().st_size / 1e6:.1f} MB")
+    restart_phase(directory, "snapshot + tail", written)
+
+if __name__ == '__main__':
+    main()
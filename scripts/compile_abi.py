@@ -1,6 +1,12 @@
 # scripts/compile_abi.py
 
 import solcx, json, os
+from pathlib import Path
+
+# resolve paths from the repo root, not the caller's cwd
+BASE     = Path(__file__).parent.parent
+SRC_PATH = BASE / "contracts" / "evm_adapter" / "TwoPhaseAdapter.sol"
+ABI_PATH = BASE / "abi" / "TwoPhaseAdapter.json"
 
 # ensure Solc 0.8.0 is installed
 try:
@@ -10,7 +16,7 @@ except solcx.exceptions.SolcNotInstalled:
     solcx.set_solc_version("0.8.0")
 
 # read Solidity source file as UTF-8
-with open("TwoPhaseAdapter.sol", encoding="utf-8") as f:
+with open(SRC_PATH, encoding="utf-8") as f:
     src = f.read()
 
 # compile just to get the ABI
@@ -25,8 +31,8 @@ compiled = solcx.compile_standard({
 abi = compiled["contracts"]["TwoPhaseAdapter.sol"]["TwoPhaseAdapter"]["abi"]
 
 # write it out
-os.makedirs("abi", exist_ok=True)
-with open("abi/TwoPhaseAdapter.json", "w", encoding="utf-8") as f:
+os.makedirs(ABI_PATH.parent, exist_ok=True)
+with open(ABI_PATH, "w", encoding="utf-8") as f:
     json.dump(abi, f, indent=2)
 
-print("ABI written to abi/TwoPhaseAdapter.json")
+print(f"ABI written to {ABI_PATH}")
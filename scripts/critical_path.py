@@ -0,0 +1,122 @@
+# scripts/critical_path.py
+#
+# Where one transaction's time went, from the spans the services recorded
+# with tracing on (--trace-file, or TWOPC_TRACE_FILE=<path> in their env):
+#   python scripts/critical_path.py spans.jsonl --tx 3f2a9c...
+#
+# Span files from several processes are merged. The tx's trace starts at its
+# topmost span naming it: the client's "transaction", or the coordinator's
+# Prepare and Commit when the client doesn't trace. Group-commit and
+# on-chain batch spans that carried the tx together with others are followed
+# through their links. From each root the critical path walks back from the
+# end, taking at every level the child that finished last before the point
+# reached so far: the chain of work the tx actually waited on. Each line
+# shows a span's duration and its self time (the part not spent in its
+# children on the path); the spans with the most self time are listed last.
+
+import argparse, json, sys
+from typing import Dict, List, Tuple
+
+# cross-process clock skew tolerated when fitting children into a parent
+SLACK = 0.001
+
+def load(paths) -> Dict[str, dict]:
+    # span_id -> span, from JSON-lines span files
+    spans = {}
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    span = json.loads(line)
+                    spans[span["span_id"]] = span
+    return spans
+
+def mentions(span, tx_id) -> bool:
+    attrs = span.get("attrs", {})
+    return attrs.get("tx") == tx_id or tx_id in attrs.get("txs", ())
+
+def children_index(spans) -> Dict[str, List[dict]]:
+    # parent span_id -> children; a span linked to others is also a child of
+    # each of them, since it did their work too
+    children: Dict[str, List[dict]] = {}
+    for span in spans.values():
+        parents = {span.get("parent_id")} | {span_id for _, span_id in span.get("links", ())}
+        for parent in parents - {None}:
+            children.setdefault(parent, []).append(span)
+    return children
+
+def descendants(span, children) -> set:
+    seen, todo = set(), [span]
+    while todo:
+        for child in children.get(todo.pop()["span_id"], ()):
+            if child["span_id"] not in seen:
+                seen.add(child["span_id"])
+                todo.append(child)
+    return seen
+
+def roots(spans, children, tx_id) -> List[dict]:
+    # the spans naming tx_id that no other such span leads to, oldest first
+    named = [s for s in spans.values() if mentions(s, tx_id)]
+    below = set()
+    for span in named:
+        below |= descendants(span, children)
+    return sorted((s for s in named if s["span_id"] not in below), key=lambda s: s["start"])
+
+def critical_path(span, children, depth=0) -> List[Tuple[int, dict, float]]:
+    # [(depth, span, self seconds)] along the critical path below span
+    cursor, chosen = span["end"] + SLACK, []
+    for child in sorted(children.get(span["span_id"], ()), key=lambda c: c["end"], reverse=True):
+        if child["end"] <= cursor:
+            chosen.append(child)
+            cursor = child["start"] + SLACK
+    chosen.reverse()
+
+    covered = sum(max(0.0, min(c["end"], span["end"]) - max(c["start"], span["start"]))
+                  for c in chosen)
+    path = [(depth, span, max(0.0, span["end"] - span["start"] - covered))]
+    for child in chosen:
+        path.extend(critical_path(child, children, depth + 1))
+    return path
+
+def describe(span) -> str:
+    attrs = span.get("attrs", {})
+    notes = [attrs[k] for k in ("kind", "service", "shard") if attrs.get(k)]
+    if attrs.get("size"):
+        notes.append(f"{attrs['size']} items")
+    if span.get("status", "OK") != "OK":
+        notes.append(span["status"])
+    return span["name"] + (f"  ({', '.join(str(n) for n in notes)})" if notes else "")
+
+def report(spans, tx_id, top=5, out=sys.stdout) -> bool:
+    # prints the critical path of every root of tx_id; False if none found
+    children = children_index(spans)
+    found = roots(spans, children, tx_id)
+    if not found:
+        print(f"no spans mention tx {tx_id}", file=out)
+        return False
+    for root in found:
+        path = critical_path(root, children)
+        print(f"trace {root['trace_id']}  tx={tx_id}  "
+              f"{(root['end'] - root['start']) * 1000:.1f}ms", file=out)
+        print(f"{'total':>11} {'self':>10}  span", file=out)
+        for depth, span, own in path:
+            print(f"{(span['end'] - span['start']) * 1000:9.1f}ms {own * 1000:8.1f}ms  "
+                  f"{'  ' * depth}{describe(span)}", file=out)
+        print("most self time:", file=out)
+        for _, span, own in sorted(path, key=lambda p: p[2], reverse=True)[:top]:
+            print(f"  {own * 1000:9.1f}ms  {describe(span)}", file=out)
+        print(file=out)
+    return True
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="critical path of one transaction's trace")
+    p.add_argument('files', nargs='+', help='span files (JSON lines)')
+    p.add_argument('--tx', required=True, help='transaction id')
+    p.add_argument('--top', type=int, default=5, help='spans listed by self time')
+    args = p.parse_args(argv)
+    if not report(load(args.files), args.tx, args.top):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
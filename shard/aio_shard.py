@@ -0,0 +1,240 @@
+# shard/aio_shard.py
+import asyncio, grpc, logging, time
+
+from web3 import Web3
+
+from mcp2pc import two_phase_pb2, two_phase_pb2_grpc
+from common.chain_backend import connect
+from common.channels import SERVER_OPTIONS
+from common import tracing
+from common.interceptors import AioServerMetricsInterceptor, AioServerTracingInterceptor
+from common.metrics import serve_metrics
+from common.nonce_manager import is_nonce_too_low
+from shard.locks import KeyLocks, NO_WAIT
+from shard.shard_node import CHAIN_REPLACEMENTS, CHAIN_SECONDS, Shard, load_config, open_store, _tx_id32
+
+logger = logging.getLogger(__name__)
+
+class AioShard(two_phase_pb2_grpc.ShardServicer):
+    # grpc.aio servicer over a regular Shard. Off-chain handlers run inline
+    # unless they may block (chain head reads, disk); on-chain handlers build and
+    # send through AsyncWeb3 and await the shard's ReceiptTracker /
+    # OnChainBatcher futures, so a pending chain call holds a coroutine
+    # rather than a worker thread.
+    RECEIPT_TIMEOUT = Shard.RECEIPT_TIMEOUT
+
+    def __init__(self, shard: Shard, rpc_url: str):
+        self.shard = shard
+        self.w3 = connect(rpc_url).async_w3()
+        self.adapter = self.w3.eth.contract(address=shard.adapter.address, abi=shard.adapter.abi)
+        # read once so building a tx never needs an extra eth_chainId
+        self.chain_id = shard.chain.chain_id
+
+    # --- off‐chain 2PC handlers ---
+
+    async def Prepare(self, request, context):
+        return await self._offchain(self.shard.Prepare, request, context, reads_head=True)
+
+    async def Commit(self, request, context):
+        return await self._offchain(self.shard.Commit, request, context)
+
+    async def Abort(self, request, context):
+        return await self._offchain(self.shard.Abort, request, context)
+
+    async def Rollback(self, request, context):
+        return await self._offchain(self.shard.Rollback, request, context)
+
+    async def PrepareAndCommit(self, request, context):
+        # waits for a receipt; run the threaded handler off the loop
+        return await asyncio.to_thread(self.shard.PrepareAndCommit, request, context)
+
+    async def PrepareBatch(self, request, context):
+        return await self._offchain(self.shard.PrepareBatch, request, context, reads_head=True)
+
+    async def CommitBatch(self, request, context):
+        return await self._offchain(self.shard.CommitBatch, request, context)
+
+    async def AbortBatch(self, request, context):
+        return await self._offchain(self.shard.AbortBatch, request, context)
+
+    async def _offchain(self, handler, request, context, reads_head=False):
+        # in-memory Commit/Abort run inline. Prepare may read the chain head
+        # (a blocking eth_blockNumber once the oracle's cache is stale), and
+        # with a durable store every handler waits for an fsync, so those
+        # run on a thread, where concurrent ones can share the store's next
+        # flush instead of stalling the loop
+        if not reads_head and not self.shard.store.durable:
+            return handler(request, context)
+        return await asyncio.to_thread(handler, request, context)
+
+    # --- on‐chain adapter handlers ---
+
+    async def LockOnChain(self, request, context):
+        fn = self.adapter.functions.lockFunds(
+            _tx_id32(request.transaction_id),
+            Web3.to_checksum_address(request.recipient),
+            request.deadline
+        )
+        # fixed gas limit (skip estimateGas)
+        receipt = await self._transact(fn, {"value": request.amount, "gas": 200_000},
+                                       request.deadline)
+        if receipt.status != 1:
+            logger.error(f"[{self.shard.id}] onChain reverted: tx={receipt.transactionHash.hex()} "
+                         f"status={receipt.status}")
+        else:
+            self.shard._lock_deadlines[request.transaction_id] = request.deadline
+        return two_phase_pb2.TxHash(hash=receipt.transactionHash.hex())
+
+    async def CommitOnChain(self, request, context):
+        fn = self.adapter.functions.commit(_tx_id32(request.transaction_id))
+        return await self._finalize("CommitOnChain", fn, request, context,
+                                    "past deadline or not pending",
+                                    self.shard._lock_deadlines.pop(request.transaction_id, None))
+
+    async def ReclaimOnChain(self, request, context):
+        fn = self.adapter.functions.reclaim(_tx_id32(request.transaction_id))
+        # past its deadline by definition: priced without one
+        self.shard._lock_deadlines.pop(request.transaction_id, None)
+        return await self._finalize("ReclaimOnChain", fn, request, context,
+                                    "too early or not pending")
+
+    async def _finalize(self, name, fn, request, context, revert_hint, deadline=None):
+        # shared body of CommitOnChain / ReclaimOnChain, same error mapping
+        # as the threaded Shard
+        try:
+            receipt = await self._transact(fn, {"gas": 100_000}, deadline)
+            tx_hash = receipt.transactionHash.hex()
+            if receipt.status != 1:
+                logger.error(f"[{self.shard.id}] {name}(tx={request.transaction_id}) reverted on‐chain, status=0")
+                context.set_details(f"{name} reverted ({revert_hint})")
+                context.set_code(grpc.StatusCode.FAILED_PRECONDITION)
+                return two_phase_pb2.TxHash(hash=tx_hash)
+
+            logger.info(f"[{self.shard.id}] {name} succeeded tx={tx_hash}")
+            return two_phase_pb2.TxHash(hash=tx_hash)
+
+        except Exception as e:
+            logger.exception(f"[{self.shard.id}] {name} exception for tx={request.transaction_id}")
+            context.set_details(str(e))
+            context.set_code(grpc.StatusCode.INTERNAL)
+            return two_phase_pb2.TxHash(hash="")
+
+    # --- batched on‐chain adapter handlers ---
+
+    async def LockOnChainBatch(self, request, context):
+        return await self._submit_batch("lock", [(it.transaction_id, it) for it in request.items])
+
+    async def CommitOnChainBatch(self, request, context):
+        return await self._submit_batch("commit", [(tx, tx) for tx in request.transaction_ids])
+
+    async def ReclaimOnChainBatch(self, request, context):
+        return await self._submit_batch("reclaim", [(tx, tx) for tx in request.transaction_ids])
+
+    async def _submit_batch(self, kind, items):
+        # items still go out through the shard's per-block OnChainBatcher
+        waits = [
+            asyncio.wait_for(asyncio.wrap_future(self.shard.onchain.submit(kind, item)),
+                             Shard.BATCH_TIMEOUT)
+            for _, item in items
+        ]
+        outcomes = await asyncio.gather(*waits, return_exceptions=True)
+        return self.shard._batch_result(kind, [tx for tx, _ in items], outcomes)
+
+    # --- chain I/O ---
+
+    async def _transact(self, fn, params, deadline=None):
+        # Shard._transact over AsyncWeb3: build, sign, send and await the
+        # receipt of one adapter call, replacing it with bumped fees under
+        # the same nonce while it sits unmined
+        shard = self.shard
+        # fee history is read at most once per block; off the loop when it is
+        fees = await asyncio.to_thread(shard.fees.quote, deadline)
+        tx = await fn.build_transaction({
+            "from":    shard.account.address,
+            "chainId": self.chain_id,
+            **params,
+            **fees.as_tx(),
+        })
+        hashes = [await self._sign_and_send(tx)]   # tx now carries its nonce
+
+        receipts = shard.receipts
+        try:
+            with CHAIN_SECONDS.time(shard=shard.id, op="receipt_wait"), \
+                 tracing.span("chain/receipt_wait", shard=shard.id, hash=bytes(hashes[0]).hex()):
+                give_up = time.monotonic() + self.RECEIPT_TIMEOUT
+                while True:
+                    waiting = [asyncio.wrap_future(receipts.track(h)) for h in hashes]
+                    stale = asyncio.wrap_future(receipts.after_blocks(shard.fees.replace_after))
+                    await asyncio.wait(waiting + [stale], timeout=max(give_up - time.monotonic(), 0),
+                                       return_when=asyncio.FIRST_COMPLETED)
+                    for fut in waiting:
+                        if fut.done():
+                            return fut.result()
+                    if not stale.done():
+                        # the node may have dropped it; see Shard._transact
+                        await asyncio.to_thread(shard.nonces.resync)
+                        raise asyncio.TimeoutError(f"no receipt for nonce {tx['nonce']}")
+                    replacement = await asyncio.to_thread(shard._replacement, tx, deadline)
+                    if replacement is not None:
+                        tx_hash = await self._resend(replacement)
+                        if tx_hash is not None:
+                            tx.update(replacement)
+                            hashes.append(tx_hash)
+        finally:
+            for h in hashes:
+                receipts.forget(h)
+
+    async def _resend(self, replacement):
+        # Shard._resend with an awaited send
+        with tracing.span("chain/replace", shard=self.shard.id, nonce=replacement["nonce"]):
+            try:
+                signed = self.shard._sign(replacement)
+                tx_hash = await self.w3.eth.send_raw_transaction(signed.raw_transaction)
+            except Exception as e:
+                logger.warning(f"[{self.shard.id}] replacing nonce {replacement['nonce']} failed: {e}")
+                return None
+        CHAIN_REPLACEMENTS.inc(shard=self.shard.id)
+        return tx_hash
+
+    async def _sign_and_send(self, tx_dict):
+        # Shard._sign_and_send with an awaited send; nonces come from the
+        # shard's allocator, whose RPCs are rare (first use and resyncs)
+        nonces = self.shard.nonces
+        for attempt in range(1, Shard.SEND_ATTEMPTS + 1):
+            nonce = tx_dict["nonce"] = nonces.allocate()
+            signed = self.shard._sign(tx_dict)
+            try:
+                with CHAIN_SECONDS.time(shard=self.shard.id, op="send"), \
+                     tracing.span("chain/send", shard=self.shard.id):
+                    tx_hash = await self.w3.eth.send_raw_transaction(signed.raw_transaction)
+            except Exception as e:
+                if not is_nonce_too_low(e):
+                    nonces.release(nonce)
+                    raise
+                logger.warning(f"[{self.shard.id}] nonce {nonce} rejected ({e}); resyncing")
+                nonces.confirm(nonce)
+                nonces.resync()
+                if attempt == Shard.SEND_ATTEMPTS:
+                    raise
+                continue
+            nonces.confirm(nonce)
+            return tx_hash
+
+
+async def serve_aio(shard_id, port, data_dir=None, lock_policy=NO_WAIT, metrics_port=None,
+                    trace_file=None):
+    rpc_url, adapter_address = load_config(shard_id)
+    if metrics_port is not None:
+        serve_metrics(metrics_port)
+    if trace_file is not None:
+        tracing.configure(trace_file)
+    shard = Shard(shard_id, rpc_url, adapter_address, store=open_store(shard_id, data_dir),
+                  locks=KeyLocks(policy=lock_policy))
+
+    server = grpc.aio.server(options=SERVER_OPTIONS,
+                             interceptors=[AioServerMetricsInterceptor(),
+                                           AioServerTracingInterceptor(f"shard {shard_id}")])
+    two_phase_pb2_grpc.add_ShardServicer_to_server(AioShard(shard, rpc_url), server)
+    server.add_insecure_port(f'[::]:{port}')
+    await server.start()
+    await server.wait_for_termination()
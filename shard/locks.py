@@ -0,0 +1,123 @@
+# shard/locks.py
+import math, threading, time
+from typing import Dict, Iterable, List, Optional
+
+NO_WAIT   = "no-wait"
+WAIT_DIE  = "wait-die"
+POLICIES  = (NO_WAIT, WAIT_DIE)
+# the age of a tx that came without one: younger than any other
+YOUNGEST  = math.inf
+
+class KeyLocks:
+    # exclusive key locks held from a tx's READY vote until its Commit or
+    # Abort. Keys hash onto `stripes` independently locked tables, so txs on
+    # disjoint keys never contend on one mutex. A tx takes all its keys or
+    # none, in one global (stripe, key) order. On a conflict:
+    #   no-wait:  give up at once; the shard votes ABORT
+    #   wait-die: a tx strictly older than the holder waits up to
+    #             `wait_timeout`s for it; any other gives up at once, so
+    #             waits never form a cycle. Ages come from the caller (the
+    #             coordinator's start timestamp), so a retried tx keeps its
+    #             place instead of turning younger and starving
+    def __init__(self, stripes: int = 64, policy: str = NO_WAIT, wait_timeout: float = 1.0):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown lock policy {policy!r}; expected one of {POLICIES}")
+        self.policy = policy
+        self.wait_timeout = wait_timeout
+        self._stripes = [_Stripe() for _ in range(stripes)]
+        # tx -> keys it holds, and tx -> age (lower is older)
+        self._held: Dict[str, List[str]] = {}
+        self._ages: Dict[str, float] = {}
+        self._meta = threading.Lock()
+        self._counters = {"acquired": 0, "conflicts": 0, "waits": 0, "wait_seconds": 0.0}
+
+    def acquire(self, tx_id: str, keys: Iterable[str], age: Optional[int] = None) -> Optional[str]:
+        # locks every key for tx_id (re-entrant). Returns None on success, or
+        # the key that could not be taken, in which case tx_id holds nothing
+        # new from this call. `age` orders txs under wait-die (lower is
+        # older); None counts as YOUNGEST. A tx keeps the age it first came
+        # with for as long as it holds keys.
+        with self._meta:
+            age = self._ages.setdefault(tx_id, YOUNGEST if age is None else age)
+            already = set(self._held.get(tx_id, ()))
+        ordered = sorted(set(keys) - already, key=lambda k: (self._index(k), k))
+        taken = []
+        for key in ordered:
+            if not self._take(tx_id, age, key):
+                for k in taken:
+                    self._stripe(k).release(k, tx_id)
+                with self._meta:
+                    self._counters["conflicts"] += 1
+                    if tx_id not in self._held:
+                        self._ages.pop(tx_id, None)
+                return key
+            taken.append(key)
+        with self._meta:
+            self._held.setdefault(tx_id, []).extend(taken)
+            self._counters["acquired"] += 1
+        return None
+
+    def release(self, tx_id: str):
+        # drops every key tx_id holds; a no-op for unknown txs
+        with self._meta:
+            keys = self._held.pop(tx_id, ())
+            self._ages.pop(tx_id, None)
+        for key in keys:
+            self._stripe(key).release(key, tx_id)
+
+    def holder(self, key: str) -> Optional[str]:
+        stripe = self._stripe(key)
+        with stripe.cond:
+            owner = stripe.owners.get(key)
+        return owner[0] if owner else None
+
+    def stats(self) -> dict:
+        with self._meta:
+            return {**self._counters, "held_txs": len(self._held)}
+
+    # --- internals ---
+
+    def _index(self, key: str) -> int:
+        return hash(key) % len(self._stripes)
+
+    def _stripe(self, key: str) -> "_Stripe":
+        return self._stripes[self._index(key)]
+
+    def _take(self, tx_id, age, key) -> bool:
+        stripe = self._stripe(key)
+        deadline = None
+        with stripe.cond:
+            while True:
+                owner = stripe.owners.get(key)
+                if owner is None or owner[0] == tx_id:
+                    stripe.owners[key] = (tx_id, age)
+                    return True
+                # wait-die: only a strictly older tx may wait for the holder
+                if self.policy == NO_WAIT or age >= owner[1]:
+                    return False
+                now = time.monotonic()
+                if deadline is None:
+                    deadline = now + self.wait_timeout
+                    with self._meta:
+                        self._counters["waits"] += 1
+                elif now >= deadline:
+                    return False
+                stripe.cond.wait(deadline - now)
+                with self._meta:
+                    self._counters["wait_seconds"] += time.monotonic() - now
+
+
+class _Stripe:
+    # key -> (holder tx, holder age) for the keys hashing here
+    __slots__ = ("cond", "owners")
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.owners: Dict[str, tuple] = {}
+
+    def release(self, key, tx_id):
+        with self.cond:
+            owner = self.owners.get(key)
+            if owner is not None and owner[0] == tx_id:
+                del self.owners[key]
+                self.cond.notify_all()
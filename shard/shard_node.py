@@ -2,16 +2,27 @@
 import grpc, threading
 from concurrent import futures
 from pathlib import Path
-import json, os, logging
+import json, os, logging, time
 
 from web3 import Web3
+from web3.logs import DISCARD
 from dotenv import load_dotenv
 
 from mcp2pc import two_phase_pb2, two_phase_pb2_grpc
-from collections import defaultdict
 
 from common.timeout_manager import TimeoutManager
-from common.lightclient import LightClient
+from common.block_oracle import get_oracle
+from common.channels import SERVER_OPTIONS
+from common import tracing
+from common.interceptors import ServerMetricsInterceptor, ServerTracingInterceptor
+from common.fee_engine import FeeEngine, Fees
+from common.metrics import counter, histogram, serve_metrics
+from common.nonce_manager import NonceManager, is_nonce_too_low
+from common.receipt_tracker import ReceiptTracker
+from common.onchain_batcher import OnChainBatcher
+from common.ops import InvalidOperation, compile_write_set
+from shard.storage import MemoryStore, LogStore
+from shard.locks import KeyLocks, NO_WAIT, POLICIES
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -19,17 +30,40 @@ logger = logging.getLogger(__name__)
 # load environment
 load_dotenv()
 
+# seconds per step of the shard's on-chain calls: sign, send (until the node
+# accepts the tx) and receipt_wait (until it is mined)
+CHAIN_SECONDS = histogram("chain_call_seconds", "Seconds per chain call step of a shard",
+                          ("shard", "op"))
+# adapter txs re-sent with bumped fees under the same nonce after sitting
+# unmined for FeeEngine.replace_after blocks
+CHAIN_REPLACEMENTS = counter("chain_tx_replacements_total",
+                             "Adapter txs re-sent with bumped fees", ("shard",))
+
 class Shard(two_phase_pb2_grpc.ShardServicer):
-    def __init__(self, shard_id, rpc_url: str, adapter_address: str):
+    def __init__(self, shard_id, rpc_url: str, adapter_address: str, store=None, locks=None):
         self.id = shard_id
-        self.state = {}
-        self.prepared = defaultdict(dict)
-
-        # off‐chain timeout manager
-        self.timeout_mgr = TimeoutManager(LightClient(rpc_url))
-
-        # set up Web3 + account for on‐chain calls
-        self.w3 = LightClient(rpc_url).w3
+        # committed state and staged write sets; pass a LogStore to survive restarts
+        self.store = store if store is not None else MemoryStore()
+
+        # keys written by a prepared tx stay locked until its Commit/Abort;
+        # txs still prepared from before a restart take theirs back, as the
+        # youngest: older txs may wait for them, they never wait themselves
+        self.locks = locks if locks is not None else KeyLocks()
+        for tx, writes in self.store.prepared.items():
+            self.locks.acquire(tx, writes)
+
+        # off‐chain timeout manager, backed by the process-wide head oracle
+        # the sweeper drops staged ops of txs whose deadline passed
+        oracle = get_oracle(rpc_url)
+        self.timeout_mgr = TimeoutManager(oracle, on_expired=self._on_expired)
+        # txs still prepared from before a restart keep their deadlines
+        for tx, deadline in self.store.deadlines.items():
+            self.timeout_mgr.restore(tx, deadline)
+
+        # on-chain calls go through the oracle's chain backend (same
+        # connection); w3 is kept for contract encoding and signing
+        self.chain = oracle.client.backend
+        self.w3 = self.chain.w3
 
         # pick up the shard-specific key from .env, e.g. SHARD1_KEY
         key_env_var = f"{shard_id.upper()}_KEY"
@@ -39,96 +73,335 @@ class Shard(two_phase_pb2_grpc.ShardServicer):
         self.account = self.w3.eth.account.from_key(priv_key)
         self.w3.eth.default_account = self.account.address
 
+        # local nonce allocation lets many on-chain txs be in flight at once
+        self.nonces = NonceManager(self.chain, self.account.address)
+
+        # receipts for all in-flight txs are fetched together once per block
+        self.receipts = ReceiptTracker(self.chain, oracle)
+
+        # EIP-1559 fees priced by blocks left before a tx's deadline; stuck
+        # txs are replaced with bumped fees. A lock's on-chain deadline is
+        # kept until its commit/reclaim so those are priced against it too.
+        self.fees = FeeEngine(self.chain, oracle)
+        self._lock_deadlines = {}
+
         # load the adapter ABI & contract instance
         abi_path = Path(__file__).parent.parent / "abi" / "TwoPhaseAdapter.json"
         with open(abi_path) as f:
             abi = json.load(f)
         self.adapter = self.w3.eth.contract(address=adapter_address, abi=abi)
 
+        # *OnChainBatch items are queued and sent as one adapter call per block
+        self.onchain = OnChainBatcher(oracle, self._flush_batch)
+
         logger.info(f"Shard {self.id} initialized; adapter at {adapter_address}")
 
+    @property
+    def state(self):
+        return self.store.state
+
+    @property
+    def prepared(self):
+        return self.store.prepared
+
     # --- off‐chain 2PC handlers ---
 
     def Prepare(self, request, context):
-        # record block‐height deadline on first Prepare
-        if request.transaction_id not in self.timeout_mgr.deadlines:
-            self.timeout_mgr.start(request.transaction_id, request.timeout_blocks)
-
-        # auto‐abort if deadline passed
-        if self.timeout_mgr.is_expired(request.transaction_id):
+        vote, logged = self._prepare(request)
+        if logged is not None:
+            logged.result()   # the vote goes out only once it is durable
+        return vote
+
+    def _prepare(self, request):
+        # returns (vote, Future resolving once the staged writes are durable,
+        # or None when voting ABORT)
+        # validate and compile the write set once, so Commit only applies it
+        try:
+            writes = compile_write_set(request)
+        except InvalidOperation as e:
+            logger.warning(f"[{self.id}] rejecting tx={request.transaction_id}: {e}")
             return two_phase_pb2.PrepareResponse(
                 status=two_phase_pb2.PrepareResponse.ABORT,
+                shard_id=self.id,
+                error=str(e)
+            ), None
+
+        # nothing to write or lock on-chain here: vote READ_ONLY and keep no
+        # state, so the coordinator leaves this shard out of phase two
+        if not writes and not request.onchain_amount:
+            return two_phase_pb2.PrepareResponse(
+                status=two_phase_pb2.PrepareResponse.READ_ONLY,
                 shard_id=self.id
-            )
+            ), None
+
+        # record block‐height deadline on first Prepare; a tx the sweeper
+        # already expired keeps voting ABORT
+        tm = self.timeout_mgr
+        if request.transaction_id not in tm.deadlines and not tm.was_swept(request.transaction_id):
+            tm.start(request.transaction_id, request.timeout_blocks)
+
+        # auto‐abort if deadline passed or the tx was already aborted
+        if tm.is_expired(request.transaction_id):
+            return two_phase_pb2.PrepareResponse(
+                status=two_phase_pb2.PrepareResponse.ABORT,
+                shard_id=self.id,
+                error="deadline passed or tx aborted"
+            ), None
+
+        # lock the write set; a conflicting tx keeps its locks and this one
+        # votes ABORT (or, under wait-die, an older one waits its turn)
+        conflict = self.locks.acquire(request.transaction_id, writes,
+                                      getattr(request, "start_ts", 0) or None)
+        if conflict is not None:
+            logger.info(f"[{self.id}] tx={request.transaction_id}: key {conflict!r} is locked "
+                        f"by tx={self.locks.holder(conflict)}")
+            return two_phase_pb2.PrepareResponse(
+                status=two_phase_pb2.PrepareResponse.ABORT,
+                shard_id=self.id,
+                error=f"lock conflict on key {conflict!r}"
+            ), None
 
-        # otherwise stage ops
-        self.prepared[request.transaction_id] = request.operations
+        # otherwise stage the writes
+        logged = self.store.prepare(request.transaction_id, writes,
+                                    tm.deadlines.get(request.transaction_id), wait=False)
         return two_phase_pb2.PrepareResponse(
             status=two_phase_pb2.PrepareResponse.READY,
             shard_id=self.id
-        )
+        ), logged
 
     def Commit(self, request, context):
-        tx = request.transaction_id
-        ops = self.prepared.pop(tx, [])
-        for op in ops:
-            parts = op.split(maxsplit=2)
-            if len(parts)==3 and parts[0].upper()=="SET":
-                _, key, val = parts
-                self.state[key] = val
+        logged = self._commit(request.transaction_id)
+        if logged is not None:
+            logged.result()
         return two_phase_pb2.Empty()
 
+    def _commit(self, tx):
+        # returns a Future resolving once the commit is durable, or None if
+        # nothing was prepared here
+        logged = None
+        if tx in self.prepared:
+            logged = self.store.commit(tx, wait=False)
+        # the writes are applied in memory by now, so later readers see them
+        self.locks.release(tx)
+        self.timeout_mgr.complete(tx)
+        return logged
+
     def Abort(self, request, context):
-        self.prepared.pop(request.transaction_id, None)
+        if request.transaction_id in self.prepared:
+            self.store.abort(request.transaction_id)
+        self.locks.release(request.transaction_id)
+        # an Abort can overtake the Prepare it cancels; that Prepare then
+        # finds the tx expired and votes ABORT instead of staging it
+        self.timeout_mgr.cancel(request.transaction_id)
         return two_phase_pb2.Empty()
 
     def Rollback(self, request, context):
         return self.Abort(request, context)
 
+    def PrepareAndCommit(self, request, context):
+        # one-phase commit: this shard is the tx's only participant, so its
+        # own outcome is the decision. The on-chain transfer goes first;
+        # only once it is mined are the staged writes committed.
+        tx = request.prepare.transaction_id
+        vote, _ = self._prepare(request.prepare)
+        if vote.status == two_phase_pb2.PrepareResponse.READ_ONLY:
+            vote.committed = True   # nothing to do in a second phase
+        if vote.status != two_phase_pb2.PrepareResponse.READY:
+            return vote
+
+        if request.lock.amount:
+            try:
+                tx_hash = self._lock_and_commit(request.lock)
+            except Exception as e:
+                logger.error(f"[{self.id}] one-phase tx={tx} failed on-chain: {e}")
+                self.Abort(two_phase_pb2.AbortRequest(transaction_id=tx), context)
+                return two_phase_pb2.PrepareResponse(
+                    status=two_phase_pb2.PrepareResponse.ABORT,
+                    shard_id=self.id,
+                    error=str(e) or type(e).__name__
+                )
+            logger.info(f"[{self.id}] lockAndCommit succeeded tx={tx_hash}")
+
+        logged = self._commit(tx)
+        if logged is not None:
+            logged.result()
+        return two_phase_pb2.PrepareResponse(
+            status=two_phase_pb2.PrepareResponse.READY,
+            shard_id=self.id,
+            committed=True
+        )
+
+    # group-commit variants: one RPC carries a coordinator window of txs.
+    # Every record is queued before waiting, so a durable store covers the
+    # whole window with one group fsync rather than one per tx
+
+    def PrepareBatch(self, request, context):
+        staged = [self._prepare(req) for req in request.requests]
+        for _, logged in staged:
+            if logged is not None:
+                logged.result()
+        return two_phase_pb2.PrepareBatchResponse(responses=[vote for vote, _ in staged])
+
+    def CommitBatch(self, request, context):
+        pending = [self._commit(tx) for tx in request.transaction_ids]
+        for logged in pending:
+            if logged is not None:
+                logged.result()
+        return two_phase_pb2.Empty()
+
+    def AbortBatch(self, request, context):
+        for tx in request.transaction_ids:
+            self.Abort(two_phase_pb2.AbortRequest(transaction_id=tx), context)
+        return two_phase_pb2.Empty()
+
+    def _on_expired(self, tx_ids):
+        # called by the timeout sweeper with every tx that passed its deadline
+        for tx in tx_ids:
+            if tx in self.prepared:
+                self.store.abort(tx)
+            self.locks.release(tx)
+        logger.info(f"[{self.id}] expired {len(tx_ids)} prepared tx(s)")
+
     # --- on‐chain adapter handlers ---
 
+    # attempts per tx when the node rejects an allocated nonce as used
+    SEND_ATTEMPTS = 3
+
     def _sign_and_send(self, tx_dict):
-        tx_dict.setdefault("chainId", self.w3.eth.chain_id)
-        tx_dict.setdefault("nonce", self.w3.eth.get_transaction_count(self.account.address))
-        signed = self.account.sign_transaction(tx_dict)
-        return self.w3.eth.send_raw_transaction(signed.raw_transaction)
+        # tx_dict is left carrying the nonce it went out with
+        tx_dict.setdefault("chainId", self.chain.chain_id)
+        if "nonce" in tx_dict:
+            return self._send(self._sign(tx_dict))
+
+        for attempt in range(1, self.SEND_ATTEMPTS + 1):
+            nonce = tx_dict["nonce"] = self.nonces.allocate()
+            signed = self._sign(tx_dict)
+            try:
+                tx_hash = self._send(signed)
+            except Exception as e:
+                if not is_nonce_too_low(e):
+                    self.nonces.release(nonce)
+                    raise
+                # someone else used it (another process, a replaced tx)
+                logger.warning(f"[{self.id}] nonce {nonce} rejected ({e}); resyncing")
+                self.nonces.confirm(nonce)
+                self.nonces.resync()
+                if attempt == self.SEND_ATTEMPTS:
+                    raise
+                continue
+            self.nonces.confirm(nonce)
+            return tx_hash
+
+    def _sign(self, tx_dict):
+        with CHAIN_SECONDS.time(shard=self.id, op="sign"), \
+             tracing.span("chain/sign", shard=self.id, nonce=tx_dict.get("nonce")):
+            return self.account.sign_transaction(tx_dict)
+
+    def _send(self, signed):
+        with CHAIN_SECONDS.time(shard=self.id, op="send"), tracing.span("chain/send", shard=self.id):
+            return self.chain.send(signed.raw_transaction)
+
+    RECEIPT_TIMEOUT = 120   # same as ReceiptTracker.wait
+
+    def _transact(self, fn, params, deadline=None):
+        # build, sign and send one adapter call priced by the fee engine, and
+        # wait for its receipt. A version still unmined after
+        # fees.replace_after blocks is re-sent under the same nonce with
+        # bumped fees; returns the receipt of whichever version was mined.
+        tx = fn.build_transaction({
+            "from": self.account.address,
+            **params,
+            **self.fees.quote(deadline).as_tx(),
+        })
+        hashes = [self._sign_and_send(tx)]   # tx now carries its nonce
+        try:
+            with CHAIN_SECONDS.time(shard=self.id, op="receipt_wait"), \
+                 tracing.span("chain/receipt_wait", shard=self.id, hash=bytes(hashes[0]).hex()):
+                give_up = time.monotonic() + self.RECEIPT_TIMEOUT
+                while True:
+                    waiting = [self.receipts.track(h) for h in hashes]
+                    stale = self.receipts.after_blocks(self.fees.replace_after)
+                    futures.wait(waiting + [stale], max(give_up - time.monotonic(), 0),
+                                 return_when=futures.FIRST_COMPLETED)
+                    for fut in waiting:
+                        if fut.done():
+                            return fut.result()
+                    if not stale.done():
+                        # the node may have dropped it: a resync hands a
+                        # lost nonce out again, so later txs don't queue
+                        # behind the gap
+                        self.nonces.resync()
+                        raise futures.TimeoutError(f"no receipt for nonce {tx['nonce']}")
+                    replacement = self._replacement(tx, deadline)
+                    if replacement is not None:
+                        tx_hash = self._resend(replacement)
+                        if tx_hash is not None:
+                            tx.update(replacement)
+                            hashes.append(tx_hash)
+        finally:
+            for h in hashes:
+                self.receipts.forget(h)
+
+    def _replacement(self, tx, deadline):
+        # tx with bumped fees, or None once max_fee_cap leaves no room
+        bumped = self.fees.bump(Fees.of(tx), deadline)
+        if bumped is None:
+            logger.warning(f"[{self.id}] nonce {tx['nonce']} unmined at the fee cap "
+                           f"({tx['maxFeePerGas']}); waiting")
+            return None
+        logger.warning(f"[{self.id}] nonce {tx['nonce']} unmined after {self.fees.replace_after} "
+                       f"blocks; replacing at maxFeePerGas={bumped.max_fee} tip={bumped.tip}")
+        return {**tx, **bumped.as_tx()}
+
+    def _resend(self, replacement):
+        # send a replacement under the same nonce; None if the node rejects
+        # it, e.g. an earlier version was mined meanwhile (nonce too low)
+        with tracing.span("chain/replace", shard=self.id, nonce=replacement["nonce"]):
+            try:
+                tx_hash = self._send(self._sign(replacement))
+            except Exception as e:
+                logger.warning(f"[{self.id}] replacing nonce {replacement['nonce']} failed: {e}")
+                return None
+        CHAIN_REPLACEMENTS.inc(shard=self.id)
+        return tx_hash
 
     def LockOnChain(self, request, context):
-        # parse & pad the tx ID
-        raw      = bytes.fromhex(request.transaction_id)
-        tx_id32  = raw.rjust(32, b'\x00')
+        tx_id32 = _tx_id32(request.transaction_id)
 
         # normalize the recipient address
         recipient = Web3.to_checksum_address(request.recipient)
 
         # build with a fixed gas limit (skip estimateGas)
-        tx = self.adapter.functions.lockFunds(
-            tx_id32,
-            recipient,
-            request.deadline
-        ).build_transaction({
-            "from":  self.account.address,
-            "value": request.amount,
-            "gas":   200_000,
-        })
-
-        tx_hash = self._sign_and_send(tx)
-        receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
+        fn = self.adapter.functions.lockFunds(tx_id32, recipient, request.deadline)
+        receipt = self._transact(fn, {"value": request.amount, "gas": 200_000}, request.deadline)
         if receipt.status != 1:
-            logger.error(f"[{self.id}] onChain reverted: tx={tx_hash.hex()} status={receipt.status}")
+            logger.error(f"[{self.id}] onChain reverted: tx={receipt.transactionHash.hex()} "
+                         f"status={receipt.status}")
+        else:
+            self._lock_deadlines[request.transaction_id] = request.deadline
         return two_phase_pb2.TxHash(hash=receipt.transactionHash.hex())
 
+    def _lock_and_commit(self, lock):
+        # lockAndCommit: lock + commit in one adapter call; raises if it reverts
+        fn = self.adapter.functions.lockAndCommit(
+            _tx_id32(lock.transaction_id),
+            Web3.to_checksum_address(lock.recipient),
+            lock.deadline
+        )
+        receipt = self._transact(fn, {"value": lock.amount, "gas": 250_000}, lock.deadline)
+        if receipt.status != 1:
+            raise RuntimeError(f"lockAndCommit reverted (past deadline or tx exists): "
+                               f"tx={receipt.transactionHash.hex()}")
+        return receipt.transactionHash.hex()
+
     def CommitOnChain(self, request, context):
-        raw     = bytes.fromhex(request.transaction_id)
-        tx_id32 = raw.rjust(32, b'\x00')
+        tx_id32 = _tx_id32(request.transaction_id)
 
         try:
-            tx = self.adapter.functions.commit(tx_id32).build_transaction({
-                "from": self.account.address,
-                "gas":  100_000,
-            })
-            tx_hash = self._sign_and_send(tx)
-            receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
+            fn = self.adapter.functions.commit(tx_id32)
+            receipt = self._transact(fn, {"gas": 100_000},
+                                     self._lock_deadlines.pop(request.transaction_id, None))
+            tx_hash = receipt.transactionHash
 
             if receipt.status != 1:
                 # on‐chain revert
@@ -149,16 +422,13 @@ class Shard(two_phase_pb2_grpc.ShardServicer):
             return two_phase_pb2.TxHash(hash="")
 
     def ReclaimOnChain(self, request, context):
-        raw     = bytes.fromhex(request.transaction_id)
-        tx_id32 = raw.rjust(32, b'\x00')
+        tx_id32 = _tx_id32(request.transaction_id)
 
         try:
-            tx = self.adapter.functions.reclaim(tx_id32).build_transaction({
-                "from": self.account.address,
-                "gas":  100_000,
-            })
-            tx_hash = self._sign_and_send(tx)
-            receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
+            # past its deadline by definition: priced without one
+            self._lock_deadlines.pop(request.transaction_id, None)
+            receipt = self._transact(self.adapter.functions.reclaim(tx_id32), {"gas": 100_000})
+            tx_hash = receipt.transactionHash
 
             if receipt.status != 1:
                 logger.error(f"[{self.id}] reclaim(tx={request.transaction_id}) reverted on‐chain, status=0")
@@ -175,8 +445,106 @@ class Shard(two_phase_pb2_grpc.ShardServicer):
             context.set_code(grpc.StatusCode.INTERNAL)
             return two_phase_pb2.TxHash(hash="")
 
-
-def serve(shard_id, port):
+    # --- batched on‐chain adapter handlers ---
+
+    # fixed gas limits for the *Batch calls: base + per item (skip estimateGas)
+    BATCH_GAS_BASE = 50_000
+    BATCH_GAS_PER_ITEM = {"lock": 150_000, "commit": 60_000, "reclaim": 60_000}
+    BATCH_OK_EVENT = {"lock": "Locked", "commit": "Committed", "reclaim": "Reclaimed"}
+    # covers waiting for the next block plus the batch receipt
+    BATCH_TIMEOUT = 180
+
+    def LockOnChainBatch(self, request, context):
+        return self._submit_batch("lock", [(it.transaction_id, it) for it in request.items])
+
+    def CommitOnChainBatch(self, request, context):
+        return self._submit_batch("commit", [(tx, tx) for tx in request.transaction_ids])
+
+    def ReclaimOnChainBatch(self, request, context):
+        return self._submit_batch("reclaim", [(tx, tx) for tx in request.transaction_ids])
+
+    def _submit_batch(self, kind, items):
+        # queue every item, then wait for the block flush(es) that carry them
+        pending = [(tx, self.onchain.submit(kind, item)) for tx, item in items]
+        outcomes = []
+        for _, fut in pending:
+            try:
+                outcomes.append(fut.result(self.BATCH_TIMEOUT))
+            except Exception as e:
+                outcomes.append(e)
+        return self._batch_result(kind, [tx for tx, _ in pending], outcomes)
+
+    def _batch_result(self, kind, tx_ids, outcomes):
+        # outcomes: a (tx_hash, error) pair or the exception, per tx
+        results = []
+        for tx, outcome in zip(tx_ids, outcomes):
+            if isinstance(outcome, Exception):
+                tx_hash, err = "", str(outcome) or type(outcome).__name__
+            else:
+                tx_hash, err = outcome
+            results.append(two_phase_pb2.BatchItemResult(
+                transaction_id=tx, hash=tx_hash, ok=not err, error=err
+            ))
+        failed = sum(not r.ok for r in results)
+        if failed:
+            logger.warning(f"[{self.id}] {kind} batch: {failed}/{len(results)} item(s) failed")
+        return two_phase_pb2.BatchResult(results=results)
+
+    def _flush_batch(self, kind, items):
+        # OnChainBatcher callback: one lockFundsBatch/commitBatch/reclaimBatch
+        # for all queued items; returns (tx_hash, error) per item. Priced
+        # against the most urgent item's deadline
+        params = {"gas": self.BATCH_GAS_BASE + self.BATCH_GAS_PER_ITEM[kind] * len(items)}
+        if kind == "lock":
+            fn = self.adapter.functions.lockFundsBatch([
+                (_tx_id32(it.transaction_id), Web3.to_checksum_address(it.recipient),
+                 it.amount, it.deadline)
+                for it in items
+            ])
+            params["value"] = sum(it.amount for it in items)
+            deadline = min(it.deadline for it in items)
+        else:
+            fn = self.adapter.functions[f"{kind}Batch"]([_tx_id32(tx) for tx in items])
+            deadlines = [self._lock_deadlines.pop(tx, None) for tx in items]
+            # reclaims are past their deadlines by definition
+            deadline = None if kind == "reclaim" else \
+                min((d for d in deadlines if d is not None), default=None)
+
+        receipt = self._transact(fn, params, deadline)
+        hash_hex = receipt.transactionHash.hex()
+        if receipt.status != 1:
+            logger.error(f"[{self.id}] {kind}Batch reverted on‐chain: tx={hash_hex}")
+            return [(hash_hex, f"{kind}Batch reverted")] * len(items)
+
+        # every item emits exactly one event, in item order: its usual
+        # Locked/Committed/Reclaimed on success, BatchItemFailed when skipped
+        events = sorted(
+            self.adapter.events[self.BATCH_OK_EVENT[kind]]().process_receipt(receipt, errors=DISCARD)
+            + self.adapter.events.BatchItemFailed().process_receipt(receipt, errors=DISCARD),
+            key=lambda ev: ev.logIndex,
+        )
+        results = [
+            (hash_hex, ev.args.reason if ev.event == "BatchItemFailed" else "")
+            for ev in events
+        ]
+        if kind == "lock":
+            for it, (_, err) in zip(items, results):
+                if not err:
+                    self._lock_deadlines[it.transaction_id] = it.deadline
+        ok = sum(not err for _, err in results)
+        logger.info(f"[{self.id}] {kind}Batch tx={hash_hex}: {ok}/{len(items)} ok")
+        return results
+
+
+def _tx_id32(transaction_id):
+    # hex tx ID, left-padded to the adapter's bytes32
+    raw = bytes.fromhex(transaction_id)
+    if len(raw) > 32:
+        raise ValueError(f"transaction id {transaction_id!r} is longer than 32 bytes")
+    return raw.rjust(32, b'\x00')
+
+
+def load_config(shard_id):
     base = Path(__file__).parent.parent
 
     # off‐chain RPC endpoints
@@ -188,10 +556,33 @@ def serve(shard_id, port):
     with open(base / 'config' / 'adapters.json') as f:
         adapter_cfg   = json.load(f)
     adapter_address = adapter_cfg[shard_id]
-
-    server = grpc.server(futures.ThreadPoolExecutor())
+    return rpc_url, adapter_address
+
+
+def open_store(shard_id, data_dir=None):
+    # one LogStore directory per shard under data_dir; in-memory without one
+    if data_dir is None:
+        return MemoryStore()
+    return LogStore(Path(data_dir) / shard_id)
+
+
+def serve(shard_id, port, data_dir=None, lock_policy=NO_WAIT, metrics_port=None,
+          trace_file=None):
+    rpc_url, adapter_address = load_config(shard_id)
+    if metrics_port is not None:
+        serve_metrics(metrics_port)
+    if trace_file is not None:
+        tracing.configure(trace_file)
+
+    # on-chain handlers park on a ReceiptTracker future rather than polling,
+    # so a waiting thread is cheap; size the pool so chain waits don't starve
+    # off-chain Prepare/Commit
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=64), options=SERVER_OPTIONS,
+                         interceptors=[ServerMetricsInterceptor(),
+                                       ServerTracingInterceptor(f"shard {shard_id}")])
     two_phase_pb2_grpc.add_ShardServicer_to_server(
-        Shard(shard_id, rpc_url, adapter_address), server
+        Shard(shard_id, rpc_url, adapter_address, store=open_store(shard_id, data_dir),
+              locks=KeyLocks(policy=lock_policy)), server
     )
     server.add_insecure_port(f'[::]:{port}')
     server.start()
@@ -203,5 +594,22 @@ if __name__ == '__main__':
     p = argparse.ArgumentParser()
     p.add_argument('--id', required=True)
     p.add_argument('--port', type=int, required=True)
+    p.add_argument('--aio', action='store_true',
+                   help='serve with the asyncio (grpc.aio) shard')
+    p.add_argument('--data-dir', default=None,
+                   help='keep shard state in a durable log + snapshots under this directory')
+    p.add_argument('--lock-policy', choices=POLICIES, default=NO_WAIT,
+                   help='on a key conflict at Prepare: vote ABORT at once, or let older txs wait')
+    p.add_argument('--metrics-port', type=int, default=None,
+                   help='serve Prometheus metrics on http://0.0.0.0:<port>/metrics')
+    p.add_argument('--trace-file', default=None,
+                   help='append trace spans to this file as JSON lines (scripts/critical_path.py)')
     args = p.parse_args()
-    serve(args.id, args.port)
+    if args.aio:
+        import asyncio
+        from shard.aio_shard import serve_aio
+        asyncio.run(serve_aio(args.id, args.port, args.data_dir, args.lock_policy,
+                              args.metrics_port, args.trace_file))
+    else:
+        serve(args.id, args.port, args.data_dir, args.lock_policy, args.metrics_port,
+              args.trace_file)
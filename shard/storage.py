@@ -0,0 +1,321 @@
+# shard/storage.py
+import os, json, mmap, struct, threading, logging, time, zlib
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from common.wal import encode_record, read_records, fsync_dir
+
+logger = logging.getLogger(__name__)
+
+# snapshot layout: header (magic, key count), then per key a (key length,
+# value length) pair and the key and value bytes, then the length-prefixed
+# JSON of prepared txs and deadlines, then a crc32 of everything before it
+_SNAP_MAGIC  = b"SHS1"
+_SNAP_HEADER = struct.Struct(">4sQ")
+_SNAP_ENTRY  = struct.Struct(">II")
+_U32         = struct.Struct(">I")
+# entries per write() while dumping a snapshot
+_SNAP_CHUNK  = 4096
+# state holds arbitrary bytes as surrogate-escaped str (see common/ops.py)
+_UTF8, _ESCAPE = "utf-8", "surrogateescape"
+
+class MemoryStore:
+    # default shard storage engine: committed state and staged write sets
+    # (key -> value, None for a delete) in plain dicts; nothing survives a
+    # restart. A durable engine subclasses it and overrides _log, keeping
+    # the same in-memory view.
+    durable = False     # whether prepare/commit block on disk
+
+    def __init__(self):
+        self.state: Dict[str, str] = {}
+        self.prepared: Dict[str, Dict[str, Optional[str]]] = {}
+        # prepare-time deadlines, so a restarted shard can re-arm them
+        self.deadlines: Dict[str, int] = {}
+        # handlers for different txs apply records concurrently
+        self._apply_lock = threading.Lock()
+
+    def prepare(self, tx_id: str, writes: Dict[str, Optional[str]],
+                deadline: Optional[int] = None, wait: bool = True) -> Optional[Future]:
+        # returns once the vote is safe to send (durable, for LogStore); with
+        # wait=False, returns a Future for that instead, so a caller can
+        # queue many records and wait for one group fsync
+        record = {"op": "prepare", "tx": tx_id, "writes": writes, "deadline": deadline}
+        return self._wait(self._log(record, True), wait)
+
+    def commit(self, tx_id: str, wait: bool = True) -> Optional[Future]:
+        # applies the write set staged at prepare; `wait` as for prepare
+        return self._wait(self._log({"op": "commit", "tx": tx_id}, True), wait)
+
+    def abort(self, tx_id: str):
+        # not forced to disk: a lost abort just leaves a prepared tx that
+        # the coordinator or the deadline sweeper aborts again
+        self._log({"op": "abort", "tx": tx_id}, False)
+
+    def close(self):
+        pass
+
+    def _log(self, record: dict, durable: bool) -> Future:
+        # applies the record; the Future resolves once it is durable
+        with self._apply_lock:
+            self._apply(record)
+        done = Future()
+        done.set_result(None)
+        return done
+
+    @staticmethod
+    def _wait(fut: Future, wait: bool) -> Optional[Future]:
+        if not wait:
+            return fut
+        fut.result()
+        return None
+
+    def _apply(self, record: dict):
+        op, tx = record["op"], record["tx"]
+        if op == "prepare":
+            self.prepared[tx] = record["writes"]
+            if record["deadline"] is not None:
+                self.deadlines[tx] = record["deadline"]
+            return
+        writes = self.prepared.pop(tx, None)
+        self.deadlines.pop(tx, None)
+        if op == "commit" and writes:
+            state = self.state
+            for key, value in writes.items():
+                if value is None:
+                    state.pop(key, None)
+                else:
+                    state[key] = value
+
+
+class LogStore(MemoryStore):
+    # durable, log-structured engine. Each prepare/commit/abort is applied in
+    # memory and appended to a checksummed log (common/wal.py framing); one
+    # flusher thread writes and fsyncs everything queued since its last pass,
+    # so concurrent Prepare/Commit handlers share a disk flush. When a
+    # segment reaches `segment_bytes` the flusher starts the next one and
+    # hands a copy of the state to a background compactor, which writes it
+    # as a binary snapshot and deletes the segments it supersedes. Recovery
+    # memory-maps the newest snapshot and replays only the log after it.
+    durable = True
+
+    def __init__(self, directory, segment_bytes: int = 64 << 20):
+        super().__init__()
+        self.dir = Path(directory)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = segment_bytes
+
+        self._queue: List[Tuple[dict, Optional[Future]]] = []
+        self._cond = threading.Condition()
+        self._closed = False
+        # latest pending (seq, state, meta) snapshot; newer ones replace it
+        self._compact_job = None
+        self._compact_cond = threading.Condition()
+
+        replayed = self._recover()
+        self._flusher = threading.Thread(target=self._flush_loop, name="store-flusher", daemon=True)
+        self._compactor = threading.Thread(target=self._compact_loop, name="store-compactor", daemon=True)
+        self._flusher.start()
+        self._compactor.start()
+        if replayed >= segment_bytes:
+            # a long replayed tail: fold it into a snapshot for the next start
+            with self._cond:
+                self._schedule_snapshot(self._seq)
+
+    def segments(self) -> List[Path]:
+        return sorted(self.dir.glob("log-*.log"))
+
+    def snapshots(self) -> List[Path]:
+        return sorted(self.dir.glob("snap-*.snap"))
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._flusher.join()
+        with self._compact_cond:
+            self._compact_cond.notify()
+        self._compactor.join()
+        self._file.close()
+
+    # --- write path ---
+
+    def _log(self, record: dict, durable: bool) -> Future:
+        fut = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("shard store is closed")
+            # applied under the queue lock, so memory order is log order
+            self._apply(record)
+            self._queue.append((record, fut if durable else None))
+            self._cond.notify()
+        if not durable:
+            fut.set_result(None)
+        return fut
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                batch, self._queue = self._queue, []
+                # the state now reflects exactly what this batch ends with
+                rotate = self._file.tell() >= self.segment_bytes
+                if rotate:
+                    self._schedule_snapshot(self._seq + 1)
+            try:
+                self._file.write(b"".join(encode_record(r) for r, _ in batch))
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                if rotate:
+                    self._file.close()
+                    self._seq += 1
+                    self._open_segment()
+            except Exception as e:
+                logger.exception(f"[Store] flush of {len(batch)} record(s) failed")
+                for _, fut in batch:
+                    if fut is not None:
+                        fut.set_exception(e)
+                continue
+            for _, fut in batch:
+                if fut is not None:
+                    fut.set_result(None)
+
+    def _open_segment(self):
+        self._file = open(self.dir / f"log-{self._seq:08d}.log", "ab")
+        fsync_dir(self.dir)
+
+    # --- snapshots & compaction ---
+
+    def _schedule_snapshot(self, seq: int):
+        # caller holds self._cond; the copy is the only work done under it
+        meta = {"prepared": dict(self.prepared), "deadlines": dict(self.deadlines)}
+        with self._compact_cond:
+            self._compact_job = (seq, dict(self.state), meta)
+            self._compact_cond.notify()
+
+    def _compact_loop(self):
+        while True:
+            with self._compact_cond:
+                while self._compact_job is None and not self._closed:
+                    self._compact_cond.wait()
+                job, self._compact_job = self._compact_job, None
+            if job is None:
+                return
+            try:
+                self._write_snapshot(*job)
+            except Exception:
+                logger.exception(f"[Store] snapshot {job[0]} failed; keeping the log")
+
+    def _write_snapshot(self, seq: int, state: Dict[str, str], meta: dict):
+        # snap-N holds the state after every segment below N
+        started = time.monotonic()
+        tmp = self.dir / f"snap-{seq:08d}.tmp"
+        crc = 0
+        with open(tmp, "wb") as f:
+            def put(data: bytes):
+                nonlocal crc
+                crc = zlib.crc32(data, crc)
+                f.write(data)
+
+            put(_SNAP_HEADER.pack(_SNAP_MAGIC, len(state)))
+            chunk = []
+            for key, value in state.items():
+                k, v = key.encode(_UTF8, _ESCAPE), value.encode(_UTF8, _ESCAPE)
+                chunk += (_SNAP_ENTRY.pack(len(k), len(v)), k, v)
+                if len(chunk) >= 3 * _SNAP_CHUNK:
+                    put(b"".join(chunk))
+                    chunk = []
+            put(b"".join(chunk))
+            tail = json.dumps(meta, separators=(",", ":")).encode()
+            put(_U32.pack(len(tail)) + tail)
+            f.write(_U32.pack(crc))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.dir / f"snap-{seq:08d}.snap")
+        fsync_dir(self.dir)
+
+        for path in self.segments() + self.snapshots():
+            if _seq_of(path) < seq:
+                path.unlink()
+        logger.info(f"[Store] snapshot {seq}: {len(state)} key(s) in "
+                    f"{time.monotonic() - started:.2f}s")
+
+    def _load_snapshot(self, path: Path):
+        # parses straight out of the mapped file, without reading it into a
+        # bytes object first; raises ValueError if it is not a whole snapshot
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            end = len(m) - _U32.size
+            if end < _SNAP_HEADER.size:
+                raise ValueError(f"{path.name}: truncated")
+            with memoryview(m) as view, view[:end] as body:
+                crc = zlib.crc32(body)
+            if crc != _U32.unpack_from(m, end)[0]:
+                raise ValueError(f"{path.name}: bad checksum")
+            magic, count = _SNAP_HEADER.unpack_from(m, 0)
+            if magic != _SNAP_MAGIC:
+                raise ValueError(f"{path.name}: not a shard snapshot")
+            state, offset = {}, _SNAP_HEADER.size
+            for _ in range(count):
+                klen, vlen = _SNAP_ENTRY.unpack_from(m, offset)
+                offset += _SNAP_ENTRY.size
+                key = m[offset:offset + klen].decode(_UTF8, _ESCAPE)
+                offset += klen
+                state[key] = m[offset:offset + vlen].decode(_UTF8, _ESCAPE)
+                offset += vlen
+            (tail_len,) = _U32.unpack_from(m, offset)
+            offset += _U32.size
+            meta = json.loads(m[offset:offset + tail_len])
+        self.state = state
+        self.prepared = meta["prepared"]
+        self.deadlines = {tx: int(d) for tx, d in meta["deadlines"].items()}
+
+    # --- recovery ---
+
+    def _recover(self) -> int:
+        # returns the number of log bytes replayed on top of the snapshot
+        for tmp in self.dir.glob("snap-*.tmp"):
+            tmp.unlink()
+        base = 0
+        for path in reversed(self.snapshots()):
+            try:
+                self._load_snapshot(path)
+            except (ValueError, struct.error) as e:
+                logger.warning(f"[Store] skipping snapshot: {e}")
+                continue
+            base = _seq_of(path)
+            break
+
+        segments = []
+        for path in self.segments():
+            if _seq_of(path) < base:
+                path.unlink()   # compacted, but not yet deleted
+            else:
+                segments.append(path)
+
+        replayed = 0
+        for i, path in enumerate(segments):
+            good_end = 0
+            for good_end, record in read_records(path):
+                self._apply(record)
+            replayed += good_end
+            if good_end < path.stat().st_size:
+                logger.warning(f"[Store] {path.name}: dropping torn tail after byte {good_end}")
+                os.truncate(path, good_end)
+                for later in segments[i + 1:]:
+                    logger.warning(f"[Store] {later.name}: dropped, follows a torn segment")
+                    later.unlink()
+                segments = segments[:i + 1]
+                break
+
+        self._seq = _seq_of(segments[-1]) + 1 if segments else base
+        logger.info(f"[Store] recovered {len(self.state)} key(s), {len(self.prepared)} "
+                    f"prepared tx(s) from snapshot {base} + {len(segments)} segment(s)")
+        self._open_segment()
+        return replayed
+
+
+def _seq_of(path: Path) -> int:
+    return int(path.stem.split("-")[1])
@@ -4,7 +4,10 @@ import os, sys
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 import pytest
+from eth_account import Account
 import common.lightclient as lc
+import common.block_oracle as bo
+from common.chain_backend import ChainBackend
 
 # --- stub out Web3 / LightClient so no real RPCs happen in unit tests ---
 
@@ -13,9 +16,12 @@ class DummyW3:
         def __init__(self):
             self.chain_id = 1337
             self.default_account = None
+            self.account = Account
         def account_from_key(self, k):
             return type("A", (), {"address": "0x0000000000000000000000000000000000000000"})()
-        def get_transaction_count(self, addr):
+        def contract(self, address=None, abi=None):
+            return type("C", (), {"address": address, "abi": abi})()
+        def get_transaction_count(self, addr, block_identifier=None):
             return 0
         def send_raw_transaction(self, tx):
             return b"\x00"*32
@@ -31,12 +37,35 @@ class DummyLightClient:
     def __init__(self, rpc_url=""):
         self._height = 100
         self.w3 = DummyW3()
+        self.backend = ChainBackend(self.w3)
     def get_block_height(self):
         return self._height
     def is_connected(self):
         return True
 
+RealLightClient = lc.LightClient
+
 @pytest.fixture(autouse=True)
 def patch_lightclient(monkeypatch):
     # everywhere that does `from common.lightclient import LightClient` now gets DummyLightClient
     monkeypatch.setattr(lc, "LightClient", DummyLightClient)
+
+@pytest.fixture
+def real_lightclient(monkeypatch):
+    # undoes patch_lightclient, for tests against a simulated chain ("sim://...")
+    monkeypatch.setattr(lc, "LightClient", RealLightClient)
+
+@pytest.fixture(autouse=True)
+def fresh_block_oracles():
+    # shared oracles are process-wide; don't leak dummy clients across tests
+    bo.clear_oracles()
+    yield
+    bo.clear_oracles()
+
+# throwaway key so Shard(...) can build its signing account in tests
+TEST_KEY = "0x" + "11" * 32
+
+@pytest.fixture(autouse=True)
+def shard_keys(monkeypatch):
+    for sid in ("shard1", "shard2", "shard3", "id"):
+        monkeypatch.setenv(f"{sid.upper()}_KEY", TEST_KEY)
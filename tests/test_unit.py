@@ -6,6 +6,7 @@ from common.timeout_manager import TimeoutManager
 from shard.shard_node       import Shard
 from coordinator.coordinator import Coordinator
 from mcp2pc                  import two_phase_pb2
+from common.fee_engine       import GWEI
 
 # --- Phase A core tests ---------------------------------------------------
 
@@ -38,16 +39,47 @@ def test_shard_prepare_timeout():
     resp2 = shard.Prepare(req, context=None)
     assert resp2.status == two_phase_pb2.PrepareResponse.ABORT
 
+def test_shard_prepare_after_sweep_still_aborts():
+    from common.block_oracle import get_oracle
+    shard = Shard("shard1", rpc_url="dummy", adapter_address="0x0")
+    PrepareReq = namedtuple("PR", ["transaction_id", "operations", "timeout_blocks"])
+    req = PrepareReq("tx1", ["SET a 1"], 2)
+    assert shard.Prepare(req, None).status == two_phase_pb2.PrepareResponse.READY
+
+    oracle = get_oracle("dummy")
+    oracle.client._height = 200
+    oracle.refresh()    # sweeper expires tx1 and drops its deadline
+    assert "tx1" not in shard.prepared and "tx1" not in shard.timeout_mgr.deadlines
+
+    resp = shard.Prepare(req, None)
+    assert resp.status == two_phase_pb2.PrepareResponse.ABORT
+    assert "tx1" not in shard.prepared
+
+def test_shard_prepare_after_its_abort_votes_abort():
+    shard = Shard("shard1", rpc_url="dummy", adapter_address="0x0")
+    # the coordinator's early Abort overtook this Prepare
+    shard.Abort(two_phase_pb2.AbortRequest(transaction_id="late"), None)
+    resp = shard.Prepare(two_phase_pb2.PrepareRequest(
+        transaction_id="late", timeout_blocks=5, operations=["SET a 1"]), None)
+    assert resp.status == two_phase_pb2.PrepareResponse.ABORT
+    assert "late" not in shard.prepared and shard.locks.holder("a") is None
+
 def test_shard_commit_and_rollback():
     shard = Shard("shard1", rpc_url="dummy", adapter_address="0x0")
     tx = "txc"
-    shard.prepared[tx] = ["SET x 10", "BAD_OP"]
+    PrepReq = namedtuple("PrepReq", ["transaction_id", "operations", "timeout_blocks"])
     Req = namedtuple("R", ["transaction_id"])
 
+    # malformed ops are rejected at Prepare, not dropped at Commit
+    resp = shard.Prepare(PrepReq(tx, ["SET x 10", "BAD_OP"], 5), context=None)
+    assert resp.status == two_phase_pb2.PrepareResponse.ABORT and "BAD_OP" in resp.error
+    assert tx not in shard.prepared
+
+    shard.Prepare(PrepReq(tx, ["SET x 10"], 5), context=None)
     shard.Commit(Req(tx), context=None)
     assert shard.state.get("x") == "10"
 
-    shard.prepared["tx_abort"] = ["SET y 20"]
+    shard.prepared["tx_abort"] = {"y": "20"}
     shard.Abort(Req("tx_abort"), context=None)
     assert "tx_abort" not in shard.prepared
 
@@ -101,7 +133,7 @@ def test_coordinator_abort_path():
             return [two_phase_pb2.PrepareResponse(status=two_phase_pb2.PrepareResponse.ABORT,
                                                  shard_id="x")]
         def Commit(self, *a,**kw): pass
-        def Rollback(self, req, *a,**kw):
+        def Abort(self, req, *a,**kw):
             self.rolled = True
 
     class ReadyStub(AbortStub):
@@ -163,7 +195,7 @@ def test_coordinator_idempotence_commit_and_abort():
             return [two_phase_pb2.PrepareResponse(status=two_phase_pb2.PrepareResponse.READY,
                                                  shard_id="s")]
         def Commit(self, req, *a,**kw): self.commits += 1
-        def Rollback(self, req, *a,**kw): self.rolls   += 1
+        def Abort(self, req, *a,**kw):  self.rolls   += 1
 
     adapter_cfg = {"s":"0x0"}
     coord = Coordinator({"s":"p"}, {"s":"u"}, adapter_cfg, default_timeout_blocks=0)
@@ -177,10 +209,1939 @@ def test_coordinator_idempotence_commit_and_abort():
 
     CommitReq = namedtuple("CommitReq", ["transaction_id"])
     coord.Commit(CommitReq("x"), None)
-    coord.Commit(CommitReq("x"), None)
-    assert coord.shard_stubs["s"].commits == 2
+    # a settled tx is forgotten, so a repeated Commit is refused rather than
+    # re-locking funds on-chain; shards never see it twice
+    with pytest.raises(RuntimeError, match="No metadata"):
+        coord.Commit(CommitReq("x"), None)
+    assert coord.shard_stubs["s"].commits == 1
 
     AbortReq = namedtuple("AbortReq", ["transaction_id"])
     coord.Abort(AbortReq("x"), None)
     coord.Abort(AbortReq("x"), None)
     assert coord.shard_stubs["s"].rolls == 2
+
+# --- Parallel fan-out tests ------------------------------------------------
+
+def _make_coordinator(monkeypatch, sids, **kw):
+    return Coordinator({s: "addr" for s in sids}, {s: "u" for s in sids},
+                       {s: "0x0" for s in sids}, default_timeout_blocks=5, **kw)
+
+def test_coordinator_commit_phases_run_in_parallel(monkeypatch):
+    import time
+
+    class SlowStub:
+        def __init__(self): self.calls = []
+        def Prepare(self, req, *a, **kw):
+            return two_phase_pb2.PrepareResponse(status=two_phase_pb2.PrepareResponse.READY,
+                                                 shard_id="s")
+        def _slow(self, name, kw):
+            assert "timeout" in kw
+            time.sleep(0.2)
+            self.calls.append(name)
+            return two_phase_pb2.TxHash(hash="0x1")
+        def LockOnChain(self, req, *a, **kw):   return self._slow("lock", kw)
+        def Commit(self, req, *a, **kw):        return self._slow("commit", kw)
+        def CommitOnChain(self, req, *a, **kw): return self._slow("commit_onchain", kw)
+
+    sids = ["a", "b", "c", "d"]
+    coord = _make_coordinator(monkeypatch, sids)
+    coord.shard_stubs = coord.chain_stubs_onchain = {s: SlowStub() for s in sids}
+
+    PrepReq = namedtuple("PrepReq",
+                         ["transaction_id","operations","timeout_blocks",
+                          "onchain_recipient","onchain_amount"])
+    list(coord.Prepare(PrepReq("ab", [], 0, "0x0", 1), context=None))
+
+    t0 = time.monotonic()
+    coord.Commit(namedtuple("CommitReq", ["transaction_id"])("ab"), None)
+    elapsed = time.monotonic() - t0
+
+    # three phases of 0.2s each, regardless of shard count
+    assert elapsed < 0.2 * 3 + 0.3
+    for stub in coord.shard_stubs.values():
+        # barrier: every shard finishes a phase before the next one starts
+        assert stub.calls == ["lock", "commit", "commit_onchain"]
+
+def test_coordinator_prepare_times_out_slow_shard(monkeypatch):
+    import threading
+    release = threading.Event()
+
+    class HungStub:
+        def Prepare(self, req, *a, **kw):
+            release.wait(5)
+            return two_phase_pb2.PrepareResponse(status=two_phase_pb2.PrepareResponse.READY,
+                                                 shard_id="hung")
+
+    class ReadyStub:
+        def Prepare(self, req, *a, **kw):
+            return two_phase_pb2.PrepareResponse(status=two_phase_pb2.PrepareResponse.READY,
+                                                 shard_id="ok")
+
+    coord = _make_coordinator(monkeypatch, ["hung", "ok"])
+    coord.PREPARE_TIMEOUT = 0.2
+    coord.shard_stubs = {"hung": HungStub(), "ok": ReadyStub()}
+
+    PrepReq = namedtuple("PrepReq",
+                         ["transaction_id","operations","timeout_blocks",
+                          "onchain_recipient","onchain_amount"])
+    votes = {v.shard_id: v.status for v in coord.Prepare(PrepReq("cd", [], 0, "0x0", 0), None)}
+    release.set()
+    assert votes == {"hung": two_phase_pb2.PrepareResponse.ABORT,
+                     "ok":   two_phase_pb2.PrepareResponse.READY}
+
+def test_coordinator_streams_votes_and_aborts_on_the_first_no(monkeypatch):
+    import threading, time
+    release = threading.Event()
+
+    class Stub:
+        def __init__(self, status, wait=False):
+            self.status, self.wait, self.aborted = status, wait, []
+        def Prepare(self, req, *a, **kw):
+            if self.wait:
+                release.wait(5)
+            return two_phase_pb2.PrepareResponse(status=self.status, shard_id="s")
+        def Abort(self, req, *a, **kw): self.aborted.append(req.transaction_id)
+
+    R, A = two_phase_pb2.PrepareResponse.READY, two_phase_pb2.PrepareResponse.ABORT
+    coord = _make_coordinator(monkeypatch, ["yes", "no", "slow"])
+    coord.shard_stubs = {"yes": Stub(R), "no": Stub(A), "slow": Stub(R, wait=True)}
+
+    started = time.monotonic()
+    votes = [v.status for v in coord.Prepare(two_phase_pb2.PrepareRequest(transaction_id="t"), None)]
+    elapsed = time.monotonic() - started
+    release.set()
+    coord.executor.shutdown(wait=True)
+
+    # the stream ends on the NO vote, long before the slow shard answers
+    assert votes[-1] == A and len(votes) <= 2 and elapsed < 1
+    assert coord.shard_stubs["yes"].aborted == coord.shard_stubs["slow"].aborted == ["t"]
+    assert coord.shard_stubs["no"].aborted == []
+    with pytest.raises(RuntimeError, match="already aborted"):
+        coord._claim("t")
+    # the client's own Abort finds the tx already aborted
+    coord.Abort(two_phase_pb2.AbortRequest(transaction_id="t"), None)
+    assert coord.shard_stubs["yes"].aborted == ["t"] and coord.tx_meta == {}
+
+def test_coordinator_prepare_carries_a_grpc_deadline(monkeypatch):
+    import threading, time
+    from concurrent import futures
+    from mcp2pc import two_phase_pb2_grpc
+
+    release = threading.Event()
+    remaining = []
+
+    class HungShard(two_phase_pb2_grpc.ShardServicer):
+        def Prepare(self, req, context):
+            remaining.append(context.time_remaining())
+            release.wait(5)
+            return two_phase_pb2.PrepareResponse(status=two_phase_pb2.PrepareResponse.READY)
+
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=2))
+    two_phase_pb2_grpc.add_ShardServicer_to_server(HungShard(), server)
+    port = server.add_insecure_port("localhost:0")
+    server.start()
+    try:
+        coord = _make_coordinator(monkeypatch, ["a"])
+        coord.PREPARE_TIMEOUT = 0.2
+        coord.shard_stubs = {"a": two_phase_pb2_grpc.ShardStub(
+            grpc.insecure_channel(f"localhost:{port}"))}
+        started = time.monotonic()
+        votes = list(coord.Prepare(two_phase_pb2.PrepareRequest(transaction_id="t"), None))
+        elapsed = time.monotonic() - started
+    finally:
+        release.set()
+        server.stop(None)
+
+    assert elapsed < 2 and remaining[0] <= 0.2
+    assert votes[0].status == two_phase_pb2.PrepareResponse.ABORT
+
+def test_coordinator_fan_out_budget_starts_when_call_runs(monkeypatch):
+    import time
+
+    class SlowStub:
+        def __init__(self): self.committed = []
+        def Commit(self, req, *a, **kw):
+            time.sleep(0.3)
+            self.committed.append(req.transaction_id)
+
+    sids = ["a", "b", "c"]
+    # one worker: b and c queue behind a for longer than the phase budget
+    coord = _make_coordinator(monkeypatch, sids, fanout_workers=1)
+    stubs = {s: SlowStub() for s in sids}
+
+    def commit(sid, stub):
+        return stub.Commit(two_phase_pb2.CommitRequest(transaction_id="t"), timeout=0.5)
+
+    results = coord._fan_out(stubs, commit, 0.5)
+    assert all(err is None for _, err in results.values())
+    for stub in stubs.values():
+        assert stub.committed == ["t"]
+
+# --- Block-height oracle tests ---------------------------------------------
+
+def test_block_oracle_dedupes_and_caches():
+    from common.block_oracle import get_oracle
+    o1 = get_oracle("http://rpc", max_staleness=60)
+    assert get_oracle("http://rpc") is o1
+    assert get_oracle("http://other") is not o1
+
+    calls = []
+    real = o1.client.get_block_height
+    o1.client.get_block_height = lambda: calls.append(1) or real()
+    assert o1.get_block_height() == 100
+    o1.client._height = 101
+    # within the staleness bound: served from cache, no extra RPC
+    assert o1.get_block_height() == 100
+    assert len(calls) == 1
+    assert o1.refresh() == 101
+
+def test_block_oracle_pushes_and_waits():
+    import threading
+    from common.block_oracle import get_oracle
+    oracle = get_oracle("http://rpc", max_staleness=0, poll_interval=0.01)
+    seen = []
+    unsubscribe = oracle.subscribe(seen.append)
+
+    def mine():
+        for h in range(101, 106):
+            oracle.client._height = h
+            threading.Event().wait(0.02)
+    threading.Thread(target=mine).start()
+
+    assert oracle.wait_for_height(105, timeout=2) >= 105
+    unsubscribe()
+    assert seen and seen == sorted(seen) and seen[-1] >= 105
+    with pytest.raises(TimeoutError):
+        oracle.wait_for_height(10_000, timeout=0.05)
+
+def test_block_oracle_runs_subscribers_only_on_poller():
+    import threading
+    from common.block_oracle import get_oracle
+    oracle = get_oracle("http://rpc", max_staleness=0, poll_interval=60)
+    ran = []
+    got = threading.Event()
+    def cb(height):
+        # a subscriber reading the (stale) height must not deadlock
+        ran.append((threading.current_thread().name, height, oracle.get_block_height()))
+        got.set()
+    oracle.subscribe(cb)
+
+    oracle.client._height = 101
+    assert oracle.get_block_height() == 101   # stale cache: fetched here
+    assert got.wait(2)
+    assert ran[0][:2] == ("block-oracle", 101)
+
+def test_coordinator_shares_one_oracle_per_rpc(monkeypatch):
+    coord = _make_coordinator(monkeypatch, ["a", "b", "c"])
+    clients = {id(tm.client) for tm in coord.timeout_mgrs.values()}
+    assert len(clients) == 1
+
+# --- Deadline sweeper tests ------------------------------------------------
+
+def test_timeout_manager_pops_expired_in_deadline_order():
+    from common.lightclient import LightClient
+    client = LightClient("dummy")
+    tm = TimeoutManager(client)
+    tm.start("late", timeout_blocks=10)
+    tm.start("early", timeout_blocks=2)
+    tm.start("done", timeout_blocks=1)
+    tm.complete("done")
+
+    assert tm.pop_expired(103) == ["early"]
+    assert tm.pop_expired(200) == ["late"]
+    assert tm.deadlines == {}
+    assert tm.pop_expired(500) == []
+
+def test_timeout_manager_memory_stays_flat():
+    from common.lightclient import LightClient
+    tm = TimeoutManager(LightClient("dummy"))
+    for i in range(10_000):
+        tm.start(f"tx{i}", timeout_blocks=5)
+        tm.complete(f"tx{i}")
+    assert tm.deadlines == {}
+    assert len(tm._heap) <= 64 + 1
+
+def test_timeout_manager_sweeper_hands_batch_to_callback():
+    from common.block_oracle import get_oracle
+    oracle = get_oracle("http://rpc", max_staleness=0)
+    batches = []
+    tm = TimeoutManager(oracle, on_expired=batches.append)
+    tm.start("a", 1); tm.start("b", 1); tm.start("c", 50)
+
+    oracle.client._height = 102
+    oracle.refresh()   # publishes the new head to subscribers
+    assert batches == [["a", "b"]]
+    assert set(tm.deadlines) == {"c"}
+
+def test_coordinator_sweeper_aborts_undecided_in_bulk(monkeypatch):
+    class Stub:
+        def __init__(self): self.aborted = []
+        def Prepare(self, req, *a, **kw):
+            return two_phase_pb2.PrepareResponse(status=two_phase_pb2.PrepareResponse.READY,
+                                                 shard_id="s")
+        def Abort(self, req, *a, **kw): self.aborted.append(req.transaction_id)
+
+    coord = _make_coordinator(monkeypatch, ["a", "b"])
+    coord.shard_stubs = coord.chain_stubs_onchain = {"a": Stub(), "b": Stub()}
+    PrepReq = namedtuple("PrepReq",
+                         ["transaction_id","operations","timeout_blocks",
+                          "onchain_recipient","onchain_amount"])
+    for tx in ("t1", "t2"):
+        list(coord.Prepare(PrepReq(tx, [], 3, "0x0", 1), None))
+
+    tm = coord.timeout_mgrs["a"]
+    tm.client.client._height = 200
+    tm.client.refresh()
+    coord.sweep_executor.shutdown(wait=True)
+
+    assert coord.tx_meta == {}
+    assert all(not m.deadlines for m in coord.timeout_mgrs.values())
+    for stub in coord.shard_stubs.values():
+        assert sorted(stub.aborted) == ["t1", "t2"]
+
+# --- Nonce allocation tests ------------------------------------------------
+
+class _CountingEth:
+    def __init__(self, pending=7):
+        self.pending = pending
+        self.reads = 0
+    def get_transaction_count(self, addr, block_identifier=None):
+        self.reads += 1
+        return self.pending
+
+def test_nonce_manager_concurrent_allocations_are_unique():
+    import threading
+    from common.chain_backend import ChainBackend
+    from common.nonce_manager import NonceManager
+    w3 = type("W3", (), {"eth": _CountingEth(pending=7)})()
+    nm = NonceManager(ChainBackend(w3), "0xabc")
+
+    got, lock = [], threading.Lock()
+    def worker():
+        for _ in range(50):
+            n = nm.allocate()
+            with lock: got.append(n)
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+
+    assert sorted(got) == list(range(7, 7 + 400))
+    assert w3.eth.reads == 1
+
+def test_nonce_manager_fills_gaps_and_resyncs():
+    from common.chain_backend import ChainBackend
+    from common.nonce_manager import NonceManager
+    w3 = type("W3", (), {"eth": _CountingEth(pending=0)})()
+    nm = NonceManager(ChainBackend(w3), "0xabc")
+    a, b, c = nm.allocate(), nm.allocate(), nm.allocate()
+    nm.confirm(a); nm.confirm(c)
+    nm.release(b)                     # send of b failed: gap at 1
+    assert nm.allocate() == 1
+    assert nm.allocate() == 3
+
+    # another process used nonces up to 9
+    w3.eth.pending = 10
+    nm.resync()
+    assert nm.allocate() == 10
+
+def test_shard_sign_and_send_resyncs_on_nonce_too_low():
+    shard = Shard("shard1", rpc_url="dummy", adapter_address="0x0")
+    eth = shard.w3.eth
+    sent = []
+    def send(raw):
+        if not sent:
+            sent.append("rejected")
+            eth.get_transaction_count = lambda addr, block_identifier=None: 5
+            raise ValueError({"code": -32000, "message": "nonce too low"})
+        sent.append(raw)
+        return b"\x01" * 32
+    eth.send_raw_transaction = send
+
+    tx = {"to": "0x" + "22" * 20, "value": 0, "gas": 21000, "gasPrice": 1}
+    assert shard._sign_and_send(dict(tx)) == b"\x01" * 32
+    assert shard.nonces.allocate() == 6
+
+# --- Receipt tracker tests -------------------------------------------------
+
+def test_receipt_tracker_batches_per_block():
+    from common.block_oracle import get_oracle
+    from common.chain_backend import ChainBackend
+    from common.receipt_tracker import ReceiptTracker
+
+    mined = {}
+    batches = []
+    class Provider:
+        def make_batch_request(self, reqs):
+            batches.append(len(reqs))
+            return [{"jsonrpc": "2.0", "id": i, "result": mined.get(params[0])}
+                    for i, (_, params) in enumerate(reqs)]
+
+    def raw_receipt(h):
+        return {"transactionHash": h, "status": "0x1", "blockNumber": "0x65", "logs": []}
+
+    oracle = get_oracle("http://rpc", max_staleness=0)
+    w3 = type("W3", (), {"provider": Provider()})()
+    tracker = ReceiptTracker(ChainBackend(w3), oracle)
+
+    hashes = [bytes([i]) * 32 for i in (1, 2, 3)]
+    futs = [tracker.track(h) for h in hashes]
+    for h in hashes[:2]:
+        mined["0x" + h.hex()] = raw_receipt("0x" + h.hex())
+
+    oracle.client._height = 101
+    oracle.refresh()
+    assert batches == [3]
+    assert futs[0].result(0).status == 1 and futs[1].done() and not futs[2].done()
+
+    mined["0x" + hashes[2].hex()] = raw_receipt("0x" + hashes[2].hex())
+    oracle.client._height = 102
+    oracle.refresh()
+    assert batches == [3, 1]
+    assert futs[2].result(0).transactionHash == hashes[2]
+    assert tracker.pending_count() == 0
+
+def test_receipt_tracker_batches_on_a_provider_of_its_own():
+    # HTTPProvider is "batching" for the length of make_batch_request, which
+    # would turn other threads' calls on the same provider into batch entries
+    from common.chain_backend import HTTPBackend
+
+    chain = HTTPBackend("http://rpc:8545")
+    assert chain._batch_provider is not chain.w3.provider
+    assert chain._batch_provider.endpoint_uri == "http://rpc:8545"
+
+# --- On-chain batching tests -----------------------------------------------
+
+def test_onchain_batcher_flushes_each_kind_once_per_block():
+    from common.block_oracle import get_oracle
+    from common.onchain_batcher import OnChainBatcher
+
+    flushed = []
+    def flush(kind, items):
+        flushed.append((kind, list(items)))
+        return [("0xb", "" if item != "bad" else "Not pending") for item in items]
+
+    oracle = get_oracle("http://rpc", max_staleness=0)
+    batcher = OnChainBatcher(oracle, flush, max_batch=2)
+    futs = [batcher.submit("commit", t) for t in ("a", "bad", "c")]
+    futs.append(batcher.submit("reclaim", "d"))
+    assert flushed == [] and batcher.pending_count() == 4
+
+    oracle.client._height = 101
+    oracle.refresh()
+    results = [f.result(1) for f in futs]
+    assert results == [("0xb", ""), ("0xb", "Not pending"), ("0xb", ""), ("0xb", "")]
+    assert sorted(flushed) == [("commit", ["a", "bad"]), ("commit", ["c"]), ("reclaim", ["d"])]
+    assert batcher.pending_count() == 0
+    batcher.close()
+
+def test_shard_batch_rpc_reports_per_item_results():
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from common.block_oracle import get_oracle
+
+    shard = Shard("shard1", rpc_url="dummy", adapter_address="0x0")
+    calls = []
+    def flush(kind, items):
+        calls.append(kind)
+        return [("0xb", "TX exists" if it.transaction_id == "02" else "") for it in items]
+    shard.onchain._flush = flush
+
+    items = [two_phase_pb2.LockRequest(transaction_id=t, recipient="0x" + "22" * 20,
+                                       amount=1, deadline=200) for t in ("01", "02")]
+    with ThreadPoolExecutor(1) as ex:
+        resp = ex.submit(shard.LockOnChainBatch, two_phase_pb2.LockBatchRequest(items=items), None)
+        while shard.onchain.pending_count() < 2:
+            time.sleep(0.01)
+        oracle = get_oracle("dummy")
+        oracle.client._height = 101
+        oracle.refresh()
+        results = resp.result(1).results
+
+    # both items went out in one lockFundsBatch; only the failed one is marked
+    assert calls == ["lock"]
+    assert [(r.transaction_id, r.ok, r.error) for r in results] == \
+        [("01", True, ""), ("02", False, "TX exists")]
+
+# --- Group commit tests ----------------------------------------------------
+
+def test_group_window_flushes_on_size_and_on_timer():
+    import time
+    from common.group_window import GroupWindow
+
+    groups = []
+    def flush(items):
+        groups.append(list(items))
+        return [i * 10 for i in items]
+
+    gw = GroupWindow(flush, window=0.1, max_size=3)
+    full = [gw.submit(i) for i in (1, 2, 3)]      # hits max_size: flushed at once
+    assert [f.result(0.05) for f in full] == [10, 20, 30]
+
+    t0 = time.monotonic()
+    late = [gw.submit(i) for i in (4, 5)]         # waits out the window
+    assert [f.result(1) for f in late] == [40, 50]
+    assert time.monotonic() - t0 >= 0.1
+    assert groups == [[1, 2, 3], [4, 5]]
+    gw.close()
+
+def test_coordinator_group_commit_sends_one_batch_per_shard(monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    class BatchStub:
+        def __init__(self): self.calls = []
+        def PrepareBatch(self, req, *a, **kw):
+            self.calls.append(("prepare", len(req.requests)))
+            return two_phase_pb2.PrepareBatchResponse(responses=[
+                two_phase_pb2.PrepareResponse(status=two_phase_pb2.PrepareResponse.READY,
+                                              shard_id="s")
+                for _ in req.requests])
+        def _onchain(self, name, tx_ids):
+            self.calls.append((name, len(tx_ids)))
+            return two_phase_pb2.BatchResult(results=[
+                two_phase_pb2.BatchItemResult(transaction_id=tx, hash="0x1", ok=True)
+                for tx in tx_ids])
+        def LockOnChainBatch(self, req, *a, **kw):
+            return self._onchain("lock", [it.transaction_id for it in req.items])
+        def CommitBatch(self, req, *a, **kw):
+            self.calls.append(("commit", len(req.transaction_ids)))
+            return two_phase_pb2.Empty()
+        def CommitOnChainBatch(self, req, *a, **kw):
+            return self._onchain("commit_onchain", req.transaction_ids)
+
+    sids = ["a", "b"]
+    coord = _make_coordinator(monkeypatch, sids, group_window=0.2, group_max=8)
+    coord.shard_stubs = coord.chain_stubs_onchain = {s: BatchStub() for s in sids}
+
+    tx_ids = [f"g{i}" for i in range(8)]
+    def run(tx_id):
+        req = two_phase_pb2.PrepareRequest(transaction_id=tx_id, timeout_blocks=5,
+                                           onchain_recipient="0x0", onchain_amount=1)
+        votes = list(coord.Prepare(req, None))
+        coord.Commit(two_phase_pb2.CommitRequest(transaction_id=tx_id), None)
+        return votes
+
+    with ThreadPoolExecutor(len(tx_ids)) as ex:
+        all_votes = list(ex.map(run, tx_ids))
+
+    assert all(len(v) == 2 for v in all_votes)
+    for stub in coord.shard_stubs.values():
+        assert stub.calls == [("prepare", 8), ("lock", 8), ("commit", 8), ("commit_onchain", 8)]
+    assert coord.tx_meta == {}
+
+# --- Transact stream tests -------------------------------------------------
+
+def test_transact_stream_pipelines_client_transactions(monkeypatch):
+    from concurrent import futures
+    from mcp2pc import two_phase_pb2_grpc
+    from client.client import run_pipelined
+
+    class Stub:
+        def __init__(self): self.committed = []; self.aborted = []
+        def Prepare(self, req, *a, **kw):
+            status = (two_phase_pb2.PrepareResponse.ABORT if "bad" in req.operations
+                      else two_phase_pb2.PrepareResponse.READY)
+            return two_phase_pb2.PrepareResponse(status=status, shard_id="s")
+        def Commit(self, req, *a, **kw):  self.committed.append(req.transaction_id)
+        def Abort(self, req, *a, **kw):   self.aborted.append(req.transaction_id)
+        def LockOnChain(self, req, *a, **kw):    return two_phase_pb2.TxHash(hash="0x1")
+        def CommitOnChain(self, req, *a, **kw):  return two_phase_pb2.TxHash(hash="0x1")
+        def ReclaimOnChain(self, req, *a, **kw): return two_phase_pb2.TxHash(hash="0x1")
+
+    coord = _make_coordinator(monkeypatch, ["a", "b"])
+    coord.shard_stubs = coord.chain_stubs_onchain = {"a": Stub(), "b": Stub()}
+
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+    two_phase_pb2_grpc.add_CoordinatorServicer_to_server(coord, server)
+    port = server.add_insecure_port("localhost:0")
+    server.start()
+    try:
+        txs = [(["bad"] if i == 3 else ["SET k v"], "0x0", 1, 5) for i in range(10)]
+        outcomes = run_pipelined(txs, max_inflight=3, target=f"localhost:{port}")
+    finally:
+        server.stop(None)
+
+    assert len(outcomes) == 10
+    assert sorted(outcomes.values()) == [False] + [True] * 9
+    for stub in coord.shard_stubs.values():
+        assert len(stub.committed) == 9
+    # the first ABORT vote aborts the other shard; the client's Abort is then a no-op
+    assert sum(len(stub.aborted) for stub in coord.shard_stubs.values()) == 1
+    assert coord.tx_meta == {}
+
+def test_channel_pool_hands_out_long_lived_channels_round_robin():
+    from common.channels import ChannelPool, CHANNEL_OPTIONS
+
+    pool = ChannelPool(size=2)
+    first = [pool.get("localhost:1") for _ in range(4)]
+    assert first[0] is first[2] and first[1] is first[3] and first[0] is not first[1]
+    assert pool.get("localhost:2") not in first
+    assert pool.options == CHANNEL_OPTIONS
+    assert ("grpc.keepalive_time_ms", 30_000) in pool.options
+    pool.close()
+    assert pool.get("localhost:1") not in first
+    pool.close()
+    with pytest.raises(ValueError):
+        ChannelPool(size=0)
+
+def test_client_library_reuses_pooled_channels(monkeypatch):
+    import asyncio
+    from concurrent import futures
+    from mcp2pc import two_phase_pb2_grpc
+    from common import channels
+    from common.channels import SERVER_OPTIONS
+    from client.client import AioClient, Client
+
+    class Stub:
+        def Prepare(self, req, *a, **kw):
+            status = (two_phase_pb2.PrepareResponse.ABORT if "bad" in req.operations
+                      else two_phase_pb2.PrepareResponse.READY)
+            return two_phase_pb2.PrepareResponse(status=status, shard_id="s")
+        def Commit(self, req, *a, **kw):  pass
+        def Abort(self, req, *a, **kw):   pass
+        def LockOnChain(self, req, *a, **kw):    return two_phase_pb2.TxHash(hash="0x1")
+        def CommitOnChain(self, req, *a, **kw):  return two_phase_pb2.TxHash(hash="0x1")
+
+    coord = _make_coordinator(monkeypatch, ["a", "b"])
+    coord.shard_stubs = coord.chain_stubs_onchain = {"a": Stub(), "b": Stub()}
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=8), options=SERVER_OPTIONS)
+    two_phase_pb2_grpc.add_CoordinatorServicer_to_server(coord, server)
+    target = f"localhost:{server.add_insecure_port('localhost:0')}"
+    server.start()
+    try:
+        client = Client(target)
+        assert client.run(["SET k v"], "0x0", 1, 5) is True
+        assert client.run(["bad"], "0x0", 1, 5) is False
+        for _ in range(10):
+            client.run(["SET k v"], "0x0", 1, 5)
+        # twelve transactions, no more channels than the pool holds
+        assert len(channels._pool._channels[target]) == channels._pool.size
+
+        txs = [(["bad"] if i == 3 else [f"SET k{i} v"], "0x0", 1, 5) for i in range(20)]
+        outcomes = asyncio.run(AioClient(target).run_many(txs, max_inflight=8))
+    finally:
+        server.stop(None)
+
+    assert sorted(outcomes.values()) == [False] + [True] * 19
+    assert coord.tx_meta == {}
+
+def test_transact_prepare_failure_still_replies_with_abort_votes(monkeypatch):
+    import asyncio
+    from coordinator.aio_coordinator import AioCoordinator
+
+    coord = _make_coordinator(monkeypatch, ["a", "b"])
+    def broken_begin(request, routes):
+        raise OSError("fsync failed")
+    coord._begin = broken_begin
+    req = two_phase_pb2.TransactRequest(prepare=two_phase_pb2.PrepareRequest(transaction_id="t"))
+
+    aio = AioCoordinator(coord, {})
+    for resp in (coord._transact_step(req), asyncio.run(aio._transact_step(req))):
+        assert resp.transaction_id == "t"
+        assert {v.shard_id for v in resp.votes.votes} == {"a", "b"}
+        assert all(v.status == two_phase_pb2.PrepareResponse.ABORT and "fsync" in v.error
+                   for v in resp.votes.votes)
+
+# --- asyncio servicer tests ------------------------------------------------
+
+def test_aio_coordinator_runs_transactions_concurrently(monkeypatch):
+    import asyncio, time
+    from coordinator.aio_coordinator import AioCoordinator
+
+    class AsyncStub:
+        def __init__(self): self.calls = 0
+        async def Prepare(self, req, *a, **kw):
+            return two_phase_pb2.PrepareResponse(status=two_phase_pb2.PrepareResponse.READY,
+                                                 shard_id="s")
+        async def _slow(self, kw):
+            assert "timeout" in kw
+            await asyncio.sleep(0.1)
+            self.calls += 1
+            return two_phase_pb2.TxHash(hash="0x1")
+        async def LockOnChain(self, req, *a, **kw):   return await self._slow(kw)
+        async def Commit(self, req, *a, **kw):        return await self._slow(kw)
+        async def CommitOnChain(self, req, *a, **kw): return await self._slow(kw)
+
+    sids = ["a", "b", "c"]
+    core = _make_coordinator(monkeypatch, sids)
+    coord = AioCoordinator(core, {})
+    coord.shard_stubs = coord.chain_stubs_onchain = {s: AsyncStub() for s in sids}
+
+    async def run(tx_id):
+        req = two_phase_pb2.PrepareRequest(transaction_id=tx_id, timeout_blocks=5,
+                                           onchain_recipient="0x0", onchain_amount=1)
+        votes = [v async for v in coord.Prepare(req, None)]
+        await coord.Commit(two_phase_pb2.CommitRequest(transaction_id=tx_id), None)
+        return votes
+
+    async def main():
+        return await asyncio.gather(*(run(f"aio{i}") for i in range(500)))
+
+    t0 = time.monotonic()
+    all_votes = asyncio.run(main())
+    elapsed = time.monotonic() - t0
+
+    # 500 txs x three 0.1s phases, all overlapping on one event loop
+    assert elapsed < 0.1 * 3 + 1.0
+    assert all(len(v) == 3 for v in all_votes)
+    assert all(stub.calls == 500 * 3 for stub in coord.shard_stubs.values())
+    assert core.tx_meta == {}
+
+def test_aio_servicers_keep_head_reads_off_the_event_loop(monkeypatch):
+    import asyncio, threading
+    from shard.aio_shard import AioShard
+    from coordinator.aio_coordinator import AioCoordinator
+
+    shard = Shard("shard1", rpc_url="dummy", adapter_address="0x" + "00" * 20)
+    aio_shard = AioShard(shard, "http://localhost:1")
+    coord = _make_coordinator(monkeypatch, ["a"])
+    coord.prepare_window = None
+    aio_coord = AioCoordinator(coord, {})
+    class AsyncStub:
+        async def Prepare(self, req, *a, **kw):
+            return two_phase_pb2.PrepareResponse(status=two_phase_pb2.PrepareResponse.READY,
+                                                 shard_id="a")
+    aio_coord.shard_stubs = {"a": AsyncStub()}
+
+    threads = []
+    real_start = shard.timeout_mgr.start
+    def start(tx_id, tb):
+        threads.append(threading.current_thread())
+        real_start(tx_id, tb)
+    shard.timeout_mgr.start = start
+    coord.timeout_mgrs["a"].start = start
+
+    async def run():
+        loop_thread = threading.current_thread()
+        req = two_phase_pb2.PrepareRequest(transaction_id="t", timeout_blocks=5,
+                                           operations=["SET a 1"])
+        vote = await aio_shard.Prepare(req, None)
+        assert vote.status == two_phase_pb2.PrepareResponse.READY
+        [v async for v in aio_coord.Prepare(req, None)]
+        return loop_thread
+
+    loop_thread = asyncio.run(run())
+    assert len(threads) == 2 and loop_thread not in threads
+
+# --- Write-ahead log tests -------------------------------------------------
+
+def test_wal_group_fsync_and_replay(tmp_path, monkeypatch):
+    import os, threading
+    from common.wal import WriteAheadLog
+
+    fsyncs = []
+    real_fsync = os.fsync
+    def counting_fsync(fd):
+        fsyncs.append(fd)
+        real_fsync(fd)
+    monkeypatch.setattr(os, "fsync", counting_fsync)
+
+    wal = WriteAheadLog(tmp_path)
+    fsyncs.clear()
+    barrier = threading.Barrier(32)
+    def writer(i):
+        barrier.wait()
+        wal.put(f"tx{i}", {"amount": i}).result(5)
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(32)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    wal.put("tx0", {"decision": "commit"}).result(5)
+    wal.delete("tx1")
+    wal.close()
+
+    # 33 durable puts, far fewer flushes
+    assert len(fsyncs) < 33
+    state = WriteAheadLog(tmp_path).state()
+    assert len(state) == 31 and "tx1" not in state
+    assert state["tx0"] == {"amount": 0, "decision": "commit"}
+
+def test_wal_rotates_compacts_and_drops_torn_tail(tmp_path):
+    from common.wal import WriteAheadLog
+
+    wal = WriteAheadLog(tmp_path, segment_bytes=512)
+    for i in range(200):
+        wal.put(f"tx{i}", {"amount": i}).result(5)
+        if i >= 2:
+            wal.delete(f"tx{i - 2}")
+    wal.put("tx199", {"decision": "commit"}).result(5)
+    segment = wal.segments()[-1]
+    wal.close()
+
+    # rotation deleted the superseded segments
+    assert len(wal.segments()) == 1
+    with open(segment, "ab") as f:
+        f.write(b"\x00\x00\x00\x40garbage")     # crash mid-append
+
+    wal = WriteAheadLog(tmp_path)
+    assert wal.state() == {"tx198": {"amount": 198},
+                           "tx199": {"amount": 199, "decision": "commit"}}
+    assert len(wal.segments()) == 1 and wal.segments()[0] != segment
+    wal.close()
+
+def test_coordinator_recovers_in_flight_txs_from_wal(tmp_path, monkeypatch):
+    class Stub:
+        def __init__(self): self.calls = []
+        def Prepare(self, req, *a, **kw):
+            return two_phase_pb2.PrepareResponse(status=two_phase_pb2.PrepareResponse.READY,
+                                                 shard_id="s")
+        def _call(self, name, req):
+            self.calls.append((name, req.transaction_id))
+            return two_phase_pb2.TxHash(hash="0x1")
+        def LockOnChain(self, req, *a, **kw):   return self._call("lock", req)
+        def Commit(self, req, *a, **kw):        return self._call("commit", req)
+        def CommitOnChain(self, req, *a, **kw): return self._call("commit_onchain", req)
+
+    sids = ["a", "b"]
+    coord = _make_coordinator(monkeypatch, sids, wal_dir=tmp_path)
+    coord.shard_stubs = coord.chain_stubs_onchain = {s: Stub() for s in sids}
+    for tx in ("undecided", "deciding", "done"):
+        list(coord.Prepare(two_phase_pb2.PrepareRequest(
+            transaction_id=tx, timeout_blocks=5, onchain_recipient="0x0", onchain_amount=7), None))
+    coord.Commit(two_phase_pb2.CommitRequest(transaction_id="done"), None)
+    _, logged = coord._claim("deciding")       # crash right after the decision
+    logged.result(5)
+    deadline = coord.timeout_mgrs["a"].deadlines["undecided"]
+    coord.wal.close()
+
+    # recovery starts in the constructor, so hand it fake stubs up front
+    from mcp2pc import two_phase_pb2_grpc
+    stubs = []
+    monkeypatch.setattr(two_phase_pb2_grpc, "ShardStub",
+                        lambda channel: stubs.append(Stub()) or stubs[-1])
+    restarted = _make_coordinator(monkeypatch, sids, wal_dir=tmp_path)
+    restarted.sweep_executor.shutdown(wait=True)   # runs the queued recovery
+
+    assert restarted.timeout_mgrs["a"].deadlines["undecided"] == deadline
+    assert restarted.tx_meta == {"undecided": {"recipient": "0x0", "amount": 7}}
+    assert len(stubs) == 2
+    for stub in stubs:
+        assert stub.calls == [("lock", "deciding"), ("commit", "deciding"),
+                              ("commit_onchain", "deciding")]
+
+# --- Shard storage tests ---------------------------------------------------
+
+def test_log_store_snapshots_compacts_and_recovers(tmp_path):
+    from shard.storage import LogStore
+
+    store = LogStore(tmp_path, segment_bytes=1024)
+    for i in range(300):
+        store.prepare(f"tx{i}", {f"k{i % 50}": f"v{i}"}, deadline=1000 + i)
+        if i % 3:
+            store.commit(f"tx{i}")
+    store.abort("tx0")
+    store.prepare("late", {"k3": "late", "k4": None, "\udcff": "raw"})
+    store.commit("late")
+    segment = store.segments()[-1]
+    expected = (dict(store.state), dict(store.prepared), dict(store.deadlines))
+    store.close()
+
+    # the compactor replaced all but the live segment(s) with a snapshot
+    assert len(store.snapshots()) == 1
+    assert len(store.segments()) <= 2
+    with open(segment, "ab") as f:
+        f.write(b"\x00\x00\x00\x40garbage")     # crash mid-append
+
+    store = LogStore(tmp_path)
+    assert (store.state, store.prepared, store.deadlines) == expected
+    assert store.state["k3"] == "late" and "k4" not in store.state
+    assert store.state["\udcff"] == "raw" and "tx0" not in store.prepared
+    assert store.deadlines["tx297"] == 1297
+    store.close()
+
+def test_shard_restart_keeps_state_and_prepared_votes(tmp_path):
+    from shard.storage import LogStore
+
+    PrepReq = namedtuple("PrepReq", ["transaction_id", "operations", "timeout_blocks"])
+    TxReq = namedtuple("TxReq", ["transaction_id"])
+    shard = Shard("shard1", rpc_url="dummy", adapter_address="0x0", store=LogStore(tmp_path))
+    shard.Prepare(PrepReq("done", ["SET a 1"], 5), None)
+    shard.Commit(TxReq("done"), None)
+    shard.Prepare(PrepReq("voted", ["SET b 2"], 5), None)
+    shard.Prepare(PrepReq("dropped", ["SET c 3"], 5), None)
+    shard.Abort(TxReq("dropped"), None)
+    deadline = shard.timeout_mgr.deadlines["voted"]
+    shard.store.close()
+
+    restarted = Shard("shard1", rpc_url="dummy", adapter_address="0x0", store=LogStore(tmp_path))
+    assert restarted.state == {"a": "1"}
+    assert restarted.prepared == {"voted": {"b": "2"}}
+    assert restarted.timeout_mgr.deadlines == {"voted": deadline}
+    restarted.Commit(TxReq("voted"), None)
+    assert restarted.state == {"a": "1", "b": "2"} and restarted.prepared == {}
+    restarted.store.close()
+
+def test_shard_batches_share_one_store_fsync(tmp_path, monkeypatch):
+    import os, time
+    from shard.storage import LogStore
+
+    shard = Shard("shard1", rpc_url="dummy", adapter_address="0x0", store=LogStore(tmp_path))
+    fsyncs = []
+    real_fsync = os.fsync
+
+    def slow_fsync(fd):
+        # a disk-like flush time, so the count doesn't hinge on how quickly
+        # the flusher thread happens to wake up
+        fsyncs.append(fd)
+        time.sleep(0.02)
+        real_fsync(fd)
+    monkeypatch.setattr(os, "fsync", slow_fsync)
+
+    tx_ids = [f"t{i}" for i in range(50)]
+    resp = shard.PrepareBatch(two_phase_pb2.PrepareBatchRequest(requests=[
+        two_phase_pb2.PrepareRequest(transaction_id=tx, timeout_blocks=5, operations=[f"SET {tx} 1"])
+        for tx in tx_ids]), None)
+    assert all(v.status == two_phase_pb2.PrepareResponse.READY for v in resp.responses)
+    shard.CommitBatch(two_phase_pb2.CommitBatchRequest(transaction_ids=tx_ids), None)
+
+    # 100 durable records, a handful of flushes
+    assert len(fsyncs) <= 10
+    assert len(shard.state) == 50 and shard.prepared == {}
+    shard.store.close()
+
+def test_shard_compiles_typed_and_legacy_ops_at_prepare():
+    from common.ops import Operation, set_op, delete_op
+
+    shard = Shard("shard1", rpc_url="dummy", adapter_address="0x0")
+    shard.state.update({"gone": "1", "kept": "2"})
+    req = two_phase_pb2.PrepareRequest(
+        transaction_id="t1", timeout_blocks=5,
+        ops=[set_op("a", "1"), set_op(b"bin", b"\xff\x00"), delete_op("gone")],
+        operations=["SET a 2", "DEL kept"])
+    assert shard.Prepare(req, None).status == two_phase_pb2.PrepareResponse.READY
+    assert shard.prepared["t1"] == {"a": "2", "bin": "\udcff\x00", "gone": None, "kept": None}
+
+    shard.Commit(two_phase_pb2.CommitRequest(transaction_id="t1"), None)
+    assert shard.state == {"a": "2", "bin": "\udcff\x00"}
+
+    for bad in (Operation(key=b"k"), Operation(opcode=Operation.SET)):
+        resp = shard.Prepare(two_phase_pb2.PrepareRequest(
+            transaction_id="t2", timeout_blocks=5, ops=[bad]), None)
+        assert resp.status == two_phase_pb2.PrepareResponse.ABORT and resp.error
+    assert "t2" not in shard.prepared
+
+def test_client_sends_unparseable_legacy_ops_for_the_shard_to_reject():
+    from client.client import _op_fields
+    from common.ops import delete_op
+
+    fields = _op_fields([delete_op("k"), "SET a 1", "bad"])
+    assert [op.key for op in fields["ops"]] == [b"k", b"a"]
+    assert fields["operations"] == ["bad"]
+
+    shard = Shard("shard1", rpc_url="dummy", adapter_address="0x0")
+    resp = shard.Prepare(two_phase_pb2.PrepareRequest(
+        transaction_id="t", timeout_blocks=5, **fields), None)
+    assert resp.status == two_phase_pb2.PrepareResponse.ABORT and "bad" in resp.error
+
+def test_coordinator_recovery_discards_partial_wal_records(tmp_path, monkeypatch):
+    from common.wal import WriteAheadLog
+
+    wal = WriteAheadLog(tmp_path)
+    wal.put("orphan", {"stranded": ["a"]}).result(5)
+    wal.put("live", {"recipient": "0x0", "amount": 3, "deadlines": {"a": 50}}).result(5)
+    wal.close()
+
+    coord = _make_coordinator(monkeypatch, ["a"], wal_dir=tmp_path)
+    assert coord.tx_meta == {"live": {"recipient": "0x0", "amount": 3}}
+    coord.wal.close()
+    assert "orphan" not in WriteAheadLog(tmp_path).state()
+
+def test_coordinator_settle_does_not_resurrect_swept_tx(tmp_path, monkeypatch):
+    coord = _make_coordinator(monkeypatch, ["a", "b"], wal_dir=tmp_path)
+    meta = {"recipient": "0x0", "amount": 1, "decision": "commit"}
+    # the sweeper already dropped the tx before _settle runs
+    coord._settle("gone", meta, locked={"a", "b"}, committed={"b"})
+    coord.wal.close()
+    from common.wal import WriteAheadLog
+    assert "gone" not in WriteAheadLog(tmp_path).state()
+
+# --- Key lock tests --------------------------------------------------------
+
+def test_shard_locks_conflicting_writes_until_commit_or_abort():
+    shard = Shard("shard1", rpc_url="dummy", adapter_address="0x0")
+    def prepare(tx, *ops):
+        return shard.Prepare(two_phase_pb2.PrepareRequest(
+            transaction_id=tx, timeout_blocks=5, operations=list(ops)), None)
+
+    assert prepare("t1", "SET a 1", "SET b 1").status == two_phase_pb2.PrepareResponse.READY
+    # a re-sent Prepare of the same tx is not a conflict with itself
+    assert prepare("t1", "SET a 1", "SET b 1").status == two_phase_pb2.PrepareResponse.READY
+    assert prepare("t2", "SET c 2").status == two_phase_pb2.PrepareResponse.READY
+    lost = prepare("t3", "SET c 3", "SET b 3")
+    assert lost.status == two_phase_pb2.PrepareResponse.ABORT and "lock conflict" in lost.error
+    assert "t3" not in shard.prepared and shard.locks.holder("c") == "t2"
+
+    shard.Commit(two_phase_pb2.CommitRequest(transaction_id="t1"), None)
+    shard.Abort(two_phase_pb2.AbortRequest(transaction_id="t2"), None)
+    assert prepare("t3", "SET c 3", "SET b 3").status == two_phase_pb2.PrepareResponse.READY
+    stats = shard.locks.stats()
+    assert stats["conflicts"] == 1 and stats["held_txs"] == 1
+
+def test_key_locks_wait_die_lets_only_older_txs_wait():
+    import threading, time
+    from shard.locks import KeyLocks, WAIT_DIE
+
+    locks = KeyLocks(stripes=4, policy=WAIT_DIE, wait_timeout=2)
+    assert locks.acquire("young", ["x"], age=200) is None
+    # younger than the holder, or without an age: dies at once
+    assert locks.acquire("younger", ["x"], age=300) == "x"
+    assert locks.acquire("unstamped", ["x"]) == "x"
+    assert locks.stats()["waits"] == 0
+
+    # a fresh tx that started earlier waits for the holder to release
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(locks.acquire("old", ["x"], age=100)))
+    waiter.start()
+    time.sleep(0.1)
+    assert got == [] and locks.holder("x") == "young"
+    locks.release("young")
+    waiter.join(2)
+    assert got == [None] and locks.holder("x") == "old"
+    assert locks.stats()["waits"] == 1
+
+    # a retry comes back with its original age, so it still waits rather
+    # than dying behind the younger tx
+    assert locks.acquire("young", ["y"], age=200) is None
+    locks.release("old")
+    threading.Timer(0.1, locks.release, ("young",)).start()
+    assert locks.acquire("old", ["x", "y"], age=100) is None
+    assert locks.stats()["waits"] == 2
+
+def test_coordinator_stamps_a_start_time_once_per_tx(monkeypatch):
+    coord = _make_coordinator(monkeypatch, ["a"])
+    first = two_phase_pb2.PrepareRequest(transaction_id="t1", operations=["SET k 1"])
+    coord._route(first)
+    assert first.start_ts
+    # a retry of the tx keeps its age; a client-supplied one is kept as is
+    retry = two_phase_pb2.PrepareRequest(transaction_id="t1", operations=["SET k 1"])
+    assert coord._route(retry)["a"].start_ts == first.start_ts
+    other = two_phase_pb2.PrepareRequest(transaction_id="t2", start_ts=7)
+    assert coord._route(other)["a"].start_ts == 7
+
+def test_shard_restart_relocks_prepared_keys(tmp_path):
+    from shard.storage import LogStore
+
+    shard = Shard("shard1", rpc_url="dummy", adapter_address="0x0", store=LogStore(tmp_path))
+    shard.Prepare(two_phase_pb2.PrepareRequest(
+        transaction_id="voted", timeout_blocks=5, operations=["SET k 1"]), None)
+    shard.store.close()
+
+    restarted = Shard("shard1", rpc_url="dummy", adapter_address="0x0", store=LogStore(tmp_path))
+    resp = restarted.Prepare(two_phase_pb2.PrepareRequest(
+        transaction_id="other", timeout_blocks=5, operations=["SET k 2"]), None)
+    assert resp.status == two_phase_pb2.PrepareResponse.ABORT
+    restarted.store.close()
+
+# --- Key routing tests -----------------------------------------------------
+
+def test_hash_ring_moves_few_keys_when_a_shard_joins():
+    from common.partition import HashRing, RangeMap
+
+    keys = [f"k{i}".encode() for i in range(2000)]
+    before = HashRing(["a", "b", "c"])
+    after = HashRing(["a", "b", "c", "d"])
+    moved = [k for k in keys if before.owner(k) != after.owner(k)]
+    # only keys taken over by the new shard move
+    assert all(after.owner(k) == "d" for k in moved)
+    assert 0.1 < len(moved) / len(keys) < 0.4
+
+    ranges = RangeMap([["", "a"], ["m", "b"]])
+    assert (ranges.owner(b"apple"), ranges.owner(b"m"), ranges.owner(b"zed")) == ("a", "b", "b")
+
+def test_split_request_keeps_each_key_on_its_owner():
+    from common.partition import RangeMap, split_request
+    from common.ops import set_op
+
+    ranges = RangeMap([["", "a"], ["m", "b"]])
+    req = two_phase_pb2.PrepareRequest(
+        transaction_id="ab", timeout_blocks=5, onchain_recipient="0x0", onchain_amount=3,
+        ops=[set_op("x", "1"), set_op("c", "1")], operations=["SET c 2", "bad", "DEL y"])
+    parts = split_request(req, ranges)
+    assert sorted(parts) == ["a", "b"]
+    assert [op.key for op in parts["a"].ops] == [b"c"]
+    assert list(parts["a"].operations) == ["SET c 2", "bad"]   # tx id "ab" is owned by a
+    assert [op.key for op in parts["b"].ops] == [b"x"] and list(parts["b"].operations) == ["DEL y"]
+    assert all(p.timeout_blocks == 5 for p in parts.values())
+    # only one shard carries the transfer: the tx id's owner, as it writes
+    assert (parts["a"].onchain_amount, parts["b"].onchain_amount) == (3, 0)
+
+    # "zz" is owned by b, which writes nothing: the writer pays instead
+    other = split_request(two_phase_pb2.PrepareRequest(
+        transaction_id="zz", onchain_amount=3, ops=[set_op("c", "1")]), ranges)
+    assert list(other) == ["a"] and other["a"].onchain_amount == 3
+
+    empty = split_request(two_phase_pb2.PrepareRequest(transaction_id="zz"), ranges)
+    assert list(empty) == ["b"]
+
+def test_coordinator_routes_phases_to_owning_shards_only(monkeypatch):
+    from common.partition import RangeMap
+    from common.ops import set_op
+
+    class Stub:
+        def __init__(self): self.calls = []
+        def _call(self, name, req):
+            self.calls.append(name)
+            return two_phase_pb2.TxHash(hash="0x1")
+        def Prepare(self, req, *a, **kw):
+            self.calls.append(("prepare", sorted(op.key for op in req.ops)))
+            return two_phase_pb2.PrepareResponse(status=two_phase_pb2.PrepareResponse.READY,
+                                                 shard_id="s")
+        def LockOnChain(self, req, *a, **kw):    return self._call("lock", req)
+        def Commit(self, req, *a, **kw):         return self._call("commit", req)
+        def CommitOnChain(self, req, *a, **kw):  return self._call("commit_onchain", req)
+        def Abort(self, req, *a, **kw):          return self._call("abort", req)
+        def ReclaimOnChain(self, req, *a, **kw): return self._call("reclaim", req)
+
+    sids = ["a", "b", "c"]
+    coord = _make_coordinator(monkeypatch, sids,
+                              partitioner=RangeMap([["", "a"], ["h", "b"], ["p", "c"]]))
+    stubs = {s: Stub() for s in sids}
+    coord.shard_stubs = coord.chain_stubs_onchain = stubs
+
+    def prepare(tx, *keys):
+        req = two_phase_pb2.PrepareRequest(transaction_id=tx, timeout_blocks=5,
+                                           onchain_recipient="0x0", onchain_amount=1,
+                                           ops=[set_op(k, "v") for k in keys])
+        return list(coord.Prepare(req, None))
+
+    assert len(prepare("01", "apple", "banana", "zebra")) == 2
+    assert set(coord.timeout_mgrs["b"].deadlines) == set()
+    coord.Commit(two_phase_pb2.CommitRequest(transaction_id="01"), None)
+    assert stubs["a"].calls == [("prepare", [b"apple", b"banana"]), "lock", "commit", "commit_onchain"]
+    assert stubs["b"].calls == []
+    # "01" is owned by a, which pays; c only commits its write
+    assert stubs["c"].calls == [("prepare", [b"zebra"]), "commit"]
+
+    prepare("02", "kiwi")
+    coord.Abort(two_phase_pb2.AbortRequest(transaction_id="02"), None)
+    assert stubs["b"].calls == [("prepare", [b"kiwi"]), "abort", "reclaim"]
+    assert len(stubs["a"].calls) == 4 and len(stubs["c"].calls) == 2
+    assert coord.tx_meta == {}
+
+# --- One-phase commit tests ------------------------------------------------
+
+def test_shard_prepare_and_commit_transfers_before_committing():
+    shard = Shard("shard1", rpc_url="dummy", adapter_address="0x0")
+    sent = []
+    def lock_and_commit(lock):
+        sent.append((lock.transaction_id, lock.amount, lock.deadline))
+        if lock.transaction_id == "bad":
+            raise RuntimeError("lockAndCommit reverted")
+        return "0xabc"
+    shard._lock_and_commit = lock_and_commit
+
+    def one_phase(tx, op, amount=5):
+        return shard.PrepareAndCommit(two_phase_pb2.OnePhaseRequest(
+            prepare=two_phase_pb2.PrepareRequest(transaction_id=tx, timeout_blocks=5,
+                                                 operations=[op]),
+            lock=two_phase_pb2.LockRequest(transaction_id=tx, recipient="0x0",
+                                           amount=amount, deadline=105)), None)
+
+    vote = one_phase("ok", "SET a 1")
+    assert vote.status == two_phase_pb2.PrepareResponse.READY and vote.committed
+    assert shard.state == {"a": "1"} and shard.prepared == {}
+
+    vote = one_phase("bad", "SET b 1")
+    assert vote.status == two_phase_pb2.PrepareResponse.ABORT and "reverted" in vote.error
+    assert "b" not in shard.state and shard.locks.holder("b") is None
+    assert one_phase("free", "SET c 1", amount=0).committed
+    assert sent == [("ok", 5, 105), ("bad", 5, 105)]
+
+def test_coordinator_commits_single_shard_txs_in_one_phase(monkeypatch):
+    from common.partition import RangeMap
+    from common.ops import set_op
+
+    class Stub:
+        def __init__(self): self.calls = []
+        def PrepareAndCommit(self, req, *a, **kw):
+            self.calls.append(("one_phase", req.lock.deadline, req.lock.amount))
+            return two_phase_pb2.PrepareResponse(status=two_phase_pb2.PrepareResponse.READY,
+                                                 shard_id="a", committed=True)
+        def Prepare(self, req, *a, **kw):
+            self.calls.append("prepare")
+            return two_phase_pb2.PrepareResponse(status=two_phase_pb2.PrepareResponse.READY,
+                                                 shard_id="a")
+
+    coord = _make_coordinator(monkeypatch, ["a", "b"],
+                              partitioner=RangeMap([["", "a"], ["m", "b"]]))
+    coord.shard_stubs = coord.chain_stubs_onchain = {"a": Stub(), "b": Stub()}
+    req = two_phase_pb2.PrepareRequest(transaction_id="01", timeout_blocks=5, onchain_amount=9,
+                                       ops=[set_op("apple", "1")], commit_on_ready=True)
+    votes = list(coord.Prepare(req, None))
+    assert [v.committed for v in votes] == [True]
+    assert coord.shard_stubs["a"].calls == [("one_phase", 105, 9)]
+    # nothing to remember, sweep or recover for it
+    assert coord.tx_meta == {} and not coord.timeout_mgrs["a"].deadlines
+
+    # a client that keeps the decision to itself still gets two phases
+    req.commit_on_ready = False
+    list(coord.Prepare(req, None))
+    assert coord.shard_stubs["a"].calls[-1] == "prepare" and "01" in coord.tx_meta
+
+# --- Read-only vote tests --------------------------------------------------
+
+def test_shard_votes_read_only_and_keeps_no_state():
+    from common.ops import read_op
+
+    shard = Shard("shard1", rpc_url="dummy", adapter_address="0x0")
+    vote = shard.Prepare(two_phase_pb2.PrepareRequest(
+        transaction_id="r", timeout_blocks=5, ops=[read_op("k")]), None)
+    assert vote.status == two_phase_pb2.PrepareResponse.READ_ONLY
+    assert "r" not in shard.prepared and "r" not in shard.timeout_mgr.deadlines
+    assert shard.locks.holder("k") is None
+
+    # a shard that locks funds on-chain takes part even without writes
+    vote = shard.Prepare(two_phase_pb2.PrepareRequest(
+        transaction_id="p", timeout_blocks=5, onchain_amount=1), None)
+    assert vote.status == two_phase_pb2.PrepareResponse.READY
+
+def test_coordinator_skips_read_only_shards_in_phase_two(monkeypatch):
+    from common.partition import RangeMap
+    from common.ops import read_op, set_op
+
+    class Stub:
+        def __init__(self): self.calls = []
+        def Prepare(self, req, *a, **kw):
+            self.calls.append("prepare")
+            writes = any(op.opcode != op.READ for op in req.ops) or req.onchain_amount
+            status = (two_phase_pb2.PrepareResponse.READY if writes
+                      else two_phase_pb2.PrepareResponse.READ_ONLY)
+            return two_phase_pb2.PrepareResponse(status=status, shard_id="s")
+        def _call(self, name):
+            self.calls.append(name)
+            return two_phase_pb2.TxHash(hash="0x1")
+        def LockOnChain(self, req, *a, **kw):   return self._call("lock")
+        def Commit(self, req, *a, **kw):        return self._call("commit")
+        def CommitOnChain(self, req, *a, **kw): return self._call("commit_onchain")
+
+    sids = ["a", "b", "c"]
+    coord = _make_coordinator(monkeypatch, sids,
+                              partitioner=RangeMap([["", "a"], ["h", "b"], ["p", "c"]]))
+    stubs = {s: Stub() for s in sids}
+    coord.shard_stubs = coord.chain_stubs_onchain = stubs
+    req = two_phase_pb2.PrepareRequest(
+        transaction_id="01", timeout_blocks=5, onchain_recipient="0x0", onchain_amount=2,
+        ops=[set_op("apple", "1"), read_op("kiwi"), read_op("zebra")])
+    statuses = sorted(v.status for v in coord.Prepare(req, None))
+    assert statuses == [two_phase_pb2.PrepareResponse.READY] + [two_phase_pb2.PrepareResponse.READ_ONLY] * 2
+    assert coord.tx_meta["01"]["participants"] == ["a"]
+    assert "01" not in coord.timeout_mgrs["b"].deadlines
+
+    coord.Commit(two_phase_pb2.CommitRequest(transaction_id="01"), None)
+    assert stubs["a"].calls == ["prepare", "lock", "commit", "commit_onchain"]
+    assert stubs["b"].calls == stubs["c"].calls == ["prepare"]
+
+    # all read-only: Commit has nothing left to do
+    req = two_phase_pb2.PrepareRequest(transaction_id="02", timeout_blocks=5, ops=[read_op("kiwi")])
+    list(coord.Prepare(req, None))
+    coord.Commit(two_phase_pb2.CommitRequest(transaction_id="02"), None)
+    assert stubs["b"].calls == ["prepare", "prepare"] and coord.tx_meta == {}
+
+# --- Presumed-abort tests --------------------------------------------------
+
+def test_presumed_abort_cuts_rpcs_and_log_writes_on_the_timeout_path(tmp_path, monkeypatch):
+    import os
+
+    class Stub:
+        def __init__(self): self.calls = []
+        def Prepare(self, req, *a, **kw):
+            return two_phase_pb2.PrepareResponse(status=two_phase_pb2.PrepareResponse.READY,
+                                                 shard_id="s")
+        def Abort(self, req, *a, **kw):   self.calls.append("abort")
+        def ReclaimOnChain(self, req, *a, **kw):
+            self.calls.append("reclaim")
+            return two_phase_pb2.TxHash(hash="0x1")
+
+    def run(presumed_abort):
+        fsyncs = []
+        real_fsync = os.fsync
+        monkeypatch.setattr(os, "fsync", lambda fd: fsyncs.append(fd) or real_fsync(fd))
+        coord = _make_coordinator(monkeypatch, ["a", "b", "c"], wal_dir=tmp_path / str(presumed_abort),
+                                  presumed_abort=presumed_abort)
+        coord.shard_stubs = coord.chain_stubs_onchain = {s: Stub() for s in "abc"}
+        oracle = coord.timeout_mgrs["a"].client
+        head = oracle.get_block_height()      # the oracle is shared across runs
+        fsyncs.clear()
+        for i in range(20):
+            list(coord.Prepare(two_phase_pb2.PrepareRequest(
+                transaction_id=f"t{i}", timeout_blocks=3, onchain_recipient="0x0",
+                onchain_amount=1), None))
+        coord.Abort(two_phase_pb2.AbortRequest(transaction_id="t0"), None)
+        oracle.client._height = head + 100
+        oracle.refresh()                      # the other 19 time out
+        coord.sweep_executor.shutdown(wait=True)
+        coord.executor.shutdown(wait=True)
+        coord.wal.close()
+        rpcs = sum(len(stub.calls) for stub in coord.shard_stubs.values())
+        assert coord.tx_meta == {}
+        return rpcs, len(fsyncs), coord
+
+    rpcs, fsyncs, _ = run(False)
+    pa_rpcs, pa_fsyncs, coord = run(True)
+    # baseline: Abort + Reclaim on 3 shards for t0, an Abort per shard per expired tx
+    assert rpcs == 3 * 2 + 19 * 3
+    # presumed abort: one unacknowledged Abort per shard for t0, nothing on expiry
+    assert pa_rpcs == 3 and all(s.calls == ["abort"] for s in coord.shard_stubs.values())
+    assert pa_fsyncs == 0 < fsyncs
+
+def test_presumed_abort_logs_the_whole_record_with_the_commit_decision(tmp_path, monkeypatch):
+    from common.wal import WriteAheadLog
+
+    class Stub:
+        def Prepare(self, req, *a, **kw):
+            return two_phase_pb2.PrepareResponse(status=two_phase_pb2.PrepareResponse.READY,
+                                                 shard_id="a")
+
+    coord = _make_coordinator(monkeypatch, ["a"], wal_dir=tmp_path, presumed_abort=True)
+    coord.shard_stubs = {"a": Stub()}
+    for tx in ("undecided", "deciding"):
+        list(coord.Prepare(two_phase_pb2.PrepareRequest(
+            transaction_id=tx, timeout_blocks=5, onchain_recipient="0x0", onchain_amount=7), None))
+    _, logged = coord._claim("deciding")
+    logged.result(5)
+    coord.wal.close()
+
+    # the undecided tx was never logged: after a restart it is presumed aborted
+    assert WriteAheadLog(tmp_path).state() == {
+        "deciding": {"recipient": "0x0", "amount": 7, "deadlines": {"a": 105}, "decision": "commit"}}
+
+def test_aio_coordinator_aborts_on_the_first_no_vote(monkeypatch):
+    import asyncio, time
+    from coordinator.aio_coordinator import AioCoordinator
+
+    class AsyncStub:
+        def __init__(self, status, delay=0):
+            self.status, self.delay, self.aborted = status, delay, []
+        async def Prepare(self, req, *a, **kw):
+            await asyncio.sleep(self.delay)
+            return two_phase_pb2.PrepareResponse(status=self.status, shard_id="s")
+
+    class Stub:
+        def __init__(self): self.aborted = []
+        def Abort(self, req, *a, **kw): self.aborted.append(req.transaction_id)
+
+    R, A = two_phase_pb2.PrepareResponse.READY, two_phase_pb2.PrepareResponse.ABORT
+    coord = _make_coordinator(monkeypatch, ["no", "slow"])
+    coord.shard_stubs = {"no": Stub(), "slow": Stub()}
+    aio = AioCoordinator(coord, {})
+    aio.shard_stubs = {"no": AsyncStub(A), "slow": AsyncStub(R, delay=5)}
+
+    async def prepare():
+        return [v async for v in aio.Prepare(two_phase_pb2.PrepareRequest(transaction_id="t"), None)]
+
+    started = time.monotonic()
+    votes = asyncio.run(prepare())
+    assert time.monotonic() - started < 1
+    assert [v.status for v in votes] == [A]
+    coord.executor.shutdown(wait=True)
+    assert coord.shard_stubs["slow"].aborted == ["t"] and coord.shard_stubs["no"].aborted == []
+
+# --- Simulated chain tests -------------------------------------------------
+
+def test_sim_chain_runs_adapter_locks_and_settlements(real_lightclient):
+    import json
+    from eth_account import Account
+    from common import simchain
+    from common.lightclient import LightClient
+
+    chain = simchain.SimChain()
+    adapter = chain.deploy_adapter()
+    w3 = LightClient(simchain.register("unit", chain)).w3
+    contract = w3.eth.contract(address=adapter, abi=json.loads(simchain.ABI_PATH.read_text()))
+    account = Account.from_key("0x" + "11" * 32)
+    recipient = "0x24c881bF947a922cfb46794DEC370036d413b4B2"
+    nonce = iter(range(100))
+
+    def send(call, value=0):
+        tx = call.build_transaction({"from": account.address, "nonce": next(nonce), "value": value})
+        return w3.eth.send_raw_transaction(account.sign_transaction(tx).raw_transaction)
+
+    a, b = b"\x0a" * 32, b"\x0b" * 32
+    deadline = chain.height + 2
+    lock_a = send(contract.functions.lockFunds(a, recipient, deadline), value=5)
+    send(contract.functions.lockFunds(b, recipient, deadline), value=7)
+    chain.mine()
+    assert w3.eth.get_transaction_receipt(lock_a).status == 1
+    assert contract.functions.transactions(a).call()[2:] == [5, deadline, simchain.PENDING]
+
+    # a batched commit and an early reclaim, then a late commit
+    send(contract.functions.commitBatch([a]))
+    early = send(contract.functions.reclaim(b))
+    chain.mine()
+    assert w3.eth.get_transaction_receipt(early).status == 0      # "Too early"
+    assert chain.balance(recipient) == simchain.SimChain.FUNDING + 5
+    chain.mine()
+    late = send(contract.functions.commit(b))
+    chain.mine()
+    assert w3.eth.get_transaction_receipt(late).status == 0       # "Past deadline"
+    send(contract.functions.reclaim(b))
+    chain.mine()
+    assert chain.adapter_tx(adapter, b)[4] == simchain.ABORTED
+    assert chain.stats()["mined"] == 6 and chain.stats()["pending"] == 0
+
+    stale = contract.functions.commit(a).build_transaction({"from": account.address, "nonce": 0})
+    with pytest.raises(Exception, match="nonce too low"):
+        w3.eth.send_raw_transaction(account.sign_transaction(stale).raw_transaction)
+    chain.close()
+
+def test_bench_harness_runs_in_process(real_lightclient, tmp_path):
+    import importlib.util
+    from pathlib import Path
+    from common.channels import close_channels
+
+    path = Path(__file__).parent.parent / "scripts" / "bench_2pc.py"
+    spec = importlib.util.spec_from_file_location("bench_2pc", path)
+    bench = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(bench)
+
+    args = bench.parse_args(["--shards", "2", "--clients", "2", "--txs", "6", "--block-time", "0.02",
+                             "--abort-ratio", "0.5", "--keys", "50", "--fanout", "2"])
+    report = bench.run(args)
+    close_channels()
+    assert sum(report["txs"].values()) == 6 and report["txs"].get("failed", 0) == 0
+    assert report["txs"]["committed"] + report["txs"]["aborted"] == 6
+    assert report["phases"]["total"]["count"] == 6
+    assert report["phases"]["prepare"]["p50_ms"] <= report["phases"]["total"]["p99_ms"]
+    assert report["chain"]["mined"] >= report["txs"]["committed"]
+
+# --- Chain backend tests ---------------------------------------------------
+
+def test_light_client_connects_lazily_and_picks_a_backend(real_lightclient):
+    from common import simchain
+    from common.chain_backend import HTTPBackend, SimBackend
+    from common.lightclient import LightClient
+
+    # nothing listens on port 1; construction must not need the node
+    http = LightClient("http://127.0.0.1:1")
+    assert isinstance(http.backend, HTTPBackend) and not http.is_connected()
+
+    chain = simchain.SimChain(block_time=0)
+    sim = LightClient(simchain.register("lazy", chain))
+    assert isinstance(sim.backend, SimBackend) and sim.get_block_height() == 0
+
+def test_shards_settle_on_instant_blocks_through_the_sim_backend(real_lightclient):
+    import asyncio, time
+    from common import simchain
+    from common.block_oracle import get_oracle
+    from shard.aio_shard import AioShard
+    from shard.shard_node import _tx_id32
+
+    chain = simchain.SimChain(block_time=0)
+    adapter = chain.deploy_adapter()
+    url = simchain.register("instant", chain)
+    get_oracle(url, max_staleness=0, poll_interval=0.005)
+    shard = Shard("shard1", url, adapter)
+    recipient = "0x24c881bF947a922cfb46794DEC370036d413b4B2"
+
+    started = time.monotonic()
+    lock = two_phase_pb2.LockRequest(transaction_id="0a", recipient=recipient, amount=5,
+                                     deadline=chain.height + 10)
+    shard.LockOnChain(lock, None)
+    shard.CommitOnChain(two_phase_pb2.OnChainRequest(transaction_id="0a"), None)
+    assert chain.adapter_tx(adapter, _tx_id32("0a"))[4] == simchain.COMMITTED
+
+    # the asyncio shard signs with the same nonces and sends over AsyncWeb3
+    aio = AioShard(shard, url)
+    async def lock_and_commit():
+        await aio.LockOnChain(two_phase_pb2.LockRequest(transaction_id="0b", recipient=recipient,
+                                                        amount=7, deadline=chain.height + 10), None)
+        return await aio.CommitOnChain(two_phase_pb2.OnChainRequest(transaction_id="0b"), None)
+    assert asyncio.run(lock_and_commit()).hash
+    assert chain.adapter_tx(adapter, _tx_id32("0b"))[4] == simchain.COMMITTED
+    assert chain.balance(recipient) == simchain.SimChain.FUNDING + 12
+    assert chain.height == 4 and time.monotonic() - started < 2
+    shard.receipts.close()
+
+def test_batch_flush_decodes_item_events_from_backend_receipts(real_lightclient):
+    from common import simchain
+    from common.block_oracle import get_oracle
+    from shard.shard_node import _tx_id32
+
+    chain = simchain.SimChain(block_time=0)
+    adapter = chain.deploy_adapter()
+    url = simchain.register("batched", chain)
+    get_oracle(url, max_staleness=0, poll_interval=0.005)
+    shard = Shard("shard1", url, adapter)
+    recipient = "0x24c881bF947a922cfb46794DEC370036d413b4B2"
+
+    # receipts come back with attribute access down to the logs
+    locks = [two_phase_pb2.LockRequest(transaction_id=tx, recipient=recipient, amount=5,
+                                       deadline=chain.height + 10) for tx in ("0c", "0d")]
+    assert [err for _, err in shard._flush_batch("lock", locks)] == ["", ""]
+    results = shard._flush_batch("commit", ["0c", "0e"])
+    assert results[0][1] == "" and results[1][1]          # 0e was never locked
+    assert chain.adapter_tx(adapter, _tx_id32("0c"))[4] == simchain.COMMITTED
+    shard.receipts.close()
+
+# --- Fee engine tests ------------------------------------------------------
+
+class _FeeChain:
+    # fee_history of blocks whose txs paid tips of 1, 2 and 3 gwei
+    def __init__(self, base):
+        self.base, self.reads = base, 0
+
+    def fee_history(self, block_count, percentiles):
+        self.reads += 1
+        return {"baseFeePerGas": [self.base] * (block_count + 1),
+                "reward": [[GWEI, 2 * GWEI, 3 * GWEI]] * (block_count - 1) + [[0, 0, 0]]}
+
+class _Head:
+    def __init__(self, height):
+        self.height = height
+
+    def get_block_height(self):
+        return self.height
+
+def test_fee_engine_prices_by_blocks_left_and_reads_history_once_per_block():
+    from common.fee_engine import FeeEngine, Fees
+
+    chain, head = _FeeChain(10 * GWEI), _Head(100)
+    fees = FeeEngine(chain, head, replace_after=3, max_fee_cap=30 * GWEI)
+    relaxed, median, urgent = fees.quote(200), fees.quote(), fees.quote(103)
+    assert (relaxed.tip, median.tip, urgent.tip) == (GWEI, 2 * GWEI, 3 * GWEI)
+    # headroom for three blocks of 12.5% base fee growth on top of the tip
+    assert urgent.max_fee == -(-10 * GWEI * 729 // 512) + 3 * GWEI
+    assert chain.reads == 1                      # empty blocks' 0 tips ignored, one read
+    head.height += 1
+    fees.quote(103)
+    assert chain.reads == 2
+
+    # replacements raise both caps by 12.5%, until the cap leaves no room
+    bumped = fees.bump(urgent, 103)
+    assert bumped.max_fee >= urgent.max_fee * 1.125 and bumped.tip >= urgent.tip * 1.125
+    assert fees.bump(Fees(29 * GWEI, 3 * GWEI), 103) is None
+
+def test_simchain_fee_history_reports_paid_tips():
+    from web3 import Web3
+    from common import simchain
+    from common.chain_backend import SimBackend
+
+    chain = simchain.SimChain(block_time=0)
+    account = Web3().eth.account.create()
+    for i, tip in enumerate((GWEI, 3 * GWEI)):
+        signed = account.sign_transaction({
+            "to": account.address, "value": 0, "gas": 21_000, "nonce": i, "chainId": chain.CHAIN_ID,
+            "maxFeePerGas": 10 * GWEI, "maxPriorityFeePerGas": tip,
+        })
+        chain.rpc("eth_sendRawTransaction", ["0x" + bytes(signed.raw_transaction).hex()])
+    history = SimBackend(chain).fee_history(3, [50])
+    assert history["baseFeePerGas"] == [chain.base_fee] * 4
+    assert history["reward"] == [[0], [GWEI], [3 * GWEI]]
+
+def test_stuck_lock_is_replaced_under_the_same_nonce(real_lightclient):
+    import threading, time
+    from common import simchain
+    from common.block_oracle import get_oracle
+    from shard.shard_node import CHAIN_REPLACEMENTS, _tx_id32
+
+    chain = simchain.SimChain(block_time=0)
+    adapter = chain.deploy_adapter()
+    url = simchain.register("stuck", chain)
+    get_oracle(url, max_staleness=0, poll_interval=0.005)
+    shard = Shard("shard1", url, adapter)
+    replaced = CHAIN_REPLACEMENTS.value(shard="shard1")
+
+    # the engine priced this block's fees before the base fee tripled, so
+    # the first version sits in the mempool below it
+    shard.fees.quote()
+    chain.base_fee *= 3
+    lock = two_phase_pb2.LockRequest(transaction_id="0f", amount=5, deadline=chain.height + 50,
+                                     recipient="0x24c881bF947a922cfb46794DEC370036d413b4B2")
+    result = {}
+    worker = threading.Thread(target=lambda: result.update(tx=shard.LockOnChain(lock, None)))
+    worker.start()
+    while not chain.stats()["pending"]:   # no new block until it was priced and sent
+        time.sleep(0.005)
+    while worker.is_alive():
+        chain.mine()
+        time.sleep(0.02)
+
+    mined = chain.rpc("eth_getTransactionByHash", ["0x" + result["tx"].hash.removeprefix("0x")])
+    assert int(mined["nonce"], 16) == 0
+    assert int(mined["maxFeePerGas"], 16) >= chain.base_fee
+    assert chain.adapter_tx(adapter, _tx_id32("0f"))[4] == simchain.PENDING
+    assert CHAIN_REPLACEMENTS.value(shard="shard1") == replaced + 1
+    assert shard._lock_deadlines["0f"] == lock.deadline
+    shard.receipts.close()
+
+def test_dropped_tx_nonce_is_reissued_after_its_receipt_times_out(real_lightclient):
+    import threading, time
+    from concurrent import futures
+    from common import simchain
+    from common.block_oracle import get_oracle
+    from shard.shard_node import _tx_id32
+
+    chain = simchain.SimChain(block_time=60)   # not started: no blocks yet
+    adapter = chain.deploy_adapter()
+    url = simchain.register("dropped", chain)
+    get_oracle(url, max_staleness=0, poll_interval=0.005)
+    shard = Shard("shard1", url, adapter)
+    shard.RECEIPT_TIMEOUT = 0.3
+    recipient = "0x24c881bF947a922cfb46794DEC370036d413b4B2"
+
+    def lock(tx):
+        return shard.LockOnChain(two_phase_pb2.LockRequest(
+            transaction_id=tx, amount=5, deadline=chain.height + 50, recipient=recipient), None)
+
+    errors = []
+    def first():
+        try:
+            lock("0a")
+        except futures.TimeoutError as e:
+            errors.append(e)
+    worker = threading.Thread(target=first)
+    worker.start()
+    while not chain.stats()["pending"]:
+        time.sleep(0.005)
+    with chain._lock:
+        chain._mempool.clear()                 # the node drops nonce 0
+    worker.join()
+    assert len(errors) == 1
+
+    # the next tx fills the gap instead of waiting behind it
+    chain.block_time = 0
+    mined = chain.rpc("eth_getTransactionByHash", ["0x" + lock("0b").hash.removeprefix("0x")])
+    assert int(mined["nonce"], 16) == 0
+    assert chain.adapter_tx(adapter, _tx_id32("0b"))[4] == simchain.PENDING
+    shard.receipts.close()
+
+# --- Metrics tests ---------------------------------------------------------
+
+def test_metrics_render_the_prometheus_text_format():
+    import urllib.request
+    from common.metrics import Counter, Histogram, Registry, serve_metrics
+
+    registry = Registry()
+    calls = registry.get(Counter, "calls_total", "Calls", ("code",))
+    calls.inc(code="OK")
+    calls.inc(2, code="OK")
+    seconds = registry.get(Histogram, "call_seconds", "Call time", ("op",), buckets=(0.1, 1))
+    for value in (0.05, 0.5, 3):
+        seconds.observe(value, op="send")
+    assert registry.get(Counter, "calls_total", "Calls", ("code",)) is calls
+    with pytest.raises(ValueError):
+        calls.inc(op="x")
+
+    server = serve_metrics(0, "127.0.0.1", registry)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url) as resp:
+            text = resp.read().decode()
+            assert resp.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    finally:
+        server.shutdown()
+    assert text.splitlines() == [
+        "# HELP call_seconds Call time",
+        "# TYPE call_seconds histogram",
+        'call_seconds_bucket{op="send",le="0.1"} 1',
+        'call_seconds_bucket{op="send",le="1"} 2',
+        'call_seconds_bucket{op="send",le="+Inf"} 3',
+        'call_seconds_sum{op="send"} 3.55',
+        'call_seconds_count{op="send"} 3',
+        "# HELP calls_total Calls",
+        "# TYPE calls_total counter",
+        'calls_total{code="OK"} 3',
+    ]
+
+def test_interceptors_and_phase_timers_record_each_rpc(monkeypatch):
+    from concurrent import futures
+    from mcp2pc import two_phase_pb2_grpc
+    from common import interceptors
+    from common.channels import SERVER_OPTIONS, get_channel
+    from coordinator.coordinator import PHASE_SECONDS
+
+    class Stub:
+        def Prepare(self, req, *a, **kw):
+            return two_phase_pb2.PrepareResponse(status=two_phase_pb2.PrepareResponse.READY)
+        def Commit(self, req, *a, **kw):         pass
+        def LockOnChain(self, req, *a, **kw):    return two_phase_pb2.TxHash(hash="0x1")
+        def CommitOnChain(self, req, *a, **kw):  return two_phase_pb2.TxHash(hash="0x1")
+
+    coord = _make_coordinator(monkeypatch, ["a", "b"])
+    coord.shard_stubs = coord.chain_stubs_onchain = {"a": Stub(), "b": Stub()}
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=4), options=SERVER_OPTIONS,
+                         interceptors=[interceptors.ServerMetricsInterceptor()])
+    two_phase_pb2_grpc.add_CoordinatorServicer_to_server(coord, server)
+    target = f"localhost:{server.add_insecure_port('localhost:0')}"
+    server.start()
+
+    handled = {side: interceptors._HANDLED[side] for side in ("server", "client")}
+    def count(side, method, code="OK"):
+        return handled[side].value(grpc_service="mcp2pc.Coordinator", grpc_method=method,
+                                   grpc_code=code)
+    before = {k: count(*k) for k in [("server", "Prepare"), ("client", "Commit"),
+                                     ("server", "Commit", "UNKNOWN")]}
+    phases = {p: PHASE_SECONDS.count(phase=p) for p in ("vote", "lock_onchain", "commit_onchain")}
+    try:
+        stub = two_phase_pb2_grpc.CoordinatorStub(get_channel(target))
+        votes = list(stub.Prepare(two_phase_pb2.PrepareRequest(transaction_id="m", timeout_blocks=5)))
+        assert len(votes) == 2
+        stub.Commit(two_phase_pb2.CommitRequest(transaction_id="m"))
+        with pytest.raises(grpc.RpcError):
+            stub.Commit(two_phase_pb2.CommitRequest(transaction_id="unknown"))
+    finally:
+        server.stop(None)
+
+    assert count("server", "Prepare") == before[("server", "Prepare")] + 1
+    assert count("client", "Commit") == before[("client", "Commit")] + 1
+    assert count("server", "Commit", "UNKNOWN") == before[("server", "Commit", "UNKNOWN")] + 1
+    assert interceptors._IN_FLIGHT["server"].value(grpc_service="mcp2pc.Coordinator",
+                                                   grpc_method="Commit") == 0
+    assert all(PHASE_SECONDS.count(phase=p) == n + 1 for p, n in phases.items())
+
+def test_aio_interceptors_record_streams_and_abort_codes():
+    import asyncio
+    from mcp2pc import two_phase_pb2_grpc
+    from common import interceptors
+    from common.channels import get_aio_channel
+
+    class Servicer(two_phase_pb2_grpc.CoordinatorServicer):
+        async def Prepare(self, req, context):
+            yield two_phase_pb2.PrepareResponse()
+            yield two_phase_pb2.PrepareResponse()
+        async def Commit(self, req, context):
+            await context.abort(grpc.StatusCode.NOT_FOUND, "unknown tx")
+
+    def count(side, method, code):
+        return interceptors._HANDLED[side].value(grpc_service="mcp2pc.Coordinator",
+                                                 grpc_method=method, grpc_code=code)
+    keys = [(side, m, c) for side in ("server", "client")
+            for m, c in (("Prepare", "OK"), ("Commit", "NOT_FOUND"))]
+    before = {k: count(*k) for k in keys}
+
+    async def run():
+        server = grpc.aio.server(interceptors=[interceptors.AioServerMetricsInterceptor()])
+        two_phase_pb2_grpc.add_CoordinatorServicer_to_server(Servicer(), server)
+        port = server.add_insecure_port("127.0.0.1:0")
+        await server.start()
+        try:
+            stub = two_phase_pb2_grpc.CoordinatorStub(get_aio_channel(f"127.0.0.1:{port}"))
+            assert len([v async for v in stub.Prepare(two_phase_pb2.PrepareRequest())]) == 2
+            with pytest.raises(grpc.aio.AioRpcError):
+                await stub.Commit(two_phase_pb2.CommitRequest(transaction_id="t"))
+            await asyncio.sleep(0.05)    # client metrics land on a done callback
+        finally:
+            await server.stop(None)
+
+    asyncio.run(run())
+    assert all(count(*k) == before[k] + 1 for k in keys)
+
+# --- Tracing tests ---------------------------------------------------------
+
+@pytest.fixture
+def spans():
+    from common import tracing
+    exporter = tracing.configure(tracing.MemoryExporter())
+    yield exporter.spans
+    tracing.configure(None)
+
+def _load_script(name):
+    import importlib.util
+    from pathlib import Path
+    path = Path(__file__).parent.parent / "scripts" / f"{name}.py"
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def test_trace_context_crosses_grpc_worker_threads_and_group_windows(monkeypatch, spans):
+    import time
+    from concurrent import futures
+    from mcp2pc import two_phase_pb2_grpc
+    from common import tracing
+    from common.channels import get_channel
+    from common.group_window import GroupWindow
+    from common.interceptors import ServerTracingInterceptor
+
+    seen = []
+    class Servicer(two_phase_pb2_grpc.CoordinatorServicer):
+        def Commit(self, req, context):
+            seen.append(tracing.current())
+            return two_phase_pb2.Empty()
+
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=2),
+                         interceptors=[ServerTracingInterceptor("coordinator")])
+    two_phase_pb2_grpc.add_CoordinatorServicer_to_server(Servicer(), server)
+    target = f"localhost:{server.add_insecure_port('localhost:0')}"
+    server.start()
+    try:
+        with tracing.span("transaction", tx="t1") as root:
+            two_phase_pb2_grpc.CoordinatorStub(get_channel(target)).Commit(
+                two_phase_pb2.CommitRequest(transaction_id="t1"))
+    finally:
+        server.stop(None)
+    deadline = time.monotonic() + 1
+    while len(spans) < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)    # the client span ends on the call's done callback
+
+    client = next(s for s in spans if s.attrs.get("kind") == "client")
+    assert (client.name, client.parent_id, client.attrs["tx"]) == ("Coordinator/Commit", root.span_id, "t1")
+    assert seen[0].trace_id == root.trace_id and seen[0].parent_id == client.span_id
+    assert seen[0].attrs == {"kind": "server", "service": "coordinator", "tx": "t1"}
+
+    # fan-out calls run on pool threads as children of the phase's span
+    coord = _make_coordinator(monkeypatch, ["a", "b"])
+    with tracing.span("lock") as phase:
+        results = coord._fan_out({"a": 1, "b": 2}, lambda sid, stub: tracing.current(), 1)
+    assert all(result is phase for result, _ in results.values())
+
+    # a group flush is a child of its first caller, linked to the rest
+    window = GroupWindow(lambda items: [tracing.current()] * len(items), 0.05, 2, "prepare")
+    with tracing.span("a") as a:
+        first = window.submit(1)
+    with tracing.span("b") as b:
+        window.submit(2)
+    group = first.result(timeout=1)
+    assert (group.name, group.parent_id, group.links) == ("prepare group", a.span_id, [b.context])
+    window.close()
+
+def test_aio_tracing_propagates_through_streams(spans):
+    import asyncio
+    from mcp2pc import two_phase_pb2_grpc
+    from common import tracing
+    from common.channels import get_aio_channel
+    from common.interceptors import AioServerTracingInterceptor
+
+    seen = []
+    class Servicer(two_phase_pb2_grpc.CoordinatorServicer):
+        async def Prepare(self, req, context):
+            seen.append(tracing.current())
+            yield two_phase_pb2.PrepareResponse()
+
+    async def run():
+        server = grpc.aio.server(interceptors=[AioServerTracingInterceptor("coordinator")])
+        two_phase_pb2_grpc.add_CoordinatorServicer_to_server(Servicer(), server)
+        port = server.add_insecure_port("127.0.0.1:0")
+        await server.start()
+        try:
+            stub = two_phase_pb2_grpc.CoordinatorStub(get_aio_channel(f"127.0.0.1:{port}"))
+            with tracing.span("transaction") as root:
+                [v async for v in stub.Prepare(two_phase_pb2.PrepareRequest(transaction_id="t2"))]
+            await asyncio.sleep(0.05)    # the client span ends on a done callback
+        finally:
+            await server.stop(None)
+        return root
+
+    root = asyncio.run(run())
+    client = next(s for s in spans if s.attrs.get("kind") == "client")
+    assert client.parent_id == root.span_id and seen[0].parent_id == client.span_id
+    assert seen[0].trace_id == root.trace_id and seen[0].end is not None
+
+def test_critical_path_of_a_bench_tx(real_lightclient, tmp_path, monkeypatch):
+    import io
+    from common import tracing
+    from common.channels import close_channels
+
+    bench, critical_path = _load_script("bench_2pc"), _load_script("critical_path")
+    path = str(tmp_path / "spans.jsonl")
+    monkeypatch.setenv(tracing.TRACE_FILE_ENV, path)
+    args = bench.parse_args(["--shards", "2", "--clients", "3", "--txs", "3", "--block-time", "0.02",
+                             "--group-window", "0.01", "--trace-file", path])
+    try:
+        report = bench.run(args)
+    finally:
+        tracing.configure(None)
+        close_channels()
+    assert report["txs"] == {"committed": 3}
+
+    spans = critical_path.load([path])
+    assert all(s["status"] == "OK" for s in spans.values())
+    tx_ids = [s["attrs"]["tx"] for s in spans.values() if s["name"] == "transaction"]
+    assert len(tx_ids) == 3
+    children = critical_path.children_index(spans)
+    for tx_id in tx_ids:
+        # every tx reaches the shared group and batch spans, through links
+        # where another tx went first
+        root, = critical_path.roots(spans, children, tx_id)
+        names = [s["name"] for _, s, _ in critical_path.critical_path(root, children)]
+        assert names[0] == "transaction" and "Coordinator/Commit" in names
+        assert "commit group" in names and names[-1] == "chain/receipt_wait"
+
+    out = io.StringIO()
+    assert critical_path.report(spans, tx_ids[0], out=out)
+    assert "most self time:" in out.getvalue()
+    assert not critical_path.report(spans, "nope", out=io.StringIO())
+
+# --- Event indexer tests ---------------------------------------------------
+
+def test_indexer_follows_adapter_logs_and_serves_status(real_lightclient):
+    from concurrent import futures
+    from mcp2pc import two_phase_pb2_grpc
+    from common import simchain
+    from common.block_oracle import get_oracle
+    from common.channels import get_channel
+    from indexer.index_node import EventIndexer, TxIndex
+    from indexer.store import TxStatusStore
+
+    chain = simchain.SimChain(block_time=0)
+    adapters = {"shard1": chain.deploy_adapter(), "shard2": chain.deploy_adapter()}
+    url = simchain.register("indexed", chain)
+    oracle = get_oracle(url, max_staleness=0, poll_interval=0.005)
+    shards = {sid: Shard(sid, url, a) for sid, a in adapters.items()}
+    alice = "0x24c881bF947a922cfb46794DEC370036d413b4B2"
+    bob = "0x000000000000000000000000000000000000b0b0"
+
+    def lock(sid, tx, recipient, deadline):
+        shards[sid].LockOnChain(two_phase_pb2.LockRequest(
+            transaction_id=tx, recipient=recipient, amount=5, deadline=deadline), None)
+
+    lock("shard1", "01", alice, chain.height + 2)
+    lock("shard2", "01", alice, chain.height + 30)
+    lock("shard1", "02", bob, chain.height + 20)
+    shards["shard2"].CommitOnChain(two_phase_pb2.OnChainRequest(transaction_id="01"), None)
+
+    store = TxStatusStore()
+    indexer = EventIndexer(store, oracle.client.backend, oracle, adapters)
+    indexer.MAX_RANGE = 2                 # several ranges per batched call
+    assert indexer.catch_up() == chain.height
+    shards["shard1"].ReclaimOnChain(two_phase_pb2.OnChainRequest(transaction_id="01"), None)
+    indexer.catch_up()
+
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=2))
+    two_phase_pb2_grpc.add_TxIndexServicer_to_server(TxIndex(store, adapters), server)
+    port = server.add_insecure_port("localhost:0")
+    server.start()
+    try:
+        stub = two_phase_pb2_grpc.TxIndexStub(get_channel(f"localhost:{port}"))
+        status = stub.GetStatus(two_phase_pb2.StatusRequest(transaction_ids=["01", "03"]))
+        assert status.indexed_height == chain.height
+        assert [(r.shard_id, r.status) for r in status.records] == [
+            ("shard1", two_phase_pb2.TxRecord.ABORTED), ("shard2", two_phase_pb2.TxRecord.COMMITTED)]
+        assert status.records[0].recipient == alice and status.records[0].settle_hash
+
+        pending = stub.ListPending(two_phase_pb2.ListPendingRequest(recipient=bob.lower()))
+        assert [(r.transaction_id[-2:], r.amount) for r in pending.records] == [("02", 5)]
+        assert not stub.ListPending(two_phase_pb2.ListPendingRequest(sender=alice)).records
+        with pytest.raises(grpc.RpcError) as err:
+            stub.GetStatus(two_phase_pb2.StatusRequest(transaction_ids=["not hex"]))
+        assert err.value.code() == grpc.StatusCode.INVALID_ARGUMENT
+    finally:
+        server.stop(None)
+    for shard in shards.values():
+        shard.receipts.close()
+
+def test_tx_status_store_pages_pending_and_keeps_its_cursor(tmp_path):
+    from indexer.store import AdapterEvent, TxStatusStore, PENDING, COMMITTED
+
+    def locked(i, sender, deadline):
+        return AdapterEvent("s1", "Locked", bytes([i]) * 32, 10 + i, f"0x{i:02x}",
+                            {"sender": sender, "recipient": "0xR", "amount": 10**24, "deadline": deadline})
+
+    store = TxStatusStore(str(tmp_path / "index.db"))
+    store.apply([locked(i, "0xA" if i % 2 else "0xB", 100 - i) for i in range(1, 8)], {"s1": 20})
+    store.apply([AdapterEvent("s1", "Committed", bytes([3]) * 32, 21, "0xc3", {})], {"s1": 21})
+    store.close()
+
+    store = TxStatusStore(str(tmp_path / "index.db"))
+    assert store.cursor("s1") == 21 and store.indexed_height(["s1", "s2"]) == 0
+    assert store.get([bytes([3]) * 32])[0].status == COMMITTED
+    # by deadline, one at a time, resuming after the last key of each page
+    pages, after = [], None
+    while True:
+        page = store.pending(sender="0xA", deadline_from=94, limit=1, after=after)
+        if not page:
+            break
+        pages.append([r.deadline for r in page])
+        after = (page[-1].deadline, page[-1].tx_id, page[-1].shard)
+    assert pages == [[95], [99]]          # 93 is too early, 97 was committed
+    assert [r.deadline for r in store.pending(deadline_to=96)] == [93, 94, 95, 96]
+    assert all(r.status == PENDING and r.amount == 10**24 for r in store.pending())
+    store.close()
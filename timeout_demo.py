@@ -1,6 +1,7 @@
 # timeout_demo.py
-import time, os, uuid, grpc, json
+import os, uuid, json
 from mcp2pc import two_phase_pb2, two_phase_pb2_grpc
+from common.channels import get_channel
 from web3 import Web3
 from dotenv import load_dotenv
 
@@ -11,7 +12,7 @@ def run_and_check_timeout():
     adapters = json.load(open("config/adapters.json"))
 
     tx_id = uuid.uuid4().hex
-    ch    = grpc.insecure_channel("localhost:50051")
+    ch    = get_channel("localhost:50051")
     stub  = two_phase_pb2_grpc.CoordinatorStub(ch)
 
     # use a very small timeout to wait it out
@@ -32,12 +33,16 @@ def run_and_check_timeout():
         print("waiting for timeout…")
         # check current height and deadline
         from common.timeout_manager import TimeoutManager
-        from common.lightclient import LightClient
-        tm = TimeoutManager(LightClient(os.getenv("ALCHEMY_RPC_URL")))
+        from common.block_oracle import get_oracle
+        oracle = get_oracle(os.getenv("ALCHEMY_RPC_URL"))
+        tm = TimeoutManager(oracle)
         tm.start(tx_id, tb)
-        while tm.client.get_block_height() <= tm.deadlines[tx_id]:
-            print("  block", tm.client.get_block_height(), "≤", tm.deadlines[tx_id])
-            time.sleep(10)
+        # print each new head as it arrives, then block until the deadline passes
+        unsubscribe = oracle.subscribe(
+            lambda h: print("  block", h, "≤", tm.deadlines[tx_id])
+        )
+        oracle.wait_for_height(tm.deadlines[tx_id] + 1)
+        unsubscribe()
         print("  deadline passed, now aborting…")
         stub.Abort(two_phase_pb2.AbortRequest(transaction_id=tx_id))
     else: